@@ -0,0 +1,86 @@
+"""Upstream calls and latency of opening several pages, one `fetch` per URL vs. one `fetch_many`.
+
+Serves a fake Exa contents API locally that answers each request after
+`--request-ms` plus `--url-ms` per requested URL, and at most `--upstream-limit`
+requests at a time (like a rate-limited API key). Opens `--pages` pages, as the
+prefetcher does with the top results of a search, with sequential `fetch`
+calls, concurrent `fetch` calls and a single batched `fetch_many` call.
+
+    python benchmarks/browser_fetch_many.py --pages 5 --request-ms 300 --url-ms 20
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from aiohttp import ClientSession, web
+from aiohttp.test_utils import TestServer
+
+from gpt_oss.tools.simple_browser import ExaBackend
+
+
+def make_app(args) -> tuple[web.Application, list[int]]:
+    calls: list[int] = []
+    limit = asyncio.Semaphore(args.upstream_limit)
+
+    async def contents(request: web.Request) -> web.Response:
+        urls = (await request.json())["urls"]
+        calls.append(len(urls))
+        async with limit:
+            await asyncio.sleep((args.request_ms + args.url_ms * len(urls)) / 1e3)
+        text = "<p>" + "lorem ipsum dolor sit amet " * (args.page_kb * 40) + "</p>"
+        return web.json_response({"results": [{"id": url, "title": url, "text": text} for url in urls]})
+
+    app = web.Application()
+    app.router.add_post("/contents", contents)
+    return app, calls
+
+
+async def run(args):
+    os.environ.setdefault("EXA_API_KEY", "benchmark")
+    app, calls = make_app(args)
+    urls = [f"https://example.com/page/{i}" for i in range(args.pages)]
+    async with TestServer(app) as server, ClientSession() as session:
+        backend = ExaBackend(source="web", BASE_URL=str(server.make_url("")).rstrip("/"))
+
+        async def sequential():
+            return [await backend.fetch(url, session=session) for url in urls]
+
+        async def concurrent():
+            return await asyncio.gather(*(backend.fetch(url, session=session) for url in urls))
+
+        async def batched():
+            return await backend.fetch_many(urls, session=session)
+
+        for name, open_pages in [("sequential fetch", sequential), ("concurrent fetch", concurrent), ("fetch_many", batched)]:
+            latencies = []
+            calls.clear()
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                pages = await open_pages()
+                latencies.append(time.perf_counter() - start)
+            assert all(not isinstance(page, Exception) for page in pages)
+            print(
+                f"{name:>17}: {len(calls) / args.repeats:4.1f} upstream calls, "
+                f"best {min(latencies) * 1e3:7.1f} ms, mean {sum(latencies) / len(latencies) * 1e3:7.1f} ms"
+            )
+
+
+def main(args):
+    print(
+        f"{args.pages} pages of ~{args.page_kb} KB, {args.request_ms} ms per request + {args.url_ms} ms per URL, "
+        f"{args.upstream_limit} concurrent upstream requests"
+    )
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--page-kb", type=int, default=20, help="approximate page size")
+    parser.add_argument("--request-ms", type=float, default=300.0, help="upstream latency per request")
+    parser.add_argument("--url-ms", type=float, default=20.0, help="additional upstream latency per URL")
+    parser.add_argument("--upstream-limit", type=int, default=2, help="concurrent requests the upstream serves")
+    parser.add_argument("--repeats", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,118 @@
+"""Latency of `find` on a large page, line scan per call vs. the cached `FindIndex`.
+
+`find` used to re-wrap the page, strip its links and lowercase and scan every
+line in Python for each query. The page's `FindIndex` does that work once and
+answers each pattern with C-level scans (`str.find` / `re.search`) of the
+lowercased text, mapped back to lines by binary search. Runs `--queries`
+literal patterns (frequent words, rare words and absent ones) against a
+synthetic page of `--size` characters with both, then the index alone with
+whole-word, regex and multi-pattern queries. The first indexed query includes
+building the index (and wrapping the page, if it has not been shown yet).
+
+    python benchmarks/browser_find.py --size 1000000 --queries 200
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from gpt_oss.tools.simple_browser.page_contents import PageContents
+from gpt_oss.tools.simple_browser.simple_browser_tool import (
+    join_lines,
+    run_find_in_page,
+    strip_links,
+    wrap_lines,
+)
+
+WORDS = (
+    "the of and to in is was for on that with as by at from his her an were which are this be "
+    "has had it not or have first one their its new after who they two been other when there all "
+    "during into school time may years more most only over city some world would where later up "
+    "such used many can state about national out known university united then made"
+).split()
+
+
+def make_page(size: int, seed: int = 0) -> PageContents:
+    rng = random.Random(seed)
+    lines = []
+    length = 0
+    i = 0
+    while length < size:
+        words = rng.choices(WORDS, k=rng.randint(5, 60))
+        if i % 7 == 0:
+            words.insert(rng.randint(0, len(words)), f"【{i}†Article {i}†example.com】")
+        if i % 97 == 0:
+            words.append(f"rare{i}")
+        line = " ".join(words) + "."
+        lines.append(line)
+        length += len(line) + 1
+        i += 1
+    return PageContents(url="https://example.com/long", text="\n".join(lines)[:size], title="Long page", urls={})
+
+
+def scan_find(pattern: str, page: PageContents, max_results: int = 50, num_show_lines: int = 4) -> list[int]:
+    """The previous implementation of `run_find_in_page`, without building the result page."""
+    lines = strip_links(join_lines(wrap_lines(text=page.text))).split("\n")
+    results = []
+    line_idx = 0
+    while line_idx < len(lines):
+        if pattern not in lines[line_idx].lower():
+            line_idx += 1
+            continue
+        results.append(line_idx)
+        if len(results) == max_results:
+            break
+        line_idx += num_show_lines
+    return results
+
+
+def indexed_find(page: PageContents, pattern, **kwargs) -> list[int]:
+    result = asyncio.run(run_find_in_page(pattern, page, **kwargs))
+    return [snippet.line_idx for snippet in result.snippets.values()]
+
+
+def timed(fn, queries) -> tuple[list[float], list]:
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(fn(query))
+        latencies.append(time.perf_counter() - start)
+    return latencies, results
+
+
+def report(name: str, latencies: list[float]) -> None:
+    print(
+        f"{name:>22}: first {latencies[0] * 1e3:8.2f} ms, median {statistics.median(latencies) * 1e3:7.3f} ms, "
+        f"p99 {statistics.quantiles(latencies, n=100)[98] * 1e3:7.3f} ms, total {sum(latencies):6.2f} s"
+    )
+
+
+def main(args):
+    rng = random.Random(1)
+    page = make_page(args.size)
+    queries = [
+        rng.choice([rng.choice(WORDS), f"rare{rng.randrange(0, 20000, 97)}", "absent term", "article 12"])
+        for _ in range(args.queries)
+    ]
+    print(f"page of {len(page.text) / 1e6:.1f} MB, {len(queries)} queries")
+
+    scan_latencies, scan_results = timed(lambda q: scan_find(q, page), queries)
+    report("line scan", scan_latencies)
+    index_latencies, index_results = timed(lambda q: indexed_find(page, q), queries)
+    report("index", index_latencies)
+    print("same results" if scan_results == index_results else "results differ")
+
+    report("index, whole word", timed(lambda q: indexed_find(page, q, whole_word=True), queries)[0])
+    regexes = [rf"\b{q}\w*\b" for q in queries]
+    report("index, regex", timed(lambda q: indexed_find(page, q, regex=True), regexes)[0])
+    multi = [[queries[i], queries[i - 1], queries[i - 2]] for i in range(len(queries))]
+    report("index, 3 patterns", timed(lambda q: indexed_find(page, q), multi)[0])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1_000_000, help="page size in characters")
+    parser.add_argument("--queries", type=int, default=200)
+    main(parser.parse_args())
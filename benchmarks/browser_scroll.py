@@ -0,0 +1,99 @@
+"""Latency of scrolling through a large page in the browser tool, per call vs. `PageView`.
+
+Each `show_page` used to re-wrap the whole page text and re-tokenize the
+window it shows to find how many lines fit in `view_tokens`. The cached
+`PageView` wraps the page and counts the tokens of each line once, as far as
+the viewports shown so far reach, then resolves each viewport with a binary
+search. Scrolls through a synthetic page
+of `--size` bytes from top to bottom `--passes` times, the way the model pages
+through a document with `open(loc=...)`, and reports the latency per viewport.
+The first viewport shown with `PageView` includes wrapping the page.
+
+    python benchmarks/browser_scroll.py --size 1000000 --passes 2
+"""
+
+import argparse
+import statistics
+import time
+
+from gpt_oss.tools.simple_browser.page_contents import PageContents
+from gpt_oss.tools.simple_browser.simple_browser_tool import (
+    ENC_NAME,
+    get_end_loc,
+    join_lines,
+    page_view,
+    wrap_lines,
+)
+
+
+def make_page(size: int) -> PageContents:
+    paragraphs = []
+    i = 0
+    while sum(map(len, paragraphs)) < size:
+        paragraphs.append(
+            f"Paragraph {i} of the article, with a 【{i}†link to another page】 and some "
+            f"more words to wrap: the quick brown fox jumps over the lazy dog {i * 7} times.\n"
+        )
+        i += 1
+    return PageContents(url="https://example.com/long", text="".join(paragraphs)[:size], title="Long page", urls={})
+
+
+def show_per_call(page: PageContents, loc: int, view_tokens: int, encoding_name: str) -> tuple[str, int]:
+    """What `show_page` did before `PageView`."""
+    lines = wrap_lines(text=page.text)
+    end_loc = get_end_loc(loc, -1, len(lines), lines, view_tokens, encoding_name)
+    return join_lines(lines[loc:end_loc], add_line_numbers=True, offset=loc), end_loc
+
+
+def show_cached(page: PageContents, loc: int, view_tokens: int, encoding_name: str) -> tuple[str, int]:
+    view = page_view(page)
+    end_loc = view.end_loc(loc, -1, view_tokens, encoding_name)
+    return join_lines(view.lines[loc:end_loc], add_line_numbers=True, offset=loc), end_loc
+
+
+def scroll(page: PageContents, passes: int, view_tokens: int, encoding_name: str, show) -> tuple[list[float], list[int]]:
+    total_lines = len(wrap_lines(text=page.text))
+    latencies, ends = [], []
+    for _ in range(passes):
+        loc = 0
+        while True:
+            start = time.perf_counter()
+            _, end_loc = show(page, loc, view_tokens, encoding_name)
+            latencies.append(time.perf_counter() - start)
+            ends.append(end_loc)
+            if end_loc >= total_lines:
+                break
+            loc = end_loc
+    return latencies, ends
+
+
+def main(args):
+    page = make_page(args.size)
+    print(f"page of {len(page.text) / 1e6:.1f} MB, view_tokens={args.view_tokens}, {args.passes} passes")
+    # Warm the tokenizer caches so that neither mode pays for them.
+    get_end_loc(0, -1, 2, ["x" * args.view_tokens] * 2, args.view_tokens, args.encoding)
+
+    results = {}
+    for name, show in [("per call", show_per_call), ("page view", show_cached)]:
+        fresh = page.model_copy()
+        latencies, ends = scroll(fresh, args.passes, args.view_tokens, args.encoding, show)
+        results[name] = ends
+        print(
+            f"{name:>9}: {len(latencies)} viewports, first {latencies[0] * 1e3:8.2f} ms, "
+            f"median {statistics.median(latencies) * 1e3:8.3f} ms, total {sum(latencies):7.2f} s"
+        )
+    if results["per call"] == results["page view"]:
+        print("same viewports")
+    else:
+        # The per-call path maps tokens to characters with the decoded length of
+        # each token, which overcounts characters split over several tokens.
+        print("viewports differ: the text has characters that are split over several tokens")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1_000_000, help="page size in characters")
+    parser.add_argument("--passes", type=int, default=1)
+    parser.add_argument("--view-tokens", type=int, default=1024)
+    parser.add_argument("--encoding", default=ENC_NAME)
+    main(parser.parse_args())
@@ -0,0 +1,149 @@
+"""Browser tool latency with a session per call vs. the shared `ClientSessionPool`.
+
+Starts a local mock of the Exa search API in a separate process (optionally
+over TLS with a throw-away self-signed certificate, which needs the `openssl`
+command) and runs `SimpleBrowserTool.search` + `open` through it, first opening
+a new `ClientSession` for every call as before, then with one pooled
+keep-alive session. Reports per-call latency and the number of TCP
+connections the server accepted.
+
+    python benchmarks/browser_session_pool.py --calls 200 --tls
+"""
+
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import ssl
+import statistics
+import subprocess
+import tempfile
+import time
+
+
+def _serve(port_queue, certfile, keyfile):
+    from aiohttp import web
+
+    # Holding the transports keeps their ids unique (client ports get reused).
+    connections = {}
+
+    async def search(request):
+        connections[id(request.transport)] = request.transport
+        payload = await request.json()
+        results = [
+            {"title": f"Result {i}", "url": f"https://example.com/{payload['query']}/{i}", "summary": "summary"}
+            for i in range(5)
+        ]
+        return web.json_response({"results": results})
+
+    async def contents(request):
+        connections[id(request.transport)] = request.transport
+        payload = await request.json()
+        # Pages stay below the browser's view size so rendering does not need the tokenizer.
+        text = "<p>" + "lorem ipsum " * 50 + "</p>"
+        return web.json_response({"results": [{"title": payload["urls"][0], "text": text}]})
+
+    async def stats(request):
+        count = len(connections)
+        connections.clear()
+        return web.json_response({"connections": count})
+
+    async def main():
+        app = web.Application()
+        app.router.add_post("/search", search)
+        app.router.add_post("/contents", contents)
+        app.router.add_get("/stats", stats)
+        ssl_context = None
+        if certfile:
+            ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            ssl_context.load_cert_chain(certfile, keyfile)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0, ssl_context=ssl_context)
+        await site.start()
+        port_queue.put(site._server.sockets[0].getsockname()[1])
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+def _self_signed_cert(directory):
+    certfile, keyfile = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1",
+         "-addext", "subjectAltName=IP:127.0.0.1", "-keyout", keyfile, "-out", certfile],
+        check=True,
+        capture_output=True,
+    )
+    return certfile, keyfile
+
+
+async def _run(args, base_url):
+    import aiohttp
+
+    from gpt_oss.tools.simple_browser import ClientSessionPool, ExaBackend, SimpleBrowserTool
+
+    os.environ.setdefault("EXA_API_KEY", "benchmark")
+    backend = ExaBackend(source="web", BASE_URL=base_url)
+
+    async def server_connections():
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{base_url}/stats") as resp:
+                return (await resp.json())["connections"]
+
+    async def one_call(tool, i):
+        start = time.perf_counter()
+        async for _ in tool.search(query=f"query-{i}"):
+            pass
+        async for _ in tool.open(id=0):
+            pass
+        return time.perf_counter() - start
+
+    print(f"{'mode':>8} {'calls':>6} {'mean ms':>8} {'p50 ms':>7} {'p99 ms':>7} {'total s':>8} {'connections':>12}")
+    for mode in ("session", "pooled"):
+        await server_connections()
+        pool = ClientSessionPool() if mode == "pooled" else None
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def call(i):
+            async with semaphore:
+                return await one_call(SimpleBrowserTool(backend=backend, session_pool=pool), i)
+
+        start = time.perf_counter()
+        latencies = sorted(await asyncio.gather(*(call(i) for i in range(args.calls))))
+        total = time.perf_counter() - start
+        if pool is not None:
+            await pool.close()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"{mode:>8} {args.calls:>6} {statistics.fmean(latencies) * 1e3:>8.2f} "
+              f"{latencies[len(latencies) // 2] * 1e3:>7.2f} {p99 * 1e3:>7.2f} {total:>8.2f} "
+              f"{await server_connections():>12}")
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        certfile = keyfile = None
+        if args.tls:
+            certfile, keyfile = _self_signed_cert(tmp)
+        ctx = mp.get_context("spawn")
+        port_queue = ctx.Queue()
+        server = ctx.Process(target=_serve, args=(port_queue, certfile, keyfile), daemon=True)
+        server.start()
+        try:
+            port = port_queue.get(timeout=30)
+            scheme = "https" if args.tls else "http"
+            print(f"mock search API at {scheme}://127.0.0.1:{port}, concurrency {args.concurrency}")
+            if certfile:
+                # aiohttp builds its default SSL context from SSL_CERT_FILE when it is first imported.
+                os.environ["SSL_CERT_FILE"] = certfile
+            asyncio.run(_run(args, f"{scheme}://127.0.0.1:{port}"))
+        finally:
+            server.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200, help="search + open round trips per mode")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--tls", action="store_true", help="serve over HTTPS with a self-signed certificate")
+    main(parser.parse_args())
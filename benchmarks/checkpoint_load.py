@@ -0,0 +1,97 @@
+"""Cold-start load time of `Transformer.from_checkpoint` on a synthetic multi-shard checkpoint.
+
+Compares the previous loader behaviour (scan every shard for keys, re-open the file
+for every tensor, load sequentially) with the current one (index file, persistent
+handles, thread-pool read + MXFP4 decode). Page cache is dropped for the shard
+files before each run with posix_fadvise, so runs start cold.
+
+    python benchmarks/checkpoint_load.py --shards 4 --layers 8 --workers 1 4 8
+"""
+
+import argparse
+import functools
+import os
+import tempfile
+import time
+
+import torch
+from safetensors import safe_open
+
+import gpt_oss.torch.model as torch_model
+from gpt_oss.torch.weights import Checkpoint
+
+from common import SMALL_CONFIG, write_synthetic_checkpoint
+
+
+class LegacyCheckpoint(Checkpoint):
+    """The loader before handles were cached: scans all shards, opens a file per tensor."""
+
+    def __init__(self, path: str, device: torch.device):
+        super().__init__(path, device, num_workers=1)
+        if os.path.exists(os.path.join(path, "model.safetensors.index.json")):
+            self.tensor_name_to_file = {}
+            for fname in os.listdir(path):
+                if fname.endswith(".safetensors"):
+                    with safe_open(os.path.join(path, fname), framework="pt", device=self.device_str) as f:
+                        for key in f.keys():
+                            self.tensor_name_to_file[key] = os.path.join(path, fname)
+
+    def _get_tensor(self, name: str) -> torch.Tensor:
+        with safe_open(self.tensor_name_to_file[name], framework="pt", device=self.device_str) as f:
+            return f.get_tensor(name)
+
+
+def drop_page_cache(path: str):
+    for fname in os.listdir(path):
+        if fname.endswith(".safetensors"):
+            fd = os.open(os.path.join(path, fname), os.O_RDONLY)
+            try:
+                os.fsync(fd)
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+
+
+def time_load(path: str, checkpoint_factory, repeats: int) -> float:
+    original = torch_model.Checkpoint
+    torch_model.Checkpoint = checkpoint_factory
+    try:
+        best = float("inf")
+        for _ in range(repeats):
+            drop_page_cache(path)
+            start = time.perf_counter()
+            model = torch_model.Transformer.from_checkpoint(path, device="cpu")
+            best = min(best, time.perf_counter() - start)
+            del model
+        return best
+    finally:
+        torch_model.Checkpoint = original
+
+
+def main(args):
+    config = SMALL_CONFIG | dict(num_hidden_layers=args.layers, num_experts=args.experts)
+    with tempfile.TemporaryDirectory(dir=args.tmpdir) as tmp:
+        path = write_synthetic_checkpoint(os.path.join(tmp, "checkpoint"), config, num_shards=args.shards, index=True)
+        size_mb = sum(
+            os.path.getsize(os.path.join(path, f)) for f in os.listdir(path) if f.endswith(".safetensors")
+        ) / 2**20
+        print(f"checkpoint: {args.shards} shards, {size_mb:.1f} MiB on disk, {args.layers} layers x {args.experts} experts")
+
+        baseline = time_load(path, LegacyCheckpoint, args.repeats)
+        print(f"{'loader':<28} {'seconds':>8} {'speedup':>8}")
+        print(f"{'legacy (open per tensor)':<28} {baseline:>8.3f} {1.0:>7.2f}x")
+        for workers in args.workers:
+            elapsed = time_load(path, functools.partial(Checkpoint, num_workers=workers), args.repeats)
+            label = f"persistent, {workers} worker{'s' if workers > 1 else ''}"
+            print(f"{label:<28} {elapsed:>8.3f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--layers", type=int, default=8)
+    parser.add_argument("--experts", type=int, default=32)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--tmpdir", type=str, default=None, help="Where to write the synthetic checkpoint")
+    main(parser.parse_args())
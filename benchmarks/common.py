@@ -0,0 +1,93 @@
+"""Helpers shared by the benchmark scripts."""
+
+import dataclasses
+import json
+import os
+import resource
+import time
+from contextlib import contextmanager
+
+import torch
+from safetensors.torch import save_file
+
+from gpt_oss.torch.model import ModelConfig, Transformer
+
+
+# Small enough to build in seconds on a laptop, large enough that matmuls dominate.
+SMALL_CONFIG = dict(
+    num_hidden_layers=4,
+    num_experts=8,
+    experts_per_token=2,
+    vocab_size=8192,
+    hidden_size=512,
+    intermediate_size=512,
+    swiglu_limit=7.0,
+    head_dim=64,
+    num_attention_heads=16,
+    num_key_value_heads=4,
+    sliding_window=128,
+    initial_context_length=4096,
+    rope_theta=150000.0,
+    rope_scaling_factor=1.0,
+)
+
+
+def write_synthetic_checkpoint(
+    path: str,
+    config: dict = SMALL_CONFIG,
+    num_shards: int = 1,
+    seed: int = 0,
+    index: bool = False,
+    std: float = 0.2,
+) -> str:
+    """Write a random checkpoint with MXFP4-packed MoE weights in the on-disk layout.
+
+    `std` is the standard deviation of the dense weights; the default gives large,
+    near one-hot attention scores, which is fine for speed measurements but makes
+    the model chaotic, so accuracy comparisons should pass something like 0.02.
+    """
+    generator = torch.Generator().manual_seed(seed)
+    config = ModelConfig(**config)
+    with torch.device("meta"):
+        model = Transformer(config, device=torch.device("meta"))
+    tensors = {}
+    for name, param in model.named_parameters():
+        if name.endswith("mlp1_weight") or name.endswith("mlp2_weight"):
+            *prefix, cols = param.shape
+            tensors[f"{name}.blocks"] = torch.randint(
+                0, 256, (*prefix, cols // 32, 16), dtype=torch.uint8, generator=generator
+            )
+            tensors[f"{name}.scales"] = torch.randint(
+                118, 124, (*prefix, cols // 32), dtype=torch.uint8, generator=generator
+            )
+        elif name.endswith("norm.scale"):
+            tensors[name] = 1.0 + 0.1 * torch.randn(param.shape, generator=generator)
+        else:
+            tensors[name] = (std * torch.randn(param.shape, generator=generator)).to(param.dtype)
+
+    os.makedirs(path, exist_ok=True)
+    names = sorted(tensors)
+    weight_map = {}
+    for shard in range(num_shards):
+        filename = f"model-{shard:05d}-of-{num_shards:05d}.safetensors"
+        shard_names = names[shard::num_shards]
+        save_file({name: tensors[name].contiguous() for name in shard_names}, os.path.join(path, filename))
+        weight_map.update({name: filename for name in shard_names})
+    if index:
+        with open(os.path.join(path, "model.safetensors.index.json"), "w") as f:
+            json.dump({"metadata": {}, "weight_map": weight_map}, f)
+    with open(os.path.join(path, "config.json"), "w") as f:
+        json.dump(dataclasses.asdict(config), f)
+    return path
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@contextmanager
+def timer(results: dict, key: str):
+    start = time.perf_counter()
+    yield
+    results[key] = time.perf_counter() - start
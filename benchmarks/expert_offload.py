@@ -0,0 +1,87 @@
+"""Expert offloading on CPU: cache hit rate and decode tokens/s vs. expert cache size.
+
+Writes a synthetic checkpoint with many small experts, then greedily generates
+from the same prompt with all experts resident and with offloaded experts at
+several cache sizes (given as a fraction of all layers x experts). Each run is a
+fresh process so the peak RSS figure is its own.
+
+    python benchmarks/expert_offload.py --experts 32 --fractions 0.125 0.25 0.5 1.0
+"""
+
+import argparse
+import multiprocessing
+import tempfile
+import time
+
+from common import SMALL_CONFIG, peak_rss_mb, write_synthetic_checkpoint
+
+
+def _run(path, cache_size, prefetch, args, queue):
+    import torch
+
+    from gpt_oss.torch.model import TokenGenerator
+
+    torch.set_num_threads(args.threads)
+    generator = TokenGenerator(path, device=torch.device("cpu"), context=512, expert_cache_size=cache_size)
+    if cache_size and not prefetch:
+        # TokenGenerator always prefetches; unhook it to measure demand loading alone.
+        for block in generator.model.block:
+            block.mlp.next_route = None
+
+    prompt = torch.randint(0, args.vocab, (args.prompt,), generator=torch.Generator().manual_seed(0)).tolist()
+    list(generator.generate(prompt, stop_tokens=[], temperature=0.0, max_tokens=2))  # warm-up
+    if cache_size:
+        generator.model.expert_cache.stats.__init__()
+    start = time.perf_counter()
+    tokens = list(generator.generate(prompt, stop_tokens=[], temperature=0.0, max_tokens=args.tokens))
+    seconds = time.perf_counter() - start
+    stats = generator.model.expert_cache.stats.as_dict() if cache_size else {}
+    queue.put((len(tokens) / seconds, stats, peak_rss_mb()))
+
+
+def main(args):
+    config = dict(
+        SMALL_CONFIG,
+        num_experts=args.experts,
+        experts_per_token=args.top_k,
+        intermediate_size=args.intermediate,
+        hidden_size=args.hidden,
+    )
+    total = config["num_hidden_layers"] * config["num_experts"]
+    ctx = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as tmp:
+        write_synthetic_checkpoint(tmp, config)
+        args.vocab = config["vocab_size"]
+        runs = [("resident", 0, False)]
+        for fraction in args.fractions:
+            size = max(int(total * fraction), 1)
+            runs.append((f"offload {size}/{total}", size, False))
+            runs.append((f"offload {size}/{total} +pf", size, True))
+        print(f"{config['num_hidden_layers']} layers x {args.experts} experts (top-{args.top_k}), {args.tokens} tokens")
+        print(f"{'mode':<24} {'tok/s':>8} {'hit rate':>9} {'pf acc':>7} {'evictions':>10} {'peak MiB':>9}")
+        for name, size, prefetch in runs:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_run, args=(tmp, size, prefetch, args, queue))
+            proc.start()
+            tokens_per_s, stats, peak = queue.get()
+            proc.join()
+            if stats:
+                print(
+                    f"{name:<24} {tokens_per_s:>8.2f} {stats['hit_rate']:>9.2%} "
+                    f"{stats['prefetch_accuracy']:>7.2%} {stats['evictions']:>10} {peak:>9.1f}"
+                )
+            else:
+                print(f"{name:<24} {tokens_per_s:>8.2f} {'-':>9} {'-':>7} {'-':>10} {peak:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--experts", type=int, default=32)
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--hidden", type=int, default=512)
+    parser.add_argument("--intermediate", type=int, default=1024)
+    parser.add_argument("--fractions", type=float, nargs="+", default=[0.125, 0.25, 0.5, 1.0])
+    parser.add_argument("--prompt", type=int, default=32, help="Prompt length in tokens")
+    parser.add_argument("--tokens", type=int, default=32, help="Tokens to generate")
+    parser.add_argument("--threads", type=int, default=1)
+    main(parser.parse_args())
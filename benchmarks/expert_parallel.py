@@ -0,0 +1,135 @@
+"""MoE communication volume and latency: expert-parallel vs. tensor-parallel sharding (gloo, CPU).
+
+Tensor parallelism splits every expert's intermediate dimension, so each layer
+all-reduces the [tokens, top-k, hidden] partial sums. Expert parallelism gives
+every rank whole experts and moves only the routed token rows (all-to-all
+there and back) plus one all-gather of the combined [tokens, hidden] output.
+The script measures the MoE bytes each rank sends for a prefill and for
+single-token decode steps, next to the analytic estimate for the full-size
+model (hidden 2880, top-4).
+
+    python benchmarks/expert_parallel.py --world-size 2 4 --prompt-tokens 128
+"""
+
+import argparse
+import json
+import os
+import socket
+import tempfile
+import time
+
+import torch.multiprocessing as mp
+
+from common import SMALL_CONFIG, write_synthetic_checkpoint
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def analytic_bytes_per_token(hidden_size: int, experts_per_token: int, world_size: int, dtype_bytes: int = 2):
+    """Expected MoE bytes sent per rank, per token and layer, under uniform routing."""
+    w = world_size
+    # 环形 all-reduce：每个 rank 发送 2 * (W - 1) / W 份 [K, D] 部分和。
+    tp = 2 * (w - 1) / w * experts_per_token * hidden_size * dtype_bytes
+    # 每个 rank 路由 1/W 的 token，其中 (W - 1)/W 的 (token, 专家) 行要去往并返回其他 rank；
+    # 另加一次 all-gather，把本段 [D] 输出发给其余 W - 1 个 rank。
+    ep = (2 * experts_per_token * (w - 1) / w + (w - 1)) * hidden_size * dtype_bytes / w
+    return tp, ep
+
+
+def _worker(rank, world_size, port, args, result_path):
+    os.environ.update(
+        MASTER_ADDR="127.0.0.1",
+        MASTER_PORT=str(port),
+        RANK=str(rank),
+        LOCAL_RANK=str(rank),
+        WORLD_SIZE=str(world_size),
+        LOCAL_WORLD_SIZE=str(world_size),
+    )
+    import torch
+    import torch.distributed as dist
+
+    from gpt_oss.torch.model import Cache, Transformer
+    from gpt_oss.torch.utils import init_distributed
+
+    device = init_distributed(backend="gloo", device="cpu", num_threads=args.num_threads)
+    prompt = torch.arange(args.prompt_tokens, dtype=torch.int32) % 1000 + 1
+    results = {}
+    for mode in ("tp", "ep"):
+        model = Transformer.from_checkpoint(args.checkpoint, device=device, expert_parallel=mode == "ep")
+        attn = model.block[0].attn
+        caches = [
+            Cache(1, args.prompt_tokens + args.decode_steps + 1, attn.num_key_value_heads, attn.head_dim, device=device)
+            for _ in model.block
+        ]
+        with torch.inference_mode():
+            model(prompt[None, :4], None)  # warm-up
+            for block in model.block:
+                block.mlp.bytes_sent = 0
+            dist.barrier()
+            start = time.perf_counter()
+            model(prompt[None, :], caches)
+            prefill_s = time.perf_counter() - start
+            prefill_bytes = sum(block.mlp.bytes_sent for block in model.block)
+            start = time.perf_counter()
+            for step in range(args.decode_steps):
+                model(prompt[None, step : step + 1], caches)
+            decode_s = (time.perf_counter() - start) / args.decode_steps
+            decode_bytes = sum(block.mlp.bytes_sent for block in model.block) - prefill_bytes
+        results[mode] = dict(
+            prefill_bytes=prefill_bytes,
+            prefill_s=prefill_s,
+            decode_bytes=decode_bytes / args.decode_steps,
+            decode_s=decode_s,
+        )
+        del model, caches
+    gathered = [None] * world_size
+    dist.all_gather_object(gathered, results)
+    if rank == 0:
+        with open(result_path, "w") as f:
+            json.dump(gathered, f)
+    dist.destroy_process_group()
+
+
+def main(args):
+    config = dict(SMALL_CONFIG, num_experts=args.experts, experts_per_token=args.top_k)
+    layers, hidden = config["num_hidden_layers"], config["hidden_size"]
+    with tempfile.TemporaryDirectory() as tmp:
+        args.checkpoint = write_synthetic_checkpoint(os.path.join(tmp, "checkpoint"), config)
+        print(f"{layers} layers, hidden {hidden}, {args.experts} experts (top-{args.top_k}), "
+              f"prefill {args.prompt_tokens} tokens")
+        print(f"{'ws':>3} {'mode':>4} {'prefill KiB/rank':>17} {'B/token/layer':>14} {'analytic':>9} "
+              f"{'prefill ms':>11} {'decode KiB/step':>16} {'decode ms':>10}")
+        for world_size in args.world_size:
+            result_path = os.path.join(tmp, f"result-{world_size}.json")
+            mp.spawn(_worker, args=(world_size, _free_port(), args, result_path), nprocs=world_size)
+            with open(result_path) as f:
+                per_rank = json.load(f)
+            tp_analytic, ep_analytic = analytic_bytes_per_token(hidden, args.top_k, world_size)
+            for mode, analytic in (("tp", tp_analytic), ("ep", ep_analytic)):
+                prefill = sum(r[mode]["prefill_bytes"] for r in per_rank) / world_size
+                decode = sum(r[mode]["decode_bytes"] for r in per_rank) / world_size
+                prefill_ms = max(r[mode]["prefill_s"] for r in per_rank) * 1e3
+                decode_ms = max(r[mode]["decode_s"] for r in per_rank) * 1e3
+                print(f"{world_size:>3} {mode:>4} {prefill / 1024:>17.1f} "
+                      f"{prefill / args.prompt_tokens / layers:>14.0f} {analytic:>9.0f} "
+                      f"{prefill_ms:>11.1f} {decode / 1024:>16.1f} {decode_ms:>10.2f}")
+
+    print("\nAnalytic MoE bytes sent per rank, per token and layer, full-size model (hidden 2880, top-4):")
+    for world_size in (2, 4, 8):
+        tp, ep = analytic_bytes_per_token(2880, 4, world_size)
+        print(f"  ws={world_size}: tensor-parallel {tp / 1024:.1f} KiB, expert-parallel {ep / 1024:.1f} KiB ({tp / ep:.1f}x less)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--world-size", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--experts", type=int, default=16)
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--prompt-tokens", type=int, default=128)
+    parser.add_argument("--decode-steps", type=int, default=8)
+    parser.add_argument("--num-threads", type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,92 @@
+"""Event-loop stalls caused by HTML processing, inline vs. `HTMLProcessor`.
+
+Processes a batch of large synthetic pages concurrently while a ticker
+coroutine wakes up every millisecond and records how late it was. Inline
+processing blocks the loop for the whole conversion of a page; the thread pool
+still contends for the GIL; the process pool keeps the loop responsive.
+Reports the maximum and p99 loop lag and the page throughput of each mode.
+
+    python benchmarks/html_event_loop_stall.py --pages 32 --paragraphs 5000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from gpt_oss.tools.simple_browser.html_pool import HTMLProcessor
+from gpt_oss.tools.simple_browser.page_contents import process_html
+
+
+def make_page(index: int, paragraphs: int) -> str:
+    body = "".join(
+        f'<div class="c"><p>Section {index}.{i}: some <b>text</b> with a '
+        f'<a href="/wiki/Article_{i}">link</a>, x<sup>{i % 7}</sup> and a '
+        f'<img src="/img/{i}.png" alt="figure {i}"></p><table><tr><td>{i}</td><td>cell</td></tr></table></div>'
+        for i in range(paragraphs)
+    )
+    return f"<html><head><title>Page {index}</title></head><body>{body}</body></html>"
+
+
+async def ticker(lags: list[float], stop: asyncio.Event, interval: float = 1e-3):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run(mode: str, pages: list[str], workers: int) -> dict:
+    if mode == "inline":
+
+        async def process(html, url):
+            return process_html(html, url, None, display_urls=True)
+
+        processor = None
+    else:
+        processor = HTMLProcessor(max_workers=workers, use_processes=mode == "process", timeout=None)
+        # Start the workers outside the measured window.
+        await processor.process(pages[0], "https://example.com/warmup", None)
+
+        async def process(html, url):
+            return await processor.process(html, url, None, display_urls=True)
+
+    lags: list[float] = []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    await asyncio.gather(*(process(html, f"https://example.com/{i}") for i, html in enumerate(pages)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+    if processor is not None:
+        processor.close()
+    lags.sort()
+    return {
+        "pages_per_s": len(pages) / elapsed,
+        "max_lag_ms": 1e3 * lags[-1],
+        "p99_lag_ms": 1e3 * lags[int(0.99 * (len(lags) - 1))],
+        "median_lag_ms": 1e3 * statistics.median(lags),
+    }
+
+
+def main(args):
+    pages = [make_page(i, args.paragraphs) for i in range(args.pages)]
+    size = sum(map(len, pages)) / len(pages)
+    print(f"{args.pages} pages of {size / 1024:.0f} KiB, {args.workers} workers")
+    for mode in args.modes:
+        result = asyncio.run(run(mode, pages, args.workers))
+        print(
+            f"{mode:>8}: {result['pages_per_s']:7.1f} pages/s  "
+            f"loop lag max {result['max_lag_ms']:8.1f} ms  p99 {result['p99_lag_ms']:8.1f} ms  "
+            f"median {result['median_lag_ms']:6.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=16)
+    parser.add_argument("--paragraphs", type=int, default=3000, help="paragraphs per synthetic page")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--modes", nargs="+", default=["inline", "thread", "process"])
+    main(parser.parse_args())
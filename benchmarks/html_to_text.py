@@ -0,0 +1,104 @@
+"""Pages/s of `process_html` with the lxml tree walker vs. the previous html2text path.
+
+The html2text path serialized the cleaned lxml tree back to a string,
+rewrote it with regexes and parsed it again with html2text's pure-Python
+HTMLParser. The tree walker converts the tree that `process_html` already
+parsed in one pass. Pages are the saved fixtures of the browser tests (or any
+directory of .html files), each processed `--repeat` times per engine. The
+html2text baseline is only run when html2text is installed.
+
+    python benchmarks/html_to_text.py --repeat 20
+"""
+
+import argparse
+import pathlib
+import re
+import time
+from unittest import mock
+
+import lxml.etree
+import lxml.html
+
+from gpt_oss.tools.simple_browser import page_contents
+from gpt_oss.tools.simple_browser.page_contents import process_html
+
+FIXTURES = pathlib.Path(__file__).parent.parent / "tests/gpt_oss/tools/simple_browser/fixtures"
+
+HTML_SUP_RE = re.compile(r"<sup( [^>]*)?>([\w\-]+)</sup>")
+HTML_SUB_RE = re.compile(r"<sub( [^>]*)?>([\w\-]+)</sub>")
+HTML_TAGS_SEQ_RE = re.compile(r"(?<=\w)((<[^>]*>)+)(?=\w)")
+
+
+def html2text_tree_to_text(root) -> str:
+    """The previous conversion: serialize, regex-rewrite and re-parse with html2text."""
+    import html2text
+
+    html = lxml.etree.tostring(root, encoding="UTF-8").decode()
+    html = HTML_SUP_RE.sub(r"^{\2}", html)
+    html = HTML_SUB_RE.sub(r"_{\2}", html)
+    html = HTML_TAGS_SEQ_RE.sub(r" \1", html)
+    h = html2text.HTML2Text()
+    h.ignore_links = True
+    h.ignore_images = True
+    h.body_width = 0
+    h.ignore_tables = True
+    h.unicode_snob = True
+    h.ignore_emphasis = True
+    with mock.patch.object(html2text, "escape_md_section", lambda text, snob=False: text):
+        return h.handle(html).strip()
+
+
+def run(pages: list[str], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            process_html(html=html, url="https://example.com/page", title=None)
+    return len(pages) * repeat / (time.perf_counter() - start)
+
+
+def run_conversion(pages: list[str], repeat: int, convert) -> float:
+    """Pages/s of the tree-to-text step alone, on trees prepared as in `process_html`."""
+    elapsed = 0.0
+    for _ in range(repeat):
+        for html in pages:
+            root = lxml.html.fromstring(html)
+            start = time.perf_counter()
+            convert(root)
+            elapsed += time.perf_counter() - start
+    return len(pages) * repeat / elapsed
+
+
+def tree_walker_to_text(root) -> str:
+    page_contents._inline_sup_sub(root)
+    return page_contents.tree_to_text(root)
+
+
+def main(args):
+    paths = sorted(pathlib.Path(args.pages).glob("*.html"))
+    pages = [path.read_text() for path in paths]
+    print(f"{len(pages)} pages, {sum(map(len, pages)) / 1024:.0f} KiB total, x{args.repeat}")
+    rate = run(pages, args.repeat)
+    conversion = run_conversion(pages, args.repeat, tree_walker_to_text)
+    print(f"tree walker: {rate:8.1f} pages/s  (conversion alone {conversion:8.1f} pages/s)")
+    try:
+        import html2text  # noqa: F401
+    except ImportError:
+        print("html2text is not installed, skipping the baseline")
+        return
+    # The sup/sub rewrite is part of the html2text baseline's regexes.
+    with mock.patch.object(page_contents, "tree_to_text", html2text_tree_to_text), mock.patch.object(
+        page_contents, "_inline_sup_sub", lambda root: None
+    ):
+        baseline = run(pages, args.repeat)
+    baseline_conversion = run_conversion(pages, args.repeat, html2text_tree_to_text)
+    print(
+        f"html2text:   {baseline:8.1f} pages/s  (conversion alone {baseline_conversion:8.1f} pages/s); "
+        f"speedup {rate / baseline:.1f}x, conversion {conversion / baseline_conversion:.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default=str(FIXTURES), help="directory of .html files")
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,86 @@
+"""Accuracy and memory of the int8 / fp8 KV cache vs. the bf16 cache (torch reference path, CPU).
+
+Prefills a prompt and teacher-forces the same continuation through a model with
+bf16, int8 and fp8 caches, then reports the per-step KL(bf16 || quantized) of
+the next-token distribution, top-1 agreement, cache bytes and decode latency,
+followed by the KV memory the full-size model needs at several context lengths.
+
+    python benchmarks/kv_cache_quant.py --prompt-tokens 256 --decode-steps 64
+"""
+
+import argparse
+import tempfile
+import time
+
+import torch
+
+from common import SMALL_CONFIG, write_synthetic_checkpoint
+
+# gpt-oss-120b attention shape.
+FULL_LAYERS, FULL_KV_HEADS, FULL_HEAD_DIM = 36, 8, 64
+
+
+def _run(model, caches, prompt, continuation):
+    logits = [model(prompt[None, :], caches=caches)[0, -1]]
+    start = time.perf_counter()
+    for token in continuation:
+        logits.append(model(token.view(1, 1), caches=caches)[0, -1])
+    decode_s = (time.perf_counter() - start) / len(continuation)
+    return torch.log_softmax(torch.stack(logits).float(), dim=-1), decode_s
+
+
+@torch.inference_mode()
+def main(args):
+    from gpt_oss.torch.model import KV_CACHE_DTYPES, Cache, QuantizedCache, Transformer
+
+    torch.set_num_threads(args.num_threads)
+    with tempfile.TemporaryDirectory() as tmp:
+        write_synthetic_checkpoint(tmp, SMALL_CONFIG, std=args.init_std)
+        model = Transformer.from_checkpoint(tmp, device="cpu")
+    config = model.config
+    generator = torch.Generator().manual_seed(0)
+    tokens = torch.randint(0, config.vocab_size, (args.prompt_tokens + args.decode_steps,), generator=generator)
+    prompt, continuation = tokens[: args.prompt_tokens].int(), tokens[args.prompt_tokens :].int()
+    context = len(tokens)
+
+    def make_caches(kv_dtype):
+        if kv_dtype is None:
+            return [Cache(1, context, config.num_key_value_heads, config.head_dim) for _ in model.block]
+        return [
+            QuantizedCache(1, context, config.num_key_value_heads, config.head_dim, kv_dtype=kv_dtype, block_size=args.block_size)
+            for _ in model.block
+        ]
+
+    reference_caches = make_caches(None)
+    reference, reference_s = _run(model, reference_caches, prompt, continuation)
+    reference_bytes = sum(c.nbytes for c in reference_caches)
+    print(f"{config.num_hidden_layers} layers, {config.num_key_value_heads} KV heads x {config.head_dim}, "
+          f"{args.prompt_tokens} prompt + {args.decode_steps} decode tokens")
+    print(f"{'cache':>6} {'KL mean':>10} {'KL max':>10} {'top-1 agree':>12} {'KiB':>9} {'vs bf16':>8} {'decode ms':>10}")
+    print(f"{'bf16':>6} {0:>10.2e} {0:>10.2e} {1:>12.2%} {reference_bytes / 1024:>9.0f} {1:>8.2f} {reference_s * 1e3:>10.2f}")
+    for kv_dtype in sorted(KV_CACHE_DTYPES):
+        caches = make_caches(kv_dtype)
+        logprobs, decode_s = _run(model, caches, prompt, continuation)
+        kl = (reference.exp() * (reference - logprobs)).sum(-1)
+        agree = (reference.argmax(-1) == logprobs.argmax(-1)).float().mean()
+        nbytes = sum(c.nbytes for c in caches)
+        print(f"{kv_dtype:>6} {kl.mean():>10.2e} {kl.max():>10.2e} {agree:>12.2%} {nbytes / 1024:>9.0f} "
+              f"{nbytes / reference_bytes:>8.2f} {decode_s * 1e3:>10.2f}")
+
+    block = args.block_size or FULL_HEAD_DIM
+    bf16_per_token = 2 * FULL_LAYERS * FULL_KV_HEADS * FULL_HEAD_DIM * 2
+    quant_per_token = 2 * FULL_LAYERS * FULL_KV_HEADS * (FULL_HEAD_DIM + 4 * FULL_HEAD_DIM // block)
+    print(f"\nFull-size model KV cache per sequence ({FULL_LAYERS} layers, {FULL_KV_HEADS} KV heads x {FULL_HEAD_DIM}):")
+    for tokens in (16_384, 65_536, 131_072):
+        print(f"  {tokens:>7} tokens: bf16 {bf16_per_token * tokens / 2**30:.2f} GiB, "
+              f"int8/fp8 {quant_per_token * tokens / 2**30:.2f} GiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompt-tokens", type=int, default=256)
+    parser.add_argument("--decode-steps", type=int, default=64)
+    parser.add_argument("--block-size", type=int, default=None, help="Channels per scale (default: whole head)")
+    parser.add_argument("--init-std", type=float, default=0.02, help="Std of the synthetic dense weights")
+    parser.add_argument("--num-threads", type=int, default=1)
+    main(parser.parse_args())
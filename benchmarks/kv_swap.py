@@ -0,0 +1,79 @@
+"""Restoring an idle session's KV cache from host memory or disk vs. prefilling it again (CPU).
+
+Prefills a session of each length, swaps it out with `KVSwapManager` (host
+memory, or an mmapped file with --swap-dir / the default temporary directory),
+lets another session take over the caches and then times swap-in against a
+fresh prefill of the same tokens. On a GPU the swap-out is asynchronous and
+the copies run over PCIe; on CPU both are plain memory copies, so the ratio
+shown here is mostly the cost of recomputation.
+
+    python benchmarks/kv_swap.py --tokens 256 1024
+"""
+
+import argparse
+import tempfile
+import time
+
+import torch
+
+from common import SMALL_CONFIG, write_synthetic_checkpoint
+
+
+@torch.inference_mode()
+def main(args):
+    from gpt_oss.torch.kv_swap import KVSwapManager, KVSwapPolicy
+    from gpt_oss.torch.model import Cache, Transformer
+
+    torch.set_num_threads(args.num_threads)
+    with tempfile.TemporaryDirectory() as tmp:
+        write_synthetic_checkpoint(tmp, SMALL_CONFIG)
+        model = Transformer.from_checkpoint(tmp, device="cpu")
+    config = model.config
+    caches = [Cache(1, max(args.tokens), config.num_key_value_heads, config.head_dim) for _ in model.block]
+    generator = torch.Generator().manual_seed(0)
+
+    with tempfile.TemporaryDirectory(dir=args.swap_dir) as swap_dir:
+        tiers = {
+            "host": KVSwapPolicy(min_tokens=1),
+            "disk": KVSwapPolicy(min_tokens=1, max_host_bytes=0, swap_dir=swap_dir),
+        }
+        print(f"{config.num_hidden_layers} layers, {config.num_key_value_heads} KV heads x {config.head_dim}")
+        print(f"{'tokens':>7} {'MiB':>7} {'prefill ms':>11} {'tier':>5} {'swap-out ms':>12} {'swap-in ms':>11} {'speed-up':>9}")
+        for n_tokens in args.tokens:
+            tokens = torch.randint(0, config.vocab_size, (n_tokens,), generator=generator).int()
+            other = torch.randint(0, config.vocab_size, (n_tokens,), generator=generator).int()
+            for cache in caches:
+                cache.reset()
+            start = time.perf_counter()
+            model.prefill(tokens[None, :], caches)
+            prefill_s = time.perf_counter() - start
+            for tier, policy in tiers.items():
+                manager = KVSwapManager(caches, policy)
+                swap_out_s, swap_in_s = [], []
+                for _ in range(args.repeats):
+                    start = time.perf_counter()
+                    manager.swap_out(tokens.tolist())
+                    manager.flush()
+                    swap_out_s.append(time.perf_counter() - start)
+                    # 另一个会话接管 cache。
+                    for cache in caches:
+                        cache.truncate(0)
+                    model.prefill(other[None, :8], caches)
+                    key, _ = manager.match(tokens.tolist())
+                    start = time.perf_counter()
+                    manager.swap_in(key)
+                    swap_in_s.append(time.perf_counter() - start)
+                nbytes = manager.stats.bytes_in / manager.stats.swap_ins
+                manager.close()
+                swap_in = min(swap_in_s)
+                print(f"{n_tokens:>7} {nbytes / 2**20:>7.1f} {prefill_s * 1e3:>11.1f} {tier:>5} "
+                      f"{min(swap_out_s) * 1e3:>12.2f} {swap_in * 1e3:>11.2f} {prefill_s / swap_in:>8.0f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, nargs="+", default=[256, 1024])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--swap-dir", default=None, help="Directory for the disk tier (default: system temp)")
+    parser.add_argument("--num-threads", type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,79 @@
+"""MXFP4 dequantization throughput (GB/s of bf16 output) and peak memory.
+
+Compares `Checkpoint._get_mxfp4_tensor` (nibble gathers + ldexp, chunked),
+`Checkpoint._get_mxfp4_tensor_copy` (unchunked reference) and `decode_mxfp4`
+(byte LUT + exponent-bit scaling) with one and several threads. Each method runs
+in a fresh process so the peak RSS figure is its own.
+
+    python benchmarks/mxfp4_decode.py --experts 32 --rows 2880 --groups 90 --threads 1 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from common import peak_rss_mb
+
+
+def _run(path, method, threads, repeats, queue):
+    import torch
+
+    from gpt_oss.torch.weights import Checkpoint, decode_mxfp4
+
+    torch.set_num_threads(max(threads, 1))
+    checkpoint = Checkpoint(path, torch.device("cpu"), num_workers=1)
+    blocks = checkpoint._get_tensor("w.blocks")
+    scales = checkpoint._get_tensor("w.scales")
+    decode = {
+        "ldexp_chunked": lambda: checkpoint._get_mxfp4_tensor("w.blocks", "w.scales"),
+        "copy": lambda: checkpoint._get_mxfp4_tensor_copy("w.blocks", "w.scales"),
+        "lut": lambda: decode_mxfp4(blocks, scales, num_threads=threads),
+    }[method]
+    baseline = peak_rss_mb()
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = decode()
+        best = min(best, time.perf_counter() - start)
+        out_bytes = out.numel() * out.element_size()
+        del out
+    queue.put((best, out_bytes, peak_rss_mb() - baseline))
+
+
+def main(args):
+    import torch
+    from safetensors.torch import save_file
+
+    ctx = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as tmp:
+        generator = torch.Generator().manual_seed(0)
+        shape = (args.experts, args.rows, args.groups)
+        save_file(
+            {
+                "w.blocks": torch.randint(0, 256, (*shape, 16), dtype=torch.uint8, generator=generator),
+                "w.scales": torch.randint(118, 124, shape, dtype=torch.uint8, generator=generator),
+            },
+            os.path.join(tmp, "model.safetensors"),
+        )
+        runs = [("ldexp_chunked", 1), ("copy", 1)] + [("lut", t) for t in args.threads]
+        print(f"tensor: {shape} blocks -> {args.experts}x{args.rows}x{args.groups * 32} bf16")
+        print(f"{'method':<14} {'threads':>7} {'seconds':>8} {'GB/s':>7} {'peak +MiB':>10}")
+        for method, threads in runs:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_run, args=(tmp, method, threads, args.repeats, queue))
+            proc.start()
+            seconds, out_bytes, peak = queue.get()
+            proc.join()
+            print(f"{method:<14} {threads:>7} {seconds:>8.3f} {out_bytes / seconds / 1e9:>7.2f} {peak:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--experts", type=int, default=32)
+    parser.add_argument("--rows", type=int, default=2880)
+    parser.add_argument("--groups", type=int, default=90, help="32-value blocks per row")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--repeats", type=int, default=3)
+    main(parser.parse_args())
@@ -0,0 +1,70 @@
+"""Peak RSS and time for one tensor-parallel rank loading its MoE weights.
+
+"full" decodes every MXFP4 expert tensor and slices afterwards (the previous
+behaviour of `Transformer.from_checkpoint`); "sliced" passes the rank's slice to
+`Checkpoint.get` so only those blocks/scales are read and decoded. Each
+measurement runs in a fresh process so ru_maxrss reflects just that load.
+
+    python benchmarks/sharded_load_memory.py --world-sizes 1 2 4 8
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from common import SMALL_CONFIG, peak_rss_mb, write_synthetic_checkpoint
+
+
+def _load_rank(path, config, world_size, mode, queue):
+    import torch
+
+    from gpt_oss.torch.weights import Checkpoint
+
+    torch.set_num_threads(1)
+    per_rank = config["intermediate_size"] // world_size
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    checkpoint = Checkpoint(path, torch.device("cpu"), num_workers=1)
+    kept = []
+    for layer in range(config["num_hidden_layers"]):
+        specs = {
+            f"block.{layer}.mlp.mlp1_weight": (slice(None), slice(0, 2 * per_rank)),
+            f"block.{layer}.mlp.mlp2_weight": (..., slice(0, per_rank)),
+        }
+        for name, spec in specs.items():
+            if mode == "full":
+                kept.append(checkpoint.get(name)[spec].clone())
+            else:
+                kept.append(checkpoint.get(name, spec))
+    elapsed = time.perf_counter() - start
+    kept_mb = sum(t.numel() * t.element_size() for t in kept) / 2**20
+    queue.put((elapsed, peak_rss_mb() - baseline, kept_mb))
+
+
+def main(args):
+    config = SMALL_CONFIG | dict(
+        num_hidden_layers=args.layers, num_experts=args.experts, intermediate_size=args.intermediate_size
+    )
+    ctx = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_synthetic_checkpoint(os.path.join(tmp, "checkpoint"), config)
+        print(f"{'world':>5} {'mode':>7} {'seconds':>8} {'peak +MiB':>10} {'kept MiB':>9}")
+        for world_size in args.world_sizes:
+            for mode in ("full", "sliced"):
+                queue = ctx.Queue()
+                proc = ctx.Process(target=_load_rank, args=(path, config, world_size, mode, queue))
+                proc.start()
+                elapsed, peak, kept = queue.get()
+                proc.join()
+                print(f"{world_size:>5} {mode:>7} {elapsed:>8.3f} {peak:>10.1f} {kept:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--world-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--experts", type=int, default=32)
+    parser.add_argument("--intermediate-size", type=int, default=1024)
+    main(parser.parse_args())
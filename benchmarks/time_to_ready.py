@@ -0,0 +1,75 @@
+"""Time-to-ready of the torch backend on CPU with and without the converted weight cache.
+
+"Ready" means `TokenGenerator` is constructed and has produced its first token.
+Each measurement runs in a fresh process with the page cache for the checkpoint
+and cache files dropped, like a server restart on a busy machine.
+
+    python benchmarks/time_to_ready.py --layers 8 --experts 32
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from checkpoint_load import drop_page_cache
+from common import SMALL_CONFIG, peak_rss_mb, write_synthetic_checkpoint
+
+
+def _ready(path, cache_dir, queue):
+    os.environ["GPT_OSS_CONVERTED_CACHE"] = cache_dir
+    import torch
+
+    from gpt_oss.torch.model import TokenGenerator
+
+    # 不计 import torch 的固定开销，只比较权重加载与首 token。
+    start = time.perf_counter()
+    generator = TokenGenerator(path, device=torch.device("cpu"), context=256)
+    loaded = time.perf_counter() - start
+    next(iter(generator.generate([1, 2, 3, 4], stop_tokens=[], temperature=0.0, max_tokens=1)))
+    queue.put((loaded, time.perf_counter() - start, peak_rss_mb()))
+
+
+def _measure(ctx, path, cache_dir):
+    for root, _, files in os.walk(cache_dir):
+        if any(f.endswith(".safetensors") for f in files):
+            drop_page_cache(root)
+    drop_page_cache(path)
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_ready, args=(path, cache_dir, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main(args):
+    from gpt_oss.convert import convert
+
+    config = SMALL_CONFIG | dict(num_hidden_layers=args.layers, num_experts=args.experts)
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(dir=args.tmpdir) as tmp:
+        path = write_synthetic_checkpoint(os.path.join(tmp, "checkpoint"), config, num_shards=args.shards, index=True)
+        cache_dir = os.path.join(tmp, "converted")
+
+        print(f"{'run':<22} {'load s':>7} {'ready s':>8} {'peak RSS MiB':>13}")
+        cold = _measure(ctx, path, cache_dir)
+        print(f"{'without cache':<22} {cold[0]:>7.2f} {cold[1]:>8.2f} {cold[2]:>13.0f}")
+
+        start = time.perf_counter()
+        convert(path, "torch", cache_dir=cache_dir)
+        print(f"{'convert (one-off)':<22} {time.perf_counter() - start:>7.2f}")
+
+        warm = _measure(ctx, path, cache_dir)
+        print(f"{'with converted cache':<22} {warm[0]:>7.2f} {warm[1]:>8.2f} {warm[2]:>13.0f}")
+        print(f"time-to-ready speedup: {cold[1] / warm[1]:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--layers", type=int, default=8)
+    parser.add_argument("--experts", type=int, default=32)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--tmpdir", type=str, default=None, help="Where to write the synthetic checkpoint")
+    main(parser.parse_args())
@@ -0,0 +1,92 @@
+"""Cold start of the browser tool's token offsets, decoding the vocabulary vs. the saved table.
+
+The first page the browser tool shows used to decode every token of the
+encoding one by one to learn its length in characters, in every process.
+`vocabulary_lengths` builds that table once, saves it as a `.npy` file and
+memory-maps it in later processes; `get_tokens` then computes the offsets with
+a numpy cumsum instead of `itertools.accumulate`. Each mode runs in a fresh
+process and reports the time of the first `get_tokens` + `max_chars_per_token`
+call (what the first scroll of a long page pays, excluding loading the
+encoding itself) and of later `get_tokens` calls on a `--size` character text.
+
+    python benchmarks/token_lengths_cold_start.py --encoding o200k_base
+"""
+
+import argparse
+import itertools
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+
+def make_text(size: int) -> str:
+    sentence = "The quick brown fox jumps over the lazy dog, 【3†a link】 and 12.5% of ünïcode. "
+    return (sentence * (size // len(sentence) + 1))[:size]
+
+
+_decoded_lengths: dict[str, list[int]] = {}
+
+
+def decode_loop_tokens(text: str, enc_name: str) -> list[int]:
+    """The previous implementation: decode the vocabulary once, accumulate in Python."""
+    import tiktoken
+
+    encoding = tiktoken.get_encoding(enc_name)
+    if enc_name not in _decoded_lengths:
+        results = []
+        for i in range(encoding.n_vocab):
+            try:
+                results.append(len(encoding.decode([i])))
+            except Exception:
+                results.append(1)
+        _decoded_lengths[enc_name] = results
+    lengths = _decoded_lengths[enc_name]
+    max(lengths)
+    tokens = encoding.encode(text, disallowed_special=())
+    return [0] + list(itertools.accumulate(lengths[i] for i in tokens))[:-1]
+
+
+def table_tokens(text: str, enc_name: str) -> list[int]:
+    from gpt_oss.tools.simple_browser.simple_browser_tool import get_tokens, max_chars_per_token
+
+    max_chars_per_token(enc_name)
+    return get_tokens(text, enc_name).tok2idx
+
+
+def child(mode: str, enc_name: str, size: int, cache_dir: str, repeat: int) -> tuple[float, float]:
+    os.environ["BROWSER_TOKEN_LENGTHS_DIR"] = cache_dir
+    import tiktoken
+
+    # Not part of the cold start being measured: loading the encoding and the tool's imports.
+    import gpt_oss.tools.simple_browser.simple_browser_tool  # noqa: F401
+
+    tiktoken.get_encoding(enc_name)
+    get_offsets = decode_loop_tokens if mode == "decode loop" else table_tokens
+    text = make_text(size)
+    start = time.perf_counter()
+    get_offsets(text, enc_name)
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(repeat):
+        get_offsets(text, enc_name)
+    return first, (time.perf_counter() - start) / repeat
+
+
+def main(args):
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        print(f"{args.encoding}, text of {args.size} characters")
+        # The first table run finds an empty cache directory, the second one the saved table.
+        for mode in ["decode loop", "build + save", "load (mmap)"]:
+            with ctx.Pool(1) as pool:
+                first, steady = pool.apply(child, (mode, args.encoding, args.size, cache_dir, args.repeat))
+            print(f"{mode:>12}: first call {first * 1e3:9.1f} ms, later calls {steady * 1e3:8.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--encoding", default="o200k_base")
+    parser.add_argument("--size", type=int, default=100_000, help="characters of text to tokenize")
+    parser.add_argument("--repeat", type=int, default=10)
+    main(parser.parse_args())
@@ -0,0 +1,98 @@
+"""Tokens/s of the torch backend on CPU as the tensor-parallel world size grows.
+
+Each world size is launched as a set of local gloo processes that go through
+`init_distributed`, exactly like `torchrun --nproc-per-node=N -m gpt_oss.generate --device cpu`.
+
+    python benchmarks/torch_cpu_scaling.py --world-sizes 1 2 4 --tokens 32
+"""
+
+import argparse
+import json
+import os
+import socket
+import tempfile
+import time
+
+import torch
+import torch.multiprocessing as mp
+
+from common import SMALL_CONFIG, write_synthetic_checkpoint
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _worker(rank, world_size, port, args, result_path):
+    os.environ.update(
+        MASTER_ADDR="127.0.0.1",
+        MASTER_PORT=str(port),
+        RANK=str(rank),
+        LOCAL_RANK=str(rank),
+        WORLD_SIZE=str(world_size),
+        LOCAL_WORLD_SIZE=str(world_size),
+    )
+    from gpt_oss.torch.model import TokenGenerator
+    from gpt_oss.torch.utils import init_distributed
+
+    device = init_distributed(backend="gloo", device="cpu", num_threads=args.num_threads, pin_cpus=not args.no_pin)
+    generator = TokenGenerator(args.checkpoint, device=device, context=args.prompt_tokens + args.tokens + 1)
+    prompt = list(range(1, args.prompt_tokens + 1))
+
+    # 预热一次，排除首次分配与通信建立的开销。
+    list(generator.generate(prompt, stop_tokens=[], temperature=0.0, max_tokens=2))
+    start = time.perf_counter()
+    first_token = None
+    for i, _ in enumerate(generator.generate(prompt, stop_tokens=[], temperature=0.0, max_tokens=args.tokens)):
+        if i == 0:
+            first_token = time.perf_counter() - start
+    elapsed = time.perf_counter() - start
+    if rank == 0:
+        decode = elapsed - first_token
+        with open(result_path, "w") as f:
+            json.dump(
+                {
+                    "world_size": world_size,
+                    "threads_per_rank": torch.get_num_threads(),
+                    "prefill_s": first_token,
+                    "decode_tokens_per_s": (args.tokens - 1) / decode if decode > 0 else float("inf"),
+                },
+                f,
+            )
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.checkpoint is None:
+            args.checkpoint = write_synthetic_checkpoint(os.path.join(tmp, "checkpoint"), SMALL_CONFIG)
+        results = []
+        for world_size in args.world_sizes:
+            result_path = os.path.join(tmp, f"result-{world_size}.json")
+            mp.spawn(_worker, args=(world_size, _free_port(), args, result_path), nprocs=world_size)
+            with open(result_path) as f:
+                results.append(json.load(f))
+
+    baseline = results[0]["decode_tokens_per_s"]
+    print(f"{'world':>5} {'threads/rank':>12} {'prefill s':>10} {'decode tok/s':>13} {'speedup':>8}")
+    for r in results:
+        print(
+            f"{r['world_size']:>5} {r['threads_per_rank']:>12} {r['prefill_s']:>10.3f} "
+            f"{r['decode_tokens_per_s']:>13.2f} {r['decode_tokens_per_s'] / baseline:>7.2f}x"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checkpoint", type=str, default=None, help="Checkpoint directory (default: synthetic)")
+    parser.add_argument("--world-sizes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--prompt-tokens", type=int, default=64)
+    parser.add_argument("--tokens", type=int, default=32, help="Tokens to generate per run")
+    parser.add_argument("--num-threads", type=int, default=None, help="Threads per rank (default: even split)")
+    parser.add_argument("--no-pin", action="store_true", help="Do not pin ranks to CPUs / NUMA nodes")
+    parser.add_argument("--json", type=str, default=None, help="Also write results to this JSON file")
+    main(parser.parse_args())
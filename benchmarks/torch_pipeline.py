@@ -0,0 +1,102 @@
+"""Per-stage utilization and throughput of pipeline-parallel generation on CPU (gloo).
+
+    python benchmarks/torch_pipeline.py --stages 2 --sequences 1 2 4 8
+"""
+
+import argparse
+import json
+import os
+import socket
+import tempfile
+import time
+
+import torch.multiprocessing as mp
+
+from common import SMALL_CONFIG, write_synthetic_checkpoint
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _worker(rank, world_size, port, args, num_sequences, result_path):
+    os.environ.update(
+        MASTER_ADDR="127.0.0.1",
+        MASTER_PORT=str(port),
+        RANK=str(rank),
+        LOCAL_RANK=str(rank),
+        WORLD_SIZE=str(world_size),
+        LOCAL_WORLD_SIZE=str(world_size),
+    )
+    from gpt_oss.torch.pipeline import (
+        PipelineStage,
+        StageStats,
+        format_utilization_report,
+        gather_stage_stats,
+        pipeline_generate,
+    )
+    from gpt_oss.torch.utils import init_distributed
+
+    device = init_distributed(backend="gloo", device="cpu", num_threads=args.num_threads)
+    stage = PipelineStage.from_checkpoint(args.checkpoint, device=device)
+    prompts = [[(7 * i + j) % 1000 + 1 for j in range(args.prompt_tokens)] for i in range(num_sequences)]
+    context = args.prompt_tokens + args.tokens + 1
+
+    pipeline_generate(stage, prompts[:1], stop_tokens=[], temperature=0.0, max_tokens=2, context=context)
+    stats = StageStats()
+    start = time.perf_counter()
+    outputs = pipeline_generate(
+        stage, prompts, stop_tokens=[], temperature=0.0, max_tokens=args.tokens, context=context, stats=stats
+    )
+    elapsed = time.perf_counter() - start
+    all_stats = gather_stage_stats(stats)
+    if rank == 0:
+        print(f"\n{num_sequences} concurrent sequences:")
+        print(format_utilization_report(all_stats))
+        with open(result_path, "w") as f:
+            json.dump(
+                {
+                    "sequences": num_sequences,
+                    "tokens_per_s": sum(len(o) for o in outputs) / elapsed,
+                    "stages": [s.as_dict() for s in all_stats],
+                },
+                f,
+            )
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.checkpoint is None:
+            args.checkpoint = write_synthetic_checkpoint(os.path.join(tmp, "checkpoint"), SMALL_CONFIG)
+        results = []
+        for num_sequences in args.sequences:
+            result_path = os.path.join(tmp, f"result-{num_sequences}.json")
+            mp.spawn(
+                _worker,
+                args=(args.stages, _free_port(), args, num_sequences, result_path),
+                nprocs=args.stages,
+            )
+            with open(result_path) as f:
+                results.append(json.load(f))
+
+    print(f"\n{'sequences':>9} {'tok/s':>8} {'mean util':>9}")
+    for r in results:
+        mean_util = sum(s["utilization"] for s in r["stages"]) / len(r["stages"])
+        print(f"{r['sequences']:>9} {r['tokens_per_s']:>8.2f} {mean_util:>9.1%}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checkpoint", type=str, default=None, help="Checkpoint directory (default: synthetic)")
+    parser.add_argument("--stages", type=int, default=2)
+    parser.add_argument("--sequences", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--prompt-tokens", type=int, default=32)
+    parser.add_argument("--tokens", type=int, default=16)
+    parser.add_argument("--num-threads", type=int, default=None, help="Threads per stage")
+    parser.add_argument("--json", type=str, default=None, help="Also write results to this JSON file")
+    main(parser.parse_args())
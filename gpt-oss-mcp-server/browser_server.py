@@ -5,12 +5,24 @@ from dataclasses import dataclass, field
 from typing import Union, Optional
 
 from mcp.server.fastmcp import Context, FastMCP
-from gpt_oss.tools.simple_browser import SimpleBrowserTool
+from gpt_oss.tools.simple_browser import ClientSessionPool, PageCache, Prefetcher, SearchCache, SimpleBrowserTool
 from gpt_oss.tools.simple_browser.backend import YouComBackend, ExaBackend
+from gpt_oss.tools.simple_browser.html_pool import default_html_processor
 
 @dataclass
 class AppContext:
     browsers: dict[str, SimpleBrowserTool] = field(default_factory=dict)
+    # Keep-alive HTTP sessions shared by every client's browser.
+    sessions: ClientSessionPool = field(default_factory=ClientSessionPool.from_env)
+    # Fetched pages shared across clients.
+    page_cache: PageCache = field(default_factory=PageCache.from_env)
+    # Search results shared across clients; identical concurrent searches are coalesced.
+    search_cache: SearchCache = field(default_factory=SearchCache.from_env)
+    # Background fetches of the top search results into the page cache.
+    prefetcher: Prefetcher = field(init=False)
+
+    def __post_init__(self):
+        self.prefetcher = Prefetcher.from_env(self.page_cache)
 
     def create_or_get_browser(self, session_id: str) -> SimpleBrowserTool:
         if session_id not in self.browsers:
@@ -21,16 +33,32 @@ class AppContext:
                 backend = ExaBackend(source="web")
             else:
                 raise ValueError(f"Invalid tool backend: {tool_backend}")
-            self.browsers[session_id] = SimpleBrowserTool(backend=backend)
+            self.browsers[session_id] = SimpleBrowserTool(
+                backend=backend,
+                session_pool=self.sessions,
+                page_cache=self.page_cache,
+                search_cache=self.search_cache,
+                prefetcher=self.prefetcher,
+            )
         return self.browsers[session_id]
 
     def remove_browser(self, session_id: str) -> None:
-        self.browsers.pop(session_id, None)
+        browser = self.browsers.pop(session_id, None)
+        if browser is not None:
+            browser.cancel_prefetches()
 
 
 @asynccontextmanager
 async def app_lifespan(_server: FastMCP) -> AsyncIterator[AppContext]:
-    yield AppContext()
+    context = AppContext()
+    try:
+        yield context
+    finally:
+        context.prefetcher.close()
+        context.search_cache.close()
+        context.page_cache.close()
+        default_html_processor().close()
+        await context.sessions.close()
 
 
 # Pass lifespan to server
@@ -106,15 +134,26 @@ async def open_link(ctx: Context,
 @mcp.tool(
     name="find",
     title="Find pattern in page",
-    description=
-    "Finds exact matches of `pattern` in the current page, or the page given by `cursor`.",
+    description="""
+Finds exact matches of `pattern` in the current page, or the page given by `cursor`.
+`pattern` can be a list of patterns; results that match more of them are shown first.
+Set `regex` to treat the patterns as regular expressions, and `whole_word` to only match whole words.
+Matching is case-insensitive.
+""".strip(),
 )
-async def find_pattern(ctx: Context, pattern: str, cursor: int = -1) -> str:
+async def find_pattern(ctx: Context,
+                       pattern: Union[str, list[str]],
+                       cursor: int = -1,
+                       regex: bool = False,
+                       whole_word: bool = False) -> str:
     """Find exact matches of a pattern in the current page"""
     browser = ctx.request_context.lifespan_context.create_or_get_browser(
         ctx.client_id)
     messages = []
-    async for message in browser.find(pattern=pattern, cursor=cursor):
+    async for message in browser.find(pattern=pattern,
+                                      cursor=cursor,
+                                      regex=regex,
+                                      whole_word=whole_word):
         if message.content and hasattr(message.content[0], 'text'):
             messages.append(message.content[0].text)
     return "\n".join(messages)
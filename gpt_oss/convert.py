@@ -0,0 +1,194 @@
+# Pre-convert a checkpoint into the runtime layout of one backend, so that
+# `from_checkpoint` can memory-map it on the next start without any decoding,
+# resharding or re-quantization.
+#
+#   python -m gpt_oss.convert model/ --backend torch --world-size 4
+#   python -m gpt_oss.convert model/ --backend triton --device cuda
+#
+# The cache lives under $GPT_OSS_CONVERTED_CACHE (default ~/.cache/gpt-oss/converted)
+# and is keyed by the checkpoint's fingerprint, the backend and the world size.
+# Each rank is a directory of safetensors shards of at most --max-shard-mb (one
+# shard is held in host memory at a time) with a model.safetensors.index.json.
+
+import argparse
+import json
+import os
+import time
+
+import torch
+from safetensors.torch import save_file
+
+from gpt_oss.torch.model import ModelConfig, Transformer
+from gpt_oss.torch.weights import CONVERTED_INDEX, converted_checkpoint_path
+
+
+def _replace_atomically(write, filename: str):
+    # 先写临时文件再原子重命名，避免半成品缓存被误用。
+    tmp = f"{filename}.tmp-{os.getpid()}"
+    write(tmp)
+    os.replace(tmp, filename)
+
+
+def _write(tensors, directory: str, max_shard_bytes: int):
+    """Write (name, tensor) pairs to shards of about `max_shard_bytes` in `directory`, then their index.
+
+    Only the tensors of the shard being filled are held on the host, never the whole rank.
+    """
+    os.makedirs(directory, exist_ok=True)
+    weight_map: dict[str, str] = {}
+    shard: dict[str, torch.Tensor] = {}
+    shard_bytes = 0
+    num_shards = 0
+
+    def flush():
+        nonlocal shard, shard_bytes, num_shards
+        fname = f"model-{num_shards:05d}.safetensors"
+        _replace_atomically(lambda tmp: save_file(shard, tmp), os.path.join(directory, fname))
+        weight_map.update(dict.fromkeys(shard, fname))
+        shard, shard_bytes = {}, 0
+        num_shards += 1
+
+    for name, tensor in tensors:
+        tensor = tensor.detach().to("cpu").contiguous()
+        nbytes = tensor.numel() * tensor.element_size()
+        if shard and shard_bytes + nbytes > max_shard_bytes:
+            flush()
+        shard[name] = tensor
+        shard_bytes += nbytes
+        del tensor
+    if shard or num_shards == 0:
+        flush()
+
+    # 索引最后写入：它存在即表示该 rank 的所有分片都已完整写出。
+    def write_index(tmp):
+        with open(tmp, "w") as f:
+            json.dump({"metadata": {}, "weight_map": weight_map}, f)
+
+    _replace_atomically(write_index, os.path.join(directory, CONVERTED_INDEX))
+
+
+def converted_size(directory: str) -> int:
+    return sum(os.path.getsize(os.path.join(directory, fname)) for fname in os.listdir(directory))
+
+
+def convert(
+    checkpoint: str,
+    backend: str,
+    world_size: int = 1,
+    ranks: list[int] | None = None,
+    device: str | torch.device = "cpu",
+    cache_dir: str | None = None,
+    force: bool = False,
+    expert_parallel: bool = False,
+    max_shard_bytes: int = 4 << 30,
+) -> list[str]:
+    """Write the converted weights of `ranks` (default: all) and return their directories."""
+    checkpoint = os.path.expanduser(checkpoint)
+    device = torch.device(device)
+    with open(os.path.join(checkpoint, "config.json"), "r") as f:
+        config = ModelConfig(**json.load(f))
+    written = []
+    for rank in ranks if ranks is not None else range(world_size):
+        # 专家并行的分片方式不同，单独缓存。
+        cache_backend = "torch-ep" if backend == "torch" and expert_parallel else backend
+        directory = converted_checkpoint_path(checkpoint, cache_backend, world_size, rank, cache_dir)
+        if os.path.exists(os.path.join(directory, CONVERTED_INDEX)) and not force:
+            written.append(directory)
+            continue
+        match backend:
+            case "torch":
+                tensors = Transformer.iter_checkpoint_tensors(
+                    checkpoint, config, device, rank, world_size, expert_parallel=expert_parallel
+                )
+            case "triton":
+                if world_size != 1:
+                    raise ValueError("The triton backend does not support tensor parallelism")
+                from gpt_oss.triton.model import Transformer as TritonTransformer
+
+                # 只需要模型结构（参数名与 MX 布局），权重由 iter_converted_tensors 读取转换。
+                model = TritonTransformer(config=config, device=device)
+                tensors = model.iter_converted_tensors(checkpoint, device)
+            case _:
+                raise ValueError(f"Invalid backend: {backend}")
+        _write(tensors, directory, max_shard_bytes)
+        written.append(directory)
+    return written
+
+
+def main(args):
+    start = time.perf_counter()
+    written = convert(
+        args.checkpoint,
+        args.backend,
+        world_size=args.world_size,
+        ranks=args.ranks,
+        device=args.device,
+        cache_dir=args.cache_dir,
+        force=args.force,
+        expert_parallel=args.expert_parallel,
+        max_shard_bytes=args.max_shard_mb << 20,
+    )
+    for directory in written:
+        print(f"{directory} ({converted_size(directory) / 2**30:.2f} GiB)")
+    print(f"Converted in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-convert a checkpoint for fast loading")
+    parser.add_argument(
+        "checkpoint",
+        metavar="FILE",
+        type=str,
+        help="Path to the SafeTensors checkpoint",
+    )
+    parser.add_argument(
+        "-b",
+        "--backend",
+        metavar="BACKEND",
+        type=str,
+        default="torch",
+        choices=["torch", "triton"],
+        help="Inference backend to convert for",
+    )
+    parser.add_argument(
+        "--world-size",
+        type=int,
+        default=1,
+        help="Tensor-parallel world size the torch backend will run with",
+    )
+    parser.add_argument(
+        "--expert-parallel",
+        action="store_true",
+        help="Convert for expert-parallel MoE sharding (torch backend)",
+    )
+    parser.add_argument(
+        "--ranks",
+        type=int,
+        nargs="+",
+        default=None,
+        help="Only convert these ranks (default: all)",
+    )
+    parser.add_argument(
+        "--device",
+        type=str,
+        default="cpu",
+        help="Device used for conversion (triton needs a GPU)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Cache directory (default: $GPT_OSS_CONVERTED_CACHE or ~/.cache/gpt-oss/converted)",
+    )
+    parser.add_argument(
+        "--max-shard-mb",
+        type=int,
+        default=4096,
+        help="Size of each converted safetensors file; only one is held in host memory at a time",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rewrite existing cache files",
+    )
+    main(parser.parse_args())
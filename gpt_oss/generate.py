@@ -2,6 +2,7 @@
 # Note: This script is for demonstration purposes only. It is not designed for production use.
 #       See gpt_oss.chat for a more complete example with the Harmony parser.
 # torchrun --nproc-per-node=4 -m gpt_oss.generate -p "why did the chicken cross the road?" model/
+# CPU-only: torchrun --nproc-per-node=4 -m gpt_oss.generate --device cpu -p "why did the chicken cross the road?" model/
 
 import argparse
 
@@ -13,29 +14,77 @@ def main(args):
         case "torch":
             from gpt_oss.torch.utils import init_distributed
             from gpt_oss.torch.model import TokenGenerator as TorchGenerator
-            device = init_distributed()
-            generator = TorchGenerator(args.checkpoint, device=device)
+            device = init_distributed(backend=args.dist_backend, device=args.device, num_threads=args.num_threads)
+            generator = TorchGenerator(
+                args.checkpoint,
+                device=device,
+                expert_cache_size=args.expert_cache_size,
+                expert_parallel=args.expert_parallel,
+                prefill_chunk_size=args.prefill_chunk_size,
+                kv_cache_dtype=args.kv_cache_dtype,
+            )
         case "triton":
             from gpt_oss.torch.utils import init_distributed
             from gpt_oss.triton.model import TokenGenerator as TritonGenerator
             device = init_distributed()
-            generator = TritonGenerator(args.checkpoint, context=args.context_length, device=device)
+            generator = TritonGenerator(
+                args.checkpoint,
+                context=args.context_length,
+                device=device,
+                router_stats=bool(args.router_stats),
+                prefill_chunk_size=args.prefill_chunk_size,
+                kv_cache_dtype=args.kv_cache_dtype,
+            )
         case "vllm":
             from gpt_oss.vllm.token_generator import TokenGenerator as VLLMGenerator
             generator = VLLMGenerator(args.checkpoint, tensor_parallel_size=args.tensor_parallel_size)
         case _:
             raise ValueError(f"Invalid backend: {args.backend}")
 
+    if args.router_stats:
+        if args.backend not in ("torch", "triton"):
+            raise ValueError("Router statistics are only supported by the torch and triton backends")
+        if args.backend == "triton":
+            router_stats = generator.router_stats
+        else:
+            from gpt_oss.torch.router_stats import attach_router_stats
+            router_stats = attach_router_stats(generator.model)
+
+    kwargs = {}
+    if args.speculative > 0:
+        if args.backend not in ("torch", "triton"):
+            raise ValueError("Speculative decoding is only supported by the torch and triton backends")
+        from gpt_oss.torch.speculative import NGramDrafter
+        kwargs["drafter"] = NGramDrafter(num_draft_tokens=args.speculative)
+
     tokenizer = get_tokenizer()
     tokens = tokenizer.encode(args.prompt)
     max_tokens = None if args.limit == 0 else args.limit
-    for token, logprob in generator.generate(tokens, stop_tokens=[tokenizer.eot_token], temperature=args.temperature, max_tokens=max_tokens, return_logprobs=True):
+    for token, logprob in generator.generate(tokens, stop_tokens=[tokenizer.eot_token], temperature=args.temperature, max_tokens=max_tokens, return_logprobs=True, **kwargs):
         tokens.append(token)
         token_text = tokenizer.decode([token])
         print(
             f"Generated token: {repr(token_text)}, logprob: {logprob}"
         )
 
+    if args.router_stats:
+        router_stats.to_json(args.router_stats)
+        print(f"Router statistics written to {args.router_stats}")
+
+    if args.expert_cache_size:
+        stats = generator.model.expert_cache.stats
+        print(
+            f"Expert cache: hit rate {stats.hit_rate:.2%}, "
+            f"prefetch accuracy {stats.prefetch_accuracy:.2%}, {stats.evictions} evictions"
+        )
+
+    if args.speculative > 0:
+        stats = generator.speculative_stats
+        print(
+            f"Speculative decoding: acceptance rate {stats.acceptance_rate:.2%}, "
+            f"{stats.tokens_per_step:.2f} tokens/step over {stats.steps} steps"
+        )
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Text generation example")
@@ -84,6 +133,64 @@ if __name__ == "__main__":
         default=2,
         help="Tensor parallel size for vLLM backend",
     )
+    parser.add_argument(
+        "--speculative",
+        metavar="K",
+        type=int,
+        default=0,
+        help="Draft K tokens per step with prompt-lookup speculative decoding (0 to disable)",
+    )
+    parser.add_argument(
+        "--device",
+        type=str,
+        default=None,
+        help="Device for the torch backend, e.g. cpu or cuda (default: cuda if available)",
+    )
+    parser.add_argument(
+        "--dist-backend",
+        type=str,
+        default=None,
+        help="torch.distributed backend (default: nccl on GPU, gloo on CPU)",
+    )
+    parser.add_argument(
+        "--num-threads",
+        type=int,
+        default=None,
+        help="CPU threads per rank (default: this rank's share of the host's cores)",
+    )
+    parser.add_argument(
+        "--expert-cache-size",
+        metavar="N",
+        type=int,
+        default=0,
+        help="Offload MoE experts and keep at most N decoded experts on the device (torch backend, 0 to disable)",
+    )
+    parser.add_argument(
+        "--expert-parallel",
+        action="store_true",
+        help="Shard whole MoE experts across ranks with all-to-all dispatch instead of splitting every expert (torch backend)",
+    )
+    parser.add_argument(
+        "--prefill-chunk-size",
+        metavar="N",
+        type=int,
+        default=None,
+        help="Prefill the prompt in chunks of N tokens to bound activation memory (torch and triton backends)",
+    )
+    parser.add_argument(
+        "--kv-cache-dtype",
+        type=str,
+        default=None,
+        choices=["int8", "fp8"],
+        help="Store the KV cache quantized (torch and triton backends; default bf16)",
+    )
+    parser.add_argument(
+        "--router-stats",
+        metavar="FILE",
+        type=str,
+        default=None,
+        help="Collect MoE router statistics and write them to FILE as JSON",
+    )
     parser.add_argument(
         "--context-length",
         type=int,
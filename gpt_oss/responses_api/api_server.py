@@ -1,9 +1,10 @@
 import os
 import datetime
 import uuid
+from contextlib import asynccontextmanager
 from typing import Callable, Literal, Optional, Union
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.exception_handlers import request_validation_exception_handler
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import StreamingResponse
@@ -22,8 +23,15 @@ from openai_harmony import (
 )
 
 from gpt_oss.tools.python_docker.docker_tool import PythonTool
-from gpt_oss.tools.simple_browser import SimpleBrowserTool
-from gpt_oss.tools.simple_browser.backend import YouComBackend, ExaBackend
+from gpt_oss.tools.simple_browser import (
+    ClientSessionPool,
+    PageCache,
+    Prefetcher,
+    SearchCache,
+    SimpleBrowserTool,
+)
+from gpt_oss.tools.simple_browser.html_pool import default_html_processor
+from gpt_oss.tools.simple_browser.backend import Backend, YouComBackend, ExaBackend
 
 from .events import (
     ResponseCodeInterpreterCallCodeDelta,
@@ -98,9 +106,32 @@ def is_not_builtin_tool(
 
 
 def create_api_server(
-    infer_next_token: Callable[[list[int], float], int], encoding: HarmonyEncoding
+    infer_next_token: Callable[[list[int], float], int],
+    encoding: HarmonyEncoding,
+    metrics: Optional[Callable[[], dict]] = None,
 ) -> FastAPI:
-    app = FastAPI()
+    # Keep-alive HTTP sessions, fetched pages, search results, search result
+    # prefetching and the search backend are shared by all requests.
+    browser_sessions = ClientSessionPool.from_env()
+    page_cache = PageCache.from_env()
+    search_cache = SearchCache.from_env()
+    prefetcher = Prefetcher.from_env(page_cache)
+    browser_backends: dict[str, Backend] = {}
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        prefetcher.close()
+        search_cache.close()
+        page_cache.close()
+        default_html_processor().close()
+        await browser_sessions.close()
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.browser_sessions = browser_sessions
+    app.state.page_cache = page_cache
+    app.state.search_cache = search_cache
+    app.state.prefetcher = prefetcher
 
     @app.exception_handler(RequestValidationError)
     async def log_validation_error(request: Request, exc: RequestValidationError):
@@ -491,6 +522,15 @@ def create_api_server(
                 return event
 
         async def run(self):
+            try:
+                async for event in self._run():
+                    yield event
+            finally:
+                # The conversation is over: its pending prefetches are of no use.
+                if self.browser_tool is not None:
+                    self.browser_tool.cancel_prefetches()
+
+        async def _run(self):
             browser_tool = self.browser_tool
             self.new_request = True
             initial_response = generate_response(
@@ -1132,6 +1172,17 @@ def create_api_server(
                     )
                 )
 
+    @app.get("/v1/metrics")
+    async def get_metrics():
+        # Backend statistics (e.g. MoE router utilization) plus the browser caches.
+        result = metrics() if metrics is not None else {}
+        result["browser"] = {
+            "page_cache": page_cache.metrics(),
+            "search_cache": search_cache.metrics(),
+            "prefetch": prefetcher.metrics(),
+        }
+        return result
+
     @app.post("/v1/responses", response_model=ResponseObject)
     async def generate(body: ResponsesRequest, request: Request):
         print("request received")
@@ -1146,15 +1197,38 @@ def create_api_server(
             for tool in (body.tools or [])
         )
 
+        num_samples = body.n or 1
+        if num_samples < 1:
+            raise HTTPException(status_code=422, detail="`n` must be at least 1")
+        if num_samples > 1 and body.stream:
+            raise HTTPException(
+                status_code=422, detail="`n` > 1 is not supported with streaming"
+            )
+        temperature = (
+            body.temperature if body.temperature is not None else DEFAULT_TEMPERATURE
+        )
+        if num_samples > 1 and temperature == 0:
+            raise HTTPException(
+                status_code=422,
+                detail="`n` > 1 requires a temperature above 0; greedy samples are identical",
+            )
+
         if use_browser_tool:
             tool_backend = os.getenv("BROWSER_BACKEND", "exa")
-            if tool_backend == "youcom":
-                backend = YouComBackend(source="web")
-            elif tool_backend == "exa":
-                backend = ExaBackend(source="web")
-            else:
-                raise ValueError(f"Invalid tool backend: {tool_backend}")
-            browser_tool = SimpleBrowserTool(backend=backend)
+            if tool_backend not in browser_backends:
+                if tool_backend == "youcom":
+                    browser_backends[tool_backend] = YouComBackend(source="web")
+                elif tool_backend == "exa":
+                    browser_backends[tool_backend] = ExaBackend(source="web")
+                else:
+                    raise ValueError(f"Invalid tool backend: {tool_backend}")
+            browser_tool = SimpleBrowserTool(
+                backend=browser_backends[tool_backend],
+                session_pool=browser_sessions,
+                page_cache=page_cache,
+                search_cache=search_cache,
+                prefetcher=prefetcher,
+            )
         else:
             browser_tool = None
 
@@ -1328,6 +1402,54 @@ def create_api_server(
         def store_callback(rid: str, req: ResponsesRequest, resp: ResponseObject):
             responses_store[rid] = (req, resp)
 
+        if num_samples > 1:
+            # The server drives the single-sequence infer_next_token callback, so the
+            # samples run back to back, each through its own StreamResponsesEvents pass
+            # that starts a new request from the prompt tokens. Each sample gets its own
+            # tool instances because tools carry per-conversation state.
+            responses = []
+            for sample_idx in range(num_samples):
+                event_stream = StreamResponsesEvents(
+                    initial_tokens,
+                    body,
+                    as_sse=False,
+                    request=request,
+                    response_id=response_id,
+                    browser_tool=(
+                        browser_tool
+                        if sample_idx == 0 or browser_tool is None
+                        else SimpleBrowserTool(
+                            backend=browser_tool.backend,
+                            session_pool=browser_tool.session_pool,
+                            page_cache=browser_tool.page_cache,
+                            search_cache=browser_tool.search_cache,
+                            prefetcher=browser_tool.prefetcher,
+                        )
+                    ),
+                    python_tool=(
+                        python_tool
+                        if sample_idx == 0 or python_tool is None
+                        else PythonTool()
+                    ),
+                    functions_python_as_builtin=functions_python_as_builtin,
+                )
+                last_event = None
+                async for event in event_stream.run():
+                    last_event = event
+                responses.append(last_event.response)
+
+            response = responses[0].model_copy()
+            response.outputs = [r.output for r in responses]
+            output_tokens = sum(r.usage.output_tokens for r in responses if r.usage)
+            response.usage = Usage(
+                input_tokens=len(initial_tokens),
+                output_tokens=output_tokens,
+                total_tokens=len(initial_tokens) + output_tokens,
+            )
+            if body.store:
+                store_callback(response_id, body, response)
+            return response
+
         event_stream = StreamResponsesEvents(
             initial_tokens,
             body,
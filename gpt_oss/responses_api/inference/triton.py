@@ -6,18 +6,28 @@ os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
 import torch
 import torch.distributed as dist
 
+from gpt_oss.torch.kv_swap import KVSwapManager, KVSwapPolicy
 from gpt_oss.triton.model import Cache, ModelConfig, Transformer
 
 DEFAULT_TEMPERATURE = 0.0
 CONTEXT = 16_384
 CONCURRENT_SESSIONS = 1
+# Prompts are prefilled in chunks of this many tokens to bound activation memory.
+PREFILL_CHUNK_SIZE = int(os.environ.get("GPT_OSS_PREFILL_CHUNK_SIZE", 1024))
+# Optional quantized KV cache storage ("int8" or "fp8") for longer contexts / more sessions.
+KV_CACHE_DTYPE = os.environ.get("GPT_OSS_KV_CACHE_DTYPE") or None
+# Idle sessions' KV caches are swapped out to pinned host memory (up to this many GiB) when
+# another conversation takes over the cache, and spilled to files in KV_SWAP_DIR beyond that.
+KV_SWAP_HOST_GB = float(os.environ.get("GPT_OSS_KV_SWAP_HOST_GB", 0))
+KV_SWAP_DIR = os.environ.get("GPT_OSS_KV_SWAP_DIR") or None
+KV_SWAP_MIN_TOKENS = int(os.environ.get("GPT_OSS_KV_SWAP_MIN_TOKENS", 256))
 
 rank = int(
     os.environ.get("RANK", 0)
 )  # set this env var to another value to run on other GPUs
 
 
-def load_model(checkpoint: str):
+def load_model(checkpoint: str, router_stats: bool = False):
     print(f"[{rank}] loading model...")
 
     torch.cuda.set_device(rank)
@@ -26,6 +36,11 @@ def load_model(checkpoint: str):
 
     # Load model
     model = Transformer.from_checkpoint(checkpoint, device=device)
+    if router_stats:
+        # Attach before the CUDA graph is captured so the statistics updates are replayed with it.
+        from gpt_oss.torch.router_stats import attach_router_stats
+
+        model.router_stats = attach_router_stats(model)
 
     print(f"[{rank}] loaded")
     return model, device
@@ -33,7 +48,7 @@ def load_model(checkpoint: str):
 
 def get_infer_next_token(model, device):
     caches = [
-        Cache(CONCURRENT_SESSIONS, CONTEXT, model.config.num_key_value_heads)
+        Cache(CONCURRENT_SESSIONS, CONTEXT, model.config.num_key_value_heads, device=device, kv_dtype=KV_CACHE_DTYPE)
         for _ in range(len(model.block))
     ]
     # offsets = torch.zeros(CONCURRENT_SESSIONS, dtype=torch.int32, device=device) # TBD
@@ -47,6 +62,17 @@ def get_infer_next_token(model, device):
     with torch.cuda.graph(graph):
         logits = model(input_token[None, :], caches=caches)[0]
 
+    kv_swap = None
+    if KV_SWAP_HOST_GB > 0 or KV_SWAP_DIR:
+        kv_swap = KVSwapManager(
+            caches,
+            KVSwapPolicy(
+                min_tokens=KV_SWAP_MIN_TOKENS,
+                max_host_bytes=int(KV_SWAP_HOST_GB * 2**30),
+                swap_dir=KV_SWAP_DIR,
+            ),
+        )
+
     def lcp(cache: list[int], inp: list[int]) -> list[int]:
         i = 0
         max_len = min(len(cache), len(inp))
@@ -70,7 +96,10 @@ def get_infer_next_token(model, device):
         new_request: bool = False,
     ) -> int:
         nonlocal tokens_so_far
-        tokens_so_far = lcp(tokens_so_far, tokens)
+        if kv_swap is not None:
+            tokens_so_far = kv_swap.switch(tokens_so_far, tokens)
+        # Keep at least the last token to run through the captured decode graph.
+        tokens_so_far = lcp(tokens_so_far, tokens)[: len(tokens) - 1]
         for cache in caches:
             cache.truncate(len(tokens_so_far))
         all_tokens = tokens  # for pdb
@@ -80,6 +109,7 @@ def get_infer_next_token(model, device):
             model.prefill(
                 torch.as_tensor(tokens[:-1], dtype=torch.int32, device=device)[None, :],
                 caches,
+                chunk_size=PREFILL_CHUNK_SIZE,
             )
 
         if len(tokens) == 0:
@@ -91,12 +121,27 @@ def get_infer_next_token(model, device):
         # decide next token on rank‑0
         next_tok = sample_next_token(logits, temperature=temperature)
 
+        # The caches now hold every token of this request.
+        tokens_so_far = list(all_tokens)
         return next_tok
 
+    infer_next_token.kv_swap = kv_swap
     return infer_next_token
 
 
-def setup_model(checkpoint: str) -> Callable[[list[int], float], int]:
-    model, device = load_model(checkpoint)
+def setup_model(checkpoint: str, router_stats: bool = False) -> Callable[[list[int], float], int]:
+    model, device = load_model(checkpoint, router_stats=router_stats)
     infer_next_token = get_infer_next_token(model, device)
+    kv_swap = infer_next_token.kv_swap
+    if router_stats or kv_swap is not None:
+
+        def metrics() -> dict:
+            result = {}
+            if router_stats:
+                result["router"] = model.router_stats.snapshot()
+            if kv_swap is not None:
+                result["kv_swap"] = kv_swap.stats.as_dict()
+            return result
+
+        infer_next_token.metrics = metrics
     return infer_next_token
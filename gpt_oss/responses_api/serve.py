@@ -35,6 +35,11 @@ if __name__ == "__main__":
         # default to metal on macOS, triton on other platforms
         default="metal" if __import__("platform").system() == "Darwin" else "triton",
     )
+    parser.add_argument(
+        "--router-stats",
+        action="store_true",
+        help="Collect MoE router statistics and serve them at /v1/metrics (triton backend)",
+    )
     args = parser.parse_args()
 
     if args.inference_backend == "triton":
@@ -54,5 +59,11 @@ if __name__ == "__main__":
 
     encoding = load_harmony_encoding(HarmonyEncodingName.HARMONY_GPT_OSS)
 
-    infer_next_token = setup_model(args.checkpoint)
-    uvicorn.run(create_api_server(infer_next_token, encoding), port=args.port)
+    if args.router_stats:
+        if args.inference_backend != "triton":
+            raise ValueError("Router statistics are only supported by the triton backend")
+        infer_next_token = setup_model(args.checkpoint, router_stats=True)
+    else:
+        infer_next_token = setup_model(args.checkpoint)
+    metrics = getattr(infer_next_token, "metrics", None)
+    uvicorn.run(create_api_server(infer_next_token, encoding, metrics=metrics), port=args.port)
@@ -182,6 +182,8 @@ class ResponsesRequest(BaseModel):
     previous_response_id: Optional[str] = None
     temperature: Optional[float] = DEFAULT_TEMPERATURE
     include: Optional[list[str]] = None
+    # number of independent samples to generate for the same input (non-streaming only)
+    n: Optional[int] = 1
 
 
 class ResponseObject(BaseModel):
@@ -213,3 +215,18 @@ class ResponseObject(BaseModel):
     text: Optional[Dict[str, Any]] = None
     tool_choice: Optional[str] = "auto"
     top_p: Optional[int] = 1
+    # one output list per sample when the request asked for n > 1; `output` is the first one
+    outputs: Optional[
+        list[
+            list[
+                Union[
+                    Item,
+                    ReasoningItem,
+                    FunctionCallItem,
+                    FunctionCallOutputItem,
+                    WebSearchCallItem,
+                    CodeInterpreterCallItem,
+                ]
+            ]
+        ]
+    ] = None
@@ -1,8 +1,18 @@
 from .simple_browser_tool import SimpleBrowserTool
 from .backend import ExaBackend, YouComBackend
+from .html_pool import HTMLProcessor
+from .page_cache import PageCache
+from .prefetch import Prefetcher
+from .search_cache import SearchCache
+from .session_pool import ClientSessionPool
 
 __all__ = [
     "SimpleBrowserTool",
     "ExaBackend",
     "YouComBackend",
+    "ClientSessionPool",
+    "HTMLProcessor",
+    "PageCache",
+    "Prefetcher",
+    "SearchCache",
 ]
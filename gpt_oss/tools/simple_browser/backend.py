@@ -8,7 +8,7 @@ import logging
 import os
 from abc import abstractmethod
 from importlib.metadata import version
-from typing import Callable, ParamSpec, TypeVar
+from typing import Callable, ParamSpec, Sequence, TypeVar
 from urllib.parse import quote
 
 import chz
@@ -29,6 +29,8 @@ from .page_contents import (
     get_domain,
     process_html,
 )
+from .html_pool import process_html_async
+from .page_cache import normalize_url
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +47,28 @@ class BackendError(Exception):
     pass
 
 
+def strip_view_source(url: str) -> str:
+    if url.startswith(VIEW_SOURCE_PREFIX):
+        return url[len(VIEW_SOURCE_PREFIX) :]
+    return url
+
+
+def match_results(urls: Sequence[str], results: list[dict]) -> dict[str, dict]:
+    """Results of a batched contents call keyed by the normalized URL they answer.
+
+    Results are matched by their `id` (the requested URL) or `url`; the only
+    result of a single-URL request is taken as is.
+    """
+    if len(urls) == 1:
+        return {normalize_url(urls[0]): results[0]} if results else {}
+    matched: dict[str, dict] = {}
+    for result in results:
+        for field in ("id", "url"):
+            if result.get(field):
+                matched.setdefault(normalize_url(result[field]), result)
+    return matched
+
+
 P = ParamSpec("P")
 R = TypeVar("R")
 
@@ -94,6 +118,62 @@ class Backend:
     async def fetch(self, url: str, session: ClientSession) -> PageContents:
         pass
 
+    async def fetch_many(
+        self, urls: Sequence[str], session: ClientSession
+    ) -> list[PageContents | Exception]:
+        """Fetch `urls`, returning a page or the error for each, in order.
+
+        Backends whose API takes several URLs per request override this with a
+        single upstream call; the default fetches the URLs concurrently.
+        """
+        return await asyncio.gather(
+            *(self.fetch(url, session=session) for url in urls), return_exceptions=True
+        )
+
+    async def _fetch_one(self, url: str, session: ClientSession) -> PageContents:
+        (page,) = await self.fetch_many([url], session=session)
+        if isinstance(page, Exception):
+            raise page
+        return page
+
+    async def _process_contents(
+        self,
+        urls: Sequence[str],
+        results: list[dict],
+        html_field: str,
+        require_html: bool = False,
+        failed: dict[str, str] | None = None,
+    ) -> list[PageContents | Exception]:
+        """Turn the results of one batched contents request into a page or error per URL.
+
+        `failed` maps normalized URLs to the error the API reported for them. The
+        distinct pages are processed concurrently.
+        """
+        urls = [strip_view_source(url) for url in urls]
+        unique = list(dict.fromkeys(urls))
+        matched = match_results(unique, results)
+        failed = failed or {}
+
+        async def process(url: str) -> PageContents:
+            key = normalize_url(url)
+            result = matched.get(key)
+            if result is None:
+                if key in failed:
+                    raise BackendError(f"Error fetching {url}: {failed[key]}")
+                raise BackendError(f"No contents returned for {url}")
+            if require_html and html_field not in result:
+                raise BackendError(f"No HTML returned for {url}")
+            return await process_html_async(
+                html=result.get(html_field, ""),
+                url=url,
+                title=result.get("title", ""),
+                display_urls=True,
+            )
+
+        pages = await asyncio.gather(*(process(url) for url in unique), return_exceptions=True)
+        by_url = dict(zip(unique, pages))
+        return [by_url[url] for url in urls]
+
     async def _post(self, session: ClientSession, endpoint: str, payload: dict) -> dict:
         headers = {
             "x-api-key": self._get_api_key(),
@@ -160,33 +240,34 @@ class ExaBackend(Backend):
 </body></html>
 """
 
-        return process_html(
+        return await process_html_async(
             html=html_page,
             url="",
             title=query,
             display_urls=True,
-            session=session,
         )
 
     async def fetch(self, url: str, session: ClientSession) -> PageContents:
-        is_view_source = url.startswith(VIEW_SOURCE_PREFIX)
-        if is_view_source:
-            url = url[len(VIEW_SOURCE_PREFIX) :]
-        data = await self._post(
-            session,
-            "/contents",
-            {"urls": [url], "text": { "includeHtmlTags": True }},
-        )
-        results = data.get("results", [])
-        if not results:
-            raise BackendError(f"No contents returned for {url}")
-        return process_html(
-            html=results[0].get("text", ""),
-            url=url,
-            title=results[0].get("title", ""),
-            display_urls=True,
-            session=session,
-        )
+        return await self._fetch_one(url, session)
+
+    async def fetch_many(
+        self, urls: Sequence[str], session: ClientSession
+    ) -> list[PageContents | Exception]:
+        unique = list(dict.fromkeys(strip_view_source(url) for url in urls))
+        try:
+            data = await self._post(
+                session,
+                "/contents",
+                {"urls": unique, "text": { "includeHtmlTags": True }},
+            )
+        except Exception as e:
+            return [e] * len(urls)
+        failed = {
+            normalize_url(status["id"]): str(status.get("error", {}).get("tag", "error"))
+            for status in data.get("statuses", [])
+            if status.get("status") == "error" and status.get("id")
+        }
+        return await self._process_contents(urls, data.get("results", []), "text", failed=failed)
 
 @chz.chz(typecheck=True)
 class YouComBackend(Backend):
@@ -233,32 +314,26 @@ class YouComBackend(Backend):
 </body></html>
 """
 
-        return process_html(
+        return await process_html_async(
             html=html_page,
             url="",
             title=query,
             display_urls=True,
-            session=session,
         )
 
     async def fetch(self, url: str, session: ClientSession) -> PageContents:
-        is_view_source = url.startswith(VIEW_SOURCE_PREFIX)
-        if is_view_source:
-            url = url[len(VIEW_SOURCE_PREFIX) :]
-        data = await self._post(
-            session,
-            "/v1/contents",
-            {"urls": [url], "livecrawl_formats": "html"},
-        )
-        if not data:
-            raise BackendError(f"No contents returned for {url}")
-        if "html" not in data[0]:
-            raise BackendError(f"No HTML returned for {url}")
-        return process_html(
-            html=data[0].get("html", ""),
-            url=url,
-            title=data[0].get("title", ""),
-            display_urls=True,
-            session=session,
-        )
-
+        return await self._fetch_one(url, session)
+
+    async def fetch_many(
+        self, urls: Sequence[str], session: ClientSession
+    ) -> list[PageContents | Exception]:
+        unique = list(dict.fromkeys(strip_view_source(url) for url in urls))
+        try:
+            data = await self._post(
+                session,
+                "/v1/contents",
+                {"urls": unique, "livecrawl_formats": "html"},
+            )
+        except Exception as e:
+            return [e] * len(urls)
+        return await self._process_contents(urls, data or [], "html", require_html=True)
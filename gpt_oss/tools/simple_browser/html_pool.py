@@ -0,0 +1,218 @@
+"""
+Run `process_html` off the event loop.
+
+Parsing, link rewriting and text conversion of a large page take tens to
+hundreds of milliseconds of pure CPU time. Done inline in the `fetch`/`search`
+coroutines they stall the event loop, and with it every other streaming
+response of the server. `HTMLProcessor` sends pages above `inline_bytes` to
+`max_workers` worker processes (spawned, so it is safe in a process that has
+initialized CUDA or runs threads) and falls back to threads when worker
+processes cannot be started or die. A page is handed to a worker only once the
+worker is idle. Input is capped at `max_html_bytes` UTF-8 bytes, and a page
+that runs longer than `timeout` seconds raises `HTMLProcessingError`; only the
+stuck worker's process is killed and replaced. Other work that may run away on
+untrusted input, such as regex `find`s, goes through `HTMLProcessor.run`.
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import multiprocessing
+import os
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, TypeVar
+
+from .page_contents import PageContents, process_html
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class HTMLProcessingError(Exception):
+    pass
+
+
+def _ready() -> None:
+    """No-op run once by a new worker process, so that its start-up is not timed."""
+
+
+def _call_soon(loop: asyncio.AbstractEventLoop, callback, *args) -> None:
+    if not loop.is_closed():
+        loop.call_soon_threadsafe(callback, *args)
+
+
+class _Worker:
+    """One worker slot: a spawned process of its own, or a thread when processes are unavailable.
+
+    A page runs on a worker only when the worker is idle, so a page's timeout
+    starts when it starts running. A process stuck on a page is terminated and
+    replaced without touching the other workers.
+    """
+
+    def __init__(self, processor: "HTMLProcessor"):
+        self.processor = processor
+        self._executor: concurrent.futures.Executor | None = None
+
+    @property
+    def uses_process(self) -> bool:
+        return isinstance(self._executor, concurrent.futures.ProcessPoolExecutor)
+
+    async def ready(self) -> concurrent.futures.Executor:
+        if self._executor is None:
+            if self.processor.use_processes:
+                executor = None
+                try:
+                    executor = concurrent.futures.ProcessPoolExecutor(
+                        1, mp_context=multiprocessing.get_context("spawn")
+                    )
+                    await asyncio.wrap_future(executor.submit(_ready))
+                    self._executor = executor
+                except (OSError, NotImplementedError, ImportError, BrokenProcessPool) as e:
+                    logger.warning("Cannot start HTML worker processes, using threads", exc_info=e)
+                    self.processor.use_processes = False
+                finally:
+                    # Failed or cancelled while starting.
+                    if executor is not None and self._executor is not executor:
+                        executor.shutdown(wait=False, cancel_futures=True)
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="process-html")
+        return self._executor
+
+    def kill(self) -> bool:
+        """Terminate the worker process; False for a thread, which cannot be interrupted."""
+        executor = self._executor
+        if not isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+            return False
+        self._executor = None
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+        return True
+
+    def close(self):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class HTMLProcessor:
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        max_html_bytes: int = 8 << 20,
+        inline_bytes: int = 64 << 10,
+        timeout: float | None = 20.0,
+        use_processes: bool = True,
+    ):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.max_html_bytes = max_html_bytes
+        self.inline_bytes = inline_bytes
+        self.timeout = timeout
+        self.use_processes = use_processes
+        self._workers: list[_Worker] | None = None
+        self._idle: tuple[asyncio.AbstractEventLoop, asyncio.Queue[_Worker]] | None = None
+
+    @classmethod
+    def from_env(cls) -> "HTMLProcessor":
+        """Processor configured by BROWSER_HTML_WORKERS, BROWSER_HTML_MAX_BYTES and BROWSER_HTML_TIMEOUT."""
+        workers = os.getenv("BROWSER_HTML_WORKERS")
+        return cls(
+            max_workers=int(workers) if workers else None,
+            max_html_bytes=int(os.getenv("BROWSER_HTML_MAX_BYTES", 8 << 20)),
+            timeout=float(os.getenv("BROWSER_HTML_TIMEOUT", 20.0)),
+            use_processes=workers != "0",
+        )
+
+    @property
+    def uses_processes(self) -> bool:
+        return any(worker.uses_process for worker in self._workers or ())
+
+    def _idle_workers(self) -> asyncio.Queue[_Worker]:
+        # Pages wait here, not in an executor queue, until a worker is free; one queue per event loop.
+        loop = asyncio.get_running_loop()
+        if self._idle is None or self._idle[0] is not loop:
+            if self._workers is None:
+                self._workers = [_Worker(self) for _ in range(self.max_workers)]
+            idle: asyncio.Queue[_Worker] = asyncio.Queue()
+            for worker in self._workers:
+                idle.put_nowait(worker)
+            self._idle = (loop, idle)
+        return self._idle[1]
+
+    async def process(
+        self,
+        html: str,
+        url: str,
+        title: str | None,
+        display_urls: bool = False,
+    ) -> PageContents:
+        """Async `process_html`."""
+        # `max_html_bytes` counts UTF-8 bytes; a character takes at most 4, so most pages skip the encode.
+        if len(html) * 4 > self.max_html_bytes:
+            encoded = html.encode("utf-8", "ignore")
+            if len(encoded) > self.max_html_bytes:
+                logger.info("Truncating %d bytes of HTML from %s", len(encoded), url)
+                # A character cut in half by the cap is dropped.
+                html = encoded[: self.max_html_bytes].decode("utf-8", "ignore")
+        call = functools.partial(process_html, html, url, title, None, display_urls)
+        if len(html) <= self.inline_bytes:
+            return call()
+        try:
+            return await self.run(call)
+        except asyncio.TimeoutError:
+            raise HTMLProcessingError(f"Processing the HTML of {url} took longer than {self.timeout}s") from None
+
+    async def run(self, call: Callable[[], T]) -> T:
+        """`call()` on the next idle worker; raises `asyncio.TimeoutError` after `timeout` seconds.
+
+        `call` must be picklable, e.g. a `functools.partial` of a module-level function.
+        """
+        idle = self._idle_workers()
+        loop = asyncio.get_running_loop()
+        worker = await idle.get()
+        future: concurrent.futures.Future | None = None
+        try:
+            future = (await worker.ready()).submit(call)
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+            except BrokenProcessPool:
+                logger.warning("HTML worker process died, falling back to threads")
+                worker.kill()
+                self.use_processes = False
+                future = (await worker.ready()).submit(call)
+                return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        finally:
+            # Timed out or cancelled while running: kill the worker process; a thread
+            # cannot be stopped, so that worker is only free again once the page is done.
+            if future is not None and not future.done() and not worker.kill():
+                future.add_done_callback(lambda _: _call_soon(loop, idle.put_nowait, worker))
+            else:
+                idle.put_nowait(worker)
+
+    def close(self):
+        workers, self._workers, self._idle = self._workers, None, None
+        for worker in workers or ():
+            worker.close()
+
+
+# Configured at import; no worker is started before the first large page.
+_DEFAULT_PROCESSOR = HTMLProcessor.from_env()
+
+
+def default_html_processor() -> HTMLProcessor:
+    return _DEFAULT_PROCESSOR
+
+
+async def process_html_async(
+    html: str,
+    url: str,
+    title: str | None,
+    display_urls: bool = False,
+    processor: HTMLProcessor | None = None,
+) -> PageContents:
+    """`process_html` on the shared (or the given) `HTMLProcessor`, without blocking the event loop."""
+    processor = processor or default_html_processor()
+    return await processor.process(html, url, title, display_urls=display_urls)
@@ -0,0 +1,291 @@
+"""
+Page cache shared by all browser tool instances of a server.
+
+`SimpleBrowserState.pages` only deduplicates within one conversation, so every
+new conversation fetches and re-parses the same popular pages. `PageCache`
+keeps processed `PageContents` keyed by normalized URL:
+
+- an in-memory LRU bounded by the pages' serialized size,
+- an optional SQLite file as a second tier that survives restarts,
+- a TTL after which a page is stale; stale pages are still served for
+  `stale_ttl` more seconds while a single background fetch refreshes them
+  (stale-while-revalidate),
+- hit/miss counters for the metrics endpoint.
+"""
+
+import asyncio
+import dataclasses
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Sequence
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .page_contents import PageContents
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """Canonical cache key: lower-case scheme and host, no default port or fragment, sorted query."""
+    prefix = ""
+    if url.startswith("view-source:"):
+        prefix, url = "view-source:", url[len("view-source:") :]
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    if parts.username:
+        host = f"{parts.username}@{host}"
+    path = parts.path or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return prefix + urlunsplit((scheme, host, path, query, ""))
+
+
+@dataclasses.dataclass
+class PageCacheStats:
+    hits: int = 0
+    stale_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    revalidations: int = 0
+    revalidation_errors: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.stale_hits + self.misses
+        return (self.hits + self.stale_hits) / lookups if lookups else 0.0
+
+    def as_dict(self) -> dict:
+        return {**dataclasses.asdict(self), "hit_rate": self.hit_rate}
+
+
+@dataclasses.dataclass
+class _Entry:
+    page: PageContents
+    fetched_at: float
+    nbytes: int
+
+
+class _DiskTier:
+    """SQLite table of serialized pages; calls are blocking and run in a worker thread."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pages (key TEXT PRIMARY KEY, fetched_at REAL, data TEXT)"
+            )
+
+    def get(self, key: str) -> tuple[str, float] | None:
+        with self._lock:
+            row = self._db.execute("SELECT data, fetched_at FROM pages WHERE key = ?", (key,)).fetchone()
+        return row
+
+    def put(self, key: str, data: str, fetched_at: float):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?)", (key, fetched_at, data))
+
+    def delete_older_than(self, fetched_at: float):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM pages WHERE fetched_at < ?", (fetched_at,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class PageCache:
+    def __init__(
+        self,
+        max_bytes: int = 256 << 20,
+        ttl: float = 600.0,
+        stale_ttl: float = 3600.0,
+        disk_path: str | None = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.stats = PageCacheStats()
+        self._clock = clock
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._nbytes = 0
+        self._revalidating: dict[str, asyncio.Task] = {}
+        self._disk = _DiskTier(disk_path) if disk_path else None
+        if self._disk is not None:
+            self._disk.delete_older_than(clock() - ttl - stale_ttl)
+
+    @classmethod
+    def from_env(cls) -> "PageCache":
+        """Cache configured by BROWSER_PAGE_CACHE_MB, BROWSER_PAGE_CACHE_TTL and BROWSER_PAGE_CACHE_DB."""
+        return cls(
+            max_bytes=int(float(os.getenv("BROWSER_PAGE_CACHE_MB", 256)) * 2**20),
+            ttl=float(os.getenv("BROWSER_PAGE_CACHE_TTL", 600)),
+            disk_path=os.getenv("BROWSER_PAGE_CACHE_DB") or None,
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def metrics(self) -> dict:
+        return {**self.stats.as_dict(), "entries": len(self._entries), "bytes": self._nbytes}
+
+    def is_fresh(self, url: str) -> bool:
+        """Whether `url` is in memory and within its TTL; does not touch the stats or the LRU order."""
+        entry = self._entries.get(normalize_url(url))
+        return entry is not None and self._clock() - entry.fetched_at < self.ttl
+
+    async def get(
+        self,
+        url: str,
+        fetch: Callable[[], Awaitable[PageContents]],
+        allow_stale: bool = True,
+    ) -> PageContents:
+        """Return the cached page for `url`, calling `fetch()` on a miss.
+
+        With `allow_stale`, a page past its TTL (but within `stale_ttl`) is returned
+        immediately and refreshed in the background; otherwise it is refetched.
+        """
+        page = await self._lookup(url, fetch, allow_stale)
+        if page is not None:
+            return page
+        self.stats.misses += 1
+        page = await fetch()
+        await self.put(url, page)
+        return page
+
+    async def get_many(
+        self,
+        urls: Sequence[str],
+        fetch_many: Callable[[list[str]], Awaitable[list[PageContents | Exception]]],
+        allow_stale: bool = True,
+    ) -> list[PageContents | Exception]:
+        """Like `get` for several URLs, fetching all the misses with one `fetch_many(urls)` call.
+
+        Returns a page or the fetch error for each URL, in order. Stale pages are
+        refreshed in the background one by one.
+        """
+
+        async def fetch_one(url: str) -> PageContents:
+            (page,) = await fetch_many([url])
+            if isinstance(page, Exception):
+                raise page
+            return page
+
+        pages: list[PageContents | Exception | None] = [
+            await self._lookup(url, functools.partial(fetch_one, url), allow_stale) for url in urls
+        ]
+        # The first spelling of each missing URL is the one fetched.
+        misses: dict[str, str] = {}
+        for url, page in zip(urls, pages):
+            if page is None:
+                misses.setdefault(normalize_url(url), url)
+        if misses:
+            self.stats.misses += len(misses)
+            fetched = dict(zip(misses, await fetch_many(list(misses.values()))))
+            for key, page in fetched.items():
+                if not isinstance(page, Exception):
+                    await self.put(misses[key], page)
+            pages = [fetched[normalize_url(url)] if page is None else page for url, page in zip(urls, pages)]
+        return pages
+
+    async def _lookup(
+        self, url: str, fetch: Callable[[], Awaitable[PageContents]], allow_stale: bool
+    ) -> PageContents | None:
+        key = normalize_url(url)
+        entry = self._entries.get(key)
+        if entry is None and self._disk is not None:
+            entry = await self._load(key)
+        if entry is not None:
+            age = self._clock() - entry.fetched_at
+            if age < self.ttl:
+                self._touch(key)
+                self.stats.hits += 1
+                return entry.page
+            if allow_stale and age < self.ttl + self.stale_ttl:
+                self._touch(key)
+                self.stats.stale_hits += 1
+                self._revalidate(key, fetch)
+                return entry.page
+        return None
+
+    async def put(self, url: str, page: PageContents, fetched_at: float | None = None):
+        key = normalize_url(url)
+        fetched_at = self._clock() if fetched_at is None else fetched_at
+        data = page.model_dump_json()
+        self._insert(key, _Entry(page, fetched_at, len(data)))
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk.put, key, data, fetched_at)
+
+    def _insert(self, key: str, entry: _Entry):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._nbytes -= old.nbytes
+        if entry.nbytes > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._nbytes += entry.nbytes
+        while self._nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._nbytes -= evicted.nbytes
+            self.stats.evictions += 1
+
+    def _touch(self, key: str):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+
+    async def _load(self, key: str) -> _Entry | None:
+        row = await asyncio.to_thread(self._disk.get, key)
+        if row is None:
+            return None
+        data, fetched_at = row
+        if self._clock() - fetched_at >= self.ttl + self.stale_ttl:
+            return None
+        entry = _Entry(PageContents.model_validate_json(data), fetched_at, len(data))
+        self.stats.disk_hits += 1
+        self._insert(key, entry)
+        return entry
+
+    def _revalidate(self, key: str, fetch: Callable[[], Awaitable[PageContents]]):
+        # At most one background refresh per URL.
+        if key in self._revalidating:
+            return
+
+        async def refresh():
+            try:
+                page = await fetch()
+            except Exception as e:
+                self.stats.revalidation_errors += 1
+                logger.warning("Error revalidating cached page %s", key, exc_info=e)
+                return
+            finally:
+                self._revalidating.pop(key, None)
+            self.stats.revalidations += 1
+            await self.put(key, page)
+
+        self._revalidating[key] = asyncio.get_running_loop().create_task(refresh())
+
+    async def wait_for_revalidations(self):
+        while self._revalidating:
+            await asyncio.gather(*self._revalidating.values(), return_exceptions=True)
+
+    def close(self):
+        for task in self._revalidating.values():
+            task.cancel()
+        self._revalidating.clear()
+        if self._disk is not None:
+            self._disk.close()
@@ -11,23 +11,36 @@ import re
 from urllib.parse import urljoin, urlparse
 
 import aiohttp
-import html2text
 import lxml
 import lxml.etree
 import lxml.html
 import pydantic
 
-import tiktoken
+from .token_lengths import vocabulary_lengths
 
 logger = logging.getLogger(__name__)
 
 
-HTML_SUP_RE = re.compile(r"<sup( [^>]*)?>([\w\-]+)</sup>")
-HTML_SUB_RE = re.compile(r"<sub( [^>]*)?>([\w\-]+)</sub>")
-HTML_TAGS_SEQ_RE = re.compile(r"(?<=\w)((<[^>]*>)+)(?=\w)")
+SUP_SUB_TEXT_RE = re.compile(r"[\w\-]+")
 WHITESPACE_ANCHOR_RE = re.compile(r"(【\@[^】]+】)(\s+)")
-EMPTY_LINE_RE = re.compile(r"^\s+$", flags=re.MULTILINE)
+# Whitespace-only lines and runs of empty lines.
 EXTRA_NEWLINE_RE = re.compile(r"\n(\s*\n)+")
+WHITESPACE_RE = re.compile(r"\s+")
+IMAGE_ANCHOR_RE = re.compile(r"【\@([^】]+)】")
+# Characters lxml serializes as entity or character references.
+ESCAPED_CHARS_RE = re.compile(r"([&<>\r])")
+STRESSED_SPACING_RE = re.compile(r"[^][(){}\s.!?]")
+
+SPECIAL_CHAR_REPLACEMENTS = {
+    "【": "〖",
+    "】": "〗",
+    "◼": "◾",
+    # "━": "─",
+    "\u200b": "",  # zero width space
+    # Note: not replacing †
+}
+# SMP characters are not supported by lxml.html processing and are dropped.
+SPECIAL_CHARS_RE = re.compile("[\U00010000-\U0001FFFF%s]" % "".join(SPECIAL_CHAR_REPLACEMENTS))
 
 
 class Extract(pydantic.BaseModel):  # A search result snippet or a quotable extract
@@ -72,12 +85,6 @@ def get_domain(url: str) -> str:
     return urlparse(url).netloc
 
 
-def multiple_replace(text: str, replacements: dict[str, str]) -> str:
-    """Performs multiple string replacements using regex pass."""
-    regex = re.compile("(%s)" % "|".join(map(re.escape, replacements.keys())))
-    return regex.sub(lambda mo: replacements[mo.group(1)], text)
-
-
 @functools.lru_cache(maxsize=1024)
 def mark_lines(text: str) -> str:
     """Adds line numbers (ex: 'L0:') to the beginning of each line in a string."""
@@ -89,37 +96,20 @@ def mark_lines(text: str) -> str:
     return numbered_text
 
 
-@functools.cache
-def _tiktoken_vocabulary_lengths(enc_name: str) -> list[int]:
-    """Gets the character lengths of all tokens in the specified TikToken vocabulary."""
-    encoding = tiktoken.get_encoding(enc_name)
-    return [len(encoding.decode([i])) for i in range(encoding.n_vocab)]
-
-
 def warmup_caches(enc_names: list[str]) -> None:
     """Warm up the cache by computing token length lists for the given TikToken encodings."""
-    for _ in map(_tiktoken_vocabulary_lengths, enc_names):
+    for _ in map(vocabulary_lengths, enc_names):
         pass
 
 
 def _replace_special_chars(text: str) -> str:
-    """Replaces specific special characters with visually similar alternatives."""
-    replacements = {
-        "【": "〖",
-        "】": "〗",
-        "◼": "◾",
-        # "━": "─",
-        "\u200b": "",  # zero width space
-        # Note: not replacing †
-    }
-    return multiple_replace(text, replacements)
+    """Replaces specific special characters with visually similar alternatives and removes SMP characters."""
+    return SPECIAL_CHARS_RE.sub(lambda m: SPECIAL_CHAR_REPLACEMENTS.get(m.group(), ""), text)
 
 
 def merge_whitespace(text: str) -> str:
     """Replace newlines with spaces and merge consecutive whitespace into a single space."""
-    text = text.replace("\n", " ")
-    text = re.sub(r"\s+", " ", text)
-    return text
+    return WHITESPACE_RE.sub(" ", text)
 
 
 def arxiv_to_ar5iv(url: str) -> str:
@@ -138,7 +128,7 @@ def _clean_links(root: lxml.html.HtmlElement, cur_url: str) -> dict[str, str]:
         if link.startswith(("mailto:", "javascript:")):
             continue
         text = _get_text(a).replace("†", "‡")
-        if not re.sub(r"【\@([^】]+)】", "", text):  # Probably an image
+        if not IMAGE_ANCHOR_RE.sub("", text):  # Probably an image
             continue
         if link.startswith("#"):
             replace_node_with_text(a, text)
@@ -174,36 +164,343 @@ def _remove_node(node: lxml.html.HtmlElement) -> None:
     node.getparent().remove(node)
 
 
-def _escape_md(text: str) -> str:
-    return text
+def _heading_level(tag: str) -> int:
+    if len(tag) == 2 and tag[0] == "h" and "0" < tag[1] <= "9":
+        return int(tag[1])
+    return 0
+
+
+def _list_numbering_start(node: lxml.html.HtmlElement) -> int:
+    try:
+        return int(node.get("start")) - 1
+    except (TypeError, ValueError):
+        return 0
+
+
+# Tags that change the text layout; all other tags only separate runs of text.
+LAYOUT_TAGS = frozenset(
+    ["p", "div", "br", "hr", "head", "style", "script", "body", "blockquote", "del", "strike", "s", "kbd"]
+    + ["code", "tt", "abbr", "q", "dl", "dt", "dd", "ol", "ul", "li", "tr", "pre"]
+    + [f"h{level}" for level in range(1, 10)]
+)
+
 
+class _TextWriter:
+    """Line-oriented plain text writer fed with the tags and text of a document in order.
 
-def _escape_md_section(text: str, snob: bool = False) -> str:
-    return text
+    Produces the output html2text used to produce for the browser (no links, images,
+    tables or emphasis markup, no wrapping, no markdown escaping): paragraphs and
+    headings are separated by blank lines, list items are indented and marked, and
+    whitespace within text is merged.
+    """
+
+    def __init__(self):
+        self.chunks: list[str] = []
+        self.quiet = 0  # inside <head>, <script> or <style>
+        self.p_p = 0  # number of newlines to write before the next output
+        self.start = True
+        self.space = False
+        self.last_was_nl = False
+        self.br_toggle = ""
+        self.blockquote = 0
+        self.lists: list[list] = []  # [tag, last item number]
+        self.last_was_list = False
+        self.list_code_indent = ""
+        self.pre = False
+        self.start_pre = False
+        self.pre_indent = ""
+        self.code = False
+        self.quote = False
+        self.stressed = False
+        self.preceding_stressed = False
+        self.preceding_data = ""
+        self.current_tag = ""
+        self.abbr_title: str | None = None
+        self.abbr_data: str | None = None
+        self.abbr_list: dict[str, str] = {}
+
+    def _p(self) -> None:
+        self.p_p = 2
+
+    def _pbr(self) -> None:
+        if self.p_p == 0:
+            self.p_p = 1
+
+    def _soft_br(self) -> None:
+        self._pbr()
+        self.br_toggle = "  "
+
+    def _out(self, s: str) -> None:
+        self.chunks.append(s)
+        if s:
+            self.last_was_nl = s[-1] == "\n"
+
+    def _o(self, data: str, puredata: bool = False, force: bool | str = False) -> None:
+        """Writes `data` after any pending line breaks or space."""
+        if self.abbr_data is not None:
+            self.abbr_data += data
+        if self.quiet:
+            return
+        if puredata and not self.pre:
+            data = WHITESPACE_RE.sub(" ", data)
+            if data and data[0] == " ":
+                self.space = True
+                data = data[1:]
+        if not data and not force:
+            return
+        if self.start_pre and not data.startswith(("\n", "\r\n")):
+            data = "\n" + data
+        bq = ">" * self.blockquote
+        if not (force and data and data[0] == ">") and self.blockquote:
+            bq += " "
+        if self.pre:
+            if self.lists:
+                bq += self.list_code_indent
+            bq += "    "
+            data = data.replace("\n", "\n" + bq)
+            self.pre_indent = bq
+        if self.start_pre:
+            self.start_pre = False
+            if self.lists:
+                data = data.lstrip("\n" + self.pre_indent)
+        if self.start:
+            self.space = False
+            self.p_p = 0
+            self.start = False
+        if force == "end":
+            self.p_p = 0
+            self._out("\n")
+            self.space = False
+        if self.p_p:
+            self._out((self.br_toggle + "\n" + bq) * self.p_p)
+            self.space = False
+            self.br_toggle = ""
+        if self.space:
+            if not self.last_was_nl:
+                self._out(" ")
+            self.space = False
+        if self.abbr_list and force == "end":
+            for abbr, definition in self.abbr_list.items():
+                self._out("  *[" + abbr + "]: " + definition + "\n")
+        self.p_p = 0
+        self._out(data)
+
+    def tag(self, tag: str, node: lxml.html.HtmlElement, start: bool) -> None:
+        self.current_tag = tag
+        if tag not in LAYOUT_TAGS:
+            self.last_was_list = False
+            return
+        level = _heading_level(tag)
+        if level:
+            self._p()
+            if not start:
+                return
+            self._o("#" * level + " ")
+        elif tag == "p" or tag == "div":
+            self._p()
+        elif tag == "br":
+            if start:
+                self._o("  \n> " if self.blockquote > 0 else "  \n")
+        elif tag == "hr":
+            if start:
+                self._p()
+                self._o("* * *")
+                self._p()
+        elif tag in ("head", "style", "script"):
+            self.quiet += 1 if start else -1
+        elif tag == "body":
+            self.quiet = 0
+        elif tag == "blockquote":
+            if start:
+                self._p()
+                self._o("> ", force=True)
+                self.start = True
+                self.blockquote += 1
+            else:
+                self.blockquote -= 1
+                self._p()
+        elif tag in ("del", "strike", "s"):
+            if start and self.preceding_data and self.preceding_data[-1] == "~":
+                self.preceding_data += " "
+                self._o(" ~~")
+            else:
+                self._o("~~")
+            if start:
+                self.stressed = True
+        elif tag in ("kbd", "code", "tt"):
+            if not self.pre:
+                self._o("`")
+                self.code = not self.code
+        elif tag == "abbr":
+            if start:
+                self.abbr_title = node.get("title")
+                self.abbr_data = ""
+            else:
+                if self.abbr_title is not None:
+                    self.abbr_list[self.abbr_data] = self.abbr_title
+                    self.abbr_title = None
+                self.abbr_data = None
+        elif tag == "q":
+            self._o('"')
+            self.quote = not self.quote
+        elif tag == "dl":
+            if start:
+                self._p()
+        elif tag == "dt":
+            if not start:
+                self._pbr()
+        elif tag == "dd":
+            if start:
+                self._o("    ")
+            else:
+                self._pbr()
+        elif tag in ("ol", "ul"):
+            if not self.lists and not self.last_was_list:
+                self._p()
+            if start:
+                self.lists.append([tag, _list_numbering_start(node)])
+            elif self.lists:
+                self.lists.pop()
+                if not self.lists:
+                    self._o("\n")
+        elif tag == "li":
+            self.list_code_indent = ""
+            self._pbr()
+            if start:
+                item = self.lists[-1] if self.lists else ["ul", 0]
+                # Two spaces per list level, three inside an ordered list.
+                parent = None
+                for name, _ in self.lists:
+                    self.list_code_indent += "   " if parent == "ol" else "  "
+                    parent = name
+                self._o(self.list_code_indent)
+                if item[0] == "ul":
+                    self.list_code_indent += "  "
+                    self._o("* ")
+                else:
+                    item[1] += 1
+                    self.list_code_indent += "   "
+                    self._o(f"{item[1]}. ")
+                self.start = True
+        elif tag == "tr":
+            if not start:
+                self._soft_br()
+        elif tag == "pre":
+            if start:
+                self.start_pre = True
+                self.pre = True
+                self.pre_indent = ""
+            else:
+                self.pre = False
+            self._p()
+        self.last_was_list = tag in ("ol", "ul")
+
+    def data(self, data: str) -> None:
+        if self.stressed:
+            data = data.strip()
+            self.stressed = False
+            self.preceding_stressed = True
+        elif self.preceding_stressed:
+            if (
+                STRESSED_SPACING_RE.match(data[0])
+                and not _heading_level(self.current_tag)
+                and self.current_tag not in ("a", "code", "pre")
+            ):
+                data = " " + data
+            self.preceding_stressed = False
+        self.preceding_data = data
+        self._o(data, puredata=True)
+
+    def text(self, text: str, raw: bool = False) -> None:
+        """Writes a run of text; `raw` text (script and style contents) is written as one piece."""
+        if raw or not ESCAPED_CHARS_RE.search(text):
+            self.data(text)
+            return
+        # Characters that are escaped in serialized HTML start a new piece of text.
+        for piece in ESCAPED_CHARS_RE.split(text):
+            if piece:
+                self.data(piece)
+
+    def finish(self) -> str:
+        self._pbr()
+        self._o("", force="end")
+        return "".join(self.chunks)
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+def _escape_raw_text(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace("\r", "&#13;")
+
+
+def _inline_sup_sub(root: lxml.html.HtmlElement) -> None:
+    """Replaces superscripts and subscripts of a single word with `^{...}` and `_{...}`."""
+    for tag, template in (("sup", "^{%s}"), ("sub", "_{%s}")):
+        for node in list(root.iter(tag)):
+            if (
+                len(node) == 0
+                and node.text
+                and node.getparent() is not None
+                and SUP_SUB_TEXT_RE.fullmatch(node.text)
+            ):
+                replace_node_with_text(node, template % node.text)
+
+
+def tree_to_text(root: lxml.html.HtmlElement) -> str:
+    """Converts a parsed HTML tree to clean plaintext in a single walk."""
+    if not isinstance(root.tag, str):  # a document that is just a comment
+        return ""
+    writer = _TextWriter()
+    text, raw = "", False
+    # Tags (and comments, as None) between the previous and the next run of text.
+    tags: list[tuple[str, lxml.html.HtmlElement, bool] | None] = []
+
+    def flush():
+        if text:
+            writer.text(text, raw)
+        for tag in tags:
+            if tag is not None:
+                writer.tag(*tag)
+        tags.clear()
+
+    for event, node in lxml.etree.iterwalk(root, events=("start", "end", "comment", "pi")):
+        if event == "start":
+            tags.append((node.tag, node, True))
+            new_text = node.text
+        elif event == "end":
+            tags.append((node.tag, node, False))
+            new_text = node.tail
+        else:
+            tags.append(None)
+            new_text = node.tail
+            if event == "comment" and node.text and ">" in node.text:
+                # `<!-- a > b -->` is the tag `<!-- a >` followed by ` b -->` when looking for tags
+                # between words, so the comment ends the sequence of tags.
+                rest = node.text.split(">", 1)[1]
+                if text and _is_word_char(text[-1]) and _is_word_char((rest or "-")[0]):
+                    text += " "
+                flush()
+                text, raw = new_text or "", False
+                continue
+        if not new_text:
+            continue
+        # Tags between two words separate them, e.g. adjacent table cells.
+        if text and _is_word_char(text[-1]) and _is_word_char(new_text[0]):
+            text += " "
+        flush()
+        raw = event == "start" and node.tag in ("script", "style")
+        text = _escape_raw_text(new_text) if raw else new_text
+    flush()
+    return writer.finish().strip()
 
 
 def html_to_text(html: str) -> str:
     """Converts an HTML string to clean plaintext."""
-    html = re.sub(HTML_SUP_RE, r"^{\2}", html)
-    html = re.sub(HTML_SUB_RE, r"_{\2}", html)
-    # add spaces between tags such as table cells
-    html = re.sub(HTML_TAGS_SEQ_RE, r" \1", html)
-    # we don't need to escape markdown, so monkey-patch the logic
-    orig_escape_md = html2text.utils.escape_md
-    orig_escape_md_section = html2text.utils.escape_md_section
-    html2text.utils.escape_md = _escape_md
-    html2text.utils.escape_md_section = _escape_md_section
-    h = html2text.HTML2Text()
-    h.ignore_links = True
-    h.ignore_images = True
-    h.body_width = 0  # no wrapping
-    h.ignore_tables = True
-    h.unicode_snob = True
-    h.ignore_emphasis = True
-    result = h.handle(html).strip()
-    html2text.utils.escape_md = orig_escape_md
-    html2text.utils.escape_md_section = orig_escape_md_section
-    return result
+    root = lxml.html.fromstring(html)
+    _inline_sup_sub(root)
+    return tree_to_text(root)
 
 
 def _remove_math(root: lxml.html.HtmlElement) -> None:
@@ -212,15 +509,6 @@ def _remove_math(root: lxml.html.HtmlElement) -> None:
         _remove_node(node)
 
 
-def remove_unicode_smp(text: str) -> str:
-    """Removes Unicode characters in the Supplemental Multilingual Plane (SMP) from `text`.
-
-    SMP characters are not supported by lxml.html processing.
-    """
-    smp_pattern = re.compile(r"[\U00010000-\U0001FFFF]", re.UNICODE)
-    return smp_pattern.sub("", text)
-
-
 def replace_node_with_text(node: lxml.html.HtmlElement, text: str) -> None:
     """Replaces an lxml node with a text string while preserving surrounding text."""
     previous = node.getprevious()
@@ -258,7 +546,6 @@ def process_html(
     display_urls: bool = False,
 ) -> PageContents:
     """Convert HTML into model-readable version."""
-    html = remove_unicode_smp(html)
     html = _replace_special_chars(html)
     root = lxml.html.fromstring(html)
 
@@ -280,15 +567,13 @@ def process_html(
         session=session,
     )
     _remove_math(root)
-    clean_html = lxml.etree.tostring(root, encoding="UTF-8").decode()
-    text = html_to_text(clean_html)
-    text = re.sub(WHITESPACE_ANCHOR_RE, lambda m: m.group(2) + m.group(1), text)
+    _inline_sup_sub(root)
+    text = tree_to_text(root)
+    text = WHITESPACE_ANCHOR_RE.sub(r"\2\1", text)
     # ^^^ move anchors to the right thru whitespace
     # This way anchors don't create extra whitespace
-    text = re.sub(EMPTY_LINE_RE, "", text)
-    # ^^^ Get rid of empty lines
-    text = re.sub(EXTRA_NEWLINE_RE, "\n\n", text)
-    # ^^^ Get rid of extra newlines
+    text = EXTRA_NEWLINE_RE.sub("\n\n", text)
+    # ^^^ Get rid of empty lines and extra newlines
 
     top_parts = []
     if display_urls:
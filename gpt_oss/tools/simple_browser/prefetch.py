@@ -0,0 +1,213 @@
+"""
+Speculative prefetch of search results for the browser tool.
+
+After a search, the model usually opens one of the top results next, and that
+`open` pays the full fetch and HTML processing latency while the model waits.
+`Prefetcher` fetches the top results of every search in the background, with
+one batched `fetch_many` call per search and at most `max_concurrency` such
+calls at a time across all conversations, and stores them in the shared
+`PageCache`. Each conversation gets a `PrefetchGroup` that hands its
+prefetched pages to `open` (waiting for a prefetch that is still running
+instead of fetching the page again) and cancels what is left when the
+conversation ends. The stats report how many prefetched pages were opened and
+how many were fetched for nothing.
+"""
+
+import asyncio
+import dataclasses
+import logging
+import os
+import time
+import weakref
+from typing import Awaitable, Callable, Sequence
+
+from .page_cache import PageCache, normalize_url
+from .page_contents import PageContents
+
+logger = logging.getLogger(__name__)
+
+FetchMany = Callable[[list[str]], Awaitable[list[PageContents | Exception]]]
+
+
+@dataclasses.dataclass
+class PrefetchStats:
+    scheduled: int = 0
+    # Top results that were already cached or already being prefetched.
+    skipped: int = 0
+    completed: int = 0
+    errors: int = 0
+    # Still running (or waiting for a slot) when their conversation ended.
+    cancelled: int = 0
+    # Opens served by a prefetch, finished or still running.
+    hits: int = 0
+    # Completed prefetches that their conversation never opened.
+    wasted: int = 0
+    # Time spent in prefetch calls, and the part of the pages' fetch time that opens did not wait for.
+    fetch_seconds: float = 0.0
+    saved_seconds: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.scheduled if self.scheduled else 0.0
+
+    def as_dict(self) -> dict:
+        return {**dataclasses.asdict(self), "hit_rate": self.hit_rate}
+
+
+@dataclasses.dataclass
+class _Result:
+    page: PageContents | None
+    # Fetch time of the batch, without the wait for a free slot, and when the page was ready.
+    latency: float = 0.0
+    finished_at: float = 0.0
+
+
+class Prefetcher:
+    def __init__(
+        self,
+        page_cache: PageCache | None = None,
+        top_n: int = 3,
+        max_concurrency: int = 4,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.page_cache = page_cache
+        self.top_n = top_n
+        self.max_concurrency = max_concurrency
+        self.stats = PrefetchStats()
+        self._clock = clock
+        self._semaphores: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._groups: weakref.WeakSet["PrefetchGroup"] = weakref.WeakSet()
+        # Running batches and their sizes; the event loop only keeps weak references to tasks.
+        self._running: dict[asyncio.Task, int] = {}
+
+    @classmethod
+    def from_env(cls, page_cache: PageCache | None = None) -> "Prefetcher":
+        """Prefetcher configured by BROWSER_PREFETCH_TOP_N (0, the default, disables it)
+        and BROWSER_PREFETCH_CONCURRENCY."""
+        return cls(
+            page_cache=page_cache,
+            top_n=int(os.getenv("BROWSER_PREFETCH_TOP_N", 0)),
+            max_concurrency=int(os.getenv("BROWSER_PREFETCH_CONCURRENCY", 4)),
+        )
+
+    def metrics(self) -> dict:
+        return {**self.stats.as_dict(), "in_flight": sum(self._running.values())}
+
+    def group(self) -> "PrefetchGroup":
+        """Prefetches of one conversation."""
+        group = PrefetchGroup(self)
+        self._groups.add(group)
+        return group
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # Semaphores are bound to the loop they are first used on.
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    async def _run(self, urls: list[str], fetch_many: FetchMany) -> list[_Result]:
+        async with self._semaphore():
+            start = self._clock()
+            try:
+                pages = await fetch_many(urls)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                pages = [e] * len(urls)
+            finally:
+                self.stats.fetch_seconds += self._clock() - start
+        latency = self._clock() - start
+        results = []
+        for url, page in zip(urls, pages):
+            if not isinstance(page, Exception) and self.page_cache is not None:
+                try:
+                    await self.page_cache.put(url, page)
+                except Exception as e:
+                    page = e
+            if isinstance(page, Exception):
+                self.stats.errors += 1
+                logger.info("Error prefetching %s", url, exc_info=page)
+                results.append(_Result(page=None))
+                continue
+            self.stats.completed += 1
+            results.append(_Result(page=page, latency=latency, finished_at=self._clock()))
+        return results
+
+    def _start(self, urls: list[str], fetch_many: FetchMany) -> asyncio.Task[list[_Result]]:
+        task = asyncio.get_running_loop().create_task(self._run(urls, fetch_many))
+        self._running[task] = len(urls)
+        task.add_done_callback(lambda task: self._running.pop(task, None))
+        self.stats.scheduled += len(urls)
+        return task
+
+    def close(self):
+        for group in list(self._groups):
+            group.close()
+        for task in list(self._running):
+            task.cancel()
+
+
+class PrefetchGroup:
+    def __init__(self, prefetcher: Prefetcher):
+        self.prefetcher = prefetcher
+        # Each prefetched URL's batch and its position in it.
+        self._tasks: dict[str, tuple[asyncio.Task[list[_Result]], int]] = {}
+
+    def schedule(self, urls: Sequence[str], fetch_many: FetchMany):
+        """Start prefetching the first `top_n` of `urls` with one `fetch_many(urls)` call."""
+        prefetcher = self.prefetcher
+        page_cache = prefetcher.page_cache
+        batch: dict[str, str] = {}
+        for url in urls[: prefetcher.top_n]:
+            key = normalize_url(url)
+            if key in self._tasks or key in batch or (page_cache is not None and page_cache.is_fresh(url)):
+                prefetcher.stats.skipped += 1
+                continue
+            batch[key] = url
+        if not batch:
+            return
+        task = prefetcher._start(list(batch.values()), fetch_many)
+        for index, key in enumerate(batch):
+            self._tasks[key] = (task, index)
+
+    async def take(self, url: str) -> PageContents | None:
+        """The prefetched page for `url`, waiting for it if it is still being fetched.
+
+        None if `url` was not prefetched or its prefetch failed. A page is only
+        handed out once; later opens go through the page cache.
+        """
+        entry = self._tasks.pop(normalize_url(url), None)
+        if entry is None:
+            return None
+        task, index = entry
+        prefetcher = self.prefetcher
+        requested_at = prefetcher._clock()
+        try:
+            # Shielded so that a cancelled open does not cancel the prefetch.
+            results = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled():  # the group was closed meanwhile
+                return None
+            raise
+        result = results[index]
+        if result.page is None:
+            return None
+        prefetcher.stats.hits += 1
+        waited = max(0.0, result.finished_at - requested_at)
+        prefetcher.stats.saved_seconds += max(0.0, result.latency - waited)
+        return result.page
+
+    def close(self):
+        """Cancel the running prefetches and count the unused pages as wasted."""
+        stats = self.prefetcher.stats
+        for task, index in self._tasks.values():
+            if not task.done():
+                task.cancel()
+                stats.cancelled += 1
+            elif not task.cancelled() and task.result()[index].page is not None:
+                stats.wasted += 1
+        self._tasks.clear()
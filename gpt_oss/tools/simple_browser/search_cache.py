@@ -0,0 +1,137 @@
+"""
+Search result cache in front of `Backend.search`.
+
+Agents often repeat near-identical queries, and concurrent conversations search
+for the same topics at the same time. `SearchCache` keys results by the
+normalized query, the number of results and the backend source, keeps them for
+`ttl` seconds, and coalesces concurrent identical searches into one upstream
+request (single-flight). Its stats report the hit rate and the upstream latency
+that hits and coalesced requests did not have to pay.
+"""
+
+import asyncio
+import dataclasses
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from .page_contents import PageContents
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Case-fold, NFKC-normalize and collapse whitespace; trailing `?`/`.` do not change a search."""
+    query = unicodedata.normalize("NFKC", query).casefold()
+    return _WHITESPACE_RE.sub(" ", query).strip().rstrip("?.").strip()
+
+
+@dataclasses.dataclass
+class SearchCacheStats:
+    hits: int = 0
+    coalesced: int = 0
+    misses: int = 0
+    errors: int = 0
+    # Time spent in upstream searches, and the upstream time hits and coalesced requests
+    # avoided (the latency of the request that produced the result they got).
+    upstream_seconds: float = 0.0
+    saved_seconds: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.coalesced + self.misses
+        return (self.hits + self.coalesced) / lookups if lookups else 0.0
+
+    def as_dict(self) -> dict:
+        return {**dataclasses.asdict(self), "hit_rate": self.hit_rate}
+
+
+@dataclasses.dataclass
+class _Entry:
+    page: PageContents
+    fetched_at: float
+    latency: float
+
+
+class SearchCache:
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        max_entries: int = 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = SearchCacheStats()
+        self._clock = clock
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._in_flight: dict[tuple, asyncio.Task] = {}
+
+    @classmethod
+    def from_env(cls) -> "SearchCache":
+        """Cache configured by BROWSER_SEARCH_CACHE_TTL and BROWSER_SEARCH_CACHE_SIZE."""
+        return cls(
+            ttl=float(os.getenv("BROWSER_SEARCH_CACHE_TTL", 300)),
+            max_entries=int(os.getenv("BROWSER_SEARCH_CACHE_SIZE", 1024)),
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def metrics(self) -> dict:
+        return {**self.stats.as_dict(), "entries": len(self._entries), "in_flight": len(self._in_flight)}
+
+    async def get(
+        self,
+        query: str,
+        topn: int,
+        source: str,
+        search: Callable[[], Awaitable[PageContents]],
+    ) -> PageContents:
+        """Cached results for (`query`, `topn`, `source`); `search()` runs at most once per key at a time."""
+        key = (normalize_query(query), topn, source)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if self._clock() - entry.fetched_at < self.ttl:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                self.stats.saved_seconds += entry.latency
+                return entry.page
+            del self._entries[key]
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.stats.coalesced += 1
+            # Shielded so that one waiter being cancelled does not cancel the shared request.
+            page = await asyncio.shield(task)
+            if key in self._entries:
+                self.stats.saved_seconds += self._entries[key].latency
+            return page
+
+        self.stats.misses += 1
+        task = asyncio.get_running_loop().create_task(self._search(key, search))
+        self._in_flight[key] = task
+        return await asyncio.shield(task)
+
+    async def _search(self, key: tuple, search: Callable[[], Awaitable[PageContents]]) -> PageContents:
+        start = self._clock()
+        try:
+            page = await search()
+        except BaseException:
+            self.stats.errors += 1
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+            self.stats.upstream_seconds += self._clock() - start
+        self._entries[key] = _Entry(page, self._clock(), self._clock() - start)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return page
+
+    def close(self):
+        for task in self._in_flight.values():
+            task.cancel()
+        self._in_flight.clear()
@@ -0,0 +1,89 @@
+"""
+Long-lived aiohttp sessions shared by the browser tools of a server.
+
+Opening a `ClientSession` per search or page fetch pays DNS resolution, the TCP
+handshake and TLS setup on every call. A `ClientSessionPool` keeps one session
+per backend (keyed by its base URL) with a keep-alive connector, so consecutive
+tool calls reuse warm connections. Servers create the pool in their lifespan
+and close it on shutdown.
+
+aiohttp only speaks HTTP/1.1; reuse comes from keep-alive connections, with up
+to `limit_per_host` of them in flight per search API.
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+
+
+class ClientSessionPool:
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 32,
+        keepalive_timeout: float = 60.0,
+        total_timeout: float | None = 60.0,
+        connect_timeout: float | None = 10.0,
+        dns_cache_ttl: int = 300,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = ClientTimeout(total=total_timeout, connect=connect_timeout)
+        self.dns_cache_ttl = dns_cache_ttl
+        # Sessions are bound to the event loop they were created on, so each loop has its own.
+        self._sessions: dict[tuple[str, asyncio.AbstractEventLoop], ClientSession] = {}
+
+    @classmethod
+    def from_env(cls) -> "ClientSessionPool":
+        """Pool configured by BROWSER_MAX_CONNECTIONS, BROWSER_MAX_CONNECTIONS_PER_HOST and BROWSER_TIMEOUT."""
+        return cls(
+            limit=int(os.getenv("BROWSER_MAX_CONNECTIONS", 100)),
+            limit_per_host=int(os.getenv("BROWSER_MAX_CONNECTIONS_PER_HOST", 32)),
+            total_timeout=float(os.getenv("BROWSER_TIMEOUT", 60.0)),
+        )
+
+    def get(self, key: str = "") -> ClientSession:
+        """The shared session for `key` (e.g. a backend's base URL), created on first use.
+
+        Must be called from the event loop that will use the session.
+        """
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get((key, loop))
+        if session is None or session.closed:
+            # Sessions of loops that are gone cannot be closed any more; let them be collected.
+            for stale in [k for k in self._sessions if k[1].is_closed()]:
+                del self._sessions[stale]
+            connector = TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            session = ClientSession(connector=connector, timeout=self.timeout)
+            self._sessions[(key, loop)] = session
+        return session
+
+    @asynccontextmanager
+    async def session(self, key: str = "") -> AsyncIterator[ClientSession]:
+        """Same as `get`, for use in `async with` blocks; the session stays open on exit."""
+        yield self.get(key)
+
+    async def close(self):
+        """Close the sessions of every loop; those of other running loops are closed on their own loop."""
+        loop = asyncio.get_running_loop()
+        sessions, self._sessions = self._sessions, {}
+        for (_, session_loop), session in sessions.items():
+            if session_loop is loop:
+                await session.close()
+            elif session_loop.is_running():
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(session.close(), session_loop))
+
+    async def __aenter__(self) -> "ClientSessionPool":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
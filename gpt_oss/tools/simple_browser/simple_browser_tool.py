@@ -1,3 +1,5 @@
+import asyncio
+import bisect
 import contextvars
 import dataclasses
 import functools
@@ -5,9 +7,11 @@ import itertools
 import json
 import re
 import textwrap
+import weakref
 from typing import Any, AsyncIterator, Callable, ParamSpec, Sequence
 from urllib.parse import quote, unquote
 
+import numpy as np
 import pydantic
 import structlog
 import tiktoken
@@ -30,7 +34,13 @@ from .backend import (
     BackendError,
     maybe_truncate,
 )
+from .html_pool import HTMLProcessor, default_html_processor
+from .page_cache import PageCache
 from .page_contents import Extract, PageContents
+from .prefetch import Prefetcher
+from .search_cache import SearchCache
+from .session_pool import ClientSessionPool
+from .token_lengths import vocabulary_lengths
 
 logger = structlog.stdlib.get_logger(component=__name__)
 
@@ -74,18 +84,6 @@ def function_the_model_can_call(
     return inner
 
 
-@functools.cache
-def _tiktoken_vocabulary_lengths(enc_name: str) -> list[int]:
-    encoding = tiktoken.get_encoding(enc_name)
-    results = []
-    for i in range(encoding.n_vocab):
-        try:
-            results.append(len(encoding.decode([i])))
-        except Exception as e:
-            results.append(1)
-    return results
-
-
 @dataclasses.dataclass(frozen=True)
 class Tokens:
     tokens: list[int]
@@ -95,18 +93,15 @@ class Tokens:
 @functools.cache
 def max_chars_per_token(enc_name: str) -> int:
     """Typical value is 128, but let's be safe."""
-    tok_lens = _tiktoken_vocabulary_lengths(enc_name)
-    return max(tok_lens)
+    return int(vocabulary_lengths(enc_name).max())
 
 
 def get_tokens(text: str, enc_name: str) -> Tokens:
     encoding = tiktoken.get_encoding(enc_name)
     tokens = encoding.encode(text, disallowed_special=())
-    _vocabulary_lengths = _tiktoken_vocabulary_lengths(enc_name)
-    tok2idx = [0] + list(itertools.accumulate(_vocabulary_lengths[i] for i in tokens))[
-        :-1
-    ]
-    result = Tokens(tokens=tokens, tok2idx=tok2idx)
+    lengths = vocabulary_lengths(enc_name)[np.asarray(tokens[:-1], dtype=np.intp)]
+    tok2idx = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+    result = Tokens(tokens=tokens, tok2idx=tok2idx.tolist())
     return result
 
 
@@ -175,6 +170,109 @@ def wrap_lines(text: str, width: int = 80) -> list[str]:
     return list(wrapped)
 
 
+class PageView:
+    """Wrapped lines of a page with the offsets of each line in its numbered text.
+
+    `show_page` renders lines as `L{i}: {line}` joined by newlines, which does not
+    depend on the viewport, so the character and token offsets of every line are
+    computed once per page and any viewport `(loc, view_tokens)` is resolved by a
+    binary search instead of re-wrapping the page and re-tokenizing the window.
+    Token offsets are only computed for pages that do not fit in one viewport,
+    and only as far down the page as the viewports shown so far reach.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lines = wrap_lines(text=text)
+        # char_offsets[i] is where line i starts in the numbered text; the last
+        # entry is one past its end, as if the text ended with a newline.
+        self.char_offsets = [0] + list(
+            itertools.accumulate(
+                len(f"L{i}: ") + len(line) + 1 for i, line in enumerate(self.lines)
+            )
+        )
+        self._token_offsets: dict[str, list[int]] = {}
+
+    @functools.cached_property
+    def find_index(self) -> "FindIndex":
+        """Index of the lines for `find`, built on the first search of the page."""
+        return FindIndex(self.lines)
+
+    def token_offsets(
+        self, encoding_name: str, line: int | None = None, token: int | None = None
+    ) -> list[int]:
+        """Number of tokens before each line of the numbered text, then the total.
+
+        The offsets are extended as needed and may stop early: they cover at
+        least the first `line` lines and then go past `token`, or the whole
+        page if neither is given.
+        """
+        offsets = self._token_offsets.setdefault(encoding_name, [0])
+        total_lines = len(self.lines)
+        if line is None and token is None:
+            line = total_lines
+        while len(offsets) <= total_lines:
+            done = len(offsets) - 1
+            if line is not None and done < line:
+                end = line
+            elif token is not None and offsets[-1] <= token:
+                # Take about one character per missing token; lines with fewer
+                # tokens than characters are the norm, so this rarely loops.
+                end = bisect.bisect_left(
+                    self.char_offsets, self.char_offsets[done] + token - offsets[-1] + 1
+                )
+            else:
+                break
+            self._extend_token_offsets(encoding_name, offsets, min(max(end, done + 1), total_lines))
+        return offsets
+
+    def _extend_token_offsets(self, encoding_name: str, offsets: list[int], end: int) -> None:
+        # A newline is never merged with the `L` that starts the next line,
+        # so tokenizing the lines one by one gives the same tokens as
+        # tokenizing the text from any line on.
+        encoding = tiktoken.get_encoding(encoding_name)
+        last = len(self.lines) - 1
+        numbered = [
+            f"L{i}: {self.lines[i]}\n" if i < last else f"L{i}: {self.lines[i]}"
+            for i in range(len(offsets) - 1, end)
+        ]
+        for tokens in encoding.encode_ordinary_batch(numbered):
+            offsets.append(offsets[-1] + len(tokens))
+
+    def end_loc(
+        self, loc: int, num_lines: int, view_tokens: int, encoding_name: str
+    ) -> int:
+        """Same as `get_end_loc` for the lines of this page."""
+        total_lines = len(self.lines)
+        if num_lines > 0:
+            return min(loc + num_lines, total_lines)
+        # if the text is very short, no need to count tokens at all
+        # at least one char per token
+        if self.char_offsets[-1] - 1 - self.char_offsets[loc] <= view_tokens:
+            return total_lines
+        end_token = self.token_offsets(encoding_name, line=loc)[loc] + view_tokens
+        offsets = self.token_offsets(encoding_name, token=end_token)
+        if end_token >= offsets[-1]:
+            return total_lines
+        # Show the line that contains the first token past the view (round up).
+        return bisect.bisect_right(offsets, end_token)
+
+
+# Views of live pages by id(); PageContents is a mutable pydantic model and not
+# hashable. An entry is dropped when its page is garbage collected.
+_page_views: dict[int, PageView] = {}
+
+
+def page_view(page: PageContents) -> PageView:
+    """The `PageView` of `page`, built on first use and reused until the page is gone."""
+    view = _page_views.get(id(page))
+    if view is None or view.text is not page.text:
+        if view is None:
+            weakref.finalize(page, _page_views.pop, id(page), None)
+        view = _page_views[id(page)] = PageView(page.text)
+    return view
+
+
 def strip_links(text: str) -> str:
     text = re.sub(PARTIAL_INITIAL_LINK_PATTERN, "", text)
     text = re.sub(PARTIAL_FINAL_LINK_PATTERN, lambda mo: mo.group("content"), text)
@@ -205,24 +303,138 @@ def maybe_get_function_args(
     return None
 
 
+class FindIndex:
+    """The lines of a page as `find` searches them, without link markup.
+
+    The lowercased lines are joined into one string that literal and regex
+    patterns scan in C, and a match is mapped back to its line with a binary
+    search over the line offsets. No match may span two lines.
+    """
+
+    def __init__(self, lines: list[str]):
+        self.lines = strip_links(join_lines(lines, add_line_numbers=False)).split("\n")
+        lowered = [line.lower() for line in self.lines]
+        self.text = "\n".join(lowered)
+        # line_offsets[i] is where line i starts in `text`; the last entry is one
+        # past its end.
+        self.line_offsets = [0] + list(
+            itertools.accumulate(len(line) + 1 for line in lowered)
+        )
+
+    def matching_lines(self, pattern: str | re.Pattern[str]) -> list[int]:
+        """Indices of the lines with a match of a lowercase literal or a compiled pattern."""
+        return _lines_with_match(self.text, self.line_offsets, pattern)
+
+
+def _lines_with_match(
+    text: str, line_offsets: list[int], pattern: str | re.Pattern[str]
+) -> list[int]:
+    result = []
+    span = _search(pattern, text, 0)
+    while span is not None:
+        start, end = span
+        line = bisect.bisect_right(line_offsets, start) - 1
+        next_line = line_offsets[line + 1]
+        if end < next_line:
+            result.append(line)
+            # Only the first match of a line matters.
+            span = _search(pattern, text, next_line)
+        else:
+            span = _search(pattern, text, start + 1)
+    return result
+
+
+def _search(
+    pattern: str | re.Pattern[str], text: str, pos: int
+) -> tuple[int, int] | None:
+    if isinstance(pattern, str):
+        start = text.find(pattern, pos)
+        return None if start == -1 else (start, start + len(pattern))
+    match = pattern.search(text, pos)
+    return None if match is None else match.span()
+
+
+def _matching_lines(
+    text: str, line_offsets: list[int], patterns: list[str | re.Pattern[str]]
+) -> list[list[int]]:
+    # Takes only what the search reads, so a worker is not sent the page's lines.
+    return [_lines_with_match(text, line_offsets, pattern) for pattern in patterns]
+
+
+def compile_find_pattern(
+    pattern: str, regex: bool = False, whole_word: bool = False
+) -> str | re.Pattern[str]:
+    """A lowercase literal, or a case-insensitive regex for `FindIndex.matching_lines`."""
+    if not regex and not whole_word:
+        return pattern.lower()
+    if regex:
+        source = rf"(?<!\w)(?:{pattern})(?!\w)" if whole_word else pattern
+    else:
+        # Starting with the literal lets `re` skip ahead to its occurrences; the
+        # fixed-width lookbehind then checks the character before it.
+        literal = re.escape(pattern.lower())
+        source = rf"{literal}(?<!\w{literal})(?!\w)"
+    # The text is lowercased, so only user regexes need to ignore case.
+    flags = re.MULTILINE | (re.IGNORECASE if regex else 0)
+    try:
+        return re.compile(source, flags)
+    except re.error as e:
+        raise ToolUsageError(f"Invalid regular expression `{pattern}`: {e}") from e
+
+
 async def run_find_in_page(
-    pattern: str,
+    pattern: str | Sequence[str],
     page: PageContents,
     max_results: int = 50,
     num_show_lines: int = 4,
+    regex: bool = False,
+    whole_word: bool = False,
+    processor: HTMLProcessor | None = None,
 ) -> PageContents:
-    lines = wrap_lines(text=page.text)
-    txt = join_lines(lines, add_line_numbers=False)
-    without_links = strip_links(txt)
-    lines = without_links.split("\n")
+    """Find the lines of `page` that match any of the patterns.
+
+    Each result shows `num_show_lines` lines from a matching line. With
+    several patterns, results that match more of them come first, otherwise
+    results are in page order. Regexes come from the model and may backtrack
+    for minutes, so they run on a worker of `processor` (the shared
+    `HTMLProcessor` by default) and fail after its timeout.
+    """
+    patterns = [pattern] if isinstance(pattern, str) else list(pattern)
+    if not regex:
+        patterns = [p.lower() for p in patterns]
+    index = page_view(page).find_index
+    lines = index.lines
+    compiled = [compile_find_pattern(p, regex, whole_word) for p in patterns]
+    if regex:
+        processor = processor or default_html_processor()
+        try:
+            found = await processor.run(
+                functools.partial(
+                    _matching_lines, index.text, index.line_offsets, compiled
+                )
+            )
+        except asyncio.TimeoutError:
+            raise ToolUsageError(
+                f"Regular expression search took longer than {processor.timeout}s"
+            ) from None
+    else:
+        found = [index.matching_lines(pattern) for pattern in compiled]
+    matches = [set(found_lines) for found_lines in found]
+
+    # Same windows as a scan that skips the lines shown with each match.
+    windows = []
+    end = 0
+    for line_idx in sorted(set().union(*matches)):
+        if line_idx < end:
+            continue
+        end = line_idx + num_show_lines
+        window = range(line_idx, end)
+        num_patterns = sum(not found.isdisjoint(window) for found in matches)
+        windows.append((line_idx, num_patterns))
+    windows.sort(key=lambda window: -window[1])
 
     result_chunks, snippets = [], []
-    line_idx, match_idx = 0, 0
-    while line_idx < len(lines):
-        line = lines[line_idx]
-        if pattern not in line.lower():
-            line_idx += 1
-            continue
+    for match_idx, (line_idx, _) in enumerate(windows[:max_results]):
         snippet = "\n".join(lines[line_idx : line_idx + num_show_lines])
         link_title = FIND_PAGE_LINK_FORMAT.format(
             idx=f"{match_idx}", title=f"match at L{line_idx}"
@@ -233,21 +445,23 @@ async def run_find_in_page(
                 url=page.url, text=snippet, title=f"#{match_idx}", line_idx=line_idx
             )
         )
-        if len(result_chunks) == max_results:
-            break
-        match_idx += 1
-        line_idx += num_show_lines
 
     urls = [page.url for _ in result_chunks]
 
+    query = " | ".join(patterns)
     if result_chunks:
         display_text = "\n\n".join(result_chunks)
     else:
-        display_text = f"No `find` results for pattern: `{pattern}`"
+        display_text = f"No `find` results for pattern: `{query}`"
 
+    find_url = f"{page.url}/find?" + "&".join(f"pattern={quote(p)}" for p in patterns)
+    if regex:
+        find_url += "&regex=true"
+    if whole_word:
+        find_url += "&whole_word=true"
     result_page = PageContents(
-        url=f"{page.url}/find?pattern={quote(pattern)}",
-        title=f"Find results for text: `{pattern}` in `{page.title}`",
+        url=find_url,
+        title=f"Find results for text: `{query}` in `{page.title}`",
         text=display_text,
         urls={str(i): url for i, url in enumerate(urls)},
         snippets={str(i): snip for i, snip in enumerate(snippets)},
@@ -325,9 +539,24 @@ class SimpleBrowserTool(Tool):
         tool_state: dict[str, Any] | None = None,
         view_tokens: int = 1024,
         name: str = "browser",
+        session_pool: ClientSessionPool | None = None,
+        page_cache: PageCache | None = None,
+        search_cache: SearchCache | None = None,
+        prefetcher: Prefetcher | None = None,
     ):
         assert name == "browser"
         self.backend = backend
+        # Shared keep-alive sessions; without a pool every call opens (and closes) its own.
+        self.session_pool = session_pool
+        # Processed pages shared across conversations (see `PageCache`).
+        self.page_cache = page_cache
+        # Search results shared across conversations, with concurrent identical searches coalesced.
+        self.search_cache = search_cache
+        # Background fetches of the top search results (see `Prefetcher`); opt-in.
+        self.prefetcher = prefetcher
+        self.prefetches = (
+            prefetcher.group() if prefetcher is not None and prefetcher.top_n > 0 else None
+        )
         if tool_state is None:
             self.tool_state = SimpleBrowserState()
         else:
@@ -399,7 +628,8 @@ sources=""" + self.backend.source
     async def show_page(self, loc: int = 0, num_lines: int = -1) -> Message:
         page = self.tool_state.get_page()
         cursor = self.tool_state.current_cursor
-        lines = wrap_lines(text=page.text)
+        view = page_view(page)
+        lines = view.lines
         total_lines = len(lines)
 
         if loc >= total_lines:
@@ -409,9 +639,7 @@ sources=""" + self.backend.source
             )
             raise ToolUsageError(err_msg)
 
-        end_loc = get_end_loc(
-            loc, num_lines, total_lines, lines, self.view_tokens, self.encoding_name
-        )
+        end_loc = view.end_loc(loc, num_lines, self.view_tokens, self.encoding_name)
 
         lines_to_show = lines[loc:end_loc]
         body = join_lines(lines_to_show, add_line_numbers=True, offset=loc)
@@ -426,18 +654,35 @@ sources=""" + self.backend.source
             self.tool_state.pop_page_stack()
             raise e
 
+    def _session(self):
+        if self.session_pool is not None:
+            return self.session_pool.session(getattr(self.backend, "BASE_URL", ""))
+        return ClientSession()
+
+    async def _fetch(self, url: str) -> PageContents:
+        async with self._session() as session:
+            return await self.backend.fetch(url, session=session)
+
+    async def _fetch_many(self, urls: list[str]) -> list[PageContents | Exception]:
+        async with self._session() as session:
+            return await self.backend.fetch_many(urls, session=session)
+
     async def _open_url(self, url: str, direct_url_open: bool) -> PageContents:
         """Use the cache, if available."""
-        backend = self.backend
         # direct_url_open should be regarded as a refresh
         if not direct_url_open and (page := self.tool_state.get_page_by_url(url)):
             assert page.url == url
             return page
+        # A prefetched page was fetched just now, so it is fresh enough for a refresh too.
+        if self.prefetches is not None and (page := await self.prefetches.take(url)):
+            return page
 
+        fetch = functools.partial(self._fetch, url)
         try:
-            async with ClientSession() as session:
-                page = await backend.fetch(url, session=session)
-            return page
+            if self.page_cache is None:
+                return await fetch()
+            # A direct open is a refresh: it may use a fresh shared copy but never a stale one.
+            return await self.page_cache.get(url, fetch, allow_stale=not direct_url_open)
         except Exception as e:
             msg = maybe_truncate(str(e))
             logger.warning("Error fetching URL in lean browser tool", exc_info=e)
@@ -445,6 +690,41 @@ sources=""" + self.backend.source
                 f"Error fetching URL `{maybe_truncate(url)}`: {msg}"
             ) from e
 
+    async def _open_urls(self, urls: list[str], direct_url_open: bool) -> list[PageContents | BackendError]:
+        """`_open_url` for several URLs, with the ones not cached fetched in one batch."""
+        pages: list[PageContents | Exception | None] = [None] * len(urls)
+        for i, url in enumerate(urls):
+            if not direct_url_open and (page := self.tool_state.get_page_by_url(url)):
+                pages[i] = page
+            elif self.prefetches is not None and (page := await self.prefetches.take(url)):
+                pages[i] = page
+        missing = [i for i, page in enumerate(pages) if page is None]
+        if missing:
+            missing_urls = [urls[i] for i in missing]
+            if self.page_cache is None:
+                fetched = await self._fetch_many(missing_urls)
+            else:
+                fetched = await self.page_cache.get_many(
+                    missing_urls, self._fetch_many, allow_stale=not direct_url_open
+                )
+            for i, page in zip(missing, fetched):
+                pages[i] = page
+
+        results: list[PageContents | BackendError] = []
+        for url, page in zip(urls, pages):
+            if isinstance(page, Exception):
+                logger.warning("Error fetching URL in lean browser tool", exc_info=page)
+                page = BackendError(
+                    f"Error fetching URL `{maybe_truncate(url)}`: {maybe_truncate(str(page))}"
+                )
+            results.append(page)
+        return results
+
+    def cancel_prefetches(self) -> None:
+        """Cancel the prefetches of this conversation; call when it ends."""
+        if self.prefetches is not None:
+            self.prefetches.close()
+
     def make_error_message(self, error: Exception) -> Message:
         """Uses the message creation codepath from the base class."""
         error_name = error.__class__.__name__
@@ -462,31 +742,45 @@ sources=""" + self.backend.source
     ) -> AsyncIterator[Message]:
         del topn
         del top_n
-        try:
-            async with ClientSession() as session:
-                search_page = await self.backend.search(
+        async def run_search() -> PageContents:
+            async with self._session() as session:
+                return await self.backend.search(
                     query=query,
                     topn=self.max_search_results,
                     session=session,
                 )
+
+        try:
+            if self.search_cache is None:
+                search_page = await run_search()
+            else:
+                search_page = await self.search_cache.get(
+                    query, self.max_search_results, self.backend.source, run_search
+                )
         except Exception as e:
             msg = maybe_truncate(str(e))
             raise BackendError(f"Error during search for `{query}`: {msg}") from e
 
         self.tool_state.add_page(search_page)
+        if self.prefetches is not None:
+            self.prefetches.schedule(list(search_page.urls.values()), self._fetch_many)
         yield await self.show_page_safely(loc=0)
 
     @function_the_model_can_call
     @handle_errors
     async def open(
         self,
-        id: int | str = -1,
+        id: int | str | list[int | str] = -1,
         cursor: int = -1,
         loc: int = -1,
         num_lines: int = -1,
         view_source: bool = False,
         source: str | None = None,
     ) -> AsyncIterator[Message]:
+        if isinstance(id, list):
+            async for msg in self._open_many(id, cursor, num_lines, view_source):
+                yield msg
+            return
         curr_page: PageContents | None = None
         stay_on_current_page = False
         direct_url_open = False
@@ -533,9 +827,58 @@ sources=""" + self.backend.source
                 loc = 0
         yield await self.show_page_safely(loc=loc, num_lines=num_lines)
 
+    async def _open_many(
+        self, ids: list[int | str], cursor: int, num_lines: int, view_source: bool
+    ) -> AsyncIterator[Message]:
+        """Open several links of the page at `cursor` (ints) or URLs (strs), one message each.
+
+        The pages are fetched with one batched backend call; a page that fails
+        to load gets an error message without failing the others. Naming a URL
+        directly makes the whole batch a refresh.
+        """
+        if not ids:
+            raise ToolUsageError("No ids to open.")
+        urls: list[str] = []
+        snippets: list[Extract | None] = []
+        for id in ids:
+            if isinstance(id, str):
+                url, snippet = id, None
+            else:
+                curr_page = self.tool_state.get_page(cursor)
+                try:
+                    url = curr_page.urls[str(id)]
+                except KeyError as e:
+                    raise ToolUsageError(f"Invalid link id `{id}`.") from e
+                snippet = (curr_page.snippets or {}).get(str(id))
+            if view_source:
+                url = f"{VIEW_SOURCE_PREFIX}{url}"
+                snippet = None
+            urls.append(url)
+            snippets.append(snippet)
+
+        direct_url_open = any(isinstance(id, str) for id in ids)
+        pages = await self._open_urls(urls, direct_url_open)
+        for page, snippet in zip(pages, snippets):
+            if isinstance(page, BackendError):
+                yield self.make_error_message(page)
+                continue
+            self.tool_state.add_page(page)
+            loc = 0
+            if snippet is not None and snippet.line_idx is not None:
+                loc = snippet.line_idx
+                if loc > 4:
+                    loc -= 4
+            yield await self.show_page_safely(loc=loc, num_lines=num_lines)
+
     @function_the_model_can_call
     @handle_errors
-    async def find(self, pattern: str, cursor: int = -1) -> AsyncIterator[Message]:
+    async def find(
+        self,
+        pattern: str | list[str],
+        cursor: int = -1,
+        regex: bool = False,
+        whole_word: bool = False,
+    ) -> AsyncIterator[Message]:
         page = self.tool_state.get_page(cursor)
         if page.snippets is not None:
             raise ToolUsageError(
@@ -543,8 +886,10 @@ sources=""" + self.backend.source
             )
 
         pc = await run_find_in_page(
-            pattern=str(pattern).lower(),
+            pattern=[str(p) for p in pattern] if isinstance(pattern, list) else str(pattern),
             page=page,
+            regex=bool(regex),
+            whole_word=bool(whole_word),
         )
         self.tool_state.add_page(pc)
         yield await self.show_page_safely(loc=0)
@@ -577,7 +922,16 @@ sources=""" + self.backend.source
         if function_args is None:
             raise ValueError("Invalid function arguments")
 
-        if "cursor" in function_args and function_args["cursor"] >= 0:
+        if isinstance(function_args.get("id"), list):
+            # Several pages are opened; the action reports the first.
+            cursor = function_args.get("cursor", -1)
+            function_args["urls"] = [
+                id if isinstance(id, str) else self.tool_state.get_page(cursor=cursor).urls[str(id)]
+                for id in function_args["id"]
+            ]
+            if function_args["urls"]:
+                function_args["url"] = function_args["urls"][0]
+        elif "cursor" in function_args and function_args["cursor"] >= 0:
             page = self.tool_state.get_page(cursor=function_args["cursor"])
             if "id" in function_args:
                 function_args["url"] = page.urls[str(function_args["id"])]
@@ -0,0 +1,79 @@
+"""
+Character lengths of the tokens of tiktoken encodings.
+
+The browser tool maps token positions back to text offsets with these
+lengths. Decoding the ~200k tokens of an encoding one by one takes seconds,
+so the table is built once per machine, saved as a `.npy` file of uint16
+next to tiktoken's own cache and memory-mapped by every later process.
+"""
+
+import contextlib
+import functools
+import logging
+import os
+import tempfile
+
+import numpy as np
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+
+def cache_dir() -> str:
+    """Where the tables are saved; the empty string disables saving them.
+
+    `BROWSER_TOKEN_LENGTHS_DIR` if set, else the directory tiktoken caches its
+    encodings in.
+    """
+    for name in ("BROWSER_TOKEN_LENGTHS_DIR", "TIKTOKEN_CACHE_DIR", "DATA_GYM_CACHE_DIR"):
+        if name in os.environ:
+            return os.environ[name]
+    return os.path.join(tempfile.gettempdir(), "data-gym-cache")
+
+
+def build_vocabulary_lengths(encoding: tiktoken.Encoding) -> np.ndarray:
+    """Length of `encoding.decode([i])` for every token id, 1 for unused ids."""
+    lengths = []
+    for i in range(encoding.n_vocab):
+        try:
+            token = encoding.decode_single_token_bytes(i)
+        except KeyError:
+            lengths.append(1)
+        else:
+            lengths.append(len(token.decode("utf-8", errors="replace")))
+    return np.array(lengths, dtype=np.uint16)
+
+
+@functools.cache
+def vocabulary_lengths(enc_name: str) -> np.ndarray:
+    """The read-only length table of an encoding, loaded from disk or built and saved."""
+    encoding = tiktoken.get_encoding(enc_name)
+    directory = cache_dir()
+    if not directory:
+        return build_vocabulary_lengths(encoding)
+
+    path = os.path.join(directory, f"{enc_name}-{encoding.n_vocab}.token_lengths.npy")
+    try:
+        lengths = np.load(path, mmap_mode="r")
+        if lengths.shape == (encoding.n_vocab,) and lengths.dtype == np.uint16:
+            return lengths
+        logger.warning("Rebuilding token length table %s with an unexpected shape", path)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        logger.warning("Rebuilding unreadable token length table %s: %s", path, e)
+
+    lengths = build_vocabulary_lengths(encoding)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            np.save(f, lengths)
+        # Atomic, so that concurrent processes never load a partial file.
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("Could not save token length table %s: %s", path, e)
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+    lengths.flags.writeable = False
+    return lengths
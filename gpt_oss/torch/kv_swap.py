@@ -0,0 +1,317 @@
+"""Swap idle sessions' KV caches out of accelerator memory and restore them on their next turn.
+
+Agentic conversations are idle for seconds to minutes while a tool runs or the
+user types. When another conversation takes over the resident caches, its
+predecessor is normally truncated away and has to be prefilled again on its
+next turn. `KVSwapManager` instead copies the first `n` positions of every
+cache buffer to pinned host memory (`non_blocking`, so the caller never waits
+for the device) and, once the host budget is exhausted, spills the least
+recently used sessions to mmapped files in the background. Restoring a session
+is a host-to-device copy back into the same cache tensors, which keeps
+captured CUDA graphs valid.
+
+Sessions are identified by their token sequences: `switch(resident, tokens)`
+uses the same longest-common-prefix matching as the serving loop to decide
+whether a swapped-out session is a better starting point for `tokens` than
+what is resident. Works with the torch `Cache` / `QuantizedCache` and the
+static triton `Cache` (anything exposing `_buffers()` laid out as
+[B, n_ctx, ...] and an `offset`), on CPU as well as CUDA tensors.
+"""
+
+import collections
+import itertools
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import torch
+
+# 每个缓冲区在会话存储中的起始偏移按此对齐，便于把 uint8 存储视作任意 dtype。
+_ALIGNMENT = 64
+
+
+def common_prefix_len(a: list[int], b: list[int]) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+@dataclass
+class KVSwapPolicy:
+    # 比这更短的会话直接丢弃：重新 prefill 比一次往返拷贝更便宜。
+    min_tokens: int = 256
+    # 主机（pinned）内存上限；超出后把最久未用的会话溢出到磁盘（无 swap_dir 时丢弃）。
+    max_host_bytes: int = 8 << 30
+    # 磁盘层目录（None 表示不启用）及其容量上限。
+    swap_dir: str | None = None
+    max_disk_bytes: int = 64 << 30
+    # 换出后超过该时长未被取回的会话直接丢弃。
+    ttl_seconds: float | None = None
+    pin_memory: bool = True
+
+
+@dataclass
+class KVSwapStats:
+    swap_outs: int = 0
+    swap_ins: int = 0
+    spills: int = 0
+    drops: int = 0
+    bytes_out: int = 0
+    bytes_in: int = 0
+    tokens_restored: int = 0
+    # 最近的换入耗时（秒），从调用到数据可被下一次前向使用（CUDA 上为入队耗时加等待磁盘/溢出的时间）。
+    swap_in_seconds: collections.deque = field(default_factory=lambda: collections.deque(maxlen=1024))
+
+    def as_dict(self) -> dict:
+        latencies = sorted(self.swap_in_seconds)
+        summary = {}
+        if latencies:
+            summary = {
+                "swap_in_ms_mean": statistics.fmean(latencies) * 1e3,
+                "swap_in_ms_p50": latencies[len(latencies) // 2] * 1e3,
+                "swap_in_ms_p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e3,
+                "swap_in_ms_max": latencies[-1] * 1e3,
+            }
+        return {
+            "swap_outs": self.swap_outs,
+            "swap_ins": self.swap_ins,
+            "spills": self.spills,
+            "drops": self.drops,
+            "bytes_out": self.bytes_out,
+            "bytes_in": self.bytes_in,
+            "tokens_restored": self.tokens_restored,
+            **summary,
+        }
+
+
+@dataclass
+class _SwappedSession:
+    tokens: list[int]
+    nbytes: int
+    # 扁平 uint8 存储：pinned 主机内存，或溢出后为 mmap 的文件。
+    storage: torch.Tensor
+    # 每个 cache 的每个缓冲区：(存储内偏移, dtype, 形状)。
+    layout: list[list[tuple[int, torch.dtype, torch.Size]]]
+    # D2H 拷贝完成事件（仅 CUDA）。
+    ready: "torch.cuda.Event | None"
+    last_used: float
+    path: str | None = None
+    spilling: "object | None" = None
+
+
+def _buffers(cache) -> tuple[torch.Tensor, ...]:
+    return tuple(cache._buffers())
+
+
+def _static(cache) -> bool:
+    # triton 的静态 cache 用设备上的张量记录 offset，且容量固定。
+    return isinstance(cache.offset, torch.Tensor)
+
+
+class KVSwapManager:
+    """Keeps swapped-out sessions for one set of per-layer `caches` (batch size 1)."""
+
+    def __init__(self, caches: list, policy: KVSwapPolicy | None = None):
+        self.caches = caches
+        self.policy = policy or KVSwapPolicy()
+        self.stats = KVSwapStats()
+        self.device = _buffers(caches[0])[0].device
+        self._sessions: collections.OrderedDict[int, _SwappedSession] = collections.OrderedDict()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kv-swap")
+        if self.policy.swap_dir:
+            os.makedirs(self.policy.swap_dir, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def host_bytes(self) -> int:
+        return sum(s.nbytes for s in self._sessions.values() if s.path is None)
+
+    @property
+    def disk_bytes(self) -> int:
+        return sum(s.nbytes for s in self._sessions.values() if s.path is not None)
+
+    def _layout(self, n_tokens: int):
+        layout, total = [], 0
+        for cache in self.caches:
+            entries = []
+            for buffer in _buffers(cache):
+                shape = torch.Size((buffer.shape[0], n_tokens, *buffer.shape[2:]))
+                entries.append((total, buffer.dtype, shape))
+                nbytes = shape.numel() * buffer.element_size()
+                total += -(-nbytes // _ALIGNMENT) * _ALIGNMENT
+            layout.append(entries)
+        return layout, total
+
+    @staticmethod
+    def _view(storage: torch.Tensor, offset: int, dtype: torch.dtype, shape: torch.Size) -> torch.Tensor:
+        nbytes = shape.numel() * dtype.itemsize
+        return storage[offset : offset + nbytes].view(dtype).view(shape)
+
+    def swap_out(self, tokens: list[int]) -> bool:
+        """Copy the resident caches, which hold `tokens`, to the host. Returns False if the session was not kept."""
+        n_tokens = len(tokens)
+        if n_tokens < self.policy.min_tokens:
+            return False
+        layout, total = self._layout(n_tokens)
+        if total > self.policy.max_host_bytes and not self.policy.swap_dir:
+            return False
+        with self._lock:
+            self._expire()
+            # 超过主机上限的会话会直接写盘，无需为它腾出主机空间。
+            self._make_room(0 if total > self.policy.max_host_bytes else total)
+        pin = self.policy.pin_memory and self.device.type == "cuda"
+        storage = torch.empty(total, dtype=torch.uint8, pin_memory=pin)
+        for cache, entries in zip(self.caches, layout):
+            for buffer, (offset, dtype, shape) in zip(_buffers(cache), entries):
+                # 与计算同流排队，之后写入 cache 的 kernel 自然排在拷贝之后，主机无需等待。
+                self._view(storage, offset, dtype, shape).copy_(buffer[:, :n_tokens], non_blocking=pin)
+        ready = None
+        if self.device.type == "cuda":
+            ready = torch.cuda.Event()
+            ready.record()
+        session = _SwappedSession(list(tokens), total, storage, layout, ready, time.monotonic())
+        with self._lock:
+            key = next(self._ids)
+            self._sessions[key] = session
+            self.stats.swap_outs += 1
+            self.stats.bytes_out += total
+            if total > self.policy.max_host_bytes:
+                self._spill(key, session)
+        return True
+
+    def match(self, tokens: list[int]) -> tuple[int | None, int]:
+        """The swapped-out session sharing the longest prefix with `tokens`, and that length."""
+        with self._lock:
+            self._expire()
+            best, best_len = None, 0
+            for key, session in self._sessions.items():
+                length = common_prefix_len(session.tokens, tokens)
+                if length > best_len:
+                    best, best_len = key, length
+            return best, best_len
+
+    def swap_in(self, key: int) -> list[int]:
+        """Restore session `key` into the caches (replacing their contents) and return its tokens."""
+        start = time.perf_counter()
+        with self._lock:
+            session = self._sessions.pop(key)
+        if session.ready is not None:
+            # 仅让当前流等待换出拷贝完成，不阻塞主机。
+            torch.cuda.current_stream().wait_event(session.ready)
+        n_tokens = len(session.tokens)
+        pinned = session.path is None and session.storage.is_pinned()
+        for cache, entries in zip(self.caches, session.layout):
+            if not _static(cache):
+                cache.reset()
+                cache._reserve(n_tokens)
+            for buffer, (offset, dtype, shape) in zip(_buffers(cache), entries):
+                # pinned 存储在异步拷贝完成前由 CUDA 主机缓存分配器保活，之后可安全释放。
+                buffer[:, :n_tokens].copy_(self._view(session.storage, offset, dtype, shape), non_blocking=pinned)
+            if _static(cache):
+                cache.truncate(n_tokens)
+            else:
+                cache.offset = n_tokens
+        if session.path is not None:
+            # 拷贝已从 mmap 同步读出（可分页内存不会异步拷贝），可以删除文件。
+            del session.storage
+            os.remove(session.path)
+        with self._lock:
+            self.stats.swap_ins += 1
+            self.stats.bytes_in += session.nbytes
+            self.stats.tokens_restored += n_tokens
+            self.stats.swap_in_seconds.append(time.perf_counter() - start)
+        return session.tokens
+
+    def switch(self, resident: list[int], tokens: list[int]) -> list[int]:
+        """Prepare the caches for a request for `tokens`, given they currently hold `resident`.
+
+        If a swapped-out session shares a longer prefix with `tokens` than `resident`
+        does, it is swapped in. Whenever at least `min_tokens` of the resident
+        session would otherwise be truncated away, that session is swapped out
+        first. Returns the token sequence the caches hold afterwards; the caller
+        still truncates to the common prefix with `tokens`.
+        """
+        resident_len = common_prefix_len(resident, tokens)
+        key, length = self.match(tokens)
+        restore = key is not None and length > resident_len
+        if restore or len(resident) - resident_len >= self.policy.min_tokens:
+            self.swap_out(resident)
+        if restore:
+            return self.swap_in(key)
+        return resident
+
+    def _make_room(self, nbytes: int):
+        # 调用方持有锁。按 LRU 把主机上的会话溢出到磁盘（或丢弃），直到放得下新会话。
+        # 正在溢出的会话很快会释放主机内存，不再计入。
+        host = sum(s.nbytes for s in self._sessions.values() if s.path is None and s.spilling is None)
+        for key, session in list(self._sessions.items()):
+            if host + nbytes <= self.policy.max_host_bytes:
+                break
+            if session.path is not None or session.spilling is not None:
+                continue
+            host -= session.nbytes
+            if self.policy.swap_dir:
+                self._spill(key, session)
+            else:
+                self._drop(key)
+        disk = self.disk_bytes
+        for key, session in list(self._sessions.items()):
+            if disk <= self.policy.max_disk_bytes:
+                break
+            if session.path is not None:
+                disk -= session.nbytes
+                self._drop(key)
+
+    def _spill(self, key: int, session: _SwappedSession):
+        # 调用方持有锁；后台线程把主机副本写入 mmap 文件后再替换存储。
+        session.spilling = self._executor.submit(self._write, key, session)
+
+    def _write(self, key: int, session: _SwappedSession):
+        if session.ready is not None:
+            session.ready.synchronize()
+        path = os.path.join(self.policy.swap_dir, f"kv-{os.getpid()}-{key}.bin")
+        mapped = torch.from_file(path, shared=True, size=session.nbytes, dtype=torch.uint8)
+        mapped.copy_(session.storage)
+        with self._lock:
+            if self._sessions.get(key) is not session:
+                # 写盘期间会话已被取回或丢弃。
+                del mapped
+                os.remove(path)
+                return
+            session.storage, session.path, session.ready = mapped, path, None
+            self.stats.spills += 1
+            self._make_room(0)
+
+    def _drop(self, key: int):
+        session = self._sessions.pop(key)
+        self.stats.drops += 1
+        if session.path is not None:
+            del session.storage
+            os.remove(session.path)
+
+    def _expire(self):
+        if self.policy.ttl_seconds is None:
+            return
+        deadline = time.monotonic() - self.policy.ttl_seconds
+        for key, session in list(self._sessions.items()):
+            if session.last_used < deadline:
+                self._drop(key)
+
+    def flush(self):
+        """Wait for pending spills to disk."""
+        self._executor.submit(lambda: None).result()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for key in list(self._sessions):
+                self._drop(key)
@@ -1,12 +1,15 @@
 import json
 import math
 import os
+from contextlib import contextmanager
 from dataclasses import dataclass
+from typing import Iterator, NamedTuple
 
 import torch
 import torch.distributed as dist
 
-from gpt_oss.torch.weights import Checkpoint
+from gpt_oss.torch.speculative import SpeculativeStats, speculative_generate
+from gpt_oss.torch.weights import Checkpoint, find_converted_checkpoint, load_converted_checkpoint
 
 
 @dataclass
@@ -169,10 +172,10 @@ class RotaryEmbedding(torch.nn.Module):
 
         return concentration, inv_freq
 
-    def _compute_cos_sin(self, num_tokens: int):
-        # 根据当前序列长度生成位置相关的 cos/sin 表。
+    def _compute_cos_sin(self, num_tokens: int, offset: int = 0):
+        # 根据当前序列长度生成位置相关的 cos/sin 表；offset 为第一个 token 的绝对位置（增量解码时非 0）。
         concentration, inv_freq = self._compute_concentration_and_inv_freq()
-        t = torch.arange(num_tokens, dtype=torch.float32, device=self.device)
+        t = torch.arange(offset, offset + num_tokens, dtype=torch.float32, device=self.device)
         # 外积得到 [position, frequency] 相位矩阵。
         freqs = torch.einsum("i,j->ij", t, inv_freq)
         # YaRN concentration 会统一放大/缩小振幅。
@@ -184,56 +187,336 @@ class RotaryEmbedding(torch.nn.Module):
         self,
         query: torch.Tensor,
         key: torch.Tensor,
+        offset: int = 0,
     ) -> tuple[torch.Tensor, torch.Tensor]:
-        # 采用 token-first 布局，第一维是序列长度。
-        num_tokens = query.shape[0]
-        cos, sin = self._compute_cos_sin(num_tokens)
+        # 布局为 [..., T, n_heads, head_dim]，倒数第三维是序列长度。
+        num_tokens = query.shape[-3]
+        cos, sin = self._compute_cos_sin(num_tokens, offset)
 
-        # 将 query 末维整理为 (..., head_dim) 以应用旋转，再恢复原形状。
-        query_shape = query.shape
-        query = query.view(num_tokens, -1, self.head_dim)
+        # cos/sin 形状 [T, head_dim / 2]，在 head 维与前导 batch 维上广播。
         query = _apply_rotary_emb(query, cos, sin)
-        query = query.reshape(query_shape)
-
-        # key 同理。
-        key_shape = key.shape
-        key = key.view(num_tokens, -1, self.head_dim)
         key = _apply_rotary_emb(key, cos, sin)
-        key = key.reshape(key_shape)
         return query, key
 
 
-def sdpa(Q, K, V, S, sm_scale, sliding_window=0):
+def sdpa(Q, K, V, S, sm_scale, sliding_window=0, start_q=0):
     # sliding_window == 0 means no sliding window
-    # Q: [T, H_kv, q_mult, D]，K/V: [T, H_kv, D]
+    # Q: [B, T_q, H_kv, q_mult, D]，K/V: [B, T_k, H_kv, D]
     # 其中 q_mult = H_q / H_kv，用于 GQA 中一个 KV 头对应多个 Q 头。
-    n_tokens, n_heads, q_mult, d_head = Q.shape
-    assert K.shape == (n_tokens, n_heads, d_head)
-    assert V.shape == (n_tokens, n_heads, d_head)
-    # 扩展 K/V 以匹配 q_mult 维度，避免显式复制（expand 视图）。
-    K = K[:, :, None, :].expand(-1, -1, q_mult, -1)
-    V = V[:, :, None, :].expand(-1, -1, q_mult, -1)
-    # S 是每个头的 attention sink，对应 softmax 的额外一列。
-    S = S.reshape(n_heads, q_mult, 1, 1).expand(-1, -1, n_tokens, -1)
+    # K/V 也可以是按时间顺序排列的分段 list（见 Cache.fork），各段 batch 维可以是 1，
+    # 此时通过广播让多条序列共享同一份前缀 KV，而不必复制。
+    # start_q 是第一个 query 的绝对位置（增量解码 / 分块 prefill 时非 0）。
+    # K/V 段也可以是 QuantizedKV：按 KV_DEQUANT_CHUNK 个 token 分块反量化，临时 bf16 拷贝不随上下文增长。
+    if not isinstance(K, list):
+        K, V = [K], [V]
+    batch_size, n_tokens, n_heads, q_mult, d_head = Q.shape
+    n_keys = sum(k.shape[1] for k in K)
+    assert n_keys == start_q + n_tokens
     # 因果遮罩：禁止看见未来 token。
-    mask = torch.triu(Q.new_full((n_tokens, n_tokens), -float("inf")), diagonal=1)
+    pos_q = torch.arange(n_tokens, device=Q.device) + start_q
+    pos_k = torch.arange(n_keys, device=Q.device)
+    masked = pos_k[None, :] > pos_q[:, None]
     if sliding_window > 0:
         # 滑动窗口额外屏蔽过远历史，只保留最近 sliding_window 个 token。
-        mask += torch.tril(
-            mask.new_full((n_tokens, n_tokens), -float("inf")), diagonal=-sliding_window
-        )
-    # 计算注意力分数，输出布局 [H_kv, q_mult, T_q, T_k]。
-    QK = torch.einsum("qhmd,khmd->hmqk", Q, K)
+        masked |= pos_k[None, :] <= pos_q[:, None] - sliding_window
+    mask = Q.new_zeros((n_tokens, n_keys)).masked_fill(masked, -float("inf"))
+    # 计算注意力分数，输出布局 [B, H_kv, q_mult, T_q, T_k]；分段分别计算后沿 key 维拼接。
+    QK = torch.cat(
+        [torch.einsum("bqhmd,bkhd->bhmqk", Q, k) for segment in K for k in _kv_chunks(segment, Q.dtype)], dim=-1
+    )
     QK *= sm_scale
-    QK += mask[None, None, :, :]
+    QK += mask[None, None, None, :, :]
+    # S 是每个头的 attention sink，对应 softmax 的额外一列。
+    S = S.reshape(1, n_heads, q_mult, 1, 1).expand(batch_size, -1, -1, n_tokens, -1)
     # 拼接 sink 列并做 softmax。
     QK = torch.cat([QK, S], dim=-1)
     W = torch.softmax(QK, dim=-1)
     # 去掉 sink 列，只保留真实 token 的权重。
     W = W[..., :-1]
-    # 按权重聚合 V，最后合并头维返回 [T, H_q * D]。
-    attn = torch.einsum("hmqk,khmd->qhmd", W, V)
-    return attn.reshape(n_tokens, -1)
+    # 按权重聚合 V（逐段累加），最后合并头维返回 [B, T, H_q * D]。
+    attn = None
+    start = 0
+    for segment in V:
+        for v in _kv_chunks(segment, Q.dtype):
+            end = start + v.shape[1]
+            part = torch.einsum("bhmqk,bkhd->bqhmd", W[..., start:end], v)
+            attn = part if attn is None else attn + part
+            start = end
+    return attn.reshape(batch_size, n_tokens, -1)
+
+
+class Cache:
+    """单个 block 的 KV cache，布局 [B, n_ctx, n_kv_heads, d_head]。
+
+    容量不足时按倍数自动扩容，因此 n_ctx 只是初始容量。`fork` 之后已写入的
+    前缀以 batch=1 的只读段共享给所有分叉序列（写时复制），新 token 写入各序列
+    自己的缓冲区。
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        n_ctx: int,
+        n_kv_heads: int,
+        d_head: int = 64,
+        device: torch.device | None = None,
+    ):
+        self.k = torch.zeros((batch_size, n_ctx, n_kv_heads, d_head), dtype=torch.bfloat16, device=device)
+        self.v = torch.zeros((batch_size, n_ctx, n_kv_heads, d_head), dtype=torch.bfloat16, device=device)
+        # 共享前缀段（fork 后才有），形状 [1, prefix_len, n_kv_heads, d_head]。
+        self.prefix: tuple[torch.Tensor, torch.Tensor] | None = None
+        # 已写入的 token 总数（含共享前缀）。
+        self.offset = 0
+
+    @property
+    def batch_size(self) -> int:
+        return self.k.shape[0]
+
+    @property
+    def prefix_len(self) -> int:
+        return 0 if self.prefix is None else self.prefix[0].shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        # 缓冲区（含共享前缀）占用的字节数。
+        tensors = [self.k, self.v, *(self.prefix or ())]
+        return sum(t.numel() * t.element_size() for t in tensors)
+
+    def reset(self):
+        # 只需把写指针归零；旧内容会被后续写入覆盖，且读时只读到 offset。
+        self.prefix = None
+        self.offset = 0
+
+    def _buffers(self) -> tuple[torch.Tensor, ...]:
+        # 按 token 维（dim 1）排布的全部存储；共享前缀先物化，保证前 offset 个位置连续有效。
+        self._materialize()
+        return self.k, self.v
+
+    def _materialize(self):
+        # 写时复制：把共享前缀拷贝进每条序列自己的缓冲区，之后可以任意截断/改写。
+        if self.prefix is None:
+            return
+        prefix_k, prefix_v = self.prefix
+        own = self.offset - self.prefix_len
+        batch_size, n_ctx, n_kv_heads, d_head = self.k.shape
+        k = self.k.new_zeros((batch_size, max(n_ctx, self.offset), n_kv_heads, d_head))
+        v = self.v.new_zeros((batch_size, max(n_ctx, self.offset), n_kv_heads, d_head))
+        k[:, : self.prefix_len] = prefix_k
+        v[:, : self.prefix_len] = prefix_v
+        k[:, self.prefix_len : self.offset] = self.k[:, :own]
+        v[:, self.prefix_len : self.offset] = self.v[:, :own]
+        self.k, self.v = k, v
+        self.prefix = None
+
+    def _reserve(self, n_ctx: int):
+        # 确保自有缓冲区至少能容纳 n_ctx 个 token，不够时按 2 倍扩容。
+        capacity = self.k.shape[1]
+        if n_ctx <= capacity:
+            return
+        new_capacity = max(n_ctx, 2 * capacity)
+        batch_size, _, n_kv_heads, d_head = self.k.shape
+        k = self.k.new_zeros((batch_size, new_capacity, n_kv_heads, d_head))
+        v = self.v.new_zeros((batch_size, new_capacity, n_kv_heads, d_head))
+        k[:, :capacity] = self.k
+        v[:, :capacity] = self.v
+        self.k, self.v = k, v
+
+    def fork(self, n: int):
+        """Split a batch-1 cache into n sequences that share the current prefix."""
+        assert self.batch_size == 1, "only a single sequence can be forked"
+        self._materialize()
+        batch_size, n_ctx, n_kv_heads, d_head = self.k.shape
+        # 前缀段是原缓冲区的视图，不发生拷贝；每条分叉序列只为后续 token 分配空间。
+        self.prefix = (self.k[:, : self.offset], self.v[:, : self.offset])
+        remaining = max(n_ctx - self.offset, 1)
+        self.k = self.k.new_zeros((n, remaining, n_kv_heads, d_head))
+        self.v = self.v.new_zeros((n, remaining, n_kv_heads, d_head))
+
+    def repeat_interleave(self, n):
+        """Repeat each cache entry n times along the batch dimension."""
+        self._materialize()
+        self.k = self.k.repeat_interleave(n, dim=0)
+        self.v = self.v.repeat_interleave(n, dim=0)
+
+    def truncate(self, n_ctx):
+        """Truncate the cache to the first n_ctx tokens."""
+        assert n_ctx <= self.offset
+        if n_ctx < self.prefix_len:
+            self._materialize()
+        self.offset = n_ctx
+
+    def extend(self, k, v) -> tuple[list[torch.Tensor], list[torch.Tensor]]:
+        """Append k/v ([B, T, n_kv_heads, d_head]) and return all cached key/value segments."""
+        batch_size, n_ctx, *_rest = k.shape
+        assert batch_size == self.batch_size
+        start = self.offset - self.prefix_len
+        self._reserve(start + n_ctx)
+        self.k[:, start : start + n_ctx] = k
+        self.v[:, start : start + n_ctx] = v
+        self.offset += n_ctx
+        own_k = self.k[:, : start + n_ctx]
+        own_v = self.v[:, : start + n_ctx]
+        if self.prefix is None:
+            return [own_k], [own_v]
+        return [self.prefix[0], own_k], [self.prefix[1], own_v]
+
+
+# KV cache 量化格式：名称 -> (存储 dtype, 最大可表示值)。fp8 需要 torch 支持 float8_e4m3fn。
+KV_CACHE_DTYPES = {"int8": (torch.int8, 127.0)}
+if hasattr(torch, "float8_e4m3fn"):
+    KV_CACHE_DTYPES["fp8"] = (torch.float8_e4m3fn, 448.0)
+
+
+def quantize_kv(
+    x: torch.Tensor, kv_dtype: str = "int8", block_size: int | None = None
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """Quantize K/V `x` ([..., d_head]) with one float32 scale per block of `block_size` channels.
+
+    Returns the quantized values (same shape as `x`) and scales [..., d_head // block_size].
+    The default block is the whole head, i.e. one scale per (token, head).
+    """
+    dtype, qmax = KV_CACHE_DTYPES[kv_dtype]
+    *lead, d_head = x.shape
+    block_size = block_size or d_head
+    blocks = x.float().reshape(*lead, d_head // block_size, block_size)
+    # 每块按绝对值最大值缩放到目标格式的表示范围；全零块的 scale 取极小值以免除零。
+    scales = (blocks.abs().amax(dim=-1, keepdim=True) / qmax).clamp_(min=torch.finfo(torch.float32).tiny)
+    q = blocks / scales
+    if dtype == torch.int8:
+        q = q.round_().clamp_(-qmax, qmax)
+    return q.to(dtype).reshape(x.shape), scales[..., 0]
+
+
+def dequantize_kv(q: torch.Tensor, scales: torch.Tensor, dtype: torch.dtype = torch.bfloat16) -> torch.Tensor:
+    """Inverse of `quantize_kv`."""
+    *lead, d_head = q.shape
+    num_blocks = scales.shape[-1]
+    x = q.float().reshape(*lead, num_blocks, d_head // num_blocks) * scales[..., None]
+    return x.reshape(q.shape).to(dtype)
+
+
+class QuantizedKV(NamedTuple):
+    """Quantized K or V [B, T, n_kv_heads, d_head] and its scales [B, T, n_kv_heads, n_blocks].
+
+    Returned by quantized caches instead of a bf16 tensor so that attention can
+    dequantize as it reads (see `sdpa` and `gpt_oss.triton.attention`).
+    """
+
+    values: torch.Tensor
+    scales: torch.Tensor
+
+    @property
+    def shape(self) -> torch.Size:
+        return self.values.shape
+
+    def dequantize(self, start: int = 0, end: int | None = None, dtype: torch.dtype = torch.bfloat16) -> torch.Tensor:
+        return dequantize_kv(self.values[:, start:end], self.scales[:, start:end], dtype)
+
+
+# sdpa 每次反量化的 token 数，限制读取量化 cache 时临时 bf16 张量的大小。
+KV_DEQUANT_CHUNK = 1024
+
+
+def _kv_chunks(kv: "torch.Tensor | QuantizedKV", dtype: torch.dtype) -> Iterator[torch.Tensor]:
+    # bf16 段原样返回；量化段沿 token 维分块反量化。
+    if not isinstance(kv, QuantizedKV):
+        yield kv
+        return
+    for start in range(0, kv.shape[1], KV_DEQUANT_CHUNK):
+        yield kv.dequantize(start, start + KV_DEQUANT_CHUNK, dtype)
+
+
+class QuantizedCache:
+    """KV cache that stores K/V as int8 or fp8 with per-(token, head, channel block) scales.
+
+    Drop-in replacement for `Cache` (without prefix sharing: `fork` copies the
+    prefix). Values are quantized once when written; `extend` returns them as
+    `QuantizedKV` views that `sdpa` dequantizes chunk by chunk, so the resident
+    cache takes about half the memory of the bf16 one and no full-size bf16 copy
+    is made on read.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        n_ctx: int,
+        n_kv_heads: int,
+        d_head: int = 64,
+        device: torch.device | None = None,
+        kv_dtype: str = "int8",
+        block_size: int | None = None,
+    ):
+        self.kv_dtype = kv_dtype
+        self.block_size = block_size or d_head
+        assert d_head % self.block_size == 0
+        dtype, _ = KV_CACHE_DTYPES[kv_dtype]
+        shape = (batch_size, n_ctx, n_kv_heads, d_head)
+        scale_shape = (batch_size, n_ctx, n_kv_heads, d_head // self.block_size)
+        self.k = torch.zeros(shape, dtype=dtype, device=device)
+        self.v = torch.zeros(shape, dtype=dtype, device=device)
+        self.k_scale = torch.zeros(scale_shape, dtype=torch.float32, device=device)
+        self.v_scale = torch.zeros(scale_shape, dtype=torch.float32, device=device)
+        self.offset = 0
+
+    @property
+    def batch_size(self) -> int:
+        return self.k.shape[0]
+
+    @property
+    def prefix_len(self) -> int:
+        return 0
+
+    @property
+    def nbytes(self) -> int:
+        return sum(t.numel() * t.element_size() for t in (self.k, self.v, self.k_scale, self.v_scale))
+
+    def reset(self):
+        self.offset = 0
+
+    def _buffers(self) -> tuple[torch.Tensor, ...]:
+        return self.k, self.v, self.k_scale, self.v_scale
+
+    def _reserve(self, n_ctx: int):
+        capacity = self.k.shape[1]
+        if n_ctx <= capacity:
+            return
+        new_capacity = max(n_ctx, 2 * capacity)
+        grown = []
+        for t in self._buffers():
+            new = t.new_zeros((t.shape[0], new_capacity, *t.shape[2:]))
+            new[:, :capacity] = t
+            grown.append(new)
+        self.k, self.v, self.k_scale, self.v_scale = grown
+
+    def fork(self, n: int):
+        assert self.batch_size == 1, "only a single sequence can be forked"
+        self.repeat_interleave(n)
+
+    def repeat_interleave(self, n):
+        self.k, self.v, self.k_scale, self.v_scale = [t.repeat_interleave(n, dim=0) for t in self._buffers()]
+
+    def truncate(self, n_ctx):
+        assert n_ctx <= self.offset
+        self.offset = n_ctx
+
+    def extend(self, k, v) -> tuple[list[torch.Tensor], list[torch.Tensor]]:
+        """Quantize and append k/v ([B, T, n_kv_heads, d_head]); return all cached K/V as `QuantizedKV` views."""
+        batch_size, n_ctx, *_rest = k.shape
+        assert batch_size == self.batch_size
+        start = self.offset
+        self._reserve(start + n_ctx)
+        self.k[:, start : start + n_ctx], self.k_scale[:, start : start + n_ctx] = quantize_kv(
+            k, self.kv_dtype, self.block_size
+        )
+        self.v[:, start : start + n_ctx], self.v_scale[:, start : start + n_ctx] = quantize_kv(
+            v, self.kv_dtype, self.block_size
+        )
+        self.offset += n_ctx
+        end = self.offset
+        return (
+            [QuantizedKV(self.k[:, :end], self.k_scale[:, :end])],
+            [QuantizedKV(self.v[:, :end], self.v_scale[:, :end])],
+        )
 
 
 class AttentionBlock(torch.nn.Module):
@@ -242,30 +525,37 @@ class AttentionBlock(torch.nn.Module):
         config: ModelConfig,
         layer_idx: int = 0,
         device: torch.device | None = None,
+        world_size: int | None = None,
     ):
         super().__init__()
-        # 头部超参数缓存。
+        # 分布式并行信息（未初始化则退化为单卡；流水线并行时显式传 1 关闭张量并行）。
+        if world_size is None:
+            world_size = dist.get_world_size() if dist.is_initialized() else 1
+        self.world_size = world_size
+        # 张量并行按 KV 头分组切分：每个 rank 持有若干完整的 KV 头及其对应的 Q 头。
+        assert config.num_key_value_heads % self.world_size == 0
+        # 头部超参数缓存（均为当前 rank 本地的头数）。
         self.head_dim = config.head_dim
-        self.num_attention_heads = config.num_attention_heads
-        self.num_key_value_heads = config.num_key_value_heads
+        self.num_attention_heads = config.num_attention_heads // self.world_size
+        self.num_key_value_heads = config.num_key_value_heads // self.world_size
         # Only apply sliding window to every other layer
         self.sliding_window = config.sliding_window if layer_idx % 2 == 0 else 0
         # 每个 Q 头一个 sink 参数，用于稳定长序列注意力分布。
         self.sinks = torch.nn.Parameter(
-            torch.empty(config.num_attention_heads, device=device, dtype=torch.bfloat16)
+            torch.empty(self.num_attention_heads, device=device, dtype=torch.bfloat16)
         )
         # 预归一化（Pre-Norm）结构。
         self.norm = RMSNorm(config.hidden_size, device=device)
         # 单线性层一次性产出 Q/K/V，减少 kernel 启动与访存。
         qkv_dim = config.head_dim * (
-            config.num_attention_heads + 2 * config.num_key_value_heads
+            self.num_attention_heads + 2 * self.num_key_value_heads
         )
         self.qkv = torch.nn.Linear(
             config.hidden_size, qkv_dim, device=device, dtype=torch.bfloat16
         )
-        # 输出投影回 residual hidden_size。
+        # 输出投影回 residual hidden_size（张量并行下输入维只含本地头）。
         self.out = torch.nn.Linear(
-            config.head_dim * config.num_attention_heads,
+            config.head_dim * self.num_attention_heads,
             config.hidden_size,
             device=device,
             dtype=torch.bfloat16,
@@ -284,20 +574,22 @@ class AttentionBlock(torch.nn.Module):
             device=device,
         )
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
+    def forward(self, x: torch.Tensor, cache: Cache | None = None) -> torch.Tensor:
+        # x: [B, T, hidden_size]
+        batch_size, n_ctx, _ = x.shape
         # 1) 归一化后做 QKV 投影。
         t = self.norm(x)
         qkv = self.qkv(t)
         # 2) 按预定义切片拆分 q / k / v。
-        q = qkv[:, : self.num_attention_heads * self.head_dim].contiguous()
+        q = qkv[..., : self.num_attention_heads * self.head_dim].contiguous()
         k = qkv[
-            :,
+            ...,
             self.num_attention_heads
             * self.head_dim : (self.num_attention_heads + self.num_key_value_heads)
             * self.head_dim,
         ].contiguous()
         v = qkv[
-            :,
+            ...,
             (self.num_attention_heads + self.num_key_value_heads)
             * self.head_dim : (self.num_attention_heads + 2 * self.num_key_value_heads)
             * self.head_dim,
@@ -305,18 +597,31 @@ class AttentionBlock(torch.nn.Module):
 
         # 3) 重排为 SDPA 所需形状；q_mult 表示每个 KV 头对应的 Q 头倍数。
         q = q.view(
-            -1,
+            batch_size,
+            n_ctx,
             self.num_key_value_heads,
             self.num_attention_heads // self.num_key_value_heads,
             self.head_dim,
         )
-        k = k.view(-1, self.num_key_value_heads, self.head_dim)
-        v = v.view(-1, self.num_key_value_heads, self.head_dim)
-        # 4) 在 Q/K 上应用旋转位置编码。
-        q, k = self.rope(q, k)
+        k = k.view(batch_size, n_ctx, self.num_key_value_heads, self.head_dim)
+        v = v.view(batch_size, n_ctx, self.num_key_value_heads, self.head_dim)
+        # 4) 在 Q/K 上应用旋转位置编码；有 cache 时位置从已缓存长度开始。
+        offset = cache.offset if cache is not None else 0
+        q = q.view(batch_size, n_ctx, -1, self.head_dim)
+        q, k = self.rope(q, k, offset=offset)
+        q = q.view(batch_size, n_ctx, self.num_key_value_heads, -1, self.head_dim)
+        if cache is not None:
+            # 写入新的 K/V，并取回包含历史在内的全部 K/V 段。
+            k, v = cache.extend(k, v)
         # 5) 执行注意力并做输出投影。
-        t = sdpa(q, k, v, self.sinks, self.sm_scale, self.sliding_window)
-        t = self.out(t)
+        t = sdpa(q, k, v, self.sinks, self.sm_scale, self.sliding_window, start_q=offset)
+        if self.world_size > 1:
+            # 各 rank 只有部分头的输出投影，all-reduce 求和后再加一次偏置。
+            t = torch.nn.functional.linear(t, self.out.weight)
+            dist.all_reduce(t, op=dist.ReduceOp.SUM)
+            t += self.out.bias
+        else:
+            t = self.out(t)
         # 6) 残差连接。
         t = x + t
         return t
@@ -341,14 +646,17 @@ class MLPBlock(torch.nn.Module):
         self,
         config: ModelConfig,
         device: torch.device | None = None,
+        world_size: int | None = None,
     ):
         super().__init__()
         # MoE 路由配置。
         self.num_experts = config.num_experts
         self.experts_per_token = config.experts_per_token
         self.swiglu_limit = config.swiglu_limit
-        # 分布式并行信息（未初始化则退化为单卡）。
-        self.world_size = dist.get_world_size() if dist.is_initialized() else 1
+        # 分布式并行信息（未初始化则退化为单卡；流水线并行时显式传 1 关闭张量并行）。
+        if world_size is None:
+            world_size = dist.get_world_size() if dist.is_initialized() else 1
+        self.world_size = world_size
         # 与注意力一致的 pre-norm 结构。
         self.norm = RMSNorm(config.hidden_size, device=device)
         # 路由器：为每个 token 输出各专家打分。
@@ -397,8 +705,15 @@ class MLPBlock(torch.nn.Module):
                 dtype=torch.bfloat16,
             )
         )
+        # 可选的路由统计钩子（见 gpt_oss.torch.router_stats），默认关闭。
+        self.record_routing = None
+        # 本 rank 发往其他 rank 的字节数，用于与专家并行比较通信量。
+        self.bytes_sent = 0
 
     def forward(self, x: torch.Tensor) -> torch.Tensor:
+        # 路由与专家计算都是逐 token 的，先把 [B, T, D] 展平成 [B*T, D]。
+        shape = x.shape
+        x = x.reshape(-1, shape[-1])
         # 1) 预归一化 + 路由分数。
         t = self.norm(x)
         g = self.gate(t)
@@ -407,6 +722,8 @@ class MLPBlock(torch.nn.Module):
         # 将 top-k logits 归一化为组合权重。
         expert_weights = torch.nn.functional.softmax(experts.values, dim=1)
         expert_indices = experts.indices
+        if self.record_routing is not None:
+            self.record_routing(g, expert_indices, expert_weights)
 
         # MLP #1
         # 按 token 选中的专家索引，批量 gather 对应专家参数。
@@ -424,14 +741,148 @@ class MLPBlock(torch.nn.Module):
         if self.world_size > 1:
             # 张量并行下，各 rank 计算部分和后做 all-reduce 聚合。
             dist.all_reduce(t, op=dist.ReduceOp.SUM)
+            # 环形 all-reduce 每个 rank 发送 2 * (W - 1) / W 份数据。
+            self.bytes_sent += 2 * (self.world_size - 1) * t.numel() * t.element_size() // self.world_size
         t += mlp2_bias
 
         # Weighted sum of experts
         # 用路由权重对 top-k 专家输出加权求和。
         t = torch.einsum("bec,be->bc", t, expert_weights)
 
-        # 残差连接。
-        return x + t
+        # 残差连接，并还原原始形状。
+        return (x + t).view(shape)
+
+
+class ExpertParallelMLPBlock(torch.nn.Module):
+    """MoE block in which each rank owns `num_experts / world_size` whole experts.
+
+    Tokens are sent to the ranks that own their top-k experts with an all-to-all,
+    each rank runs one matmul per local expert over all tokens routed to it, and
+    the expert outputs return with a second all-to-all. The input is replicated
+    across ranks (attention stays tensor-parallel), so each rank routes a
+    contiguous 1/world_size slice of the tokens and the outputs are all-gathered.
+    """
+
+    def __init__(
+        self,
+        config: ModelConfig,
+        device: torch.device | None = None,
+        world_size: int | None = None,
+    ):
+        super().__init__()
+        self.num_experts = config.num_experts
+        self.experts_per_token = config.experts_per_token
+        self.swiglu_limit = config.swiglu_limit
+        if world_size is None:
+            world_size = dist.get_world_size() if dist.is_initialized() else 1
+        self.world_size = world_size
+        self.rank = dist.get_rank() if world_size > 1 else 0
+        # 专家按 rank 连续划分：专家 e 属于 rank e // experts_per_rank。
+        assert config.num_experts % self.world_size == 0
+        self.experts_per_rank = config.num_experts // self.world_size
+        self.norm = RMSNorm(config.hidden_size, device=device)
+        # 路由器在各 rank 上完整复制。
+        self.gate = torch.nn.Linear(
+            config.hidden_size, config.num_experts, device=device, dtype=torch.bfloat16
+        )
+        # 本 rank 的完整专家（中间维不切分）。
+        self.mlp1_weight = torch.nn.Parameter(
+            torch.empty(
+                (self.experts_per_rank, config.intermediate_size * 2, config.hidden_size),
+                device=device,
+                dtype=torch.bfloat16,
+            )
+        )
+        self.mlp1_bias = torch.nn.Parameter(
+            torch.empty(
+                (self.experts_per_rank, config.intermediate_size * 2),
+                device=device,
+                dtype=torch.bfloat16,
+            )
+        )
+        self.mlp2_weight = torch.nn.Parameter(
+            torch.empty(
+                (self.experts_per_rank, config.hidden_size, config.intermediate_size),
+                device=device,
+                dtype=torch.bfloat16,
+            )
+        )
+        self.mlp2_bias = torch.nn.Parameter(
+            torch.empty(
+                (self.experts_per_rank, config.hidden_size),
+                device=device,
+                dtype=torch.bfloat16,
+            )
+        )
+        self.record_routing = None
+        self.bytes_sent = 0
+
+    def _all_to_all(self, x: torch.Tensor, send_counts: list[int], recv_counts: list[int]) -> torch.Tensor:
+        # 按行的变长 all-to-all：第 i 段发往 rank i。
+        out = x.new_empty((sum(recv_counts), *x.shape[1:]))
+        dist.all_to_all_single(out, x.contiguous(), recv_counts, send_counts)
+        row_bytes = x[0].numel() * x.element_size() if len(x) else 0
+        self.bytes_sent += (sum(send_counts) - send_counts[self.rank]) * row_bytes
+        return out
+
+    def _local_experts(self, t: torch.Tensor, expert_indices: torch.Tensor) -> torch.Tensor:
+        # 按专家分组，每个本地专家对路由到它的所有行做一次矩阵乘。
+        order = torch.argsort(expert_indices, stable=True)
+        counts = torch.bincount(expert_indices, minlength=self.experts_per_rank).tolist()
+        out = t.new_empty(t.shape)
+        for expert, rows in enumerate(order.split(counts)):
+            if len(rows) == 0:
+                continue
+            h = torch.nn.functional.linear(t[rows], self.mlp1_weight[expert], self.mlp1_bias[expert])
+            h = swiglu(h, limit=self.swiglu_limit)
+            out[rows] = torch.nn.functional.linear(h, self.mlp2_weight[expert], self.mlp2_bias[expert])
+        return out
+
+    def _moe(self, x: torch.Tensor) -> torch.Tensor:
+        # x: 本 rank 负责的 token [N, D]，返回 MoE 输出（不含残差）。
+        num_tokens, dim = x.shape
+        t = self.norm(x)
+        g = self.gate(t)
+        experts = torch.topk(g, k=self.experts_per_token, dim=-1, sorted=True)
+        expert_weights = torch.nn.functional.softmax(experts.values, dim=1)
+        if self.record_routing is not None:
+            self.record_routing(g, experts.indices, expert_weights)
+
+        # 每个 (token, 第 k 名专家) 是一行；按专家号排序后，发往同一 rank 的行自然连续。
+        flat_experts = experts.indices.flatten()
+        if self.world_size == 1:
+            out = self._local_experts(t.repeat_interleave(self.experts_per_token, dim=0), flat_experts)
+        else:
+            order = torch.argsort(flat_experts, stable=True)
+            send_counts = torch.bincount(flat_experts // self.experts_per_rank, minlength=self.world_size)
+            recv_counts = torch.empty_like(send_counts)
+            dist.all_to_all_single(recv_counts, send_counts)
+            send_counts, recv_counts = send_counts.tolist(), recv_counts.tolist()
+
+            # 分发：归一化后的 token 与其专家号；在目标 rank 上计算后按原路返回。
+            recv_t = self._all_to_all(t[order // self.experts_per_token], send_counts, recv_counts)
+            recv_experts = self._all_to_all(flat_experts[order], send_counts, recv_counts)
+            y = self._local_experts(recv_t, recv_experts - self.rank * self.experts_per_rank)
+            returned = self._all_to_all(y, recv_counts, send_counts)
+            out = torch.empty_like(returned)
+            out[order] = returned
+        return torch.einsum("bec,be->bc", out.view(num_tokens, self.experts_per_token, dim), expert_weights)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        shape = x.shape
+        x = x.reshape(-1, shape[-1])
+        if self.world_size == 1:
+            return (x + self._moe(x)).view(shape)
+        # 各 rank 输入相同：每个 rank 只路由连续的一段 token，最后 all-gather 拼回完整序列。
+        chunk = -(-x.shape[0] // self.world_size)
+        t = self._moe(x[self.rank * chunk : (self.rank + 1) * chunk])
+        padded = t.new_zeros((chunk, t.shape[-1]))
+        padded[: len(t)] = t
+        gathered = [torch.empty_like(padded) for _ in range(self.world_size)]
+        dist.all_gather(gathered, padded)
+        self.bytes_sent += (self.world_size - 1) * padded.numel() * padded.element_size()
+        t = torch.cat(gathered)[: x.shape[0]]
+        return (x + t).view(shape)
 
 
 class TransformerBlock(torch.nn.Module):
@@ -440,36 +891,94 @@ class TransformerBlock(torch.nn.Module):
         config: ModelConfig,
         layer_idx: int,
         device: torch.device | None = None,
+        world_size: int | None = None,
+        expert_parallel: bool = False,
     ):
         super().__init__()
         # 记录层号，便于与 checkpoint 参数名对齐/调试。
         self.layer_idx = layer_idx
         # 先注意力后 MoE-MLP。
-        self.attn = AttentionBlock(config, layer_idx, device)
-        self.mlp = MLPBlock(config, device)
+        self.attn = AttentionBlock(config, layer_idx, device, world_size)
+        # expert_parallel 时各 rank 持有完整专家的子集，而不是切分每个专家的中间维。
+        mlp_cls = ExpertParallelMLPBlock if expert_parallel else MLPBlock
+        self.mlp = mlp_cls(config, device, world_size)
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
+    def forward(self, x: torch.Tensor, cache: Cache | None = None) -> torch.Tensor:
         # 顺序执行两个子层，各自内部已包含残差。
-        x = self.attn(x)
+        x = self.attn(x, cache=cache)
         x = self.mlp(x)
         return x
 
 
+def prefill_activation_bytes(config: ModelConfig, n_keys: int, world_size: int = 1) -> int:
+    """Estimated peak activation bytes per prompt token of one block's forward.
+
+    Attention materializes bf16 score rows over all `n_keys` cached keys (scores,
+    scores + sink column and softmax weights are alive together); the MoE gathers
+    each token's top-k expert weights for both projections. The two phases do not
+    overlap, so the larger one sets the peak.
+    """
+    heads = config.num_attention_heads // world_size
+    intermediate = config.intermediate_size // world_size
+    hidden = config.hidden_size
+    attention = 3 * heads * (n_keys + 1) * 2 + n_keys * 2
+    moe = config.experts_per_token * (2 * intermediate * hidden + hidden * intermediate) * 2
+    # 残差、归一化、QKV 与 MoE 中间结果等逐 token 的小张量。
+    other = (8 * hidden + 2 * config.head_dim * (heads + 2 * config.num_key_value_heads)) * 2
+    return max(attention, moe) + other
+
+
+def prefill_chunk_size(
+    config: ModelConfig, memory_budget: int, n_keys: int, world_size: int = 1, batch_size: int = 1
+) -> int:
+    """Largest prefill chunk whose estimated activations fit in `memory_budget` bytes (at least 1)."""
+    per_token = prefill_activation_bytes(config, n_keys, world_size) * batch_size
+    return max(memory_budget // per_token, 1)
+
+
+class _SkipInit(torch.overrides.TorchFunctionMode):
+    """Turns `torch.nn.init` calls into no-ops on the thread that enters it."""
+
+    def __torch_function__(self, func, types, args=(), kwargs=None):
+        kwargs = kwargs or {}
+        if getattr(func, "__module__", None) == "torch.nn.init":
+            return args[0] if args else kwargs["tensor"]
+        return func(*args, **kwargs)
+
+
+@contextmanager
+def skip_init():
+    """Construct modules without random initialization (their weights are loaded right after)."""
+    # nn.Linear / nn.Embedding 构造时会随机初始化权重；词表矩阵很大时这一步就要十几秒，
+    # 而这些值随后都会被 checkpoint 覆盖。meta 设备上初始化还会触发 torch._dynamo 的导入。
+    # TorchFunctionMode 只对当前线程生效，其他线程同时构建的模块照常初始化。
+    with _SkipInit():
+        yield
+
+
 class Transformer(torch.nn.Module):
     def __init__(
         self,
         config: ModelConfig,
         device: torch.device | None = None,
+        expert_parallel: bool = False,
     ):
         super().__init__()
+        self.config = config
+        self.expert_parallel = expert_parallel
+        # 词表并行：embedding / unembedding 按词表行切分，每个 rank 持有 vocab_size / world_size 行。
+        self.world_size = dist.get_world_size() if dist.is_initialized() else 1
+        self.rank = dist.get_rank() if dist.is_initialized() else 0
+        assert config.vocab_size % self.world_size == 0
+        self.vocab_per_rank = config.vocab_size // self.world_size
         # token id -> hidden 向量。
         self.embedding = torch.nn.Embedding(
-            config.vocab_size, config.hidden_size, device=device, dtype=torch.bfloat16
+            self.vocab_per_rank, config.hidden_size, device=device, dtype=torch.bfloat16
         )
         # 堆叠 N 个 Transformer block。
         self.block = torch.nn.ModuleList(
             [
-                TransformerBlock(config, layer_idx, device)
+                TransformerBlock(config, layer_idx, device, expert_parallel=expert_parallel)
                 for layer_idx in range(config.num_hidden_layers)
             ]
         )
@@ -477,24 +986,107 @@ class Transformer(torch.nn.Module):
         self.norm = RMSNorm(config.hidden_size, device=device)
         self.unembedding = torch.nn.Linear(
             config.hidden_size,
-            config.vocab_size,
+            self.vocab_per_rank,
             bias=False,
             device=device,
             dtype=torch.bfloat16,
         )
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
-        # 输入 x: [T]（token 序列），输出 logits: [T, vocab_size]。
-        x = self.embedding(x)
-        for block in self.block:
-            x = block(x)
+    def embed(self, x: torch.Tensor) -> torch.Tensor:
+        if self.world_size == 1:
+            return self.embedding(x)
+        # 词表并行 embedding：只查本 rank 负责的 token，其余置零，all-reduce 后得到完整向量。
+        local = x - self.rank * self.vocab_per_rank
+        in_range = (local >= 0) & (local < self.vocab_per_rank)
+        t = self.embedding(local.clamp(0, self.vocab_per_rank - 1))
+        t = t * in_range[..., None].to(t.dtype)
+        dist.all_reduce(t, op=dist.ReduceOp.SUM)
+        return t
+
+    def forward(
+        self,
+        x: torch.Tensor,
+        caches: list[Cache] | None = None,
+        gather_logits: bool = True,
+    ) -> torch.Tensor:
+        # 输入 x: [T] 或 [B, T]（token 序列），输出 logits: [T, vocab_size] 或 [B, T, vocab_size]。
+        # 传入 caches 时只需送入新 token，历史 K/V 从 cache 中读取。
+        # gather_logits=False 时返回本 rank 的词表分片 [..., vocab_size / world_size]，
+        # 配合 sample_tokens_sharded / logprobs_sharded 避免汇总整张 logits。
+        unbatched = x.ndim == 1
+        if unbatched:
+            x = x[None, :]
+        caches = caches or [None] * len(self.block)
+        x = self.embed(x)
+        for block, cache in zip(self.block, caches):
+            x = block(x, cache=cache)
+        x = self.unembed(x, gather_logits)
+        return x[0] if unbatched else x
+
+    def unembed(self, x: torch.Tensor, gather_logits: bool = True) -> torch.Tensor:
+        """Final norm and unembedding of hidden states `x` ([..., hidden_size])."""
         x = self.norm(x)
         x = self.unembedding(x)
+        if gather_logits and self.world_size > 1:
+            shards = [torch.empty_like(x) for _ in range(self.world_size)]
+            dist.all_gather(shards, x.contiguous())
+            x = torch.cat(shards, dim=-1)
         return x
 
+    def prefill_chunks(
+        self,
+        x: torch.Tensor,
+        caches: list[Cache],
+        chunk_size: int | None = None,
+        memory_budget: int | None = None,
+        gather_logits: bool = True,
+    ) -> Iterator[torch.Tensor]:
+        """Append the prompt `x` ([T] or [B, T]) to `caches` in chunks of at most `chunk_size` tokens.
+
+        Yields the logits of each chunk's last position ([vocab] or [B, vocab]); the
+        last one is the next-token distribution. Between chunks the caller is free to
+        run other work, e.g. decode steps of other sessions. Without `chunk_size` the
+        chunk size is derived from `memory_budget` (bytes of activations, see
+        `prefill_chunk_size`); with neither the whole prompt is one chunk.
+        """
+        unbatched = x.ndim == 1
+        if unbatched:
+            x = x[None, :]
+        n_tokens = x.shape[1]
+        if chunk_size is None:
+            chunk_size = n_tokens
+            if memory_budget is not None:
+                # 按最后一块（key 最多）估算，保证每一块都不超过预算。
+                n_keys = caches[0].offset + n_tokens
+                chunk_size = prefill_chunk_size(self.config, memory_budget, n_keys, self.world_size, x.shape[0])
+        for start in range(0, n_tokens, max(chunk_size, 1)):
+            # 每块只写 KV cache；只对块内最后一个位置计算 logits。
+            h = self.embed(x[:, start : start + chunk_size])
+            for block, cache in zip(self.block, caches):
+                h = block(h, cache=cache)
+            logits = self.unembed(h[:, -1], gather_logits)
+            yield logits[0] if unbatched else logits
+
+    def prefill(
+        self,
+        x: torch.Tensor,
+        caches: list[Cache],
+        chunk_size: int | None = None,
+        memory_budget: int | None = None,
+        gather_logits: bool = True,
+    ) -> torch.Tensor:
+        """Chunked prefill of `x` into `caches`; returns the logits of the last position."""
+        logits = None
+        for logits in self.prefill_chunks(x, caches, chunk_size, memory_budget, gather_logits):
+            pass
+        return logits
+
     @staticmethod
     def from_checkpoint(
-        path: str, device: str | torch.device = "cuda"
+        path: str,
+        device: str | torch.device = "cuda",
+        cache_dir: str | None = None,
+        expert_parallel: bool = False,
     ) -> "Transformer":
         # 允许字符串设备名（如 "cuda:0"），统一转为 torch.device。
         if not isinstance(device, torch.device):
@@ -506,43 +1098,36 @@ class Transformer(torch.nn.Module):
             json_config = json.load(f)
             config = ModelConfig(**json_config)
 
-        model = Transformer(
-            config=config,
-            device=device,
-        )
-        model.eval()
-
-        # Load weights
-        # 计算当前 rank 的并行切片范围。
         my_rank = dist.get_rank() if dist.is_initialized() else 0
         world_size = dist.get_world_size() if dist.is_initialized() else 1
-        per_rank_intermediate_size = config.intermediate_size // world_size
 
-        # Checkpoint 包装器负责普通 tensor 与 MXFP4 权重解码。
-        checkpoint = Checkpoint(path, device)
-
-        # 逐参数按名称加载，名称需与 checkpoint 命名规则一致。
-        for name, param in model.named_parameters():
-            loaded_tensor = checkpoint.get(name)
-
-            # Note: it would be more efficient to do sharding before upcasting from MXFP4,
-            # but for simplicity we do it after.
-            # mlp1 的 weight/bias 在中间维上按 rank 分片；乘 2 是因为 SwiGLU 双分支。
-            if "mlp1" in name:  # both weight and bias
-                loaded_tensor = loaded_tensor[
-                    :,
-                    my_rank * 2
-                    * per_rank_intermediate_size : (my_rank + 1) * 2
-                    * per_rank_intermediate_size,
-                    ...,
-                ]
-            elif "mlp2_weight" in name:  # only weight
-                loaded_tensor = loaded_tensor[
-                    ...,
-                    my_rank
-                    * per_rank_intermediate_size : (my_rank + 1)
-                    * per_rank_intermediate_size,
-                ]
+        # 若存在 `python -m gpt_oss.convert` 生成的本 rank 缓存，直接映射加载，无需解码与切片。
+        backend = "torch-ep" if expert_parallel else "torch"
+        converted = find_converted_checkpoint(path, backend, world_size, my_rank, cache_dir)
+        if converted is not None:
+            with skip_init():
+                model = Transformer(config=config, device=torch.device("meta"), expert_parallel=expert_parallel)
+            model.load_state_dict(load_converted_checkpoint(converted, device), assign=True)
+            # RoPE 不含参数，只记录设备；从 meta 改回实际设备。
+            for block in model.block:
+                block.attn.rope.device = device
+            model.eval()
+            return model
+
+        with skip_init():
+            model = Transformer(
+                config=config,
+                device=device,
+                expert_parallel=expert_parallel,
+            )
+        model.eval()
+
+        # Load weights
+        params = dict(model.named_parameters())
+        for name, loaded_tensor in Transformer.iter_checkpoint_tensors(
+            path, config, device, my_rank, world_size, expert_parallel=expert_parallel
+        ):
+            param = params[name]
             try:
                 # 使用 inplace copy_ 保持 Parameter 对象与图结构不变。
                 param.data.copy_(loaded_tensor)
@@ -553,13 +1138,178 @@ class Transformer(torch.nn.Module):
 
         return model
 
+    @staticmethod
+    def iter_checkpoint_tensors(
+        path: str,
+        config: ModelConfig,
+        device: torch.device,
+        rank: int,
+        world_size: int,
+        names: list[str] | None = None,
+        expert_parallel: bool = False,
+    ) -> Iterator[tuple[str, torch.Tensor]]:
+        """Yield the parameters `names` (default: all) of tensor-parallel rank `rank`, decoded and sliced from the checkpoint.
+
+        With `expert_parallel` the rank gets whole experts instead of a slice of every expert.
+        """
+        if names is None:
+            # 只需要参数名，在 meta 设备上构建即可（不分配内存）。
+            with skip_init():
+                names = [name for name, _ in Transformer(config, device=torch.device("meta")).named_parameters()]
+
+        # 计算当前 rank 的并行切片范围。
+        per_rank_intermediate_size = config.intermediate_size // world_size
+        # 注意力按 KV 头分组切分：Q 行按 [H_kv, q_mult] 排布，所以本 rank 的 Q/K/V 都是连续行。
+        q_rows = config.num_attention_heads * config.head_dim // world_size
+        kv_rows = config.num_key_value_heads * config.head_dim // world_size
+        q_offset = config.num_attention_heads * config.head_dim
+        kv_offset = config.num_key_value_heads * config.head_dim
+        qkv_index = torch.cat([
+            torch.arange(rank * q_rows, (rank + 1) * q_rows),
+            q_offset + torch.arange(rank * kv_rows, (rank + 1) * kv_rows),
+            q_offset + kv_offset + torch.arange(rank * kv_rows, (rank + 1) * kv_rows),
+        ]).to(device)
+        per_rank_heads = config.num_attention_heads // world_size
+        per_rank_vocab = config.vocab_size // world_size
+
+        # 每个 rank 的切片在读取时就传给 checkpoint：MXFP4 权重先切 blocks/scales 再解码，
+        # 避免每个 rank 都解码并暂存完整的专家权重。
+        # mlp1 的 weight/bias 在中间维上按 rank 分片；乘 2 是因为 SwiGLU 双分支。
+        per_rank_experts = config.num_experts // world_size
+        rank_slices = {}
+        for name in names:
+            if expert_parallel and ("mlp1" in name or "mlp2" in name):
+                # 专家并行：按专家维取本 rank 的连续专家，MXFP4 只解码这些专家的 blocks。
+                rank_slices[name] = (slice(rank * per_rank_experts, (rank + 1) * per_rank_experts),)
+            elif "mlp1" in name:  # both weight and bias
+                rank_slices[name] = (
+                    slice(None),
+                    slice(rank * 2 * per_rank_intermediate_size, (rank + 1) * 2 * per_rank_intermediate_size),
+                )
+            elif "mlp2_weight" in name:  # only weight
+                rank_slices[name] = (
+                    ...,
+                    slice(rank * per_rank_intermediate_size, (rank + 1) * per_rank_intermediate_size),
+                )
+            elif world_size > 1 and "attn.sinks" in name:
+                rank_slices[name] = (slice(rank * per_rank_heads, (rank + 1) * per_rank_heads),)
+            elif world_size > 1 and "attn.out.weight" in name:
+                rank_slices[name] = (slice(None), slice(rank * q_rows, (rank + 1) * q_rows))
+            elif world_size > 1 and name in ("embedding.weight", "unembedding.weight"):
+                rank_slices[name] = (slice(rank * per_rank_vocab, (rank + 1) * per_rank_vocab),)
+
+        # Checkpoint 包装器负责普通 tensor 与 MXFP4 权重解码；读取与解码由线程池提前进行。
+        with Checkpoint(path, device) as checkpoint:
+            for name, loaded_tensor in checkpoint.get_many(names, slices=rank_slices):
+                if world_size > 1 and "attn.qkv" in name:  # both weight and bias
+                    # Q/K/V 三段各取一块，不连续，读完整张量后再选行（该张量较小）。
+                    loaded_tensor = loaded_tensor.index_select(0, qkv_index)
+                yield name, loaded_tensor
+
+
+def sample_tokens(logits: torch.Tensor, temperature: float) -> torch.Tensor:
+    """Sample one token per row of `logits` ([N, vocab_size]); greedy when temperature is 0."""
+    if temperature == 0.0:
+        # 贪心解码。
+        return torch.argmax(logits, dim=-1)
+    # 温度采样：先缩放 logits，再按概率多项采样（每行独立）。
+    probs = torch.softmax(logits * (1.0 / temperature), dim=-1)
+    return torch.multinomial(probs, num_samples=1)[:, 0]
+
+
+def _argmax_sharded(scores: torch.Tensor, vocab_start: int) -> torch.Tensor:
+    # 各 rank 先求本地最大值，再 all-gather (值, 全局下标) 选出全局最大；并列时取最小下标，与 argmax 一致。
+    values, indices = scores.max(dim=-1)
+    indices = indices + vocab_start
+    world_size = dist.get_world_size()
+    all_values = [torch.empty_like(values) for _ in range(world_size)]
+    all_indices = [torch.empty_like(indices) for _ in range(world_size)]
+    dist.all_gather(all_values, values.contiguous())
+    dist.all_gather(all_indices, indices.contiguous())
+    best_rank = torch.stack(all_values).argmax(dim=0)
+    return torch.stack(all_indices).gather(0, best_rank[None, :])[0]
+
+
+def sample_tokens_sharded(local_logits: torch.Tensor, temperature: float) -> torch.Tensor:
+    """Like `sample_tokens` for vocab-parallel logits ([N, vocab_size / world_size] on each rank)."""
+    if not dist.is_initialized() or dist.get_world_size() == 1:
+        return sample_tokens(local_logits, temperature)
+    vocab_start = dist.get_rank() * local_logits.shape[-1]
+    if temperature == 0.0:
+        return _argmax_sharded(local_logits.float(), vocab_start)
+    # Gumbel-max：argmax(logits / T + Gumbel 噪声) 服从 softmax(logits / T)。
+    # 噪声各 rank 独立生成即可，因此无需同步随机数状态。
+    uniform = torch.rand_like(local_logits, dtype=torch.float32).clamp_(min=1e-20)
+    gumbel = -torch.log(-torch.log(uniform))
+    return _argmax_sharded(local_logits.float() / temperature + gumbel, vocab_start)
+
+
+def logprobs_sharded(local_logits: torch.Tensor, tokens: torch.Tensor) -> torch.Tensor:
+    """Log-probabilities of `tokens` under vocab-parallel logits, without gathering them."""
+    local_logits = local_logits.float()
+    if not dist.is_initialized() or dist.get_world_size() == 1:
+        return torch.log_softmax(local_logits, dim=-1).gather(-1, tokens[:, None])[:, 0]
+    # 分布式 logsumexp：先 all-reduce 最大值，再 all-reduce exp 之和。
+    row_max = local_logits.max(dim=-1).values
+    dist.all_reduce(row_max, op=dist.ReduceOp.MAX)
+    sum_exp = torch.exp(local_logits - row_max[:, None]).sum(dim=-1)
+    dist.all_reduce(sum_exp, op=dist.ReduceOp.SUM)
+    # 被选中 token 的 logit 只在持有它的 rank 上非零。
+    local = tokens - dist.get_rank() * local_logits.shape[-1]
+    in_range = (local >= 0) & (local < local_logits.shape[-1])
+    selected = local_logits.gather(-1, local.clamp(0, local_logits.shape[-1] - 1)[:, None])[:, 0]
+    selected = torch.where(in_range, selected, torch.zeros_like(selected))
+    dist.all_reduce(selected, op=dist.ReduceOp.SUM)
+    return selected - row_max - torch.log(sum_exp)
+
 
 class TokenGenerator:
     @torch.inference_mode()
-    def __init__(self, checkpoint: str, device: torch.device):
+    def __init__(
+        self,
+        checkpoint: str,
+        device: torch.device,
+        context: int = 4096,
+        expert_cache_size: int | None = None,
+        expert_parallel: bool = False,
+        prefill_chunk_size: int | None = None,
+        prefill_memory_budget: int | None = None,
+        kv_cache_dtype: str | None = None,
+    ):
         # 推理模式下构建模型，关闭 autograd 以减少显存/开销。
         self.device = device
-        self.model = Transformer.from_checkpoint(checkpoint, device=self.device)
+        # 长 prompt 分块 prefill，限制峰值激活内存（见 Transformer.prefill_chunks）。
+        self.prefill_chunk_size = prefill_chunk_size
+        self.prefill_memory_budget = prefill_memory_budget
+        # KV cache 量化格式（"int8" / "fp8"），None 表示 bf16。
+        self.kv_cache_dtype = kv_cache_dtype
+        if expert_cache_size:
+            # 专家卸载：专家权重留在 checkpoint 中，按路由结果装入 LRU 缓存。
+            from gpt_oss.torch.offload import load_offloaded_model
+
+            self.model = load_offloaded_model(checkpoint, self.device, expert_cache_size)
+        else:
+            self.model = Transformer.from_checkpoint(checkpoint, device=self.device, expert_parallel=expert_parallel)
+        # KV cache 的初始容量，超出后会自动扩容。
+        self.context = context
+        # 投机解码的累计统计（接受率、每步 token 数）。
+        self.speculative_stats = SpeculativeStats()
+
+    def _new_caches(self, batch_size: int = 1) -> list[Cache]:
+        # 张量并行下每个 rank 只缓存本地 KV 头。
+        attn = self.model.block[0].attn
+        if self.kv_cache_dtype is not None:
+            return [
+                QuantizedCache(
+                    batch_size, self.context, attn.num_key_value_heads, attn.head_dim,
+                    device=self.device, kv_dtype=self.kv_cache_dtype,
+                )
+                for _ in range(len(self.model.block))
+            ]
+        return [
+            Cache(batch_size, self.context, attn.num_key_value_heads, attn.head_dim, device=self.device)
+            for _ in range(len(self.model.block))
+        ]
 
     @torch.inference_mode()
     def generate(self,
@@ -567,32 +1317,84 @@ class TokenGenerator:
                  stop_tokens: list[int],
                  temperature: float = 1.0,
                  max_tokens: int = 0,
-                 return_logprobs: bool = False):
-        # tokens 始终包含 prompt + 已生成 token。
-        tokens = list(prompt_tokens)
+                 return_logprobs: bool = False,
+                 n: int = 1,
+                 drafter=None):
+        """Generate tokens for `prompt_tokens`.
+
+        With n == 1 yields one token (or `(token, logprob)`) per step. With n > 1 the
+        prompt is prefilled once, the KV cache is forked into n sequences that are
+        decoded as a batch, and each step yields a list of n tokens (or
+        `(token, logprob)` pairs) with `None` for sequences that already stopped.
+
+        Passing a `drafter` (see `gpt_oss.torch.speculative`) enables speculative
+        decoding; counters accumulate in `self.speculative_stats`.
+        """
+        caches = self._new_caches()
+        if drafter is not None:
+            assert n == 1, "speculative decoding only supports n == 1"
+            yield from speculative_generate(
+                self.model,
+                caches,
+                prompt_tokens,
+                drafter,
+                stop_tokens,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                return_logprobs=return_logprobs,
+                stats=self.speculative_stats,
+            )
+            return
+        # prompt 只做一次 prefill，取最后一个位置的 logits 作为第一步的分布。
+        prompt = torch.as_tensor(prompt_tokens, dtype=torch.int32, device=self.device)
+        # 词表并行时 logits 保持分片，采样 / logprob 都在分片上分布式完成。
+        logits = self.model.prefill(
+            prompt[None, :],
+            caches,
+            chunk_size=self.prefill_chunk_size,
+            memory_budget=self.prefill_memory_budget,
+            gather_logits=False,
+        )
+        if n > 1:
+            # 把 prompt 的 KV 分叉给 n 条序列共享，之后 n 条序列按 batch 解码。
+            for cache in caches:
+                cache.fork(n)
+            logits = logits.expand(n, -1)
+
+        finished = [False] * n
         num_generated_tokens = 0
         # max_tokens=0 约定为不设上限，直到遇到 stop token。
         while max_tokens == 0 or num_generated_tokens < max_tokens:
-            # 每步把当前完整上下文送入模型，取最后一个位置 logits。
-            logits = self.model(torch.as_tensor(tokens, dtype=torch.int32, device=self.device))[-1]
-            if temperature == 0.0:
-                # 贪心解码。
-                predicted_token = torch.argmax(logits, dim=-1).item()
-            else:
-                # 温度采样：先缩放 logits，再按概率多项采样。
-                probs = torch.softmax(logits * (1.0 / temperature), dim=-1)
-                predicted_token = torch.multinomial(probs, num_samples=1).item()
-            tokens.append(predicted_token)
+            if num_generated_tokens > 0:
+                # 增量解码：只送入上一步采样出的 token，历史 K/V 从 cache 读取。
+                logits = self.model(
+                    predicted[:, None].to(torch.int32), caches=caches, gather_logits=False
+                )[:, -1]
+            predicted = sample_tokens_sharded(logits, temperature)
             num_generated_tokens += 1
-
+            predicted_tokens = predicted.tolist()
             if return_logprobs:
                 # 返回被采样 token 在当前步的对数概率。
-                logprobs = torch.log_softmax(logits, dim=-1)
-                selected_logprobs = logprobs[predicted_token].item()
-                yield predicted_token, selected_logprobs
+                selected_logprobs = logprobs_sharded(logits, predicted).tolist()
+
+            if n == 1:
+                if return_logprobs:
+                    yield predicted_tokens[0], selected_logprobs[0]
+                else:
+                    yield predicted_tokens[0]
             else:
-                yield predicted_token
+                step = []
+                for i, token in enumerate(predicted_tokens):
+                    if finished[i]:
+                        step.append(None)
+                    elif return_logprobs:
+                        step.append((token, selected_logprobs[i]))
+                    else:
+                        step.append(token)
+                yield step
 
-            # 命中任意停止词立即结束生成。
-            if predicted_token in stop_tokens:
+            # 命中任意停止词的序列结束生成；全部结束后退出。
+            for i, token in enumerate(predicted_tokens):
+                finished[i] = finished[i] or token in stop_tokens
+            if all(finished):
                 break
@@ -0,0 +1,297 @@
+"""MoE expert offloading for the torch Transformer.
+
+Expert weights stay packed (MXFP4) in the memory-mapped checkpoint. Each MoE
+layer routes as usual and then fetches only the experts its tokens picked from
+an LRU cache of decoded experts on the compute device. While a layer computes,
+the experts the next layer is likely to pick (its router applied to the current
+hidden state) are decoded on a background thread. Everything else in the model
+stays resident.
+"""
+
+import dataclasses
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+import torch
+import torch.distributed as dist
+
+from gpt_oss.torch.model import ModelConfig, RMSNorm, Transformer, skip_init, swiglu
+from gpt_oss.torch.weights import Checkpoint
+
+
+@dataclasses.dataclass
+class ExpertCacheStats:
+    """Counters for one `ExpertCache`."""
+
+    # 命中：请求时专家已在缓存中（或正在被预取）。
+    hits: int = 0
+    # 未命中：请求时才同步解码。
+    misses: int = 0
+    # 预取发起次数，以及其中后来真正被用到的次数。
+    prefetches: int = 0
+    prefetch_hits: int = 0
+    evictions: int = 0
+    # 从 checkpoint 解码到设备上的字节数。
+    bytes_loaded: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @property
+    def prefetch_accuracy(self) -> float:
+        return self.prefetch_hits / self.prefetches if self.prefetches else 0.0
+
+    def as_dict(self) -> dict[str, float]:
+        return dataclasses.asdict(self) | {
+            "hit_rate": self.hit_rate,
+            "prefetch_accuracy": self.prefetch_accuracy,
+        }
+
+
+class ExpertStore:
+    """Reads single experts (this rank's slice) from the packed checkpoint."""
+
+    def __init__(self, path: str, config: ModelConfig, device: torch.device, rank: int = 0, world_size: int = 1):
+        self.checkpoint = Checkpoint(path, device)
+        self.per_rank_intermediate_size = config.intermediate_size // world_size
+        self.rank = rank
+
+    def load(self, layer_idx: int, expert: int) -> tuple[torch.Tensor, torch.Tensor]:
+        # 只读取并解码该专家（及本 rank 中间维切片）对应的 blocks/scales。
+        size, rank = self.per_rank_intermediate_size, self.rank
+        mlp1_weight = self.checkpoint.get(
+            f"block.{layer_idx}.mlp.mlp1_weight",
+            (slice(expert, expert + 1), slice(rank * 2 * size, (rank + 1) * 2 * size)),
+        )
+        mlp2_weight = self.checkpoint.get(
+            f"block.{layer_idx}.mlp.mlp2_weight",
+            (slice(expert, expert + 1), slice(None), slice(rank * size, (rank + 1) * size)),
+        )
+        return mlp1_weight[0], mlp2_weight[0]
+
+
+class ExpertCache:
+    """LRU cache of decoded experts shared by all layers, with background prefetch."""
+
+    def __init__(self, store: ExpertStore, capacity: int, prefetch: bool = True):
+        assert capacity > 0
+        self.store = store
+        self.capacity = capacity
+        self.stats = ExpertCacheStats()
+        self._entries: OrderedDict[tuple[int, int], tuple[torch.Tensor, torch.Tensor]] = OrderedDict()
+        self._in_flight: dict[tuple[int, int], Future] = {}
+        # 已发起预取、尚未被请求过的专家，用于统计预取准确率。
+        self._prefetched: set[tuple[int, int]] = set()
+        self._lock = threading.Lock()
+        # 单个后台线程做预取解码：torch 算子会释放 GIL，可与前向计算重叠。
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="expert-prefetch") if prefetch else None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _insert(self, key: tuple[int, int], weights: tuple[torch.Tensor, torch.Tensor]):
+        # 调用方需持有锁。
+        self._entries[key] = weights
+        self._entries.move_to_end(key)
+        self.stats.bytes_loaded += sum(w.numel() * w.element_size() for w in weights)
+        while len(self._entries) > self.capacity:
+            evicted, _ = self._entries.popitem(last=False)
+            self._prefetched.discard(evicted)
+            self.stats.evictions += 1
+
+    def get(self, layer_idx: int, experts: list[int]) -> dict[int, tuple[torch.Tensor, torch.Tensor]]:
+        result, waiting, missing = {}, {}, []
+        with self._lock:
+            for expert in experts:
+                key = (layer_idx, expert)
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    result[expert] = self._entries[key]
+                elif key in self._in_flight:
+                    # 记录本次是否计入了预取命中：同一预取只有第一个等待者计入，失败时各自只撤销自己的。
+                    waiting[expert] = key in self._prefetched
+                else:
+                    missing.append(expert)
+                    continue
+                self.stats.hits += 1
+                if key in self._prefetched:
+                    self.stats.prefetch_hits += 1
+                    self._prefetched.discard(key)
+            self.stats.misses += len(missing)
+            futures = {
+                expert: (self._in_flight[(layer_idx, expert)], counted_prefetch_hit)
+                for expert, counted_prefetch_hit in waiting.items()
+            }
+        for expert, (future, counted_prefetch_hit) in futures.items():
+            try:
+                result[expert] = future.result()
+            except Exception:
+                # 预取失败：按未命中在当前线程重新加载（失败会照常抛给调用方）。
+                with self._lock:
+                    self.stats.hits -= 1
+                    if counted_prefetch_hit:
+                        self.stats.prefetch_hits -= 1
+                    self.stats.misses += 1
+                missing.append(expert)
+        for expert in missing:
+            weights = self.store.load(layer_idx, expert)
+            with self._lock:
+                self._insert((layer_idx, expert), weights)
+            result[expert] = weights
+        return result
+
+    def prefetch(self, layer_idx: int, experts: list[int]):
+        if self._executor is None:
+            return
+        with self._lock:
+            for expert in experts:
+                key = (layer_idx, expert)
+                if key in self._entries or key in self._in_flight:
+                    continue
+                self.stats.prefetches += 1
+                self._prefetched.add(key)
+                self._in_flight[key] = self._executor.submit(self._load_prefetched, key)
+
+    def _load_prefetched(self, key: tuple[int, int]) -> tuple[torch.Tensor, torch.Tensor]:
+        weights = None
+        try:
+            weights = self.store.load(*key)
+        finally:
+            # 无论成败都移除 in-flight 记录，失败时下一次访问会重新加载。
+            with self._lock:
+                del self._in_flight[key]
+                if weights is None:
+                    self._prefetched.discard(key)
+                else:
+                    self._insert(key, weights)
+        return weights
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+class OffloadedMLPBlock(torch.nn.Module):
+    """`MLPBlock` whose expert weights are fetched on demand from an `ExpertCache`."""
+
+    def __init__(
+        self,
+        config: ModelConfig,
+        layer_idx: int,
+        cache: ExpertCache,
+        device: torch.device | None = None,
+    ):
+        super().__init__()
+        self.layer_idx = layer_idx
+        self.num_experts = config.num_experts
+        self.experts_per_token = config.experts_per_token
+        self.swiglu_limit = config.swiglu_limit
+        self.world_size = dist.get_world_size() if dist.is_initialized() else 1
+        self.cache = cache
+        # 下一层的路由函数，用于预取（由 load_offloaded_model 设置）。
+        # 存函数而不是子模块，以免下一层的参数被重复注册到本层。
+        self.next_route: Callable[[torch.Tensor], torch.return_types.topk] | None = None
+        # 可选的路由统计钩子（见 gpt_oss.torch.router_stats）。
+        self.record_routing = None
+        # 路由器与偏置很小，常驻设备。
+        self.norm = RMSNorm(config.hidden_size, device=device)
+        self.gate = torch.nn.Linear(
+            config.hidden_size, config.num_experts, device=device, dtype=torch.bfloat16
+        )
+        self.mlp1_bias = torch.nn.Parameter(
+            torch.empty(
+                (config.num_experts, config.intermediate_size * 2 // self.world_size),
+                device=device,
+                dtype=torch.bfloat16,
+            )
+        )
+        self.mlp2_bias = torch.nn.Parameter(
+            torch.empty(
+                (config.num_experts, config.hidden_size),
+                device=device,
+                dtype=torch.bfloat16,
+            )
+        )
+
+    def route(self, x: torch.Tensor) -> torch.return_types.topk:
+        return torch.topk(self.gate(self.norm(x)), k=self.experts_per_token, dim=-1, sorted=True)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        # 与 MLPBlock 相同的计算，只是专家权重来自缓存。
+        shape = x.shape
+        x = x.reshape(-1, shape[-1])
+        t = self.norm(x)
+        g = self.gate(t)
+        experts = torch.topk(g, k=self.experts_per_token, dim=-1, sorted=True)
+        expert_weights = torch.nn.functional.softmax(experts.values, dim=1)
+        if self.record_routing is not None:
+            self.record_routing(g, experts.indices, expert_weights)
+
+        # 只取本批 token 实际用到的专家，堆叠后把全局专家号映射为堆叠下标。
+        used = torch.unique(experts.indices)
+        fetched = self.cache.get(self.layer_idx, used.tolist())
+        mlp1_stack = torch.stack([fetched[e][0] for e in used.tolist()])
+        mlp2_stack = torch.stack([fetched[e][1] for e in used.tolist()])
+        remap = torch.empty(self.num_experts, dtype=torch.long, device=x.device)
+        remap[used] = torch.arange(len(used), device=x.device)
+        local_indices = remap[experts.indices]
+
+        t = torch.einsum("beck,bk->bec", mlp1_stack[local_indices], t) + self.mlp1_bias[experts.indices]
+        t = swiglu(t, limit=self.swiglu_limit)
+        t = torch.einsum("beck,bek->bec", mlp2_stack[local_indices], t)
+        if self.world_size > 1:
+            dist.all_reduce(t, op=dist.ReduceOp.SUM)
+        t += self.mlp2_bias[experts.indices]
+        t = torch.einsum("bec,be->bc", t, expert_weights)
+        out = x + t
+
+        if self.next_route is not None:
+            # 残差流在相邻层间变化不大：用下一层的路由器预测其专家，提前在后台解码。
+            predicted = torch.unique(self.next_route(out).indices)
+            self.cache.prefetch(self.layer_idx + 1, predicted.tolist())
+        return out.view(shape)
+
+
+def load_offloaded_model(
+    path: str,
+    device: str | torch.device,
+    cache_capacity: int,
+    prefetch: bool = True,
+) -> Transformer:
+    """Load a Transformer whose MoE experts are served by an LRU cache of `cache_capacity` experts.
+
+    The cache is shared by all layers and is available as `model.expert_cache`.
+    """
+    if not isinstance(device, torch.device):
+        device = torch.device(device)
+    with open(os.path.join(path, "config.json"), "r") as f:
+        config = ModelConfig(**json.load(f))
+    rank = dist.get_rank() if dist.is_initialized() else 0
+    world_size = dist.get_world_size() if dist.is_initialized() else 1
+
+    cache = ExpertCache(ExpertStore(path, config, device, rank, world_size), cache_capacity, prefetch=prefetch)
+    with skip_init():
+        model = Transformer(config=config, device=torch.device("meta"))
+        for block in model.block:
+            block.mlp = OffloadedMLPBlock(config, block.layer_idx, cache, device=torch.device("meta"))
+    # 其余参数（注意力、路由器、偏置、词表）在目标设备上分配并从 checkpoint 加载。
+    model.to_empty(device=device)
+    for block in model.block:
+        block.attn.rope.device = device
+    for block, next_block in zip(model.block, model.block[1:]):
+        block.mlp.next_route = next_block.mlp.route if prefetch else None
+    model.eval()
+
+    params = dict(model.named_parameters())
+    for name, loaded_tensor in Transformer.iter_checkpoint_tensors(
+        path, config, device, rank, world_size, names=list(params)
+    ):
+        params[name].data.copy_(loaded_tensor)
+    model.expert_cache = cache
+    return model
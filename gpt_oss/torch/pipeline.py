@@ -0,0 +1,315 @@
+"""Pipeline-parallel inference for the torch Transformer.
+
+Every rank owns a contiguous range of layers (a stage) and only loads those
+weights; rank 0 additionally holds the embedding and the last rank the final
+norm and unembedding. Sequences are streamed through the stages as
+independent micro-batches: hidden states go forward with send/recv, sampled
+tokens come back from the last stage to rank 0, so with at least as many
+concurrent sequences as stages every stage has work at every step. Unlike
+tensor parallelism there is one point-to-point transfer per stage boundary
+per step instead of an all-reduce per layer.
+"""
+
+import dataclasses
+import json
+import os
+import time
+from collections import deque
+
+import torch
+import torch.distributed as dist
+
+from gpt_oss.torch.model import Cache, ModelConfig, RMSNorm, TransformerBlock, sample_tokens, skip_init
+from gpt_oss.torch.weights import Checkpoint
+
+
+def layer_costs(config: ModelConfig, context: int = 4096) -> tuple[list[float], list[float]]:
+    """Per-layer (weight bytes, FLOPs per decoded token at `context`) estimates."""
+    d, h = config.hidden_size, config.head_dim
+    attn_params = d * h * (config.num_attention_heads + 2 * config.num_key_value_heads) + config.num_attention_heads * h * d
+    expert_params = 3 * config.intermediate_size * d
+    memory, compute = [], []
+    for layer_idx in range(config.num_hidden_layers):
+        # 参数按 bf16 计（MXFP4 权重加载后会展开为 bf16）。
+        memory.append(2.0 * (attn_params + config.num_experts * expert_params + d * config.num_experts))
+        # 偶数层是滑动窗口注意力，只看最近 sliding_window 个 token。
+        window = min(context, config.sliding_window) if layer_idx % 2 == 0 and config.sliding_window else context
+        attn_flops = 2 * attn_params + 4 * window * config.num_attention_heads * h
+        compute.append(float(attn_flops + 2 * config.experts_per_token * expert_params))
+    return memory, compute
+
+
+def plan_stages(config: ModelConfig, num_stages: int, context: int = 4096) -> list[range]:
+    """Split the layers into `num_stages` contiguous ranges balancing memory and compute.
+
+    The embedding is charged to the first stage and the unembedding (memory and
+    logits FLOPs) to the last; the plan minimizes the largest stage cost, where a
+    stage's cost is the larger of its share of total memory and of total compute.
+    """
+    num_layers = config.num_hidden_layers
+    assert 1 <= num_stages <= num_layers, f"cannot split {num_layers} layers into {num_stages} stages"
+    memory, compute = layer_costs(config, context)
+    vocab_bytes = 2.0 * config.vocab_size * config.hidden_size
+    total_memory = sum(memory) + 2 * vocab_bytes
+    total_compute = sum(compute) + 2.0 * config.vocab_size * config.hidden_size
+    mem_prefix = [0.0]
+    comp_prefix = [0.0]
+    for m, c in zip(memory, compute):
+        mem_prefix.append(mem_prefix[-1] + m)
+        comp_prefix.append(comp_prefix[-1] + c)
+
+    def stage_cost(stage: int, start: int, end: int) -> float:
+        mem = mem_prefix[end] - mem_prefix[start]
+        comp = comp_prefix[end] - comp_prefix[start]
+        if stage == 0:
+            mem += vocab_bytes
+        if stage == num_stages - 1:
+            mem += vocab_bytes
+            comp += 2.0 * config.vocab_size * config.hidden_size
+        return max(mem / total_memory, comp / total_compute)
+
+    # best[s][i]: 前 i 层分成 s 段时的最小“最大段代价”；split 记录最后一段起点。
+    inf = float("inf")
+    best = [[inf] * (num_layers + 1) for _ in range(num_stages + 1)]
+    split = [[0] * (num_layers + 1) for _ in range(num_stages + 1)]
+    best[0][0] = 0.0
+    for s in range(1, num_stages + 1):
+        for i in range(s, num_layers - (num_stages - s) + 1):
+            for j in range(s - 1, i):
+                cost = max(best[s - 1][j], stage_cost(s - 1, j, i))
+                if cost < best[s][i]:
+                    best[s][i], split[s][i] = cost, j
+    bounds = [num_layers]
+    for s in range(num_stages, 0, -1):
+        bounds.append(split[s][bounds[-1]])
+    bounds.reverse()
+    return [range(bounds[s], bounds[s + 1]) for s in range(num_stages)]
+
+
+class PipelineStage(torch.nn.Module):
+    """The layers of one pipeline stage, plus the embedding / head on the first / last stage."""
+
+    def __init__(
+        self,
+        config: ModelConfig,
+        layers: range,
+        is_first: bool,
+        is_last: bool,
+        device: torch.device | None = None,
+    ):
+        super().__init__()
+        self.config = config
+        self.layers = layers
+        self.is_first = is_first
+        self.is_last = is_last
+        if is_first:
+            self.embedding = torch.nn.Embedding(
+                config.vocab_size, config.hidden_size, device=device, dtype=torch.bfloat16
+            )
+        # 保留全局层号，使滑动窗口层的奇偶规则与完整模型一致；world_size=1 关闭张量并行。
+        self.block = torch.nn.ModuleList(
+            [TransformerBlock(config, layer_idx, device, world_size=1) for layer_idx in layers]
+        )
+        if is_last:
+            self.norm = RMSNorm(config.hidden_size, device=device)
+            self.unembedding = torch.nn.Linear(
+                config.hidden_size, config.vocab_size, bias=False, device=device, dtype=torch.bfloat16
+            )
+
+    def forward(self, x: torch.Tensor, caches: list[Cache] | None = None) -> torch.Tensor:
+        # 首段输入 token [B, T]，其余段输入 hidden [B, T, D]；末段输出 logits，其余输出 hidden。
+        caches = caches or [None] * len(self.block)
+        if self.is_first:
+            x = self.embedding(x)
+        for block, cache in zip(self.block, caches):
+            x = block(x, cache=cache)
+        if self.is_last:
+            x = self.unembedding(self.norm(x))
+        return x
+
+    @staticmethod
+    def from_checkpoint(
+        path: str,
+        device: str | torch.device = "cuda",
+        stage: int | None = None,
+        num_stages: int | None = None,
+        plan: list[range] | None = None,
+    ) -> "PipelineStage":
+        """Build stage `stage` (default: this rank) and load only its weights."""
+        if not isinstance(device, torch.device):
+            device = torch.device(device)
+        with open(os.path.join(path, "config.json"), "r") as f:
+            config = ModelConfig(**json.load(f))
+        if stage is None:
+            stage = dist.get_rank() if dist.is_initialized() else 0
+        if num_stages is None:
+            num_stages = dist.get_world_size() if dist.is_initialized() else 1
+        plan = plan or plan_stages(config, num_stages)
+        layers = plan[stage]
+
+        with skip_init():
+            model = PipelineStage(config, layers, stage == 0, stage == num_stages - 1, device=device)
+        model.eval()
+
+        # 本地层号 -> checkpoint 中的全局层号。
+        params = {}
+        for name, param in model.named_parameters():
+            if name.startswith("block."):
+                _, local_idx, rest = name.split(".", 2)
+                name = f"block.{layers[int(local_idx)]}.{rest}"
+            params[name] = param
+        with Checkpoint(path, device) as checkpoint:
+            for name, loaded_tensor in checkpoint.get_many(params):
+                params[name].data.copy_(loaded_tensor)
+        return model
+
+
+@dataclasses.dataclass
+class StageStats:
+    """Busy/idle accounting for one pipeline stage."""
+
+    stage: int = 0
+    first_layer: int = 0
+    num_layers: int = 0
+    # 本段执行的前向次数（每个 micro-batch 每步一次）。
+    microbatch_steps: int = 0
+    # 本段处理的 token 数（prefill 计入全部 prompt token）。
+    tokens: int = 0
+    # 前向计算耗时；其余时间花在等待上游数据或通信上。
+    busy_s: float = 0.0
+    wall_s: float = 0.0
+
+    @property
+    def utilization(self) -> float:
+        return self.busy_s / self.wall_s if self.wall_s else 0.0
+
+    def as_dict(self) -> dict[str, float]:
+        return dataclasses.asdict(self) | {"utilization": self.utilization}
+
+
+def gather_stage_stats(stats: StageStats) -> list[StageStats]:
+    """Collect every stage's stats (a collective: call it on all ranks)."""
+    if not dist.is_initialized():
+        return [stats]
+    all_stats = [None] * dist.get_world_size()
+    dist.all_gather_object(all_stats, stats)
+    return all_stats
+
+
+def format_utilization_report(all_stats: list[StageStats]) -> str:
+    lines = [f"{'stage':>5} {'layers':>9} {'steps':>6} {'tokens':>7} {'busy s':>8} {'wall s':>8} {'util':>6}"]
+    for s in all_stats:
+        layers = f"{s.first_layer}-{s.first_layer + s.num_layers - 1}"
+        lines.append(
+            f"{s.stage:>5} {layers:>9} {s.microbatch_steps:>6} {s.tokens:>7} "
+            f"{s.busy_s:>8.3f} {s.wall_s:>8.3f} {s.utilization:>6.1%}"
+        )
+    return "\n".join(lines)
+
+
+def pipeline_generate(
+    stage: PipelineStage,
+    prompts: list[list[int]],
+    stop_tokens: list[int],
+    temperature: float = 1.0,
+    max_tokens: int = 0,
+    context: int = 4096,
+    stats: StageStats | None = None,
+) -> list[list[int]]:
+    """Generate a continuation for every prompt; must be called on all ranks.
+
+    Each prompt is one micro-batch with its own KV caches on every stage. Rank 0
+    feeds ready micro-batches into the pipeline as soon as their previous token
+    comes back, and the results are broadcast so every rank returns them.
+    """
+    rank = dist.get_rank() if dist.is_initialized() else 0
+    world_size = dist.get_world_size() if dist.is_initialized() else 1
+    assert stage.is_first == (rank == 0) and stage.is_last == (rank == world_size - 1)
+    stats = stats if stats is not None else StageStats()
+    stats.stage, stats.first_layer, stats.num_layers = rank, stage.layers.start, len(stage.layers)
+    device = next(stage.parameters()).device
+    hidden_size = stage.config.hidden_size
+    attn = stage.block[0].attn
+    caches: dict[int, list[Cache]] = {}
+    # isend 的句柄与张量需保持存活直到发送完成。
+    pending: list[tuple[dist.Work, torch.Tensor]] = []
+
+    def send(tensor: torch.Tensor, dst: int):
+        nonlocal pending
+        pending = [(work, t) for work, t in pending if not work.is_completed()]
+        pending.append((dist.isend(tensor, dst), tensor))
+
+    def run(mb: int, x: torch.Tensor) -> torch.Tensor:
+        if mb not in caches:
+            caches[mb] = [
+                Cache(1, context, attn.num_key_value_heads, attn.head_dim, device=device)
+                for _ in stage.block
+            ]
+        start = time.perf_counter()
+        with torch.inference_mode():
+            out = stage(x, caches[mb])
+            if stage.is_last:
+                out = sample_tokens(out[:, -1].float(), temperature)
+        stats.busy_s += time.perf_counter() - start
+        stats.microbatch_steps += 1
+        stats.tokens += x.shape[1]
+        return out
+
+    start = time.perf_counter()
+    outputs = None
+    if stage.is_first:
+        outputs = [[] for _ in prompts]
+        ready = deque((mb, list(prompt)) for mb, prompt in enumerate(prompts))
+        active = len(prompts)
+
+        def accept(mb: int, token: int):
+            nonlocal active
+            outputs[mb].append(token)
+            if token in stop_tokens or (max_tokens and len(outputs[mb]) >= max_tokens):
+                active -= 1
+            else:
+                ready.append((mb, [token]))
+
+        while active:
+            if ready:
+                mb, tokens = ready.popleft()
+                out = run(mb, torch.as_tensor(tokens, dtype=torch.int32, device=device)[None, :])
+                if stage.is_last:
+                    accept(mb, int(out[0]))
+                else:
+                    send(torch.tensor([mb, len(tokens)], dtype=torch.int64), rank + 1)
+                    send(out.contiguous(), rank + 1)
+            else:
+                # 没有可调度的 micro-batch：等待末段回传一个采样结果。
+                header = torch.empty(2, dtype=torch.int64)
+                dist.recv(header, world_size - 1)
+                accept(int(header[0]), int(header[1]))
+        if world_size > 1:
+            # mb = -1 通知下游各段结束。
+            send(torch.tensor([-1, 0], dtype=torch.int64), rank + 1)
+    else:
+        while True:
+            header = torch.empty(2, dtype=torch.int64)
+            dist.recv(header, rank - 1)
+            mb, num_tokens = int(header[0]), int(header[1])
+            if mb < 0:
+                if not stage.is_last:
+                    send(header, rank + 1)
+                break
+            hidden = torch.empty(1, num_tokens, hidden_size, dtype=torch.bfloat16, device=device)
+            dist.recv(hidden, rank - 1)
+            out = run(mb, hidden)
+            if stage.is_last:
+                send(torch.tensor([mb, int(out[0])], dtype=torch.int64), 0)
+            else:
+                send(header, rank + 1)
+                send(out.contiguous(), rank + 1)
+
+    for work, _ in pending:
+        work.wait()
+    stats.wall_s += time.perf_counter() - start
+    if world_size > 1:
+        box = [outputs]
+        dist.broadcast_object_list(box, src=0)
+        outputs = box[0]
+    return outputs
@@ -0,0 +1,182 @@
+"""Opt-in MoE router instrumentation shared by the torch and triton backends.
+
+`attach_router_stats(model)` installs a `record_routing` hook on every MoE block.
+Each call only does a handful of vectorized `index_add_` updates into small
+accumulators on the model's device, so it never synchronizes with the host and
+can be captured in a CUDA graph. `snapshot()` performs the periodic reduction:
+one device-to-host copy of the accumulators, from which the per-layer summary is
+derived.
+
+Collected per layer:
+  - selection histogram: how often expert e was picked as the k-th choice
+  - per-expert token counts (the histogram summed over k) and load imbalance
+  - router entropy over all experts, normalized by log(num_experts)
+  - distribution of the top-k combination weights
+"""
+
+import functools
+import json
+import math
+
+import torch
+
+
+class RouterStats:
+    """On-device routing accumulators for `num_layers` MoE layers."""
+
+    def __init__(
+        self,
+        num_layers: int,
+        num_experts: int,
+        experts_per_token: int,
+        device: torch.device | None = None,
+        num_bins: int = 20,
+    ):
+        self.num_layers = num_layers
+        self.num_experts = num_experts
+        self.experts_per_token = experts_per_token
+        self.num_bins = num_bins
+        self.device = device
+        self.reset()
+
+    def reset(self):
+        L, K, E, bins = self.num_layers, self.experts_per_token, self.num_experts, self.num_bins
+        # 第 k 名选中专家 e 的次数。
+        self.selections = torch.zeros((L, K, E), dtype=torch.int64, device=self.device)
+        # 第 k 名的组合权重在 [0, 1] 上的直方图。
+        self.weight_histogram = torch.zeros((L, K, bins), dtype=torch.int64, device=self.device)
+        # 归一化路由熵（0 = 确定，1 = 均匀）的直方图与总和。
+        self.entropy_histogram = torch.zeros((L, bins), dtype=torch.int64, device=self.device)
+        self.entropy_sum = torch.zeros(L, dtype=torch.float32, device=self.device)
+        self.tokens = torch.zeros(L, dtype=torch.int64, device=self.device)
+
+    def hook(self, layer_idx: int):
+        """The `record_routing` callable for layer `layer_idx`."""
+        return functools.partial(self.record, layer_idx)
+
+    def _bins(self, values: torch.Tensor) -> torch.Tensor:
+        return (values * self.num_bins).long().clamp_(0, self.num_bins - 1)
+
+    @torch.no_grad()
+    def record(
+        self,
+        layer_idx: int,
+        logits: torch.Tensor,
+        indices: torch.Tensor | None = None,
+        weights: torch.Tensor | None = None,
+    ):
+        """Accumulate one routing decision: `logits` [..., E], top-k `indices`/`weights` [..., K].
+
+        Without `indices`, top-k and softmax are computed here the same way the MoE does.
+        """
+        K, E = self.experts_per_token, self.num_experts
+        logits = logits.reshape(-1, E).float()
+        if indices is None:
+            top = torch.topk(logits, k=K, dim=-1, sorted=True)
+            indices, weights = top.indices, torch.softmax(top.values, dim=-1)
+        indices = indices.reshape(-1, K)
+        weights = weights.reshape(-1, K).float()
+        rank = torch.arange(K, device=logits.device)
+
+        # 所有更新都是张量上的 index_add_，不读回主机。
+        selections = self.selections[layer_idx].view(-1)
+        selections.index_add_(0, (rank * E + indices).flatten(), torch.ones_like(indices).flatten())
+        weight_histogram = self.weight_histogram[layer_idx].view(-1)
+        weight_bins = (rank * self.num_bins + self._bins(weights)).flatten()
+        weight_histogram.index_add_(0, weight_bins, torch.ones_like(weight_bins))
+
+        log_probs = torch.log_softmax(logits, dim=-1)
+        entropy = -(log_probs.exp() * log_probs).sum(dim=-1) / math.log(E)
+        entropy_bins = self._bins(entropy)
+        self.entropy_histogram[layer_idx].index_add_(0, entropy_bins, torch.ones_like(entropy_bins))
+        self.entropy_sum[layer_idx] += entropy.sum()
+        self.tokens[layer_idx] += logits.shape[0]
+
+    def snapshot(self) -> dict:
+        """Reduce the accumulators on the host into a JSON-serializable summary."""
+        # 一次拷贝取回所有计数，其余统计在主机上计算。
+        counts = torch.cat([
+            self.selections.flatten(),
+            self.weight_histogram.flatten(),
+            self.entropy_histogram.flatten(),
+            self.tokens,
+        ]).cpu()
+        entropy_sum = self.entropy_sum.cpu()
+        L, K, E, bins = self.num_layers, self.experts_per_token, self.num_experts, self.num_bins
+        selections, counts = counts[: L * K * E].view(L, K, E), counts[L * K * E :]
+        weight_histogram, counts = counts[: L * K * bins].view(L, K, bins), counts[L * K * bins :]
+        entropy_histogram, tokens = counts[: L * bins].view(L, bins), counts[L * bins :]
+
+        layers = []
+        for layer_idx in range(L):
+            expert_counts = selections[layer_idx].sum(dim=0)
+            num_tokens = int(tokens[layer_idx])
+            mean_count = num_tokens * K / E
+            layers.append({
+                "layer": layer_idx,
+                "tokens": num_tokens,
+                "expert_counts": expert_counts.tolist(),
+                "selection_histogram": selections[layer_idx].tolist(),
+                # 最忙专家负载相对均匀负载的倍数（1.0 为完全均衡）。
+                "load_imbalance": float(expert_counts.max()) / mean_count if num_tokens else 0.0,
+                "unused_experts": int((expert_counts == 0).sum()),
+                "entropy_mean": float(entropy_sum[layer_idx]) / num_tokens if num_tokens else 0.0,
+                "entropy_histogram": entropy_histogram[layer_idx].tolist(),
+                "topk_weight_histogram": weight_histogram[layer_idx].tolist(),
+            })
+        return {
+            "num_layers": L,
+            "num_experts": E,
+            "experts_per_token": K,
+            "num_bins": bins,
+            "layers": layers,
+        }
+
+    def to_json(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f)
+
+    def to_parquet(self, path: str):
+        """Write one row per (layer, expert) with its token count and per-rank selections."""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise RuntimeError("Parquet export requires the pyarrow package to be installed.") from exc
+
+        snapshot = self.snapshot()
+        columns = {"layer": [], "expert": [], "tokens": [], "entropy_mean": [], "load_imbalance": []}
+        columns.update({f"rank{k}": [] for k in range(self.experts_per_token)})
+        for layer in snapshot["layers"]:
+            for expert, count in enumerate(layer["expert_counts"]):
+                columns["layer"].append(layer["layer"])
+                columns["expert"].append(expert)
+                columns["tokens"].append(count)
+                columns["entropy_mean"].append(layer["entropy_mean"])
+                columns["load_imbalance"].append(layer["load_imbalance"])
+                for k in range(self.experts_per_token):
+                    columns[f"rank{k}"].append(layer["selection_histogram"][k][expert])
+        pq.write_table(pa.table(columns), path)
+
+
+def attach_router_stats(model: torch.nn.Module, num_bins: int = 20) -> RouterStats:
+    """Start collecting routing statistics for every MoE block of a torch or triton Transformer.
+
+    For the triton backend attach before capturing CUDA graphs so the updates are captured too.
+    """
+    config = model.config
+    stats = RouterStats(
+        config.num_hidden_layers,
+        config.num_experts,
+        config.experts_per_token,
+        device=next(model.parameters()).device,
+        num_bins=num_bins,
+    )
+    for block in model.block:
+        block.mlp.record_routing = stats.hook(block.layer_idx)
+    return stats
+
+
+def detach_router_stats(model: torch.nn.Module):
+    for block in model.block:
+        block.mlp.record_routing = None
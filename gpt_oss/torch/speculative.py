@@ -0,0 +1,238 @@
+"""Speculative decoding with prompt-lookup (n-gram) or draft-model proposals.
+
+The target model verifies all drafted tokens in one forward pass over its KV
+cache and keeps the longest accepted prefix. Acceptance follows speculative
+sampling (https://arxiv.org/abs/2211.17192), so sampled outputs keep exactly the
+target model's distribution; with temperature 0 it reduces to greedy matching.
+"""
+
+import dataclasses
+from typing import Callable, Iterator
+
+import torch
+
+
+@dataclasses.dataclass
+class SpeculativeStats:
+    """Running counters for one or more speculative generations."""
+
+    # 目标模型 verify 前向次数（每次前向至少产出 1 个 token）。
+    steps: int = 0
+    # 提交给目标模型验证的草稿 token 数。
+    drafted_tokens: int = 0
+    # 被接受的草稿 token 数。
+    accepted_tokens: int = 0
+    # 实际产出的 token 数（被接受的草稿 + 每步 1 个修正/奖励 token）。
+    generated_tokens: int = 0
+
+    @property
+    def acceptance_rate(self) -> float:
+        return self.accepted_tokens / self.drafted_tokens if self.drafted_tokens else 0.0
+
+    @property
+    def tokens_per_step(self) -> float:
+        return self.generated_tokens / self.steps if self.steps else 0.0
+
+    def as_dict(self) -> dict[str, float]:
+        return dataclasses.asdict(self) | {
+            "acceptance_rate": self.acceptance_rate,
+            "tokens_per_step": self.tokens_per_step,
+        }
+
+
+class NGramDrafter:
+    """Prompt-lookup drafter: copies the continuation of the latest earlier occurrence of the context suffix."""
+
+    def __init__(self, num_draft_tokens: int = 4, max_ngram: int = 3, min_ngram: int = 1):
+        assert 1 <= min_ngram <= max_ngram
+        self.num_draft_tokens = num_draft_tokens
+        self.max_ngram = max_ngram
+        self.min_ngram = min_ngram
+        self.reset([])
+
+    def reset(self, tokens: list[int]):
+        # n-gram -> 该 n-gram 最近一次出现后的下一个位置。
+        self.index: dict[tuple[int, ...], int] = {}
+        self.tokens: list[int] = []
+        self.extend(tokens)
+
+    def extend(self, tokens: list[int]):
+        # 增量索引：每追加一个 token，登记以“它之前”为结尾的各阶 n-gram。
+        # 末尾 n-gram 延迟到下一个 token 到来才登记，避免匹配到自身。
+        for token in tokens:
+            end = len(self.tokens)
+            for n in range(self.min_ngram, self.max_ngram + 1):
+                if end >= n:
+                    self.index[tuple(self.tokens[end - n : end])] = end
+            self.tokens.append(token)
+
+    def propose(self, tokens: list[int]) -> tuple[list[int], None]:
+        # tokens 只会在末尾增长；若被回退则重建索引。
+        if tokens[: len(self.tokens)] != self.tokens:
+            self.reset(tokens)
+        else:
+            self.extend(tokens[len(self.tokens) :])
+        # 优先匹配最长的后缀 n-gram。
+        for n in range(self.max_ngram, self.min_ngram - 1, -1):
+            if len(tokens) < n:
+                continue
+            start = self.index.get(tuple(tokens[-n:]))
+            if start is not None:
+                return tokens[start : start + self.num_draft_tokens], None
+        return [], None
+
+
+class DraftModelDrafter:
+    """Drafts tokens autoregressively with a smaller model that shares the target's vocabulary."""
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        num_draft_tokens: int = 4,
+        temperature: float = 0.0,
+        caches: list | None = None,
+    ):
+        from gpt_oss.torch.model import Cache
+
+        self.model = model
+        self.num_draft_tokens = num_draft_tokens
+        self.temperature = temperature
+        attn = model.block[0].attn
+        device = next(model.parameters()).device
+        self.caches = caches or [
+            Cache(1, 256, attn.num_key_value_heads, attn.head_dim, device=device)
+            for _ in range(len(model.block))
+        ]
+        # 草稿模型 cache 中已经包含的 token。
+        self.cached_tokens: list[int] = []
+
+    def _sync(self, tokens: list[int]) -> torch.Tensor:
+        # 与目标上下文对齐：保留公共前缀，补齐剩余 token，返回最后位置的 logits。
+        common = 0
+        limit = min(len(self.cached_tokens), len(tokens) - 1)
+        while common < limit and self.cached_tokens[common] == tokens[common]:
+            common += 1
+        for cache in self.caches:
+            cache.truncate(common)
+        device = next(self.model.parameters()).device
+        new_tokens = torch.as_tensor(tokens[common:], dtype=torch.int32, device=device)
+        self.cached_tokens = list(tokens)
+        return self.model(new_tokens[None, :], self.caches)[0, -1].float()
+
+    def propose(self, tokens: list[int]) -> tuple[list[int], torch.Tensor]:
+        drafts, probs = [], []
+        logits = self._sync(tokens)
+        for i in range(self.num_draft_tokens):
+            if self.temperature == 0.0:
+                q = torch.nn.functional.one_hot(logits.argmax(), logits.shape[-1]).float()
+            else:
+                q = torch.softmax(logits / self.temperature, dim=-1)
+            token = int(torch.multinomial(q, 1)) if self.temperature else int(q.argmax())
+            drafts.append(token)
+            probs.append(q)
+            if i + 1 < self.num_draft_tokens:
+                logits = self._sync(tokens + drafts)
+        return drafts, torch.stack(probs)
+
+
+def verify_draft(
+    logits: torch.Tensor,
+    draft_tokens: list[int],
+    draft_probs: torch.Tensor | None,
+    temperature: float,
+) -> list[int]:
+    """Accept the longest valid draft prefix and append one token sampled from the target.
+
+    `logits` is [len(draft_tokens) + 1, vocab]: row i is the target distribution for
+    the position of draft i (the last row follows the whole draft). `draft_probs`
+    holds the drafter's distributions, or None for deterministic (one-hot) drafts.
+    """
+    logits = logits.float()
+    accepted = []
+    for i, token in enumerate(draft_tokens):
+        if temperature == 0.0:
+            # 贪心：草稿与目标 argmax 一致才接受，否则用 argmax 修正。
+            target = int(logits[i].argmax())
+            if target != token:
+                return accepted + [target]
+            accepted.append(token)
+            continue
+        p = torch.softmax(logits[i] / temperature, dim=-1)
+        q = (
+            torch.nn.functional.one_hot(torch.tensor(token), p.shape[-1]).to(p)
+            if draft_probs is None
+            else draft_probs[i].to(p)
+        )
+        # 以 min(1, p/q) 的概率接受草稿 token。
+        if torch.rand(()) * q[token] <= p[token]:
+            accepted.append(token)
+            continue
+        # 拒绝后从残差分布 norm(max(p - q, 0)) 采样，保证整体分布与目标模型一致。
+        residual = (p - q).clamp(min=0)
+        if residual.sum() <= 0:
+            residual = p
+        return accepted + [int(torch.multinomial(residual / residual.sum(), 1))]
+
+    # 全部接受时，从最后一行额外采样一个“奖励” token。
+    if temperature == 0.0:
+        return accepted + [int(logits[-1].argmax())]
+    p = torch.softmax(logits[-1] / temperature, dim=-1)
+    return accepted + [int(torch.multinomial(p, 1))]
+
+
+def speculative_generate(
+    model: Callable[..., torch.Tensor],
+    caches: list,
+    prompt_tokens: list[int],
+    drafter: NGramDrafter | DraftModelDrafter,
+    stop_tokens: list[int],
+    temperature: float = 1.0,
+    max_tokens: int = 0,
+    return_logprobs: bool = False,
+    stats: SpeculativeStats | None = None,
+) -> Iterator[int | tuple[int, float]]:
+    """Speculative decoding loop shared by the torch and triton TokenGenerators.
+
+    `model(tokens[None, :], caches)` must return [1, T, vocab] logits and append the
+    tokens to `caches`; each cache must support `truncate(n_ctx)`.
+    """
+    stats = stats if stats is not None else SpeculativeStats()
+    device = caches[0].k.device
+    tokens = list(prompt_tokens)
+    # cache 中保存除最后一个 token 外的全部上下文；最后一个 token 随下一次 verify 送入。
+    if len(tokens) > 1:
+        model(torch.as_tensor(tokens[:-1], dtype=torch.int32, device=device)[None, :], caches)
+    n_cached = len(tokens) - 1
+    num_generated_tokens = 0
+    while True:
+        drafts, draft_probs = drafter.propose(tokens)
+        if max_tokens:
+            # 不必起草超过剩余额度的 token。
+            drafts = drafts[: max(max_tokens - num_generated_tokens - 1, 0)]
+            if draft_probs is not None:
+                draft_probs = draft_probs[: len(drafts)]
+        # 一次前向同时验证全部草稿：输入 [last_token, d_1, ..., d_k]。
+        step_input = torch.as_tensor([tokens[-1]] + drafts, dtype=torch.int32, device=device)
+        logits = model(step_input[None, :], caches)[0]
+        new_tokens = verify_draft(logits, drafts, draft_probs, temperature)
+        num_accepted = len(new_tokens) - 1
+        # 回退 cache：只保留 last_token 与被接受的草稿。
+        n_cached += 1 + num_accepted
+        for cache in caches:
+            cache.truncate(n_cached)
+
+        stats.steps += 1
+        stats.drafted_tokens += len(drafts)
+        stats.accepted_tokens += num_accepted
+        stats.generated_tokens += len(new_tokens)
+
+        logprobs = torch.log_softmax(logits.float(), dim=-1) if return_logprobs else None
+        for i, token in enumerate(new_tokens):
+            tokens.append(token)
+            num_generated_tokens += 1
+            if return_logprobs:
+                yield token, logprobs[i, token].item()
+            else:
+                yield token
+            if token in stop_tokens or (max_tokens and num_generated_tokens >= max_tokens):
+                return
@@ -20,28 +20,128 @@ def suppress_output(rank):
     __builtin__.print = print
 
 
-def init_distributed() -> torch.device:
-    """Initialize the model for distributed inference."""
+def _parse_cpulist(cpulist: str) -> list[int]:
+    # 解析 sysfs 的 CPU 列表格式，如 "0-3,8-11"。
+    cpus = []
+    for part in cpulist.strip().split(","):
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        cpus.extend(range(int(start), int(end or start) + 1))
+    return cpus
+
+
+def numa_nodes() -> dict[int, list[int]]:
+    """Map NUMA node id -> CPU ids usable by this process (empty when NUMA info is unavailable)."""
+    root = "/sys/devices/system/node"
+    allowed = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else None
+    nodes = {}
+    if not os.path.isdir(root):
+        return nodes
+    for entry in sorted(os.listdir(root)):
+        if not (entry.startswith("node") and entry[4:].isdigit()):
+            continue
+        with open(os.path.join(root, entry, "cpulist")) as f:
+            cpus = _parse_cpulist(f.read())
+        if allowed is not None:
+            cpus = [cpu for cpu in cpus if cpu in allowed]
+        if cpus:
+            nodes[int(entry[4:])] = cpus
+    return nodes
+
+
+def cpu_placement(local_rank: int, local_world_size: int) -> tuple[int | None, list[int]]:
+    """Pick a NUMA node and a disjoint CPU slice for `local_rank` among the ranks on this host.
+
+    Ranks are spread round-robin over NUMA nodes and the CPUs of each node are split
+    evenly between the ranks placed on it.
+    """
+    nodes = numa_nodes()
+    if not nodes:
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+        node_ids, node_cpus = [None], [cpus]
+    else:
+        node_ids, node_cpus = list(nodes), list(nodes.values())
+    slot = local_rank % len(node_ids)
+    node, cpus = node_ids[slot], node_cpus[slot]
+    # 同一 NUMA 节点上的 rank 平分该节点的 CPU；CPU 不够时允许共享。
+    ranks_on_node = list(range(slot, local_world_size, len(node_ids)))
+    share = max(len(cpus) // len(ranks_on_node), 1)
+    index = ranks_on_node.index(local_rank) if local_rank in ranks_on_node else 0
+    start = (index * share) % len(cpus)
+    return node, cpus[start : start + share]
+
+
+def init_distributed(
+    backend: str | None = None,
+    device: str | torch.device | None = None,
+    num_threads: int | None = None,
+    pin_cpus: bool | None = None,
+) -> torch.device:
+    """Initialize the model for distributed inference.
+
+    `backend` and `device` default to the GPT_OSS_DIST_BACKEND / GPT_OSS_DEVICE
+    environment variables, then to nccl/cuda when CUDA is available and gloo/cpu
+    otherwise. On CPU each rank limits itself to its share of the host's cores
+    (`num_threads`, or GPT_OSS_NUM_THREADS) and, with `pin_cpus` (GPT_OSS_PIN_CPUS,
+    on by default when several ranks share the host), binds itself to the cores of
+    one NUMA node so its weights are first-touched in node-local memory. A single
+    process on the host uses all of its cores unless pinning is asked for explicitly.
+    """
     # Initialize distributed inference
     # 约定从环境变量读取分布式配置；单卡时 WORLD_SIZE 默认为 1。
     world_size = int(os.environ.get("WORLD_SIZE", 1))
     rank = int(os.environ.get("RANK", 0))
+    local_rank = int(os.environ.get("LOCAL_RANK", rank))
+    local_world_size = int(os.environ.get("LOCAL_WORLD_SIZE", world_size))
+
+    device = device or os.environ.get("GPT_OSS_DEVICE") or ("cuda" if torch.cuda.is_available() else "cpu")
+    device = torch.device(device)
+    if device.type == "cuda" and device.index is None:
+        device = torch.device(f"cuda:{local_rank}")
+    backend = backend or os.environ.get("GPT_OSS_DIST_BACKEND") or ("nccl" if device.type == "cuda" else "gloo")
+
+    placement_hint = None
+    if device.type == "cuda":
+        # 将当前进程绑定到对应 GPU，避免跨卡误用。
+        torch.cuda.set_device(device)
+    else:
+        # CPU 推理：每个 rank 只使用自己那份核心，避免多进程线程数超订。
+        if pin_cpus is None:
+            env_pin_cpus = os.environ.get("GPT_OSS_PIN_CPUS")
+            pin_cpus = env_pin_cpus != "0" if env_pin_cpus is not None else local_world_size > 1
+        if pin_cpus or local_world_size > 1:
+            node, cpus = cpu_placement(local_rank, local_world_size)
+        else:
+            # 单进程且未要求绑核：使用全部可用核心，而不只是 NUMA 节点 0 的核心。
+            node = None
+            cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+        if pin_cpus and hasattr(os, "sched_setaffinity"):
+            # 绑核后按 Linux first-touch 策略，权重会分配在该 NUMA 节点的本地内存上。
+            os.sched_setaffinity(0, cpus)
+        num_threads = num_threads or int(os.environ.get("GPT_OSS_NUM_THREADS", 0)) or len(cpus)
+        torch.set_num_threads(num_threads)
+        if node is not None and world_size > 1:
+            placement_hint = (
+                f"{num_threads} threads on NUMA node {node} (for strict memory placement launch "
+                f"with `numactl --cpunodebind={node} --membind={node}`)"
+            )
+
     if world_size > 1:
-        # 使用 NCCL + env:// 初始化进程组（常见于 torchrun 启动）。
+        # 使用 env:// 初始化进程组（常见于 torchrun 启动）；GPU 默认 NCCL，CPU 默认 gloo。
         dist.init_process_group(
-            backend="nccl", init_method="env://", world_size=world_size, rank=rank
+            backend=backend, init_method="env://", world_size=world_size, rank=rank
         )
-    # 将当前进程绑定到对应 GPU，避免跨卡误用。
-    torch.cuda.set_device(rank)
-    device = torch.device(f"cuda:{rank}")
 
-    # Warm up NCCL to avoid first-time latency
-    if world_size > 1:
+        # Warm up the backend to avoid first-time latency
         # 预热一次 all_reduce，降低首次通信抖动。
         x = torch.ones(1, device=device)
         dist.all_reduce(x)
-        torch.cuda.synchronize(device)
+        if device.type == "cuda":
+            torch.cuda.synchronize(device)
 
     # 最后统一设置打印策略，减少重复日志噪声。
     suppress_output(rank)
+    if placement_hint:
+        print(placement_hint, force=True)
     return device
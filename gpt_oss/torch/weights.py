@@ -1,5 +1,13 @@
+import hashlib
+import json
 import math
+import mmap
 import os
+import struct
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator
 
 import torch
 from safetensors import safe_open
@@ -31,8 +39,89 @@ PARAM_NAME_MAP = {
 }
 
 
+# safetensors dtype 名 -> 每元素字节数，用于在读取前估算张量大小。
+_DTYPE_BYTES = {"BOOL": 1, "U8": 1, "I8": 1, "F8_E4M3": 1, "F8_E5M2": 1, "I16": 2, "F16": 2, "BF16": 2,
+                "I32": 4, "F32": 4, "I64": 8, "F64": 8}
+
+# Basic indexing applied to a tensor before it is loaded, e.g. `(slice(None), slice(0, 1024))`.
+SliceSpec = tuple[slice | type(Ellipsis), ...]
+
+
+def _expand_slices(slices: SliceSpec, ndim: int) -> tuple[slice, ...]:
+    # 展开 Ellipsis 并在末尾补齐完整切片，得到每一维一个 slice。
+    slices = tuple(slices) if isinstance(slices, tuple) else (slices,)
+    if Ellipsis in slices:
+        i = slices.index(Ellipsis)
+        fill = (slice(None),) * (ndim - len(slices) + 1)
+        slices = slices[:i] + fill + slices[i + 1 :]
+    assert len(slices) <= ndim, f"too many slices for a {ndim}-d tensor"
+    return slices + (slice(None),) * (ndim - len(slices))
+
+
+# 字节级查找表：每个打包字节 -> (低 nibble 值, 高 nibble 值)，一次 gather 解出两个 FP4。
+_FP4_BYTE_LUT = torch.stack(
+    [
+        torch.tensor(FP4_VALUES, dtype=torch.bfloat16)[torch.arange(256) & 0x0F],
+        torch.tensor(FP4_VALUES, dtype=torch.bfloat16)[torch.arange(256) >> 4],
+    ],
+    dim=-1,
+)
+
+
+def decode_mxfp4(
+    blocks: torch.Tensor,
+    scales: torch.Tensor,
+    *,
+    dtype: torch.dtype = torch.bfloat16,
+    rows_per_chunk: int = 1 << 16,
+    num_threads: int | None = None,
+) -> torch.Tensor:
+    """Dequantize MXFP4 `blocks` [..., G, B] (uint8) with E8M0 `scales` [..., G] (uint8, bias 127).
+
+    Each byte is decoded through a [256, 2] bf16 table in a single gather, and
+    the scale is applied by multiplying with the bf16 power of two whose
+    exponent bits are the E8M0 byte itself, which is exact and bitwise
+    identical to `ldexp`. Row chunks are decoded on `num_threads` threads.
+    Returns [..., G * B * 2].
+    """
+    *prefix_shape, G, B = blocks.shape
+    assert scales.shape == (*prefix_shape, G), f"{blocks.shape=} does not match {scales.shape=}"
+    rows_total = math.prod(prefix_shape) * G
+    blocks = blocks.reshape(rows_total, B)
+    scales = scales.reshape(rows_total)
+    lut = _FP4_BYTE_LUT.to(blocks.device)
+    out = torch.empty(rows_total, B * 2, dtype=dtype, device=blocks.device)
+
+    def decode_chunk(r0: int, r1: int):
+        exp = scales[r0:r1]
+        values = torch.nn.functional.embedding(blocks[r0:r1].to(torch.int32), lut).view(r1 - r0, B * 2)
+        if bool(((exp == 0) | (exp == 255)).any()):
+            # 2^-127 在 bf16 中是次正规数、255 是 NaN 编码，无法直接拼成指数位，退回 ldexp。
+            torch.ldexp(values, exp[:, None].to(torch.int32) - 127, out=values)
+        else:
+            # E8M0 字节左移 7 位正好落在 bf16 的指数域上，得到 2^(exp - 127)。
+            values *= (exp.to(torch.int16) << 7).view(torch.bfloat16)[:, None]
+        out[r0:r1] = values
+
+    chunks = [(r0, min(r0 + rows_per_chunk, rows_total)) for r0 in range(0, rows_total, rows_per_chunk)]
+    num_threads = min(num_threads or torch.get_num_threads(), len(chunks))
+    if num_threads <= 1:
+        for r0, r1 in chunks:
+            decode_chunk(r0, r1)
+    else:
+        with ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix="mxfp4") as executor:
+            list(executor.map(lambda chunk: decode_chunk(*chunk), chunks))
+    return out.view(*prefix_shape, G * B * 2)
+
+
 class Checkpoint:
-    def __init__(self, path: str, device: torch.device):
+    def __init__(
+        self,
+        path: str,
+        device: torch.device,
+        num_workers: int | None = None,
+        max_inflight_bytes: int | None = None,
+    ):
         # safetensors 需要形如 "cuda:0" 的设备字符串。
         device_str = (
             device.type
@@ -40,43 +129,183 @@ class Checkpoint:
             else device.type + ":" + str(device.index)
         )
         self.device_str = device_str
+        # 并行加载/解码的线程数（torch 算子与 safetensors 拷贝期间会释放 GIL）。
+        self.num_workers = num_workers or min(8, os.cpu_count() or 1)
+        # get_many 预读的解码后张量总字节上限（至少放行一个张量）；默认 1 GiB，
+        # 可用 GPT_OSS_LOAD_INFLIGHT_MB 调整。
+        if max_inflight_bytes is None:
+            max_inflight_bytes = int(float(os.getenv("GPT_OSS_LOAD_INFLIGHT_MB", 1024)) * 2**20)
+        self.max_inflight_bytes = max_inflight_bytes
+
+        # 已打开的 safetensors 句柄（内部是 mmap），整个加载过程只打开每个文件一次。
+        self._handles = {}
+        self._handles_lock = threading.Lock()
 
-        # Read from all files ending with .safetensors in the checkpoint directory
-        # 一个 checkpoint 可能由多个 safetensors 分片组成。
-        safetensor_files = [
-            os.path.join(path, fname)
-            for fname in os.listdir(path)
-            if fname.endswith(".safetensors")
-        ]
-        # Build a mapping from tensor name to (file, key)
-        # 先建立“张量名 -> 所在文件”索引，后续按需懒加载具体张量。
-        tensor_name_to_file = {}
-        for safetensor_file in safetensor_files:
-            with safe_open(safetensor_file, framework="pt", device=device_str) as f:
-                for key in f.keys():
+        # Build a mapping from tensor name to file
+        # 优先读取 model.safetensors.index.json，避免为列出 key 而打开所有分片。
+        index_path = os.path.join(path, "model.safetensors.index.json")
+        if os.path.exists(index_path):
+            with open(index_path, "r") as f:
+                weight_map = json.load(f)["weight_map"]
+            tensor_name_to_file = {
+                name: os.path.join(path, fname) for name, fname in weight_map.items()
+            }
+        else:
+            # Read from all files ending with .safetensors in the checkpoint directory
+            # 一个 checkpoint 可能由多个 safetensors 分片组成；扫描时顺便保留句柄供后续读取。
+            tensor_name_to_file = {}
+            for fname in sorted(os.listdir(path)):
+                if not fname.endswith(".safetensors"):
+                    continue
+                safetensor_file = os.path.join(path, fname)
+                for key in self._handle(safetensor_file).keys():
                     tensor_name_to_file[key] = safetensor_file
 
         self.tensor_name_to_file = tensor_name_to_file
 
-    def get(self, name: str) -> torch.Tensor:
+    def _handle(self, filename: str):
+        # 懒打开并缓存文件句柄；加锁保证多线程下每个文件只打开一次。
+        with self._handles_lock:
+            handle = self._handles.get(filename)
+            if handle is None:
+                handle = safe_open(filename, framework="pt", device=self.device_str)
+                self._handles[filename] = handle
+            return handle
+
+    def close(self):
+        with self._handles_lock:
+            self._handles.clear()
+
+    def __enter__(self) -> "Checkpoint":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get(self, name: str, slices: SliceSpec | None = None, *, num_threads: int | None = None) -> torch.Tensor:
+        """Load `name`, optionally only `tensor[slices]` (basic slices, `...` allowed).
+
+        Slices are applied before dequantization: only the selected rows of MXFP4
+        blocks/scales are read and decoded, so tensor-parallel ranks never
+        materialize the full expert weights. MXFP4 weights are decoded on
+        `num_threads` threads (see `decode_mxfp4`).
+        """
         # PARAM_NAME_MAP 支持两类返回：
         # 1) str: 直接读取普通 tensor；
         # 2) (blocks, scales): 表示 MXFP4 权重，需要走专门解码。
         match PARAM_NAME_MAP.get(name, name):
             case (blocks_name, scales_name):
                 # MoE weights: are in block-based MXFP4 format
-                return self._get_mxfp4_tensor(blocks_name, scales_name, dtype=torch.bfloat16)
+                if slices is None:
+                    return self._get_mxfp4_tensor_lut(
+                        blocks_name, scales_name, dtype=torch.bfloat16, num_threads=num_threads
+                    )
+                return self._get_mxfp4_tensor_sliced(blocks_name, scales_name, slices, num_threads=num_threads)
             case tensor_name:
                 # MoE biases and other weights
-                return self._get_tensor(tensor_name)
+                return self._get_tensor(tensor_name, slices)
+
+    def _get_mxfp4_tensor_sliced(
+        self, blocks_name: str, scales_name: str, slices: SliceSpec, *, num_threads: int | None = None
+    ) -> torch.Tensor:
+        # 解码后形状为 [*prefix, G * 32]；前缀维的切片直接作用在 blocks/scales 上，
+        # 末维切片若按 32 元素块对齐，则换算成块维 G 上的切片。
+        *prefix_shape, G, B = self._handle(self.tensor_name_to_file[blocks_name]).get_slice(blocks_name).get_shape()
+        values_per_block = B * 2
+        *prefix_slices, last = _expand_slices(slices, len(prefix_shape) + 1)
+        start, stop, step = last.indices(G * values_per_block)
+        if step == 1 and start % values_per_block == 0 and stop % values_per_block == 0:
+            block_slices = (*prefix_slices, slice(start // values_per_block, stop // values_per_block))
+            return self._get_mxfp4_tensor_lut(
+                blocks_name, scales_name, dtype=torch.bfloat16, slices=block_slices, num_threads=num_threads
+            )
+        # 未按块对齐：先只按前缀维切片解码，再在末维上切。
+        block_slices = (*prefix_slices, slice(None))
+        tensor = self._get_mxfp4_tensor_lut(
+            blocks_name, scales_name, dtype=torch.bfloat16, slices=block_slices, num_threads=num_threads
+        )
+        return tensor[..., last]
+
+    def get_many(
+        self, names: Iterable[str], slices: dict[str, SliceSpec] | None = None
+    ) -> Iterator[tuple[str, torch.Tensor]]:
+        """Yield `(name, self.get(name, slices.get(name)))` in order, reading and decoding ahead on a thread pool.
 
-    def _get_tensor(self, name: str) -> str:
-        # 基础读取：从对应 safetensors 文件按 key 提取 tensor。
+        Read-ahead is bounded by the decoded size of the tensors in flight
+        (`max_inflight_bytes`, estimated from the safetensors headers) and by
+        `2 * num_workers` tensors, so a tensor larger than the budget is loaded
+        on its own as in a sequential load, and I/O and MXFP4 decoding overlap
+        with the caller's work only while the extra device memory stays small.
+        """
+        names = list(names)
+        slices = slices or {}
+        if self.num_workers <= 1:
+            for name in names:
+                yield name, self.get(name, slices.get(name))
+            return
+        with ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix="checkpoint") as executor:
+            in_flight = deque()
+            in_flight_bytes = 0
+            remaining = deque(names)
+            while remaining or in_flight:
+                # 先补满预读窗口；队列为空时总是放行下一个张量，保证进度。
+                while remaining and len(in_flight) < 2 * self.num_workers:
+                    nbytes = self.decoded_nbytes(remaining[0], slices.get(remaining[0]))
+                    if in_flight and in_flight_bytes + nbytes > self.max_inflight_bytes:
+                        break
+                    name = remaining.popleft()
+                    # 多个张量已在线程池中并行处理，单个张量的解码不再额外开线程，避免超订。
+                    future = executor.submit(self.get, name, slices.get(name), num_threads=1)
+                    in_flight.append((name, nbytes, future))
+                    in_flight_bytes += nbytes
+                name, nbytes, future = in_flight.popleft()
+                tensor = future.result()
+                yield name, tensor
+                # 调用方已处理完该张量，释放它在预算中的份额。
+                del tensor, future
+                in_flight_bytes -= nbytes
+
+    def decoded_nbytes(self, name: str, slices: SliceSpec | None = None) -> int:
+        """Size in bytes of `self.get(name, slices)`, computed from the headers without reading data."""
+        match PARAM_NAME_MAP.get(name, name):
+            case (blocks_name, _):
+                *prefix_shape, G, B = self._handle(self.tensor_name_to_file[blocks_name]).get_slice(blocks_name).get_shape()
+                shape, itemsize = [*prefix_shape, G * B * 2], torch.bfloat16.itemsize
+            case tensor_name:
+                tensor_slice = self._handle(self.tensor_name_to_file[tensor_name]).get_slice(tensor_name)
+                shape, itemsize = tensor_slice.get_shape(), _DTYPE_BYTES.get(tensor_slice.get_dtype(), 4)
+        if slices is not None:
+            shape = [len(range(*s.indices(n))) for s, n in zip(_expand_slices(slices, len(shape)), shape)]
+        return math.prod(shape) * itemsize
+
+    def _get_tensor(self, name: str, slices: SliceSpec | None = None) -> torch.Tensor:
+        # 基础读取：从对应 safetensors 文件按 key 提取 tensor（复用已打开的句柄）。
+        # 给定切片时通过 get_slice 只读取所需部分。
         assert name in self.tensor_name_to_file, f"Tensor {name} not found in checkpoint."
-        with safe_open(
-            self.tensor_name_to_file[name], framework="pt", device=self.device_str
-        ) as f:
-            return f.get_tensor(name)
+        handle = self._handle(self.tensor_name_to_file[name])
+        if slices is None:
+            return handle.get_tensor(name)
+        return handle.get_slice(name)[slices]
+
+    def _get_mxfp4_tensor_lut(
+        self,
+        blocks_name: str,
+        scales_name: str,
+        *,
+        dtype: torch.dtype = torch.bfloat16,
+        slices: SliceSpec | None = None,
+        num_threads: int | None = None,
+    ) -> torch.Tensor:
+        # 默认解码路径：字节查找表 + 指数位缩放 + 多线程分块（见 decode_mxfp4）。
+        assert blocks_name in self.tensor_name_to_file, (
+            f"Blocks tensor {blocks_name} not found in checkpoint."
+        )
+        assert scales_name in self.tensor_name_to_file, (
+            f"Scales tensor {scales_name} not found in checkpoint."
+        )
+        blocks = self._get_tensor(blocks_name, slices)
+        scales = self._get_tensor(scales_name, slices)
+        return decode_mxfp4(blocks, scales, dtype=dtype, num_threads=num_threads)
 
     def _get_mxfp4_tensor(
         self,
@@ -85,6 +314,7 @@ class Checkpoint:
         *,
         dtype: torch.dtype = torch.bfloat16,
         rows_per_chunk: int = 16384 * 512,
+        slices: SliceSpec | None = None,
     ) -> torch.Tensor:
         # blocks/scales 必须同时存在，且形状前缀匹配。
         assert blocks_name in self.tensor_name_to_file, (
@@ -95,8 +325,9 @@ class Checkpoint:
         )
 
         # blocks: uint8 packed nibbles；scales: 带 127 偏移的指数。
-        blocks = self._get_tensor(blocks_name)
-        scales = self._get_tensor(scales_name).to(torch.int32) - 127
+        # slices 作用在 [*prefix, G] 维上（blocks 的字节维始终完整读取）。
+        blocks = self._get_tensor(blocks_name, slices)
+        scales = self._get_tensor(scales_name, slices).to(torch.int32) - 127
 
         assert blocks.shape[:-1] == scales.shape, (
             f"{blocks.shape=} does not match {scales.shape=}"
@@ -162,3 +393,109 @@ class Checkpoint:
         loaded_tensor = torch.ldexp(fp4_values[loaded_blocks.int()], loaded_scales.unsqueeze(-1))
         loaded_tensor = loaded_tensor.view(*loaded_tensor.shape[:-2], -1)
         return loaded_tensor
+
+
+# ---------------------------------------------------------------------------
+# Pre-converted weight cache (written by `python -m gpt_oss.convert`)
+# ---------------------------------------------------------------------------
+
+# 转换后布局变化时递增，使旧缓存自动失效。
+CONVERTED_FORMAT_VERSION = 2
+# 每个 rank 的缓存是一个目录：若干 safetensors 分片加上这个索引；索引最后写入，存在即表示完整。
+CONVERTED_INDEX = "model.safetensors.index.json"
+
+_SAFETENSORS_DTYPES = {
+    "BF16": torch.bfloat16,
+    "F16": torch.float16,
+    "F32": torch.float32,
+    "I32": torch.int32,
+    "I64": torch.int64,
+    "U8": torch.uint8,
+    "I8": torch.int8,
+}
+
+
+def default_converted_cache_dir() -> str:
+    return os.environ.get(
+        "GPT_OSS_CONVERTED_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "gpt-oss", "converted")
+    )
+
+
+def _read_safetensors_header(filename: str) -> bytes:
+    with open(filename, "rb") as f:
+        (header_len,) = struct.unpack("<Q", f.read(8))
+        return f.read(header_len)
+
+
+def checkpoint_fingerprint(path: str) -> str:
+    """Hash of config.json plus every shard's name, size, mtime and safetensors header.
+
+    The header lists each tensor's dtype, shape and byte offsets, so any change to
+    the checkpoint layout or any rewrite of a shard changes the fingerprint
+    without reading the weights.
+    """
+    digest = hashlib.sha256()
+    with open(os.path.join(path, "config.json"), "rb") as f:
+        digest.update(f.read())
+    for fname in sorted(os.listdir(path)):
+        if fname.endswith(".safetensors"):
+            filename = os.path.join(path, fname)
+            digest.update(fname.encode())
+            stat = os.stat(filename)
+            digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+            digest.update(_read_safetensors_header(filename))
+    return digest.hexdigest()
+
+
+def converted_checkpoint_path(
+    path: str, backend: str, world_size: int, rank: int, cache_dir: str | None = None
+) -> str:
+    """The directory where the `backend` weights of `rank` (out of `world_size`) for checkpoint `path` are cached."""
+    key = hashlib.sha256(
+        f"{checkpoint_fingerprint(path)}:{backend}:{world_size}:{CONVERTED_FORMAT_VERSION}".encode()
+    ).hexdigest()[:24]
+    cache_dir = cache_dir or default_converted_cache_dir()
+    return os.path.join(cache_dir, f"{backend}-ws{world_size}-{key}", f"rank-{rank:05d}")
+
+
+def find_converted_checkpoint(
+    path: str, backend: str, world_size: int, rank: int, cache_dir: str | None = None
+) -> str | None:
+    cache_dir = cache_dir or default_converted_cache_dir()
+    if not os.path.isdir(cache_dir):
+        return None
+    directory = converted_checkpoint_path(path, backend, world_size, rank, cache_dir)
+    return directory if os.path.exists(os.path.join(directory, CONVERTED_INDEX)) else None
+
+
+def load_converted_checkpoint(directory: str, device: torch.device) -> dict[str, torch.Tensor]:
+    """Load the converted cache of one rank; on CPU tensors are views of private (copy-on-write) mmaps."""
+    with open(os.path.join(directory, CONVERTED_INDEX), "r") as f:
+        weight_map = json.load(f)["weight_map"]
+    tensors = {}
+    for fname in sorted(set(weight_map.values())):
+        tensors.update(_load_converted_file(os.path.join(directory, fname), device))
+    return tensors
+
+
+def _load_converted_file(filename: str, device: torch.device) -> dict[str, torch.Tensor]:
+    if device.type != "cpu":
+        device_str = device.type if device.index is None else f"{device.type}:{device.index}"
+        with safe_open(filename, framework="pt", device=device_str) as f:
+            return {name: f.get_tensor(name) for name in f.keys()}
+    header = json.loads(_read_safetensors_header(filename))
+    header.pop("__metadata__", None)
+    with open(filename, "rb") as f:
+        # ACCESS_COPY：页面按需从文件读入，写入只影响本进程，不会改动缓存文件。
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    data_start = 8 + len(_read_safetensors_header(filename))
+    tensors = {}
+    for name, info in header.items():
+        begin, end = info["data_offsets"]
+        dtype = _SAFETENSORS_DTYPES[info["dtype"]]
+        if end == begin:
+            tensors[name] = torch.empty(info["shape"], dtype=dtype)
+            continue
+        tensor = torch.frombuffer(buffer, dtype=torch.uint8, count=end - begin, offset=data_start + begin)
+        tensors[name] = tensor.view(dtype).view(info["shape"])
+    return tensors
@@ -4,6 +4,8 @@ This is an expanded version of the Flash Attention v2 implementation (see https:
 which can be found at https://triton-lang.org/main/getting-started/tutorials/06-fused-attention.html.
 
 This version has been extended to support banded attention and learned attention sinks.
+K and V may also be int8 / fp8 with one scale per (token, KV head) (`QuantizedKV`); they are
+dequantized tile by tile as the kernel loads them.
 """
 
 import pytest
@@ -13,6 +15,8 @@ import triton
 import triton.language as tl
 from triton.tools.tensor_descriptor import TensorDescriptor
 
+from gpt_oss.torch.model import KV_CACHE_DTYPES, QuantizedKV, dequantize_kv, quantize_kv
+
 
 
 @triton.jit
@@ -33,6 +37,9 @@ def _attn_fwd(
     BLOCK_M: tl.constexpr,  #
     BLOCK_N: tl.constexpr,  #
     BANDWIDTH: tl.constexpr,
+    K_scale=None,
+    V_scale=None,
+    KV_FP8: tl.constexpr = False,
 ):
     tl.static_assert(BLOCK_N <= HEAD_DIM)
     start_q = tl.load(Start_q).to(tl.int32)
@@ -72,7 +79,14 @@ def _attn_fwd(
             too_old = (start_n + offs_n[None, :]) < (start_q + offs_m[:, None] - BANDWIDTH + 1)
             mask = mask | too_old
 
-        k = K.load([off_z, off_h, start_n, 0]).reshape([BLOCK_N, HEAD_DIM]).T
+        k = K.load([off_z, off_h, start_n, 0]).reshape([BLOCK_N, HEAD_DIM])
+        if K_scale is not None:
+            # Quantized K: per-(token, head) scales, rows [off_hz, start_n:start_n + BLOCK_N].
+            k_scale = tl.load(K_scale + off_hz * N_KV_CTX + start_n + offs_n, mask=start_n + offs_n < N_KV_CTX, other=0.0)
+            if KV_FP8:
+                k = k.to(tl.float8e4nv, bitcast=True)
+            k = (k.to(tl.float32) * k_scale[:, None]).to(q.dtype)
+        k = k.T
         qk = tl.dot(q, k, allow_tf32=False)
 
         qk = qk * qk_scale + tl.where(mask, -1.0e6, 0.0)
@@ -85,6 +99,11 @@ def _attn_fwd(
         acc = acc * alpha[:, None]
 
         v = V.load([off_z, off_h, start_n, 0]).reshape([BLOCK_N, HEAD_DIM])
+        if V_scale is not None:
+            v_scale = tl.load(V_scale + off_hz * N_KV_CTX + start_n + offs_n, mask=start_n + offs_n < N_KV_CTX, other=0.0)
+            if KV_FP8:
+                v = v.to(tl.float8e4nv, bitcast=True)
+            v = (v.to(tl.float32) * v_scale[:, None]).to(q.dtype)
         v = v.to(tl.float32)
         acc = tl.dot(p, v, acc, allow_tf32=False)
 
@@ -105,6 +124,12 @@ class _attention(torch.autograd.Function):
     @staticmethod
     def forward(ctx, q, k, v, sinks, sm_scale, bandwidth, start_q):
         assert len(start_q) == 1
+        k, k_scale = k if isinstance(k, QuantizedKV) else (k, None)
+        v, v_scale = v if isinstance(v, QuantizedKV) else (v, None)
+        kv_fp8 = k.element_size() == 1 and k.is_floating_point()
+        if kv_fp8:
+            # fp8 travels as raw bytes and is bitcast back in the kernel.
+            k, v = k.view(torch.uint8), v.view(torch.uint8)
         bs, n_ctx, n_kv_heads, repeat_kv, HEAD_DIM_Q = q.shape
         bs, n_kv_ctx, n_kv_heads, HEAD_DIM_K = k.shape
         bs, n_kv_ctx, n_kv_heads, HEAD_DIM_V = v.shape
@@ -117,6 +142,12 @@ class _attention(torch.autograd.Function):
         q = q.transpose(1, 2).contiguous()
         k = k.repeat_interleave(repeat_kv, dim=2).transpose(1, 2).contiguous()
         v = v.repeat_interleave(repeat_kv, dim=2).transpose(1, 2).contiguous()
+        if k_scale is not None:
+            # [bs, n_kv_ctx, n_kv_heads, 1] -> [bs, n_heads, n_kv_ctx], like k and v.
+            k_scale, v_scale = (
+                scale[..., 0].repeat_interleave(repeat_kv, dim=2).transpose(1, 2).contiguous()
+                for scale in (k_scale, v_scale)
+            )
 
         BLOCK_M = 64
         BLOCK_N = 64
@@ -148,6 +179,9 @@ class _attention(torch.autograd.Function):
             BANDWIDTH=bandwidth,
             BLOCK_M=BLOCK_M,
             BLOCK_N=BLOCK_N,
+            K_scale=k_scale,
+            V_scale=v_scale,
+            KV_FP8=kv_fp8,
         )
 
         ctx.save_for_backward(q, k, v, sinks, o, M, start_q)
@@ -173,6 +207,10 @@ def attention_ref(
 ):
     batch_size, num_queries, num_key_value_heads, num_key_value_groups, head_dim = query.shape
     batch_size, num_keys, num_key_value_heads, head_dim = key.shape
+    # Quantized K/V: the per-(token, head) scales are applied to the logits and the
+    # attention weights, so no dequantized copy of the cache is made.
+    key, key_scale = key if isinstance(key, QuantizedKV) else (key, None)
+    value, value_scale = value if isinstance(value, QuantizedKV) else (value, None)
 
     sinks = sinks.view(1, num_key_value_heads, num_key_value_groups, 1, 1).float()
     key = key.unsqueeze(3)
@@ -188,6 +226,8 @@ def attention_ref(
         mask.masked_fill_(too_old, float("-inf"))
 
     logits = torch.einsum("bqhmd,bkhmd->bhmqk", query.float(), key.float()) * sm_scale
+    if key_scale is not None:
+        logits = logits * key_scale[..., 0].transpose(1, 2)[:, :, None, None, :]
     logits = logits + mask[None, None, None, :, :]
 
     logits_max = torch.max(logits, dim=-1, keepdim=True).values
@@ -197,6 +237,8 @@ def attention_ref(
     normalizer = unnormalized_scores.sum(dim=-1, keepdim=True) + sinks
     scores = unnormalized_scores / normalizer
 
+    if value_scale is not None:
+        scores = scores * value_scale[..., 0].transpose(1, 2)[:, :, None, None, :]
     output = torch.einsum("bhmqk,bkhmd->bqhmd", scores, value.float())
 
     output = output.reshape(batch_size, num_queries, num_key_value_heads * num_key_value_groups * head_dim).bfloat16()
@@ -227,3 +269,22 @@ def test_eq(batch_size, num_queries, num_keys, num_key_value_heads, num_key_valu
     o2 = attention_ref(q, k, v, sinks, sm_scale, sliding_window, start_q)
 
     torch.testing.assert_close(o1, o2)
+
+
+@pytest.mark.parametrize("kv_dtype", ["int8", "fp8"])
+@pytest.mark.parametrize("num_queries", [1, 128])
+@pytest.mark.parametrize("sliding_window", [None, 128])
+def test_eq_quantized(kv_dtype, num_queries, sliding_window):
+    if kv_dtype not in KV_CACHE_DTYPES:
+        pytest.skip(f"{kv_dtype} is not supported by this torch build")
+    q = torch.randn(1, num_queries, 8, 8, 64).bfloat16().cuda()
+    k = torch.randn(1, 128, 8, 64).bfloat16().cuda()
+    v = torch.randn(1, 128, 8, 64).bfloat16().cuda()
+    sinks = torch.randn(64).bfloat16().cuda()
+    start_q = torch.tensor([128 - num_queries], dtype=torch.int32).cuda()
+    qk, qv = QuantizedKV(*quantize_kv(k, kv_dtype)), QuantizedKV(*quantize_kv(v, kv_dtype))
+    # Reading the quantized values directly matches attention over the dequantized cache.
+    expected = attention_ref(q, dequantize_kv(*qk), dequantize_kv(*qv), sinks, 0.125, sliding_window, start_q)
+    torch.testing.assert_close(attention_ref(q, qk, qv, sinks, 0.125, sliding_window, start_q), expected, atol=2e-2, rtol=2e-2)
+    if num_queries > 1:
+        torch.testing.assert_close(attention(q, qk, qv, sinks, 0.125, sliding_window, start_q), expected, atol=2e-2, rtol=2e-2)
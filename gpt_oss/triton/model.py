@@ -5,8 +5,10 @@ import os
 import torch
 from torch.profiler import record_function
 
-from gpt_oss.torch.model import ModelConfig, RMSNorm
-from gpt_oss.torch.weights import Checkpoint
+from gpt_oss.torch.model import KV_CACHE_DTYPES, ModelConfig, QuantizedKV, RMSNorm, quantize_kv, sample_tokens
+from gpt_oss.torch.router_stats import attach_router_stats
+from gpt_oss.torch.speculative import SpeculativeStats, speculative_generate
+from gpt_oss.torch.weights import Checkpoint, find_converted_checkpoint, load_converted_checkpoint
 from gpt_oss.triton.attention import attention, attention_ref
 from gpt_oss.triton.moe import quantize_mx4, moe
 
@@ -119,39 +121,81 @@ class RotaryEmbedding(torch.nn.Module):
 
 
 class Cache:
-    def __init__(self, batch_size, n_ctx, n_kv_heads, d_head=64, device: torch.device | None = None):
-        self.k = torch.zeros((batch_size, n_ctx, n_kv_heads, d_head), dtype=torch.bfloat16, device=device)
-        self.v = torch.zeros((batch_size, n_ctx, n_kv_heads, d_head), dtype=torch.bfloat16, device=device)
+    """Static KV cache. With `kv_dtype` ("int8" / "fp8") K/V are stored quantized with
+    per-(token, head) scales (see `gpt_oss.torch.model.quantize_kv`) and handed to
+    attention as `QuantizedKV`, which dequantizes them as it reads."""
+
+    def __init__(self, batch_size, n_ctx, n_kv_heads, d_head=64, device: torch.device | None = None, kv_dtype: str | None = None):
+        self.kv_dtype = kv_dtype
+        dtype = KV_CACHE_DTYPES[kv_dtype][0] if kv_dtype else torch.bfloat16
+        self.k = torch.zeros((batch_size, n_ctx, n_kv_heads, d_head), dtype=dtype, device=device)
+        self.v = torch.zeros((batch_size, n_ctx, n_kv_heads, d_head), dtype=dtype, device=device)
+        if kv_dtype:
+            self.k_scale = torch.zeros((batch_size, n_ctx, n_kv_heads, 1), dtype=torch.float32, device=device)
+            self.v_scale = torch.zeros((batch_size, n_ctx, n_kv_heads, 1), dtype=torch.float32, device=device)
         self.offset = torch.zeros((1,), dtype=torch.long, device=device)
 
+    def _buffers(self):
+        if self.kv_dtype:
+            # Quantized values are handled as raw bytes so that fp8 works with every copy kernel.
+            return [self.k.view(torch.uint8), self.v.view(torch.uint8), self.k_scale, self.v_scale]
+        return [self.k, self.v]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(t.numel() * t.element_size() for t in self._buffers())
+
     def reset(self):
-        self.k.zero_()
-        self.v.zero_()
+        for t in self._buffers():
+            t.zero_()
         self.offset.zero_()
 
-    def repeat_interleave(self, n):
-        """Repeat each cache entry n times along the batch dimension."""
-        self.k = self.k.repeat_interleave(n, dim=0)
-        self.v = self.v.repeat_interleave(n, dim=0)
+    def fork(self, n: int, n_ctx: int) -> "Cache":
+        """A new cache of n sequences of `n_ctx` tokens, each starting with the tokens of this batch-1 cache.
+
+        The attention kernel reads one contiguous K/V buffer per sequence, so the
+        prefix is copied into each row; `n_ctx` should cover only the prefix and
+        the tokens still to be generated.
+        """
+        batch_size, _, n_kv_heads, d_head = self.k.shape
+        assert batch_size == 1, "only a single sequence can be forked"
+        prefix_len = int(self.offset.item())
+        assert prefix_len <= n_ctx
+        forked = Cache(n, n_ctx, n_kv_heads, d_head, device=self.k.device, kv_dtype=self.kv_dtype)
+        for dst, src in zip(forked._buffers(), self._buffers()):
+            dst[:, :prefix_len].copy_(src[:, :prefix_len])
+        forked.offset.copy_(self.offset)
+        return forked
+
+    def _read(self):
+        if self.kv_dtype:
+            return QuantizedKV(self.k, self.k_scale), QuantizedKV(self.v, self.v_scale)
+        return self.k, self.v
 
     def truncate(self, n_ctx):
         """Truncate the cache to the first n_ctx tokens."""
         batch_size, _, n_kv_heads, d_head = self.k.shape
         assert batch_size == self.v.shape[0]
         assert n_ctx <= self.k.shape[1]
-        self.k[:, n_ctx:, :, :].zero_()
-        self.v[:, n_ctx:, :, :].zero_()
+        for t in self._buffers():
+            t[:, n_ctx:].zero_()
         self.offset.fill_(n_ctx)
-        return self.k, self.v
+        return self._read()
 
     def extend(self, k, v):
         batch_size, n_ctx, *_rest = k.shape
         assert batch_size == self.k.shape[0]
         indices = torch.arange(0, n_ctx, device=k.device, dtype=torch.long) + self.offset
-        self.k.index_copy_(1, indices, k)
-        self.v.index_copy_(1, indices, v)
+        if self.kv_dtype:
+            k, k_scale = quantize_kv(k, self.kv_dtype)
+            v, v_scale = quantize_kv(v, self.kv_dtype)
+            for buffer, new in zip(self._buffers(), (k.view(torch.uint8), v.view(torch.uint8), k_scale, v_scale)):
+                buffer.index_copy_(1, indices, new)
+        else:
+            self.k.index_copy_(1, indices, k)
+            self.v.index_copy_(1, indices, v)
         self.offset.add_(n_ctx)
-        return self.k, self.v
+        return self._read()
 
 
 class AttentionBlock(torch.nn.Module):
@@ -337,6 +381,8 @@ class MLPBlock(torch.nn.Module):
                 dtype=torch.bfloat16,
             )
         )
+        # Optional routing statistics hook, see gpt_oss.torch.router_stats.
+        self.record_routing = None
 
     @record_function("mlp")
     def forward(self, x: torch.Tensor) -> torch.Tensor:
@@ -355,6 +401,7 @@ class MLPBlock(torch.nn.Module):
             experts_per_token=self.experts_per_token,
             num_experts=self.num_experts,
             swiglu_limit=self.swiglu_limit,
+            record_routing=self.record_routing,
         )
         t = t.view(batch_size, n_ctx, dim)
 
@@ -418,9 +465,28 @@ class Transformer(torch.nn.Module):
             x = self.unembedding(x)
         return x.float()
 
+    def prefill(self, x: torch.Tensor, caches: list[Cache], chunk_size: int | None = None) -> torch.Tensor:
+        """Append prompt `x` ([B, T]) to `caches` in chunks of at most `chunk_size` tokens.
+
+        Bounds activation memory for long prompts; returns the float logits of the last position ([B, vocab]).
+        """
+        n_tokens = x.shape[1]
+        chunk_size = chunk_size or n_tokens
+        for start in range(0, n_tokens, chunk_size):
+            with record_function("embedding"):
+                h = self.embedding(x[:, start : start + chunk_size])
+            for block, cache in zip(self.block, caches):
+                with record_function("block"):
+                    h = block(h, cache=cache)
+        # Only the last position needs logits.
+        with record_function("norm_f"):
+            h = self.norm(h[:, -1:])
+        with record_function("unembedding"):
+            return self.unembedding(h)[:, -1].float()
+
     @staticmethod
     def from_checkpoint(
-        path: str, config: ModelConfig | None = None, device: str | torch.device = "cuda",
+        path: str, config: ModelConfig | None = None, device: str | torch.device = "cuda", cache_dir: str | None = None,
     ) -> "Transformer":
         if not isinstance(device, torch.device):
             device = torch.device(device)
@@ -434,46 +500,76 @@ class Transformer(torch.nn.Module):
         model = Transformer(config=config, device=device)
         model.eval()
 
-        checkpoint = Checkpoint(path, device)
+        # Weights pre-converted by `python -m gpt_oss.convert --backend triton` skip
+        # MXFP4 decode, re-quantization and transposes entirely.
+        converted = find_converted_checkpoint(path, "triton", 1, 0, cache_dir)
+        if converted is not None:
+            tensors = load_converted_checkpoint(converted, device).items()
+        else:
+            tensors = model.iter_converted_tensors(path, device)
+        for name, loaded_tensor in tensors:
+            model._load_converted_tensor(name, loaded_tensor)
 
-        for name, param in model.named_parameters():
-            torch.cuda.empty_cache()
-            loaded_tensor = checkpoint.get(name)
+        # NOTE: Required to avoid OOM errors
+        torch.cuda.empty_cache()
+        return model
 
-            if "mlp1" in name:
-                if "weight" in name:
-                    loaded_tensor, scales = quantize_mx4(loaded_tensor.mT.contiguous())
-                    _, block_index, _, _ = name.split(".")
-                    model.block[int(block_index)].mlp.mlp1_weight_mx = scales
-                    param.data.copy_(loaded_tensor.storage.data)
-                else:
-                    param.data.copy_(loaded_tensor)
+    def _load_converted_tensor(self, name: str, loaded_tensor: torch.Tensor):
+        if name.endswith("_weight_mx"):
+            # MX scales live in a triton_kernels tensor wrapper, not in a Parameter.
+            _, block_index, _, attr = name.split(".")
+            getattr(self.block[int(block_index)].mlp, attr).storage.data.copy_(loaded_tensor)
+        else:
+            self.get_parameter(name).data.copy_(loaded_tensor)
 
-            elif "mlp2_weight" in name:
-                loaded_tensor, scales = quantize_mx4(loaded_tensor.mT.contiguous())
-                _, block_index, _, _ = name.split(".")
-                model.block[int(block_index)].mlp.mlp2_weight_mx = scales
-                param.data.copy_(loaded_tensor.storage.data)
+    def iter_converted_tensors(self, path: str, device: torch.device):
+        """Yield (name, tensor) pairs from checkpoint `path` in the layout this model uses at runtime.
 
-            elif "gate" in name and loaded_tensor.ndim == 2:
-                loaded_tensor = loaded_tensor.mT.contiguous()
-                param.data.copy_(loaded_tensor)
+        MoE weights are re-quantized with `quantize_mx4`; their scales are yielded
+        under `block.{n}.mlp.mlp{1,2}_weight_mx`.
+        """
+        model_names = [name for name, _ in self.named_parameters()]
+        with Checkpoint(path, device) as checkpoint:
+            for name, loaded_tensor in checkpoint.get_many(model_names):
+                torch.cuda.empty_cache()
 
-            else:
-                param.data.copy_(loaded_tensor)
+                if "mlp1_weight" in name or "mlp2_weight" in name:
+                    loaded_tensor, scales = quantize_mx4(loaded_tensor.mT.contiguous())
+                    yield name, loaded_tensor.storage.data
+                    yield f"{name}_mx", scales.storage.data
 
-        # NOTE: Required to avoid OOM errors
-        torch.cuda.empty_cache()
-        return model
+                elif "gate" in name and loaded_tensor.ndim == 2:
+                    yield name, loaded_tensor.mT.contiguous()
+
+                else:
+                    yield name, loaded_tensor
 
 
 class TokenGenerator:
     @torch.inference_mode()
-    def __init__(self, checkpoint: str, context: int, device: torch.device):
+    def __init__(
+        self,
+        checkpoint: str,
+        context: int,
+        device: torch.device,
+        router_stats: bool = False,
+        prefill_chunk_size: int | None = None,
+        kv_cache_dtype: str | None = None,
+    ):
         self.device = device
+        # Long prompts are prefilled in chunks of this many tokens (None: all at once).
+        self.prefill_chunk_size = prefill_chunk_size
         self.model = Transformer.from_checkpoint(checkpoint, device=self.device)
-        self.caches = [Cache(1, context, self.model.config.num_key_value_heads, device=self.device) for _ in range(len(self.model.block))]
+        # Routing statistics must be attached before the graph capture below to be recorded on replay.
+        self.router_stats = attach_router_stats(self.model) if router_stats else None
+        # Optional int8 / fp8 KV cache storage.
+        self.kv_cache_dtype = kv_cache_dtype
+        self.caches = [
+            Cache(1, context, self.model.config.num_key_value_heads, device=self.device, kv_dtype=kv_cache_dtype)
+            for _ in range(len(self.model.block))
+        ]
         self.input_token = torch.zeros(1, dtype=torch.int32, device=self.device)
+        self.speculative_stats = SpeculativeStats()
         # warmup
         self.model(self.input_token[None, :], caches=self.caches)
         # capture for sampling
@@ -487,12 +583,33 @@ class TokenGenerator:
                  stop_tokens: list[int] | None = None,
                  temperature: float = 1.0,
                  max_tokens: int = 0,
-                 return_logprobs: bool = False):
+                 return_logprobs: bool = False,
+                 n: int = 1,
+                 drafter=None):
         stop_tokens = stop_tokens or []
+        if n > 1:
+            yield from self._generate_n(prompt_tokens, stop_tokens, temperature, max_tokens, return_logprobs, n)
+            return
         for cache in self.caches:
             cache.reset()
+        if drafter is not None:
+            # Verification feeds several tokens per step, so it runs eagerly rather
+            # than through the single-token CUDA graph.
+            yield from speculative_generate(
+                self.model,
+                self.caches,
+                prompt_tokens,
+                drafter,
+                stop_tokens,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                return_logprobs=return_logprobs,
+                stats=self.speculative_stats,
+            )
+            return
         prompt_tokens = torch.as_tensor(prompt_tokens, dtype=torch.int32, device=self.device)
-        self.model(prompt_tokens[None, :-1], self.caches)
+        if len(prompt_tokens) > 1:
+            self.model.prefill(prompt_tokens[None, :-1], self.caches, chunk_size=self.prefill_chunk_size)
         predicted_token = prompt_tokens[-1]
         num_generated_tokens = 0
         while max_tokens == 0 or num_generated_tokens < max_tokens:
@@ -514,3 +631,41 @@ class TokenGenerator:
 
             if predicted_token in stop_tokens:
                 break
+
+    def _generate_n(self, prompt_tokens, stop_tokens, temperature, max_tokens, return_logprobs, n):
+        """Prefill the prompt once, then decode n sampled continuations as one batch.
+
+        The prompt is prefilled into `self.caches`. The captured CUDA graph is
+        specialized to batch size 1, so the batched decode runs eagerly on caches
+        forked from them, sized to the prompt plus `max_tokens` (the full context
+        only when `max_tokens` is 0). Yields a list of n tokens (or
+        `(token, logprob)` pairs) per step, with `None` for finished sequences.
+        """
+        for cache in self.caches:
+            cache.reset()
+        prompt_tokens = torch.as_tensor(prompt_tokens, dtype=torch.int32, device=self.device)
+        logits = self.model.prefill(prompt_tokens[None, :], self.caches, chunk_size=self.prefill_chunk_size)
+        context = self.caches[0].k.shape[1]
+        n_ctx = min(len(prompt_tokens) + max_tokens, context) if max_tokens > 0 else context
+        caches = [cache.fork(n, n_ctx) for cache in self.caches]
+        logits = logits.expand(n, -1)
+
+        finished = [False] * n
+        num_generated_tokens = 0
+        while max_tokens == 0 or num_generated_tokens < max_tokens:
+            if num_generated_tokens > 0:
+                logits = self.model(predicted[:, None].to(torch.int32), caches)[:, -1]
+            predicted = sample_tokens(logits, temperature)
+            num_generated_tokens += 1
+            tokens = predicted.tolist()
+            if return_logprobs:
+                logprobs = torch.log_softmax(logits, dim=-1)
+                selected = logprobs.gather(-1, predicted[:, None])[:, 0].tolist()
+                tokens_out = [(t, lp) for t, lp in zip(tokens, selected)]
+            else:
+                tokens_out = list(tokens)
+            yield [None if done else out for done, out in zip(finished, tokens_out)]
+
+            finished = [done or t in stop_tokens for done, t in zip(finished, tokens)]
+            if all(finished):
+                break
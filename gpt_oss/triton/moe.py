@@ -31,7 +31,7 @@ def swiglu(x, alpha: float = 1.702, limit: float = 7.0, interleaved: bool = True
     return out_glu * (x_linear + 1)
 
 
-def moe(x, wg, w1, w1_mx, w2, w2_mx, bg, b1, b2, experts_per_token=4, num_experts=128, swiglu_limit=7.0, fused_act=True, interleaved=True):
+def moe(x, wg, w1, w1_mx, w2, w2_mx, bg, b1, b2, experts_per_token=4, num_experts=128, swiglu_limit=7.0, fused_act=True, interleaved=True, record_routing=None):
     if x.numel() == 0:
         return x
 
@@ -41,6 +41,10 @@ def moe(x, wg, w1, w1_mx, w2, w2_mx, bg, b1, b2, experts_per_token=4, num_expert
 
     with record_function("wg"):
         logits = matmul_ogs(x, wg, bg, precision_config=pcg)
+    if record_routing is not None:
+        # Opt-in statistics (gpt_oss.torch.router_stats): on-device updates only, safe to graph-capture.
+        with record_function("record_routing"):
+            record_routing(logits)
     with record_function("routing"):
         rdata, gather_indx, scatter_indx = routing(logits, experts_per_token, simulated_ep=1)
 
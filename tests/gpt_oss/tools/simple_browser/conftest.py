@@ -0,0 +1,137 @@
+import asyncio
+import string
+from collections import Counter
+
+import chz
+import pytest
+import tiktoken
+
+from gpt_oss.tools.simple_browser import simple_browser_tool
+from gpt_oss.tools.simple_browser.backend import Backend, BackendError
+from gpt_oss.tools.simple_browser.page_contents import PageContents
+from gpt_oss.tools.simple_browser.token_lengths import vocabulary_lengths
+
+GPT2_PATTERN = r"""'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+"""
+
+
+class FakeUpstream:
+    """What `FakeBackend` serves, and a record of what it was asked for.
+
+    A search for `query` returns "results for {query}" with links to `results`
+    and, for the query "fail", raises `BackendError` after `search_delay`
+    seconds. Fetches of URLs in `gates` wait until their event is set, and a URL
+    fails as many times as `failures` says.
+    """
+
+    def __init__(self):
+        self.results: list[str] = []
+        self.search_delay = 0.0
+        self.searches: Counter = Counter()
+        self.fetches: Counter = Counter()
+        self.gates: dict[str, asyncio.Event] = {}
+        self.failures: Counter = Counter()
+        # The URLs of each `fetch_many` call.
+        self.batches: list[list[str]] = []
+
+
+@chz.chz(typecheck=True)
+class FakeBackend(Backend):
+    """Backend that serves a numbered version of every URL from a `FakeUpstream`."""
+
+    source: str = chz.field(doc="Description of the backend source", default="web")
+    upstream: FakeUpstream = chz.field(doc="Pages and request counts", default_factory=FakeUpstream)
+
+    async def search(self, query, topn, session) -> PageContents:
+        upstream = self.upstream
+        upstream.searches[query] += 1
+        await asyncio.sleep(upstream.search_delay)
+        if query == "fail":
+            raise BackendError("upstream error")
+        links = [f"【{i}†Result {i}】" for i in range(len(upstream.results))]
+        return PageContents(
+            url="",
+            text="\n".join([f"results for {query}", *links]),
+            title=query,
+            urls={str(i): url for i, url in enumerate(upstream.results)},
+        )
+
+    async def fetch(self, url, session) -> PageContents:
+        upstream = self.upstream
+        upstream.fetches[url] += 1
+        if url in upstream.gates:
+            await upstream.gates[url].wait()
+        if upstream.failures[url] > 0:
+            upstream.failures[url] -= 1
+            raise RuntimeError("upstream error")
+        return PageContents(url=url, text=f"{url} fetch {upstream.fetches[url]}", title=url, urls={})
+
+    async def fetch_many(self, urls, session) -> list[PageContents | Exception]:
+        self.upstream.batches.append(list(urls))
+        return await super().fetch_many(urls, session)
+
+
+@pytest.fixture
+def upstream() -> FakeUpstream:
+    return FakeUpstream()
+
+
+@pytest.fixture
+def backend(upstream) -> FakeBackend:
+    return FakeBackend(upstream=upstream)
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+def _letter_pairs_encoding() -> tiktoken.Encoding:
+    """A byte-level BPE with merges of letter pairs."""
+    ranks = {bytes([i]): i for i in range(256)}
+    for a in string.ascii_lowercase:
+        ranks[f" {a}".encode()] = len(ranks)
+        for b in string.ascii_lowercase:
+            ranks[f"{a}{b}".encode()] = len(ranks)
+    return tiktoken.Encoding(
+        name="test_letter_pairs", pat_str=GPT2_PATTERN, mergeable_ranks=ranks, special_tokens={}
+    )
+
+
+def _small_encoding() -> tiktoken.Encoding:
+    """A byte-level BPE with a few merges, a multi-byte token and a gap before its special token."""
+    ranks = {bytes([i]): i for i in range(256)}
+    for token in [b"ab", b"abc", b" ab", "é".encode(), "【".encode()[:2]]:
+        ranks[token] = len(ranks)
+    return tiktoken.Encoding(
+        name="test_small",
+        pat_str=r"""\s?\S+|\s+""",
+        mergeable_ranks=ranks,
+        special_tokens={"<|end|>": 300},
+    )
+
+
+ENCODINGS = {"test_letter_pairs": _letter_pairs_encoding, "test_small": _small_encoding}
+
+
+@pytest.fixture
+def small_encoding(request, monkeypatch, tmp_path) -> tiktoken.Encoding:
+    """An encoding from `ENCODINGS` (letter pairs unless parametrized); o200k_base is not needed offline.
+
+    Every `tiktoken.get_encoding` returns it, and token length tables are saved in `tmp_path`.
+    """
+    encoding = ENCODINGS[getattr(request, "param", "test_letter_pairs")]()
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: encoding)
+    monkeypatch.setenv("BROWSER_TOKEN_LENGTHS_DIR", str(tmp_path))
+    vocabulary_lengths.cache_clear()
+    simple_browser_tool.max_chars_per_token.cache_clear()
+    yield encoding
+    vocabulary_lengths.cache_clear()
+    simple_browser_tool.max_chars_per_token.cache_clear()
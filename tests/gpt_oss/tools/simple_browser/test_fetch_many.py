@@ -0,0 +1,161 @@
+import pytest
+import pytest_asyncio
+from aiohttp import ClientSession, web
+from aiohttp.test_utils import TestServer
+
+from gpt_oss.tools.simple_browser import ExaBackend, PageCache, SimpleBrowserTool, YouComBackend
+from gpt_oss.tools.simple_browser.backend import BackendError
+
+
+class MockContentsServer:
+    """Local stand-in for the Exa and You.com contents APIs that records every request.
+
+    URLs containing "missing" get no result, "error" an error status (Exa) and
+    "nohtml" a result without HTML (You.com). Results come back in reverse order.
+    """
+
+    def __init__(self):
+        self.requests: list[list[str]] = []
+        self.status = 200
+        self.app = web.Application()
+        self.app.router.add_post("/search", self.search)
+        self.app.router.add_post("/contents", self.exa_contents)
+        self.app.router.add_post("/v1/contents", self.youcom_contents)
+
+    async def search(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "results": [
+                {"title": f"Result {i}", "url": f"https://example.com/{i}", "summary": "summary"}
+                for i in range(4)
+            ]
+        })
+
+    async def _urls(self, request: web.Request) -> list[str]:
+        urls = (await request.json())["urls"]
+        self.requests.append(urls)
+        return urls
+
+    async def exa_contents(self, request: web.Request) -> web.Response:
+        urls = await self._urls(request)
+        if self.status != 200:
+            return web.Response(status=self.status, text="upstream down")
+        results = [
+            {"id": url, "url": url, "title": f"Title {url}", "text": f"<p>Text of {url}</p>"}
+            for url in urls
+            if "missing" not in url and "error" not in url
+        ]
+        statuses = [
+            {"id": url, "status": "error", "error": {"tag": "CRAWL_NOT_FOUND", "httpStatusCode": 404}}
+            for url in urls
+            if "error" in url
+        ]
+        return web.json_response({"results": results[::-1], "statuses": statuses})
+
+    async def youcom_contents(self, request: web.Request) -> web.Response:
+        urls = await self._urls(request)
+        results = [
+            {"url": url, "title": f"Title {url}"} | ({} if "nohtml" in url else {"html": f"<p>Text of {url}</p>"})
+            for url in urls
+            if "missing" not in url
+        ]
+        return web.json_response(results[::-1])
+
+
+@pytest_asyncio.fixture
+async def mock_server(monkeypatch):
+    monkeypatch.setenv("EXA_API_KEY", "test_api_key")
+    monkeypatch.setenv("YDC_API_KEY", "test_api_key")
+    server = MockContentsServer()
+    async with TestServer(server.app) as test_server:
+        server.base_url = str(test_server.make_url("")).rstrip("/")
+        yield server
+
+
+@pytest.mark.asyncio
+async def test_exa_fetch_many_batches_urls(mock_server):
+    backend = ExaBackend(source="web", BASE_URL=mock_server.base_url)
+    urls = [
+        "https://example.com/a",
+        "https://example.com/b",
+        "view-source:https://example.com/a",
+        "https://example.com/missing",
+        "https://example.com/error",
+    ]
+    async with ClientSession() as session:
+        pages = await backend.fetch_many(urls, session=session)
+
+    # One upstream call for the distinct URLs.
+    assert mock_server.requests == [
+        ["https://example.com/a", "https://example.com/b", "https://example.com/missing", "https://example.com/error"]
+    ]
+    assert [page.url for page in pages[:3]] == ["https://example.com/a", "https://example.com/b", "https://example.com/a"]
+    assert pages[1].title == "Title https://example.com/b"
+    assert pages[1].text == "\nURL: https://example.com/b\nText of https://example.com/b"
+    assert isinstance(pages[3], BackendError)
+    assert str(pages[3]) == "No contents returned for https://example.com/missing"
+    assert isinstance(pages[4], BackendError)
+    assert str(pages[4]) == "Error fetching https://example.com/error: CRAWL_NOT_FOUND"
+
+    # `fetch` is a batch of one.
+    async with ClientSession() as session:
+        page = await backend.fetch("https://example.com/c", session=session)
+        with pytest.raises(BackendError, match="No contents returned"):
+            await backend.fetch("https://example.com/missing", session=session)
+    assert page.title == "Title https://example.com/c"
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_fails_every_url(mock_server):
+    mock_server.status = 500
+    backend = ExaBackend(source="web", BASE_URL=mock_server.base_url)
+    async with ClientSession() as session:
+        pages = await backend.fetch_many(["https://example.com/a", "https://example.com/b"], session=session)
+    assert len(mock_server.requests) == 1
+    assert all(isinstance(page, BackendError) and "error 500" in str(page) for page in pages)
+
+
+@pytest.mark.asyncio
+async def test_youcom_fetch_many(mock_server):
+    backend = YouComBackend(source="web", BASE_URL=mock_server.base_url)
+    urls = ["https://example.com/a", "https://example.com/nohtml", "https://example.com/missing"]
+    async with ClientSession() as session:
+        pages = await backend.fetch_many(urls, session=session)
+    assert mock_server.requests == [urls]
+    assert pages[0].text == "\nURL: https://example.com/a\nText of https://example.com/a"
+    assert str(pages[1]) == "No HTML returned for https://example.com/nohtml"
+    assert str(pages[2]) == "No contents returned for https://example.com/missing"
+
+
+@pytest.mark.asyncio
+async def test_open_many_uses_one_batch(mock_server):
+    backend = ExaBackend(source="web", BASE_URL=mock_server.base_url)
+    page_cache = PageCache()
+    tool = SimpleBrowserTool(backend=backend, page_cache=page_cache)
+    async for _ in tool.search(query="q"):
+        pass
+    search_cursor = tool.tool_state.current_cursor
+
+    messages = [msg async for msg in tool.open(id=[0, 2, "https://example.com/missing"])]
+    assert mock_server.requests == [["https://example.com/0", "https://example.com/2", "https://example.com/missing"]]
+    assert len(messages) == 3
+    assert messages[0].content[0].text.startswith("[1] Title https://example.com/0")
+    assert messages[1].content[0].text.startswith("[2] Title https://example.com/2")
+    assert messages[2].content[0].text == (
+        "Error fetching URL `https://example.com/missing`: No contents returned for https://example.com/missing"
+    )
+    assert tool.tool_state.get_page().url == "https://example.com/2"
+
+    # Pages already in the shared cache are not fetched again.
+    other = SimpleBrowserTool(backend=backend, page_cache=page_cache)
+    async for _ in other.search(query="q"):
+        pass
+    messages = [msg async for msg in other.open(id=[2, 3], cursor=search_cursor)]
+    assert mock_server.requests[1:] == [["https://example.com/3"]]
+    assert [msg.content[0].text.split(" (")[0] for msg in messages] == [
+        "[1] Title https://example.com/2",
+        "[2] Title https://example.com/3",
+    ]
+    assert page_cache.stats.hits == 1
+
+    messages = [msg async for msg in tool.open(id=[9])]
+    assert messages[0].content[0].text == "Invalid link id `9`."
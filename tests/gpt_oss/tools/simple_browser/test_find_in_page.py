@@ -0,0 +1,135 @@
+import asyncio
+import pathlib
+
+import pytest
+
+from gpt_oss.tools.simple_browser import HTMLProcessor
+from gpt_oss.tools.simple_browser.page_contents import PageContents
+from gpt_oss.tools.simple_browser.simple_browser_tool import (
+    ToolUsageError,
+    join_lines,
+    run_find_in_page,
+    strip_links,
+    wrap_lines,
+)
+
+FIXTURES = pathlib.Path(__file__).parent / "fixtures"
+
+
+def scan_find(pattern: str, page: PageContents, max_results: int = 50, num_show_lines: int = 4):
+    """The previous line scan: (line, snippet) of each result."""
+    lines = strip_links(join_lines(wrap_lines(page.text))).split("\n")
+    results = []
+    line_idx = 0
+    while line_idx < len(lines) and len(results) < max_results:
+        if pattern not in lines[line_idx].lower():
+            line_idx += 1
+            continue
+        results.append((line_idx, "\n".join(lines[line_idx : line_idx + num_show_lines])))
+        line_idx += num_show_lines
+    return results
+
+
+def find(pattern, page, **kwargs):
+    result = asyncio.run(run_find_in_page(pattern, page, **kwargs))
+    return [(snippet.line_idx, snippet.text) for snippet in result.snippets.values()]
+
+
+def load_pages() -> list[PageContents]:
+    return [PageContents.model_validate_json(path.read_text()) for path in sorted(FIXTURES.glob("*.json"))]
+
+
+@pytest.mark.parametrize("pattern", ["the", "a", "", "cache", "【", "link", "é", "\n", "zzz", "2", " "])
+def test_literal_find_matches_line_scan(pattern):
+    for page in load_pages():
+        for max_results in (1, 3, 50):
+            assert find(pattern, page, max_results=max_results) == scan_find(pattern, page, max_results), page.url
+
+
+def test_find_page_format():
+    page = PageContents(
+        url="https://example.com/a",
+        title="A",
+        text="First line\nsecond 【0†Link text†example.com】 line\nthird\nfourth\nfifth LINK\nsixth",
+        urls={"0": "https://example.com/b"},
+    )
+    result = asyncio.run(run_find_in_page("link", page, num_show_lines=2))
+    assert result.url == "https://example.com/a/find?pattern=link"
+    assert result.title == "Find results for text: `link` in `A`"
+    assert result.text == (
+        "# 【0†match at L1】\nsecond Link text line\nthird\n\n"
+        "# 【1†match at L4】\nfifth LINK\nsixth"
+    )
+    assert result.urls == {"0": page.url, "1": page.url}
+
+    empty = asyncio.run(run_find_in_page("missing", page))
+    assert empty.text == "No `find` results for pattern: `missing`"
+    assert empty.snippets == {}
+
+
+def test_regex_and_whole_word():
+    page = PageContents(
+        url="https://example.com",
+        title="t",
+        text="cat\ncatalog\nthe Cat sat\nconcat\nCAT-5 cable\nversion 3.11\nversion 3x11",
+        urls={},
+    )
+    kwargs = dict(num_show_lines=1)
+    assert [line for line, _ in find("cat", page, **kwargs)] == [0, 1, 2, 3, 4]
+    assert [line for line, _ in find("cat", page, whole_word=True, **kwargs)] == [0, 2, 4]
+    assert [line for line, _ in find(r"^c\w+t", page, regex=True, **kwargs)] == [0, 1, 3, 4]
+    assert [line for line, _ in find(r"3\.11", page, regex=True, **kwargs)] == [5]
+    assert [line for line, _ in find("3.11", page, **kwargs)] == [5]
+    assert [line for line, _ in find("cat|sat", page, regex=True, whole_word=True, **kwargs)] == [0, 2, 4]
+    # Matches do not span lines.
+    assert find(r"cat\s+catalog", page, regex=True, **kwargs) == []
+    with pytest.raises(ToolUsageError, match="Invalid regular expression"):
+        find("cat(", page, regex=True)
+
+
+def test_multiple_patterns_are_ranked():
+    page = PageContents(
+        url="https://example.com",
+        title="t",
+        text="apple\nbanana\napple banana\ncherry\nbanana cherry apple\ndate",
+        urls={},
+    )
+    assert find(["apple", "banana", "cherry"], page, num_show_lines=1) == [
+        (4, "banana cherry apple"),
+        (2, "apple banana"),
+        (0, "apple"),
+        (1, "banana"),
+        (3, "cherry"),
+    ]
+    # A window counts the patterns of all the lines it shows.
+    assert [line for line, _ in find(["date", "apple"], page, num_show_lines=2)] == [4, 0, 2]
+    result = asyncio.run(run_find_in_page(["Apple", "date"], page))
+    assert result.url == "https://example.com/find?pattern=apple&pattern=date"
+    assert result.title == "Find results for text: `apple | date` in `t`"
+
+
+def test_runaway_regex_times_out_off_the_event_loop():
+    page = PageContents(url="https://example.com", title="t", text="a" * 40 + "b\nabc", urls={})
+    processor = HTMLProcessor(max_workers=1, timeout=2.0)
+    try:
+        with pytest.raises(ToolUsageError, match="took longer than 2.0s"):
+            find(r"(a+)+$", page, regex=True, processor=processor)
+        # The stuck worker was replaced.
+        assert [line for line, _ in find("b+c", page, regex=True, processor=processor)] == [1]
+        assert processor.uses_processes
+    finally:
+        processor.close()
+
+
+def test_regex_find_sends_only_the_search_text_to_the_worker():
+    page = PageContents(url="https://example.com", title="t", text="apple\nbanana\ncherry", urls={})
+    calls = []
+
+    class RecordingProcessor(HTMLProcessor):
+        async def run(self, call):
+            calls.append(call)
+            return call()
+
+    assert [line for line, _ in find("an+a", page, regex=True, processor=RecordingProcessor())] == [1]
+    (call,) = calls
+    assert call.args[:2] == ("apple\nbanana\ncherry", [0, 6, 13, 20])
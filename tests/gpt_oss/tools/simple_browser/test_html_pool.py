@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+import pytest
+
+from gpt_oss.tools.simple_browser import HTMLProcessor, html_pool
+from gpt_oss.tools.simple_browser.html_pool import HTMLProcessingError
+from gpt_oss.tools.simple_browser.page_contents import process_html
+
+URL = "https://example.com/article"
+
+
+def _large_html(paragraphs: int = 2000) -> str:
+    body = "".join(
+        f'<p>Paragraph {i} with a <a href="/page/{i}">link {i}</a> and x<sup>2</sup>.</p>'
+        for i in range(paragraphs)
+    )
+    return f"<html><head><title>Big page</title></head><body>{body}</body></html>"
+
+
+@pytest.fixture
+def thread_processor():
+    processor = HTMLProcessor(max_workers=2, use_processes=False)
+    yield processor
+    processor.close()
+
+
+@pytest.mark.asyncio
+async def test_process_pool_matches_inline():
+    html = _large_html()
+    processor = HTMLProcessor(max_workers=1)
+    try:
+        page = await processor.process(html, URL, None, display_urls=True)
+        assert processor.uses_processes
+    finally:
+        processor.close()
+    assert page == process_html(html, URL, None, display_urls=True)
+    assert page.title == "Big page" and "Paragraph 1999" in page.text
+
+
+@pytest.mark.asyncio
+async def test_thread_pool_matches_inline(thread_processor):
+    html = _large_html()
+    page = await thread_processor.process(html, URL, "Title")
+    assert page == process_html(html, URL, "Title")
+    assert not thread_processor.uses_processes
+
+
+@pytest.mark.asyncio
+async def test_small_pages_are_processed_inline():
+    processor = HTMLProcessor(max_workers=1)
+    page = await processor.process("<p>hello <b>world</b></p>", URL, "Small")
+    # No worker was started for a page below `inline_bytes`.
+    assert processor._workers is None
+    assert page.text == "hello world"
+
+
+@pytest.mark.asyncio
+async def test_oversized_html_is_truncated(thread_processor):
+    html = _large_html()
+    thread_processor.max_html_bytes = len(html) // 2
+    page = await thread_processor.process(html, URL, None)
+    assert "Paragraph 0 " in page.text and "Paragraph 1999" not in page.text
+
+
+@pytest.mark.asyncio
+async def test_html_is_capped_in_utf8_bytes(thread_processor):
+    # 31 bytes keep "<p>" and 9 three-byte characters; the character cut in half is dropped.
+    thread_processor.max_html_bytes = 31
+    page = await thread_processor.process("<p>" + "语" * 40 + "</p>", URL, None)
+    assert page.text == "语" * 9
+
+
+@pytest.mark.asyncio
+async def test_timeout_raises(thread_processor):
+    thread_processor.timeout = 1e-4
+    with pytest.raises(HTMLProcessingError):
+        await thread_processor.process(_large_html(), URL, None)
+
+
+@pytest.mark.asyncio
+async def test_timeout_starts_when_the_page_runs(thread_processor, monkeypatch):
+    def process_html_slowly(html, url, *args):
+        if "slow" in url:
+            time.sleep(0.6)
+        return process_html(html, url, *args)
+
+    monkeypatch.setattr(html_pool, "process_html", process_html_slowly)
+    thread_processor.max_workers = 1
+    thread_processor.timeout = 0.3
+    html = _large_html()
+    slow, queued = await asyncio.gather(
+        thread_processor.process(html, URL + "/slow", None),
+        thread_processor.process(html, URL, None),
+        return_exceptions=True,
+    )
+    assert isinstance(slow, HTMLProcessingError)
+    # The second page waited for the stuck thread to finish, but was not timed while waiting.
+    assert queued == process_html(html, URL, None)
+
+
+@pytest.mark.asyncio
+async def test_timeout_kills_only_the_stuck_worker():
+    html = _large_html()
+    processor = HTMLProcessor(max_workers=2)
+    try:
+        await asyncio.gather(*(processor.process(html, URL, None) for _ in range(2)))
+        executors = [worker._executor for worker in processor._workers]
+        processes = [list(executor._processes.values())[0] for executor in executors]
+        # A page that takes seconds, so that it is running, not queued, when it times out.
+        processor.timeout = 0.5
+        with pytest.raises(HTMLProcessingError):
+            await processor.process(_large_html(50000), URL, None)
+        killed = [worker._executor is not executor for worker, executor in zip(processor._workers, executors)]
+        assert sorted(killed) == [False, True]
+        processes[killed.index(True)].join(5)
+        assert not processes[killed.index(True)].is_alive()
+        assert processes[killed.index(False)].is_alive()
+
+        processor.timeout = 20.0
+        assert await processor.process(html, URL, None) == process_html(html, URL, None)
+    finally:
+        processor.close()
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from gpt_oss.tools.simple_browser import PageCache, SimpleBrowserTool
+from gpt_oss.tools.simple_browser.page_cache import normalize_url
+from gpt_oss.tools.simple_browser.page_contents import PageContents
+
+def _page(url: str, text: str = "text") -> PageContents:
+    return PageContents(url=url, text=text, title=url, urls={})
+
+
+def test_normalize_url():
+    assert normalize_url("HTTPS://Example.COM:443/a?b=2&a=1#section") == "https://example.com/a?a=1&b=2"
+    assert normalize_url("http://example.com") == "http://example.com/"
+    assert normalize_url("http://example.com:8080/x") == "http://example.com:8080/x"
+    assert normalize_url("view-source:https://Example.com/a") == "view-source:https://example.com/a"
+
+
+@pytest.mark.asyncio
+async def test_page_cache_shared_between_tools(backend, upstream):
+    cache = PageCache()
+    first = SimpleBrowserTool(backend=backend, page_cache=cache)
+    second = SimpleBrowserTool(backend=backend, page_cache=cache)
+    async for _ in first.open(id="https://Example.com/page#top"):
+        pass
+    async for _ in second.open(id="https://example.com/page"):
+        pass
+    assert sum(upstream.fetches.values()) == 1
+    assert second.tool_state.get_page().text.endswith("fetch 1")
+    assert cache.stats.hits == 1 and cache.stats.misses == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_while_revalidate(backend, upstream, clock):
+    cache = PageCache(ttl=10, stale_ttl=100, clock=clock)
+    url = "https://example.com/a"
+
+    async def fetch():
+        return await backend.fetch(url, session=None)
+
+    assert (await cache.get(url, fetch)).text.endswith("fetch 1")
+    clock.now += 50
+    # Stale pages are served immediately; concurrent readers trigger a single refresh.
+    pages = await asyncio.gather(cache.get(url, fetch), cache.get(url, fetch))
+    assert all(page.text.endswith("fetch 1") for page in pages)
+    await cache.wait_for_revalidations()
+    assert upstream.fetches[url] == 2 and cache.stats.stale_hits == 2 and cache.stats.revalidations == 1
+    assert (await cache.get(url, fetch)).text.endswith("fetch 2")
+    assert cache.stats.hits == 1
+
+    # Callers that must not see stale data refetch synchronously.
+    clock.now += 50
+    assert (await cache.get(url, fetch, allow_stale=False)).text.endswith("fetch 3")
+    # Past the stale window the entry is a plain miss.
+    clock.now += 500
+    assert (await cache.get(url, fetch)).text.endswith("fetch 4")
+    assert cache.stats.misses == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_revalidation_keeps_stale_page(clock):
+    cache = PageCache(ttl=10, stale_ttl=100, clock=clock)
+    await cache.put("https://example.com/a", _page("https://example.com/a", "old"))
+    clock.now += 20
+
+    async def failing_fetch():
+        raise RuntimeError("upstream down")
+
+    assert (await cache.get("https://example.com/a", failing_fetch)).text == "old"
+    await cache.wait_for_revalidations()
+    assert cache.stats.revalidation_errors == 1
+    assert (await cache.get("https://example.com/a", failing_fetch)).text == "old"
+
+
+@pytest.mark.asyncio
+async def test_byte_budget_evicts_least_recently_used():
+    size = len(_page("https://example.com/0").model_dump_json())
+    cache = PageCache(max_bytes=2 * size)
+    for i in range(2):
+        await cache.put(f"https://example.com/{i}", _page(f"https://example.com/{i}"))
+
+    async def fetch():
+        raise AssertionError("should be cached")
+
+    await cache.get("https://example.com/0", fetch)  # 0 becomes most recently used
+    await cache.put("https://example.com/2", _page("https://example.com/2"))
+    assert len(cache) == 2 and cache.nbytes <= cache.max_bytes
+    assert cache.stats.evictions == 1
+    await cache.get("https://example.com/0", fetch)
+    await cache.get("https://example.com/2", fetch)
+
+
+@pytest.mark.asyncio
+async def test_disk_tier_survives_restart(tmp_path, backend, upstream):
+    path = str(tmp_path / "pages.sqlite")
+    url = "https://example.com/a"
+
+    async def fetch():
+        return await backend.fetch(url, session=None)
+
+    cache = PageCache(disk_path=path)
+    await cache.get(url, fetch)
+    cache.close()
+
+    restarted = PageCache(disk_path=path)
+    page = await restarted.get(url, fetch)
+    assert page.text.endswith("fetch 1") and upstream.fetches[url] == 1
+    assert restarted.stats.disk_hits == 1 and restarted.stats.hits == 1
+    restarted.close()
@@ -0,0 +1,47 @@
+import concurrent.futures
+import pathlib
+
+import pytest
+
+from gpt_oss.tools.simple_browser.page_contents import PageContents, html_to_text, process_html
+
+FIXTURES = pathlib.Path(__file__).parent / "fixtures"
+
+
+@pytest.mark.parametrize("name", sorted(path.stem for path in FIXTURES.glob("*.html")))
+def test_process_html_matches_saved_pages(name):
+    # The expected pages were produced by the previous html2text-based converter.
+    expected = PageContents.model_validate_json((FIXTURES / f"{name}.json").read_text())
+    html = (FIXTURES / f"{name}.html").read_text()
+    page = process_html(html=html, url=expected.url, title=None, display_urls=True)
+    assert page.text == expected.text
+    assert page.urls == expected.urls
+    assert page.title == expected.title
+
+
+def test_html_to_text_format():
+    html = (
+        "<h2>Title</h2><p>First&nbsp;  paragraph\nwith <b>bold</b> x<sup>2</sup> and H<sub>2</sub>O.</p>"
+        "<ul><li>one</li><li>two<ol><li>nested</li></ol></li></ul>"
+        "<table><tr><td>a</td><td>b</td></tr><tr><td>c</td><td>d</td></tr></table>"
+        "<p>- not a markdown list, 1. not escaped</p><script>ignored()</script>"
+    )
+    assert html_to_text(html) == (
+        "## Title \n\n"
+        "First paragraph with bold x^{2} and H_{2}O.\n\n"
+        "  * one \n"
+        "  * two \n"
+        "    1. nested \n\n"
+        "a b   \n"
+        "c d  \n  \n"
+        "- not a markdown list, 1. not escaped"
+    )
+
+
+def test_process_html_is_thread_safe():
+    html = (FIXTURES / "docs_page.html").read_text()
+    url = "https://docs.python.org/3/library/asyncio-sync.html"
+    expected = process_html(html=html, url=url, title=None)
+    with concurrent.futures.ThreadPoolExecutor(4) as pool:
+        pages = list(pool.map(lambda _: process_html(html=html, url=url, title=None), range(16)))
+    assert all(page == expected for page in pages)
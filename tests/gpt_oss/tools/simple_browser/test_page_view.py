@@ -0,0 +1,82 @@
+import gc
+
+import pytest
+import tiktoken
+
+from gpt_oss.tools.simple_browser import simple_browser_tool
+from gpt_oss.tools.simple_browser.page_contents import PageContents
+from gpt_oss.tools.simple_browser.simple_browser_tool import (
+    PageView,
+    get_end_loc,
+    page_view,
+    wrap_lines,
+)
+
+def make_text(num_paragraphs: int) -> str:
+    words = ["alpha", "be", "gamma", "delta  ", "x", "epsilon", "zeta,", "eta.", "42", "theta\t"]
+    paragraphs = []
+    for i in range(num_paragraphs):
+        paragraphs.append(" ".join(words[(i + j) % len(words)] for j in range(5 + i % 37)))
+        if i % 5 == 0:
+            paragraphs.append("")
+    return "\n".join(paragraphs)
+
+
+@pytest.mark.parametrize("view_tokens", [1, 7, 64, 200])
+def test_end_loc_matches_get_end_loc(small_encoding, view_tokens):
+    text = make_text(120)
+    view = PageView(text)
+    lines = wrap_lines(text)
+    assert view.lines == lines
+    for loc in range(len(lines)):
+        for num_lines in (-1, 0, 3):
+            expected = get_end_loc(loc, num_lines, len(lines), lines, view_tokens, small_encoding.name)
+            assert view.end_loc(loc, num_lines, view_tokens, small_encoding.name) == expected, loc
+
+
+def test_token_offsets_grow_with_the_viewports_shown(small_encoding):
+    text = make_text(400)
+    view = PageView(text)
+    full = PageView(text).token_offsets(small_encoding.name)
+    assert len(full) == len(view.lines) + 1
+
+    # The first viewport only tokenizes the lines it needs.
+    end = view.end_loc(0, -1, 64, small_encoding.name)
+    offsets = view.token_offsets(small_encoding.name, line=0)
+    assert end <= len(offsets) - 1 < len(view.lines) // 4
+    assert offsets == full[: len(offsets)]
+
+    # Later viewports, in any order, extend the same offsets.
+    lines = wrap_lines(text)
+    for loc in [len(lines) // 2, 3, len(lines) - 2, end]:
+        expected = get_end_loc(loc, -1, len(lines), lines, 64, small_encoding.name)
+        assert view.end_loc(loc, -1, 64, small_encoding.name) == expected, loc
+    assert view.token_offsets(small_encoding.name) == full
+
+
+def test_short_page_is_not_tokenized(monkeypatch):
+    def get_encoding(name):
+        raise AssertionError("short pages should not be tokenized")
+
+    monkeypatch.setattr(tiktoken, "get_encoding", get_encoding)
+    view = PageView("first line\n\nthird line")
+    assert view.lines == ["first line", "", "third line"]
+    assert view.char_offsets == [0, 15, 20, 35]
+    assert view.end_loc(0, -1, 1024, "o200k_base") == 3
+    assert view.end_loc(1, 1, 1024, "o200k_base") == 2
+
+
+def test_page_view_is_cached_per_page():
+    page = PageContents(url="https://example.com", text="a\nb", title="t", urls={})
+    view = page_view(page)
+    assert page_view(page) is view
+    assert page_view(page.model_copy()) is not view
+    assert page == PageContents(url="https://example.com", text="a\nb", title="t", urls={})
+
+    page.text = "c"
+    assert page_view(page).lines == ["c"]
+
+    key = id(page)
+    del page, view
+    gc.collect()
+    assert key not in simple_browser_tool._page_views
@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+from gpt_oss.tools.simple_browser import PageCache, Prefetcher, SimpleBrowserTool
+
+RESULTS = [f"https://example.com/result/{i}" for i in range(5)]
+
+
+@pytest.fixture
+def upstream(upstream):
+    upstream.results = RESULTS
+    return upstream
+
+
+async def run(messages) -> None:
+    async for _ in messages:
+        pass
+
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_open_uses_finished_prefetch(backend, upstream):
+    prefetcher = Prefetcher(page_cache=PageCache(), top_n=2)
+    tool = SimpleBrowserTool(backend=backend, page_cache=prefetcher.page_cache, prefetcher=prefetcher)
+    await run(tool.search(query="q"))
+    await settle()
+    assert upstream.fetches == {RESULTS[0]: 1, RESULTS[1]: 1}
+    # The top results are prefetched with one batched call.
+    assert upstream.batches == [RESULTS[:2]]
+    assert prefetcher.page_cache.is_fresh(RESULTS[1])
+
+    await run(tool.open(id=1))
+    assert tool.tool_state.get_page().text == f"{RESULTS[1]} fetch 1"
+    assert sum(upstream.fetches.values()) == 2
+    tool.cancel_prefetches()
+    assert prefetcher.stats.as_dict() | {"fetch_seconds": 0, "saved_seconds": 0} == {
+        "scheduled": 2,
+        "skipped": 0,
+        "completed": 2,
+        "errors": 0,
+        "cancelled": 0,
+        "hits": 1,
+        "wasted": 1,
+        "fetch_seconds": 0,
+        "saved_seconds": 0,
+        "hit_rate": 0.5,
+    }
+
+    # Another conversation finds the pages in the cache and does not prefetch them again.
+    other = SimpleBrowserTool(backend=backend, page_cache=prefetcher.page_cache, prefetcher=prefetcher)
+    await run(other.search(query="q"))
+    await run(other.open(id=0))
+    assert prefetcher.stats.skipped == 2
+    assert sum(upstream.fetches.values()) == 2
+
+
+@pytest.mark.asyncio
+async def test_open_waits_for_running_prefetch(backend, upstream):
+    upstream.gates[RESULTS[0]] = asyncio.Event()
+    prefetcher = Prefetcher(top_n=1)
+    tool = SimpleBrowserTool(backend=backend, prefetcher=prefetcher)
+    await run(tool.search(query="q"))
+    await settle()
+    opening = asyncio.create_task(run(tool.open(id=0)))
+    await settle()
+    assert not opening.done()
+    upstream.gates[RESULTS[0]].set()
+    await opening
+    assert upstream.fetches == {RESULTS[0]: 1}
+    assert tool.tool_state.get_page().url == RESULTS[0]
+    assert prefetcher.stats.hits == 1 and prefetcher.stats.completed == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_and_cancellation(backend, upstream):
+    for url in RESULTS:
+        upstream.gates[url] = asyncio.Event()
+    prefetcher = Prefetcher(top_n=5, max_concurrency=1)
+    tools = [SimpleBrowserTool(backend=backend, prefetcher=prefetcher) for _ in range(2)]
+    await run(tools[0].search(query="q"))
+    await run(tools[1].search(query="q"))
+    await settle()
+    # One batch holds the only slot; the other waits for it.
+    assert upstream.batches == [RESULTS]
+    assert sum(upstream.fetches.values()) == 5
+    assert prefetcher.metrics()["in_flight"] == 10
+
+    # The conversation ends: its prefetches, running or queued, are cancelled.
+    tools[0].cancel_prefetches()
+    await settle()
+    assert prefetcher.stats.cancelled == 5
+    assert prefetcher.metrics()["in_flight"] == 5
+
+    # The slot was released, so the other conversation's batch runs.
+    assert upstream.batches == [RESULTS, RESULTS]
+    assert sum(upstream.fetches.values()) == 10
+    prefetcher.close()
+    await settle()
+    assert prefetcher.stats.cancelled == 10
+    assert prefetcher.stats.completed == 0
+    assert prefetcher.metrics()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_prefetch_falls_back_to_fetch(backend, upstream):
+    upstream.failures[RESULTS[0]] = 1
+    prefetcher = Prefetcher(top_n=1)
+    tool = SimpleBrowserTool(backend=backend, prefetcher=prefetcher)
+    await run(tool.search(query="q"))
+    await settle()
+    await run(tool.open(id=0))
+    assert tool.tool_state.get_page().text == f"{RESULTS[0]} fetch 2"
+    assert prefetcher.stats.errors == 1 and prefetcher.stats.hits == 0
+
+
+@pytest.mark.asyncio
+async def test_prefetch_is_opt_in(monkeypatch, backend, upstream):
+    monkeypatch.delenv("BROWSER_PREFETCH_TOP_N", raising=False)
+    tool = SimpleBrowserTool(backend=backend, prefetcher=Prefetcher.from_env())
+    assert tool.prefetches is None
+    await run(tool.search(query="q"))
+    await settle()
+    assert not upstream.fetches
+    tool.cancel_prefetches()
+
+    monkeypatch.setenv("BROWSER_PREFETCH_TOP_N", "2")
+    assert Prefetcher.from_env().top_n == 2
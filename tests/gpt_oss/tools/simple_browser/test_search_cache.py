@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from gpt_oss.tools.simple_browser import SearchCache, SimpleBrowserTool
+from gpt_oss.tools.simple_browser.backend import BackendError
+from gpt_oss.tools.simple_browser.search_cache import normalize_query
+
+
+@pytest.fixture
+def upstream(upstream):
+    # Searches take a little while, so that concurrent callers overlap.
+    upstream.search_delay = 0.05
+    return upstream
+
+
+def test_normalize_query():
+    assert normalize_query("  Latest   GPU prices? ") == "latest gpu prices"
+    assert normalize_query("ＧＰＵ prices.") == "gpu prices"
+    assert normalize_query("c++ vs rust") != normalize_query("c vs rust")
+
+
+@pytest.mark.asyncio
+async def test_concurrent_searches_are_coalesced(backend, upstream):
+    cache = SearchCache()
+    tools = [SimpleBrowserTool(backend=backend, search_cache=cache) for _ in range(4)]
+    queries = ["Rust async", "rust  async", "RUST ASYNC?", "rust async"]
+
+    async def search(tool, query):
+        return [message async for message in tool.search(query=query)]
+
+    await asyncio.gather(*(search(tool, query) for tool, query in zip(tools, queries)))
+    assert sum(upstream.searches.values()) == 1
+    assert cache.stats.misses == 1 and cache.stats.coalesced == 3
+    assert all(tool.tool_state.get_page().text == "results for Rust async" for tool in tools)
+    # Later identical searches are plain hits, and each one saves a full upstream round trip.
+    await search(tools[0], "rust async")
+    assert cache.stats.hits == 1 and cache.stats.hit_rate == pytest.approx(4 / 5)
+    assert cache.stats.saved_seconds >= 4 * 0.05 * 0.9
+
+
+@pytest.mark.asyncio
+async def test_search_cache_ttl_and_key(backend, upstream, clock):
+    cache = SearchCache(ttl=60, clock=clock)
+
+    def search(query):
+        return lambda: backend.search(query, 10, session=None)
+
+    await cache.get("weather", 10, "web", search("weather"))
+    await cache.get("weather", 10, "web", search("weather"))
+    # topn and source are part of the key.
+    await cache.get("weather", 5, "web", search("weather"))
+    await cache.get("weather", 10, "news", search("weather"))
+    assert upstream.searches["weather"] == 3
+    clock.now += 61
+    await cache.get("weather", 10, "web", search("weather"))
+    assert upstream.searches["weather"] == 4 and cache.stats.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_search_is_shared_but_not_cached(backend, upstream):
+    cache = SearchCache()
+
+    def search():
+        return backend.search("fail", 10, session=None)
+
+    results = await asyncio.gather(
+        cache.get("fail", 10, "web", search), cache.get("fail", 10, "web", search), return_exceptions=True
+    )
+    assert all(isinstance(r, BackendError) for r in results)
+    assert upstream.searches["fail"] == 1 and cache.stats.errors == 1
+    with pytest.raises(BackendError):
+        await cache.get("fail", 10, "web", search)
+    assert upstream.searches["fail"] == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_shared_search(backend, upstream):
+    cache = SearchCache()
+
+    def search():
+        return backend.search("news", 10, session=None)
+
+    first = asyncio.ensure_future(cache.get("news", 10, "web", search))
+    second = asyncio.ensure_future(cache.get("news", 10, "web", search))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    page = await second
+    assert page.text == "results for news" and upstream.searches["news"] == 1
@@ -0,0 +1,108 @@
+import asyncio
+import concurrent.futures
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from gpt_oss.tools.simple_browser import ClientSessionPool, ExaBackend, SimpleBrowserTool
+
+
+class MockExaServer:
+    """Local stand-in for the Exa API that records every TCP connection it accepts."""
+
+    def __init__(self):
+        # Holding the transports keeps their ids unique (client ports get reused).
+        self.connections = {}
+        self.app = web.Application()
+        self.app.router.add_post("/search", self.search)
+        self.app.router.add_post("/contents", self.contents)
+
+    async def search(self, request: web.Request) -> web.Response:
+        self.connections[id(request.transport)] = request.transport
+        payload = await request.json()
+        return web.json_response({
+            "results": [
+                {"title": f"Result {i}", "url": f"https://example.com/{payload['query']}/{i}", "summary": payload["query"]}
+                for i in range(3)
+            ]
+        })
+
+    async def contents(self, request: web.Request) -> web.Response:
+        self.connections[id(request.transport)] = request.transport
+        payload = await request.json()
+        return web.json_response({"results": [{"title": "Page", "text": f"<p>{payload['urls'][0]}</p>"}]})
+
+
+@pytest_asyncio.fixture
+async def mock_exa():
+    server = MockExaServer()
+    async with TestServer(server.app) as test_server:
+        server.base_url = str(test_server.make_url("")).rstrip("/")
+        yield server
+
+
+async def _browse(tool: SimpleBrowserTool, n: int):
+    for i in range(n):
+        async for _ in tool.search(query=f"query-{i}"):
+            pass
+        async for _ in tool.open(id=0):
+            pass
+
+
+@pytest.mark.asyncio
+async def test_pooled_session_reuses_connections(mock_exa, monkeypatch):
+    monkeypatch.setenv("EXA_API_KEY", "test_api_key")
+    backend = ExaBackend(source="web", BASE_URL=mock_exa.base_url)
+
+    await _browse(SimpleBrowserTool(backend=backend), 3)
+    # A fresh session per call: one connection for every search and every page fetch.
+    assert len(mock_exa.connections) == 6
+
+    mock_exa.connections.clear()
+    async with ClientSessionPool(limit_per_host=4) as pool:
+        # Tool instances (one per HTTP request in the server) share the keep-alive session.
+        await _browse(SimpleBrowserTool(backend=backend, session_pool=pool), 2)
+        await _browse(SimpleBrowserTool(backend=backend, session_pool=pool), 1)
+        assert len(mock_exa.connections) == 1
+        assert pool.get(backend.BASE_URL) is pool.get(backend.BASE_URL)
+        assert pool.get(backend.BASE_URL) is not pool.get("https://other.example")
+
+
+@pytest.mark.asyncio
+async def test_pool_recreates_closed_sessions():
+    pool = ClientSessionPool()
+    session = pool.get("a")
+    await pool.close()
+    assert session.closed
+    replacement = pool.get("a")
+    assert replacement is not session and not replacement.closed
+    await pool.close()
+
+
+def test_pool_keeps_a_session_per_event_loop():
+    pool = ClientSessionPool()
+
+    async def get():
+        return pool.get("a"), asyncio.get_running_loop()
+
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        # A loop running on another thread, like a second server worker.
+        other_loop = asyncio.new_event_loop()
+        executor.submit(other_loop.run_forever)
+        try:
+            other, _ = asyncio.run_coroutine_threadsafe(get(), other_loop).result()
+
+            async def main():
+                session, _ = await get()
+                assert session is not other and pool.get("a") is session
+                assert asyncio.run_coroutine_threadsafe(get(), other_loop).result()[0] is other
+                await pool.close()
+                return session
+
+            session = asyncio.run(main())
+            assert session.closed and other.closed
+        finally:
+            other_loop.call_soon_threadsafe(other_loop.stop)
+    other_loop.close()
@@ -0,0 +1,65 @@
+import itertools
+
+import numpy as np
+import pytest
+import tiktoken
+
+from gpt_oss.tools.simple_browser import simple_browser_tool, token_lengths
+from gpt_oss.tools.simple_browser.token_lengths import vocabulary_lengths
+
+
+# A gap before the special token and a token that is not valid UTF-8 on its own.
+pytestmark = pytest.mark.parametrize("small_encoding", ["test_small"], indirect=True)
+
+
+def decoded_lengths(encoding):
+    results = []
+    for i in range(encoding.n_vocab):
+        try:
+            results.append(len(encoding.decode([i])))
+        except Exception:
+            results.append(1)
+    return results
+
+
+def test_table_is_saved_and_memory_mapped(small_encoding, tmp_path):
+    lengths = vocabulary_lengths(small_encoding.name)
+    assert lengths.tolist() == decoded_lengths(small_encoding)
+    path = tmp_path / f"test_small-{small_encoding.n_vocab}.token_lengths.npy"
+    assert path.exists()
+    assert list(tmp_path.iterdir()) == [path]
+
+    vocabulary_lengths.cache_clear()
+    loaded = vocabulary_lengths(small_encoding.name)
+    assert isinstance(loaded, np.memmap)
+    assert loaded.tolist() == lengths.tolist()
+
+
+def test_unreadable_table_is_rebuilt(small_encoding, tmp_path):
+    path = tmp_path / f"test_small-{small_encoding.n_vocab}.token_lengths.npy"
+    path.write_bytes(b"not a numpy file")
+    assert vocabulary_lengths(small_encoding.name).tolist() == decoded_lengths(small_encoding)
+    np.save(path, np.ones(3, dtype=np.uint16))
+    vocabulary_lengths.cache_clear()
+    assert vocabulary_lengths(small_encoding.name).tolist() == decoded_lengths(small_encoding)
+    vocabulary_lengths.cache_clear()
+    assert isinstance(vocabulary_lengths(small_encoding.name), np.memmap)
+
+
+def test_saving_can_be_disabled(small_encoding, tmp_path, monkeypatch):
+    monkeypatch.setenv("BROWSER_TOKEN_LENGTHS_DIR", "")
+    assert vocabulary_lengths(small_encoding.name).tolist() == decoded_lengths(small_encoding)
+    assert list(tmp_path.iterdir()) == []
+    monkeypatch.delenv("BROWSER_TOKEN_LENGTHS_DIR")
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", "/some/dir")
+    assert token_lengths.cache_dir() == "/some/dir"
+
+
+@pytest.mark.parametrize("text", ["", "a", "abc ab abcab", "café 【x】 <|end|> \n\n  done"])
+def test_get_tokens_offsets(small_encoding, text):
+    result = simple_browser_tool.get_tokens(text, small_encoding.name)
+    lengths = decoded_lengths(small_encoding)
+    assert result.tokens == small_encoding.encode(text, disallowed_special=())
+    assert result.tok2idx == [0] + list(itertools.accumulate(lengths[i] for i in result.tokens))[:-1]
+    assert all(type(offset) is int for offset in result.tok2idx)
+    assert simple_browser_tool.max_chars_per_token(small_encoding.name) == max(lengths)
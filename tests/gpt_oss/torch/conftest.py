@@ -0,0 +1,72 @@
+import dataclasses
+import json
+import os
+
+import pytest
+import torch
+from safetensors.torch import save_file
+
+from gpt_oss.torch.model import ModelConfig, Transformer
+
+
+TINY_CONFIG = dict(
+    num_hidden_layers=2,
+    num_experts=4,
+    experts_per_token=2,
+    vocab_size=96,
+    hidden_size=64,
+    intermediate_size=64,
+    swiglu_limit=7.0,
+    head_dim=16,
+    num_attention_heads=4,
+    num_key_value_heads=2,
+    sliding_window=4,
+    initial_context_length=64,
+    rope_theta=150000.0,
+    rope_scaling_factor=1.0,
+)
+
+
+def make_tiny_checkpoint(path, config: dict = TINY_CONFIG, num_shards: int = 1, seed: int = 0, index: bool = False):
+    """Write a random checkpoint with MXFP4-packed MoE weights in the on-disk layout."""
+    generator = torch.Generator().manual_seed(seed)
+    config = ModelConfig(**config)
+    model = Transformer(config, device=torch.device("cpu"))
+    tensors = {}
+    for name, param in model.named_parameters():
+        if name.endswith("mlp1_weight") or name.endswith("mlp2_weight"):
+            *prefix, cols = param.shape
+            blocks = torch.randint(0, 256, (*prefix, cols // 32, 16), dtype=torch.uint8, generator=generator)
+            scales = torch.randint(118, 124, (*prefix, cols // 32), dtype=torch.uint8, generator=generator)
+            tensors[f"{name}.blocks"] = blocks
+            tensors[f"{name}.scales"] = scales
+        elif name.endswith("norm.scale"):
+            tensors[name] = 1.0 + 0.1 * torch.randn(param.shape, generator=generator)
+        else:
+            tensors[name] = (0.2 * torch.randn(param.shape, generator=generator)).to(param.dtype)
+
+    os.makedirs(path, exist_ok=True)
+    names = sorted(tensors)
+    weight_map = {}
+    for shard in range(num_shards):
+        filename = f"model-{shard:05d}-of-{num_shards:05d}.safetensors"
+        shard_names = names[shard::num_shards]
+        save_file({name: tensors[name].contiguous() for name in shard_names}, os.path.join(path, filename))
+        weight_map.update({name: filename for name in shard_names})
+    if index:
+        with open(os.path.join(path, "model.safetensors.index.json"), "w") as f:
+            json.dump({"metadata": {}, "weight_map": weight_map}, f)
+    with open(os.path.join(path, "config.json"), "w") as f:
+        json.dump(dataclasses.asdict(config), f)
+    return str(path)
+
+
+@pytest.fixture
+def tiny_checkpoint(tmp_path):
+    return make_tiny_checkpoint(tmp_path / "checkpoint")
+
+
+@pytest.fixture
+def tiny_model(tiny_checkpoint):
+    with torch.inference_mode():
+        return Transformer.from_checkpoint(tiny_checkpoint, device="cpu")
@@ -0,0 +1,99 @@
+import gc
+import json
+import os
+
+import pytest
+import torch
+
+import gpt_oss.torch.model as torch_model
+import gpt_oss.convert as convert_module
+from gpt_oss.convert import convert
+from gpt_oss.torch.model import ModelConfig, Transformer
+from gpt_oss.torch.weights import (
+    CONVERTED_INDEX,
+    checkpoint_fingerprint,
+    converted_checkpoint_path,
+    load_converted_checkpoint,
+)
+
+from conftest import TINY_CONFIG, make_tiny_checkpoint
+
+
+@torch.inference_mode()
+def test_converted_checkpoint_loads_without_conversion(tiny_checkpoint, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    expected = Transformer.from_checkpoint(tiny_checkpoint, device="cpu", cache_dir=cache_dir)
+
+    # 分片很小，缓存由多个文件加索引组成。
+    (directory,) = convert(tiny_checkpoint, "torch", cache_dir=cache_dir, max_shard_bytes=64 << 10)
+    assert directory == converted_checkpoint_path(tiny_checkpoint, "torch", 1, 0, cache_dir)
+    assert len([f for f in os.listdir(directory) if f.endswith(".safetensors")]) > 1
+
+    # 命中缓存时不应再打开原始 checkpoint。
+    def no_checkpoint(*args, **kwargs):
+        raise AssertionError("original checkpoint was read")
+
+    monkeypatch.setattr(torch_model, "Checkpoint", no_checkpoint)
+    cached = Transformer.from_checkpoint(tiny_checkpoint, device="cpu", cache_dir=cache_dir)
+    expected_params = dict(expected.named_parameters())
+    for name, param in cached.named_parameters():
+        assert param.device.type == "cpu"
+        assert torch.equal(param, expected_params[name]), name
+
+    tokens = torch.tensor([3, 17, 5, 42], dtype=torch.int32)
+    assert torch.equal(cached(tokens), expected(tokens))
+
+
+def test_cache_key_tracks_checkpoint_and_world_size(tmp_path):
+    path = make_tiny_checkpoint(tmp_path / "checkpoint")
+    fingerprint = checkpoint_fingerprint(path)
+    assert converted_checkpoint_path(path, "torch", 1, 0) != converted_checkpoint_path(path, "torch", 2, 0)
+    assert converted_checkpoint_path(path, "torch", 1, 0) != converted_checkpoint_path(path, "triton", 1, 0)
+
+    # 重新写入权重（即使形状不变）会使缓存失效。
+    make_tiny_checkpoint(tmp_path / "checkpoint", seed=1)
+    assert checkpoint_fingerprint(path) != fingerprint
+
+
+def test_convert_writes_one_sharded_cache_per_rank(tiny_checkpoint, tmp_path):
+    directories = convert(tiny_checkpoint, "torch", world_size=2, cache_dir=str(tmp_path / "cache"))
+    assert len(directories) == 2 and all(os.path.exists(os.path.join(d, CONVERTED_INDEX)) for d in directories)
+    config = ModelConfig(**TINY_CONFIG)
+    tensors = load_converted_checkpoint(directories[1], torch.device("cpu"))
+    assert tensors["block.0.mlp.mlp2_weight"].shape[-1] == config.intermediate_size // 2
+    assert tensors["embedding.weight"].shape[0] == config.vocab_size // 2
+    assert tensors["block.0.attn.sinks"].shape[0] == config.num_attention_heads // 2
+
+
+def test_write_holds_one_shard_at_a_time(tmp_path, monkeypatch):
+    shards = []
+
+    def save_file(tensors, filename):
+        shards.append(list(tensors))
+        open(filename, "wb").close()
+
+    monkeypatch.setattr(convert_module, "save_file", save_file)
+    yielded = set()
+
+    def tensors():
+        for i in range(20):
+            # 之前产出的张量（及其 detach 后的视图）中，仍然存活的不应超过一个分片（3 个）。
+            gc.collect()
+            alive = {t.data_ptr() for t in gc.get_objects() if issubclass(type(t), torch.Tensor)}
+            assert len(alive & yielded) <= 3, i
+            tensor = torch.full((256,), i, dtype=torch.float32)
+            yielded.add(tensor.data_ptr())
+            yield f"t{i}", tensor
+            del tensor
+
+    # 每个分片 3 个 1 KiB 的张量。
+    convert_module._write(tensors(), str(tmp_path / "rank"), max_shard_bytes=3 << 10)
+    assert shards == [[f"t{i}" for i in range(j, min(j + 3, 20))] for j in range(0, 20, 3)]
+    with open(tmp_path / "rank" / CONVERTED_INDEX) as f:
+        weight_map = json.load(f)["weight_map"]
+    assert weight_map["t0"] == "model-00000.safetensors" and weight_map["t19"] == "model-00006.safetensors"
+
+
+def test_convert_rejects_unknown_backend(tiny_checkpoint, tmp_path):
+    with pytest.raises(ValueError):
+        convert(tiny_checkpoint, "metal", cache_dir=str(tmp_path / "cache"))
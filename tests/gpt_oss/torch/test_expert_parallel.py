@@ -0,0 +1,83 @@
+import pytest
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from gpt_oss.torch.model import ExpertParallelMLPBlock, TokenGenerator, Transformer
+
+from conftest import TINY_CONFIG, make_tiny_checkpoint
+
+
+EP_CONFIG = TINY_CONFIG | dict(num_attention_heads=8, num_key_value_heads=4)
+# 长度不能被 world_size 整除，覆盖 token 分段的补齐路径。
+PROMPT = [3, 17, 5, 42, 8, 11, 60]
+
+
+@torch.inference_mode()
+def _reference_logits(checkpoint, tokens):
+    model = Transformer.from_checkpoint(checkpoint, device="cpu")
+    return model(torch.tensor(tokens, dtype=torch.int32)).float()
+
+
+def _mlp_bytes_sent(model):
+    return sum(block.mlp.bytes_sent for block in model.block)
+
+
+def _worker(rank, world_size, checkpoint, init_file, result_path):
+    torch.set_num_threads(1)
+    dist.init_process_group(
+        "gloo", init_method=f"file://{init_file}", rank=rank, world_size=world_size
+    )
+    try:
+        tokens = torch.tensor(PROMPT, dtype=torch.int32)
+        with torch.inference_mode():
+            ep_model = Transformer.from_checkpoint(checkpoint, device="cpu", expert_parallel=True)
+            tp_model = Transformer.from_checkpoint(checkpoint, device="cpu")
+            logits = ep_model(tokens)
+            tp_model(tokens)
+        # 单 token 解码时多数 rank 分不到 token，仍需参与 all-to-all。
+        generator = TokenGenerator(checkpoint, device=torch.device("cpu"), context=64, expert_parallel=True)
+        generated = list(generator.generate(PROMPT, stop_tokens=[], temperature=0.0, max_tokens=4))
+        bytes_sent = torch.tensor([_mlp_bytes_sent(ep_model), _mlp_bytes_sent(tp_model)])
+        dist.all_reduce(bytes_sent)
+        if rank == 0:
+            torch.save(
+                {"logits": logits, "generated": generated, "ep_bytes": int(bytes_sent[0]), "tp_bytes": int(bytes_sent[1])},
+                result_path,
+            )
+    finally:
+        dist.destroy_process_group()
+
+
+@torch.inference_mode()
+def test_expert_parallel_block_matches_mlp_block_single_process(tmp_path):
+    checkpoint = make_tiny_checkpoint(tmp_path / "checkpoint", config=EP_CONFIG)
+    model = Transformer.from_checkpoint(checkpoint, device="cpu", expert_parallel=True)
+    assert all(isinstance(block.mlp, ExpertParallelMLPBlock) for block in model.block)
+    logits = model(torch.tensor(PROMPT, dtype=torch.int32)).float()
+    torch.testing.assert_close(logits, _reference_logits(checkpoint, PROMPT), atol=5e-2, rtol=5e-2)
+
+
+@pytest.mark.parametrize("world_size", [2, 4])
+def test_expert_parallel_matches_single_process(tmp_path, world_size):
+    checkpoint = make_tiny_checkpoint(tmp_path / "checkpoint", config=EP_CONFIG)
+
+    result_path = str(tmp_path / "result.pt")
+    mp.spawn(
+        _worker,
+        args=(world_size, checkpoint, str(tmp_path / "init"), result_path),
+        nprocs=world_size,
+    )
+    result = torch.load(result_path)
+
+    torch.testing.assert_close(
+        result["logits"].float(), _reference_logits(checkpoint, PROMPT), atol=5e-2, rtol=5e-2
+    )
+    # 与张量并行测试相同：对生成序列做 teacher forcing，每个 token 都应是（近似）argmax。
+    generated = result["generated"]
+    reference = _reference_logits(checkpoint, PROMPT + generated)[len(PROMPT) - 1 : -1]
+    for step, token in enumerate(generated):
+        assert reference[step, token] >= reference[step].max() - 5e-2
+
+    # 专家并行只搬运被路由的 token，而张量并行要 all-reduce 每个 token 的 top-k 部分和。
+    assert 0 < result["ep_bytes"] < result["tp_bytes"]
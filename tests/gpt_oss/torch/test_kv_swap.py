@@ -0,0 +1,103 @@
+import os
+
+import pytest
+import torch
+
+from gpt_oss.torch.kv_swap import KVSwapManager, KVSwapPolicy, common_prefix_len
+from gpt_oss.torch.model import Cache, QuantizedCache
+
+SESSION_A = [3, 17, 5, 42, 8, 11, 60, 2, 9]
+SESSION_B = [7, 1, 33, 4, 50, 6, 21]
+
+
+def _caches(model, cls=Cache, **kwargs):
+    config = model.config
+    return [cls(1, 4, config.num_key_value_heads, config.head_dim, **kwargs) for _ in model.block]
+
+
+def _serve(model, caches, manager, resident, tokens):
+    # 与 responses_api 的 triton 推理循环相同：换入/换出、截断到公共前缀、只跑新 token。
+    if manager is not None:
+        resident = manager.switch(resident, tokens)
+    keep = common_prefix_len(resident, tokens)
+    keep = min(keep, len(tokens) - 1)
+    for cache in caches:
+        cache.truncate(keep)
+    logits = model(torch.tensor(tokens[keep:], dtype=torch.int32), caches=caches)[-1]
+    return logits, list(tokens), len(tokens) - keep
+
+
+@torch.inference_mode()
+@pytest.mark.parametrize("cls,kwargs", [(Cache, {}), (QuantizedCache, {"kv_dtype": "int8"})])
+def test_switch_restores_idle_session(tiny_model, cls, kwargs):
+    caches = _caches(tiny_model, cls, **kwargs)
+    manager = KVSwapManager(caches, KVSwapPolicy(min_tokens=4))
+    _, resident, _ = _serve(tiny_model, caches, manager, [], SESSION_A)
+    # 另一个会话接管 cache，A 被换出而不是被截断丢弃。
+    _, resident, _ = _serve(tiny_model, caches, manager, resident, SESSION_B)
+    assert manager.stats.swap_outs == 1 and len(manager) == 1
+
+    turn = SESSION_A + [12, 13]
+    logits, resident, computed = _serve(tiny_model, caches, manager, resident, turn)
+    assert computed == 2
+    assert manager.stats.swap_ins == 1 and manager.stats.tokens_restored == len(SESSION_A)
+    # B 也被换出，等待它的下一轮。
+    assert manager.stats.swap_outs == 2 and len(manager) == 1
+
+    expected = tiny_model(torch.tensor(turn, dtype=torch.int32), caches=_caches(tiny_model, cls, **kwargs))[-1]
+    torch.testing.assert_close(logits, expected)
+    assert manager.stats.as_dict()["swap_in_ms_max"] >= 0
+    manager.close()
+
+
+@torch.inference_mode()
+def test_spill_to_disk_round_trip(tiny_model, tmp_path):
+    caches = _caches(tiny_model)
+    tiny_model(torch.tensor(SESSION_A, dtype=torch.int32), caches=caches)
+    saved = [[t[:, : len(SESSION_A)].clone() for t in cache._buffers()] for cache in caches]
+
+    # 主机预算为 0：每个会话都直接写入 mmap 文件。
+    swap_dir = tmp_path / "swap"
+    manager = KVSwapManager(caches, KVSwapPolicy(min_tokens=1, max_host_bytes=0, swap_dir=str(swap_dir)))
+    assert manager.swap_out(SESSION_A)
+    manager.flush()
+    assert manager.stats.spills == 1 and manager.host_bytes == 0 and manager.disk_bytes > 0
+    assert len(os.listdir(swap_dir)) == 1
+
+    for cache in caches:
+        cache.reset()
+    tiny_model(torch.tensor(SESSION_B, dtype=torch.int32), caches=caches)
+    key, length = manager.match(SESSION_A + [1])
+    assert length == len(SESSION_A)
+    assert manager.swap_in(key) == SESSION_A
+    for cache, buffers in zip(caches, saved):
+        assert cache.offset == len(SESSION_A)
+        for t, expected in zip(cache._buffers(), buffers):
+            assert torch.equal(t[:, : len(SESSION_A)], expected)
+    assert os.listdir(swap_dir) == []
+    manager.close()
+
+
+@torch.inference_mode()
+def test_policy_limits(tiny_model):
+    caches = _caches(tiny_model)
+    tiny_model(torch.tensor(SESSION_A, dtype=torch.int32), caches=caches)
+    probe = KVSwapManager(caches, KVSwapPolicy(min_tokens=1))
+    _, session_bytes = probe._layout(len(SESSION_A))
+
+    # 短会话不值得换出。
+    manager = KVSwapManager(caches, KVSwapPolicy(min_tokens=len(SESSION_A) + 1))
+    assert not manager.swap_out(SESSION_A)
+
+    # 主机预算只够一个会话且没有磁盘层：最久未用的会话被丢弃。
+    manager = KVSwapManager(caches, KVSwapPolicy(min_tokens=1, max_host_bytes=session_bytes))
+    assert manager.swap_out(SESSION_A)
+    assert manager.swap_out(SESSION_A[:-1] + [0])
+    assert len(manager) == 1 and manager.stats.drops == 1
+    assert manager.match(SESSION_A)[1] == len(SESSION_A) - 1
+
+    # 过期会话在下一次查找时被丢弃。
+    manager = KVSwapManager(caches, KVSwapPolicy(min_tokens=1, ttl_seconds=0.0))
+    assert manager.swap_out(SESSION_A)
+    assert manager.match(SESSION_A) == (None, 0)
+    assert manager.stats.drops == 1
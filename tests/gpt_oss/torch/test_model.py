@@ -0,0 +1,146 @@
+import threading
+
+import pytest
+import torch
+
+from gpt_oss.torch.model import Cache, TokenGenerator, prefill_chunk_size, skip_init
+
+
+def _caches(model, batch_size=1):
+    config = model.config
+    return [
+        Cache(batch_size, 8, config.num_key_value_heads, config.head_dim)
+        for _ in model.block
+    ]
+
+
+@torch.inference_mode()
+def test_incremental_decode_matches_full_forward(tiny_model):
+    tokens = torch.tensor([3, 17, 5, 42, 8, 11, 60, 2, 9, 33, 1, 7], dtype=torch.int32)
+    expected = tiny_model(tokens)
+
+    caches = _caches(tiny_model)
+    prefill = tiny_model(tokens[:5], caches=caches)
+    steps = [tiny_model(tokens[i : i + 1], caches=caches) for i in range(5, len(tokens))]
+    actual = torch.cat([prefill, *steps])
+
+    torch.testing.assert_close(actual, expected, atol=2e-2, rtol=2e-2)
+    assert caches[0].offset == len(tokens)
+
+
+@torch.inference_mode()
+def test_forked_cache_matches_independent_sequences(tiny_model):
+    prompt = torch.tensor([[3, 17, 5, 42, 8, 11]], dtype=torch.int32)
+    continuations = torch.tensor([[1, 2, 3], [4, 5, 6], [7, 8, 9]], dtype=torch.int32)
+
+    caches = _caches(tiny_model)
+    tiny_model(prompt, caches=caches)
+    for cache in caches:
+        cache.fork(len(continuations))
+    forked = [tiny_model(continuations[:, i : i + 1], caches=caches) for i in range(3)]
+    forked = torch.cat(forked, dim=1)
+
+    for row, continuation in enumerate(continuations):
+        expected = tiny_model(torch.cat([prompt[0], continuation]))[-3:]
+        torch.testing.assert_close(forked[row], expected, atol=5e-2, rtol=5e-2)
+
+
+def test_generate_n_shares_prefill(tiny_checkpoint):
+    generator = TokenGenerator(tiny_checkpoint, device=torch.device("cpu"))
+    prompt = [3, 17, 5, 42, 8, 11]
+
+    single = list(generator.generate(prompt, stop_tokens=[], temperature=0.0, max_tokens=6))
+    batched = list(generator.generate(prompt, stop_tokens=[], temperature=0.0, max_tokens=6, n=3))
+
+    assert len(batched) == 6
+    for step, token in zip(batched, single):
+        assert step == [token, token, token]
+
+
+def test_generate_n_stops_sequences_independently(tiny_checkpoint):
+    generator = TokenGenerator(tiny_checkpoint, device=torch.device("cpu"))
+    torch.manual_seed(0)
+    steps = list(
+        generator.generate([3, 17, 5], stop_tokens=list(range(48)), temperature=1.0, max_tokens=20, n=4)
+    )
+    for i in range(4):
+        column = [step[i] for step in steps]
+        if None in column:
+            first_none = column.index(None)
+            assert column[first_none - 1] < 48
+            assert all(token is None for token in column[first_none:])
+
+
+@torch.inference_mode()
+@pytest.mark.parametrize("chunk_size", [1, 3, 5, 12])
+def test_chunked_prefill_matches_single_shot(tiny_model, chunk_size):
+    # 12 个 token 超过 sliding_window=4，分块后滑动窗口需跨块生效。
+    tokens = torch.tensor([3, 17, 5, 42, 8, 11, 60, 2, 9, 33, 1, 7], dtype=torch.int32)
+    expected_caches = _caches(tiny_model)
+    expected = tiny_model(tokens, caches=expected_caches)[-1]
+
+    caches = _caches(tiny_model)
+    chunks = list(tiny_model.prefill_chunks(tokens, caches, chunk_size=chunk_size))
+    assert len(chunks) == -(-len(tokens) // chunk_size)
+    torch.testing.assert_close(chunks[-1], expected, atol=2e-2, rtol=2e-2)
+    for cache, expected_cache in zip(caches, expected_caches):
+        assert cache.offset == len(tokens)
+        torch.testing.assert_close(cache.k[:, : len(tokens)], expected_cache.k[:, : len(tokens)], atol=2e-2, rtol=2e-2)
+
+    # 分块 prefill 之后的增量解码与单次 prefill 一致。
+    next_token = torch.tensor([[4]], dtype=torch.int32)
+    torch.testing.assert_close(
+        tiny_model(next_token, caches=caches), tiny_model(next_token, caches=expected_caches), atol=2e-2, rtol=2e-2
+    )
+
+
+def test_prefill_chunk_size_follows_memory_budget(tiny_model):
+    config = tiny_model.config
+    small = prefill_chunk_size(config, 1 << 20, n_keys=64)
+    assert prefill_chunk_size(config, 4 << 20, n_keys=64) >= 4 * small - 1
+    assert prefill_chunk_size(config, 1 << 20, n_keys=64, batch_size=2) <= small // 2 + 1
+    assert prefill_chunk_size(config, 1, n_keys=64) == 1
+
+    tokens = torch.arange(1, 13, dtype=torch.int32)
+    with torch.inference_mode():
+        chunks = list(tiny_model.prefill_chunks(tokens, _caches(tiny_model), memory_budget=1))
+    assert len(chunks) == len(tokens)
+
+
+@torch.inference_mode()
+def test_prefill_chunks_interleave_with_other_sessions_decode(tiny_model):
+    long_prompt = torch.tensor([3, 17, 5, 42, 8, 11, 60, 2, 9, 33], dtype=torch.int32)
+    other = torch.tensor([7, 1, 4, 9, 2, 6], dtype=torch.int32)
+
+    # 基准：两个会话各自单独运行。
+    expected_prefill = tiny_model.prefill(long_prompt, _caches(tiny_model))
+    expected_caches = _caches(tiny_model)
+    expected_steps = [tiny_model(other[i : i + 1], caches=expected_caches) for i in range(len(other))]
+
+    # 调度器：长 prompt 的每个 prefill 块之间插入另一会话的一步解码。
+    caches, other_caches = _caches(tiny_model), _caches(tiny_model)
+    steps = []
+    for logits in tiny_model.prefill_chunks(long_prompt, caches, chunk_size=2):
+        steps.append(tiny_model(other[len(steps) : len(steps) + 1], caches=other_caches))
+    assert len(steps) == 5
+    torch.testing.assert_close(logits, expected_prefill, atol=2e-2, rtol=2e-2)
+    for step, expected_step in zip(steps, expected_steps):
+        torch.testing.assert_close(step, expected_step)
+
+
+def test_skip_init_only_affects_the_current_thread():
+    def build(out):
+        torch.manual_seed(0)
+        out.append(torch.nn.Linear(64, 64).weight.detach().clone())
+
+    expected = []
+    build(expected)
+    skipped, other = [], []
+    with skip_init():
+        build(skipped)
+        # A module built on another thread meanwhile is initialized as usual.
+        thread = threading.Thread(target=build, args=(other,))
+        thread.start()
+        thread.join()
+    assert not torch.equal(skipped[0], expected[0])
+    assert torch.equal(other[0], expected[0])
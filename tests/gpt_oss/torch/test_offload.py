@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+import torch
+
+from gpt_oss.torch.model import Transformer
+from gpt_oss.torch.offload import ExpertCache, load_offloaded_model
+
+
+class CountingStore:
+    def __init__(self):
+        self.loads = []
+
+    def load(self, layer_idx, expert):
+        self.loads.append((layer_idx, expert))
+        return torch.full((2,), float(expert)), torch.full((2,), float(layer_idx))
+
+
+class FlakyStore(CountingStore):
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def load(self, layer_idx, expert):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("read error")
+        return super().load(layer_idx, expert)
+
+
+@torch.inference_mode()
+@pytest.mark.parametrize("capacity,prefetch", [(1, False), (3, True), (8, True)])
+def test_offloaded_model_matches_resident_model(tiny_checkpoint, capacity, prefetch):
+    expected = Transformer.from_checkpoint(tiny_checkpoint, device="cpu")
+    model = load_offloaded_model(tiny_checkpoint, "cpu", cache_capacity=capacity, prefetch=prefetch)
+    # 专家权重不再是模型参数。
+    assert not any("mlp1_weight" in name or "mlp2_weight" in name for name, _ in model.named_parameters())
+
+    tokens = torch.tensor([3, 17, 5, 42, 7, 91], dtype=torch.int32)
+    for _ in range(2):
+        assert torch.equal(model(tokens), expected(tokens))
+    model.expert_cache.close()
+
+    stats = model.expert_cache.stats
+    assert len(model.expert_cache) <= capacity
+    if capacity >= 8:
+        # 全部专家都能放下：第二次前向全部命中。
+        assert stats.misses + stats.prefetches <= 8
+    assert stats.hits + stats.misses > 0
+
+
+def test_expert_cache_lru_eviction():
+    store = CountingStore()
+    cache = ExpertCache(store, capacity=2, prefetch=False)
+    cache.get(0, [0, 1])
+    cache.get(0, [0])  # 0 成为最近使用
+    cache.get(0, [2])  # 淘汰 1
+    assert store.loads == [(0, 0), (0, 1), (0, 2)]
+    cache.get(0, [0, 1])
+    assert store.loads[-1] == (0, 1)
+    assert cache.stats.hits == 2 and cache.stats.misses == 4
+    assert cache.stats.evictions == 2
+
+
+def test_expert_cache_prefetch_counts_as_hit():
+    store = CountingStore()
+    cache = ExpertCache(store, capacity=4)
+    cache.prefetch(1, [2, 3])
+    weights = cache.get(1, [2, 3])
+    cache.close()
+    assert weights[3][0][0] == 3.0 and weights[2][1][0] == 1.0
+    assert store.loads == [(1, 2), (1, 3)]
+    assert cache.stats.misses == 0 and cache.stats.prefetch_hits == 2
+    assert cache.stats.prefetch_accuracy == 1.0
+
+
+def test_failed_prefetch_is_retried():
+    store = FlakyStore(failures=1)
+    cache = ExpertCache(store, capacity=4)
+    cache.prefetch(0, [1])
+    # get() 等到的是失败的预取：改为同步重新加载，且不会留下 in-flight 记录。
+    weights = cache.get(0, [1])
+    assert weights[1][0][0] == 1.0
+    assert store.loads == [(0, 1)]
+    assert cache.stats.misses == 1 and cache.stats.hits == 0 and cache.stats.prefetch_hits == 0
+
+    store.failures = 1
+    cache.prefetch(0, [2])
+    cache._executor.submit(lambda: None).result()  # 单线程执行器：预取已结束
+    assert (0, 2) not in cache._in_flight and (0, 2) not in cache._prefetched
+    assert cache.get(0, [2])[2][0][0] == 2.0
+    cache.close()
+
+
+def test_failed_prefetch_with_two_waiters_keeps_counts_consistent():
+    gate = threading.Event()
+
+    class GatedFlakyStore(FlakyStore):
+        def load(self, layer_idx, expert):
+            gate.wait()
+            return super().load(layer_idx, expert)
+
+    store = GatedFlakyStore(failures=1)
+    cache = ExpertCache(store, capacity=4)
+    cache.prefetch(0, [1])
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(0, [1]))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    # 两个调用都已在等待同一预取后再让它失败。
+    while cache.stats.hits < 2:
+        time.sleep(0.001)
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert [weights[1][0][0] for weights in results] == [1.0, 1.0]
+    assert cache.stats.hits == 0 and cache.stats.misses == 2 and cache.stats.prefetch_hits == 0
+    cache.close()
@@ -0,0 +1,85 @@
+import pytest
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from gpt_oss.torch.model import ModelConfig, TokenGenerator
+from gpt_oss.torch.pipeline import (
+    PipelineStage,
+    StageStats,
+    gather_stage_stats,
+    pipeline_generate,
+    plan_stages,
+)
+
+from conftest import TINY_CONFIG, make_tiny_checkpoint
+
+
+PIPELINE_CONFIG = TINY_CONFIG | dict(num_hidden_layers=4)
+PROMPTS = [[3, 17, 5, 42, 8], [11, 60, 2], [9, 33, 1, 7, 20, 4], [50, 51]]
+
+
+def test_plan_stages_covers_all_layers():
+    config = ModelConfig(**(TINY_CONFIG | dict(num_hidden_layers=12)))
+    for num_stages in (1, 2, 3, 4, 12):
+        plan = plan_stages(config, num_stages)
+        assert len(plan) == num_stages
+        assert [layer for stage in plan for layer in stage] == list(range(12))
+        assert all(len(stage) > 0 for stage in plan)
+
+
+def test_plan_stages_offloads_large_vocab_from_the_ends():
+    # 词表很大时，首末段应分到更少的层。
+    config = ModelConfig(**(TINY_CONFIG | dict(num_hidden_layers=12, vocab_size=8192)))
+    plan = plan_stages(config, 3)
+    assert len(plan[1]) > len(plan[0]) and len(plan[1]) > len(plan[2])
+
+
+def _worker(rank, world_size, checkpoint, init_file, result_path):
+    torch.set_num_threads(1)
+    dist.init_process_group("gloo", init_method=f"file://{init_file}", rank=rank, world_size=world_size)
+    try:
+        stage = PipelineStage.from_checkpoint(checkpoint, device="cpu")
+        # 每个 rank 只持有自己那段的层。
+        assert len(stage.block) < PIPELINE_CONFIG["num_hidden_layers"]
+        stats = StageStats()
+        outputs = pipeline_generate(stage, PROMPTS, stop_tokens=[], temperature=0.0, max_tokens=5, context=32, stats=stats)
+        all_stats = gather_stage_stats(stats)
+        if rank == 0:
+            torch.save({"outputs": outputs, "stats": [s.as_dict() for s in all_stats]}, result_path)
+    finally:
+        dist.destroy_process_group()
+
+
+@pytest.mark.parametrize("world_size", [2, 4])
+def test_pipeline_matches_single_process(tmp_path, world_size):
+    checkpoint = make_tiny_checkpoint(tmp_path / "checkpoint", config=PIPELINE_CONFIG)
+    generator = TokenGenerator(checkpoint, device=torch.device("cpu"), context=32)
+    expected = [
+        list(generator.generate(prompt, stop_tokens=[], temperature=0.0, max_tokens=5))
+        for prompt in PROMPTS
+    ]
+
+    result_path = str(tmp_path / "result.pt")
+    mp.spawn(
+        _worker,
+        args=(world_size, checkpoint, str(tmp_path / "init"), result_path),
+        nprocs=world_size,
+    )
+    result = torch.load(result_path)
+
+    assert result["outputs"] == expected
+    stats = result["stats"]
+    assert [s["stage"] for s in stats] == list(range(world_size))
+    assert sum(s["num_layers"] for s in stats) == PIPELINE_CONFIG["num_hidden_layers"]
+    # 每段都处理了全部 micro-batch：prefill 1 次 + 解码 4 次。
+    assert all(s["microbatch_steps"] == len(PROMPTS) * 5 for s in stats)
+    assert all(0.0 < s["utilization"] <= 1.0 for s in stats)
+
+
+def test_pipeline_single_stage_stops_on_stop_token(tiny_checkpoint):
+    stage = PipelineStage.from_checkpoint(tiny_checkpoint, device="cpu")
+    outputs = pipeline_generate(stage, PROMPTS[:2], stop_tokens=[], temperature=0.0, max_tokens=4, context=32)
+    stop = outputs[0][1]
+    stopped = pipeline_generate(stage, PROMPTS[:2], stop_tokens=[stop], temperature=0.0, max_tokens=4, context=32)
+    assert stopped[0] == outputs[0][: outputs[0].index(stop) + 1]
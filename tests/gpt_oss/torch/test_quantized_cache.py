@@ -0,0 +1,100 @@
+import pytest
+import torch
+
+from gpt_oss.torch import model as torch_model
+from gpt_oss.torch.model import (
+    KV_CACHE_DTYPES,
+    Cache,
+    QuantizedCache,
+    QuantizedKV,
+    TokenGenerator,
+    dequantize_kv,
+    quantize_kv,
+    sdpa,
+)
+
+
+def _caches(model, cls=Cache, **kwargs):
+    config = model.config
+    return [cls(1, 4, config.num_key_value_heads, config.head_dim, **kwargs) for _ in model.block]
+
+
+@pytest.mark.parametrize("kv_dtype,tolerance", [("int8", 1 / 127), ("fp8", 1 / 16)])
+@pytest.mark.parametrize("block_size", [None, 8])
+def test_quantize_kv_round_trip(kv_dtype, tolerance, block_size):
+    if kv_dtype not in KV_CACHE_DTYPES:
+        pytest.skip(f"{kv_dtype} is not supported by this torch build")
+    x = torch.randn(2, 5, 3, 16) * torch.logspace(-3, 2, 16)
+    x[0, 0, 0] = 0  # 全零块不能产生 NaN
+    q, scales = quantize_kv(x, kv_dtype, block_size)
+    assert q.shape == x.shape and q.element_size() == 1
+    assert scales.shape == (2, 5, 3, 16 // (block_size or 16))
+    restored = dequantize_kv(q, scales, torch.float32)
+    # 误差不超过所在块最大绝对值的 tolerance 倍。
+    blocks = x.reshape(*x.shape[:-1], scales.shape[-1], -1)
+    amax = blocks.abs().amax(-1, keepdim=True).expand_as(blocks).reshape(x.shape)
+    assert ((restored - x).abs() <= amax * tolerance + 1e-12).all()
+    assert torch.equal(restored[0, 0, 0], torch.zeros(16))
+
+
+@torch.inference_mode()
+@pytest.mark.parametrize("kv_dtype", sorted(KV_CACHE_DTYPES))
+def test_quantized_cache_decode_close_to_bf16(tiny_model, kv_dtype):
+    tokens = torch.tensor([3, 17, 5, 42, 8, 11, 60, 2, 9, 33, 1, 7], dtype=torch.int32)
+    caches = _caches(tiny_model)
+    quantized = _caches(tiny_model, QuantizedCache, kv_dtype=kv_dtype)
+    # 先 prefill 一段，再逐 token 解码（覆盖扩容与 dequantize-on-read）。
+    expected = [tiny_model(tokens[:5], caches=caches)[-1]]
+    actual = [tiny_model(tokens[:5], caches=quantized)[-1]]
+    for i in range(5, len(tokens)):
+        expected.append(tiny_model(tokens[i : i + 1], caches=caches)[-1])
+        actual.append(tiny_model(tokens[i : i + 1], caches=quantized)[-1])
+    p = torch.log_softmax(torch.stack(expected).float(), dim=-1)
+    q = torch.log_softmax(torch.stack(actual).float(), dim=-1)
+    kl = (p.exp() * (p - q)).sum(-1)
+    assert kl.max() < 1e-2
+    # 每个值 1 字节，另加每 (token, head) 一个 float32 scale。
+    head_dim = tiny_model.config.head_dim
+    expected_ratio = (1 + 4 / head_dim) / 2
+    assert sum(c.nbytes for c in quantized) == pytest.approx(expected_ratio * sum(c.nbytes for c in caches))
+
+
+@pytest.mark.parametrize("block_size", [None, 8])
+def test_sdpa_dequantizes_in_chunks(monkeypatch, block_size):
+    torch.manual_seed(0)
+    q = torch.randn(2, 3, 2, 2, 16, dtype=torch.bfloat16)
+    k = QuantizedKV(*quantize_kv(torch.randn(2, 10, 2, 16), "int8", block_size))
+    v = QuantizedKV(*quantize_kv(torch.randn(2, 10, 2, 16), "int8", block_size))
+    sinks = torch.randn(4, dtype=torch.bfloat16)
+    expected = sdpa(q, [dequantize_kv(*k)], [dequantize_kv(*v)], sinks, 0.25, start_q=7)
+    # 3 个 token 一块：10 个 key 跨 4 块，结果与一次性反量化一致（仅 bf16 累加顺序不同）。
+    monkeypatch.setattr(torch_model, "KV_DEQUANT_CHUNK", 3)
+    dequantized = []
+    real_dequantize = QuantizedKV.dequantize
+    monkeypatch.setattr(QuantizedKV, "dequantize", lambda self, *a: dequantized.append(a) or real_dequantize(self, *a))
+    torch.testing.assert_close(sdpa(q, [k], [v], sinks, 0.25, start_q=7), expected, atol=1e-2, rtol=1e-2)
+    assert [end - start for start, end, _ in dequantized] == [3] * 8
+
+
+@torch.inference_mode()
+def test_quantized_cache_truncate_and_fork(tiny_model):
+    tokens = torch.tensor([[3, 17, 5, 42, 8, 11]], dtype=torch.int32)
+    caches = _caches(tiny_model, QuantizedCache)
+    tiny_model(tokens, caches=caches)
+    for cache in caches:
+        cache.truncate(4)
+    rerun = tiny_model(tokens[:, 4:], caches=caches)
+    fresh = _caches(tiny_model, QuantizedCache)
+    torch.testing.assert_close(rerun, tiny_model(tokens, caches=fresh)[:, 4:])
+
+    for cache in fresh:
+        cache.fork(2)
+    forked = tiny_model(torch.tensor([[1], [1]], dtype=torch.int32), caches=fresh)
+    torch.testing.assert_close(forked[0], forked[1])
+
+
+def test_token_generator_with_quantized_cache(tiny_checkpoint):
+    generator = TokenGenerator(tiny_checkpoint, device=torch.device("cpu"), context=8, kv_cache_dtype="int8")
+    tokens = list(generator.generate([3, 17, 5], stop_tokens=[], temperature=0.0, max_tokens=4))
+    assert len(tokens) == 4
+    assert all(isinstance(c, QuantizedCache) for c in generator._new_caches())
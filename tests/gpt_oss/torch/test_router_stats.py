@@ -0,0 +1,78 @@
+import json
+
+import pytest
+import torch
+
+from gpt_oss.torch.model import Transformer
+from gpt_oss.torch.router_stats import RouterStats, attach_router_stats, detach_router_stats
+
+from conftest import TINY_CONFIG
+
+
+@torch.inference_mode()
+def test_router_stats_match_model_routing(tiny_checkpoint):
+    model = Transformer.from_checkpoint(tiny_checkpoint, device="cpu")
+    tokens = torch.tensor([3, 17, 5, 42, 7, 91], dtype=torch.int32)
+    expected_logits = model(tokens)
+
+    # 手动记录每层 MoE 的输入，用来独立复算路由结果。
+    inputs = {}
+    hooks = [
+        block.mlp.register_forward_pre_hook(lambda m, args, i=block.layer_idx: inputs.__setitem__(i, args[0]))
+        for block in model.block
+    ]
+    stats = attach_router_stats(model)
+    # 统计钩子不改变模型输出。
+    assert torch.equal(model(tokens), expected_logits)
+    for hook in hooks:
+        hook.remove()
+
+    snapshot = stats.snapshot()
+    K, E = TINY_CONFIG["experts_per_token"], TINY_CONFIG["num_experts"]
+    for block in model.block:
+        layer = snapshot["layers"][block.layer_idx]
+        mlp = block.mlp
+        g = mlp.gate(mlp.norm(inputs[block.layer_idx].reshape(-1, TINY_CONFIG["hidden_size"])))
+        indices = torch.topk(g, k=K, dim=-1, sorted=True).indices
+        assert layer["tokens"] == len(tokens)
+        assert layer["expert_counts"] == torch.bincount(indices.flatten(), minlength=E).tolist()
+        for k in range(K):
+            assert layer["selection_histogram"][k] == torch.bincount(indices[:, k], minlength=E).tolist()
+        assert sum(map(sum, layer["topk_weight_histogram"])) == len(tokens) * K
+        assert sum(layer["entropy_histogram"]) == len(tokens)
+        assert 0.0 < layer["entropy_mean"] <= 1.0
+        assert layer["load_imbalance"] >= 1.0
+
+    detach_router_stats(model)
+    model(tokens)
+    assert stats.snapshot()["layers"][0]["tokens"] == len(tokens)
+
+
+def test_router_stats_computes_topk_from_logits(tmp_path):
+    stats = RouterStats(num_layers=1, num_experts=4, experts_per_token=2, num_bins=4)
+    # 第 0 个 token 选中 (3, 1)，第 1 个 token 选中 (0, 2)；均匀 logits 的熵为 1。
+    logits = torch.tensor([[0.0, 2.0, -1.0, 5.0], [9.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.0, 0.0]])
+    stats.record(0, logits[:2])
+    stats.record(0, logits[2:])
+    layer = stats.snapshot()["layers"][0]
+    assert layer["tokens"] == 3
+    assert layer["selection_histogram"][0][3] == 1 and layer["selection_histogram"][0][0] >= 1
+    assert layer["selection_histogram"][1][1] == 1 and layer["selection_histogram"][1][2] == 1
+    assert layer["entropy_histogram"][-1] == 1
+
+    stats.to_json(tmp_path / "router.json")
+    with open(tmp_path / "router.json") as f:
+        assert json.load(f)["layers"][0]["expert_counts"] == layer["expert_counts"]
+
+    stats.reset()
+    assert stats.snapshot()["layers"][0]["tokens"] == 0
+
+
+def test_router_stats_parquet_export(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    stats = RouterStats(num_layers=2, num_experts=4, experts_per_token=2)
+    stats.record(1, torch.randn(5, 4))
+    stats.to_parquet(tmp_path / "router.parquet")
+    table = pq.read_table(tmp_path / "router.parquet").to_pydict()
+    assert len(table["expert"]) == 2 * 4
+    assert sum(table["tokens"]) == 5 * 2
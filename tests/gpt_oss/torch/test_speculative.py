@@ -0,0 +1,59 @@
+import torch
+
+from gpt_oss.torch.model import TokenGenerator, Transformer
+from gpt_oss.torch.speculative import DraftModelDrafter, NGramDrafter, verify_draft
+
+
+PROMPT = [3, 17, 5, 42, 8, 11, 3, 17, 5, 42, 8, 60, 2]
+
+
+def test_ngram_drafter_copies_latest_continuation():
+    drafter = NGramDrafter(num_draft_tokens=3, max_ngram=2)
+    drafts, probs = drafter.propose([1, 2, 3, 4, 9, 1, 2, 7, 8, 1, 2])
+    assert drafts == [7, 8, 1]
+    assert probs is None
+    assert drafter.propose([5, 6]) == ([], None)
+
+
+def test_greedy_speculative_matches_plain_decoding(tiny_checkpoint):
+    generator = TokenGenerator(tiny_checkpoint, device=torch.device("cpu"))
+    expected = list(generator.generate(PROMPT, stop_tokens=[], temperature=0.0, max_tokens=12))
+
+    drafter = NGramDrafter(num_draft_tokens=4)
+    actual = list(
+        generator.generate(PROMPT, stop_tokens=[], temperature=0.0, max_tokens=12, drafter=drafter)
+    )
+    assert actual == expected
+    assert generator.speculative_stats.generated_tokens >= 12
+
+
+def test_self_drafting_accepts_everything(tiny_checkpoint):
+    generator = TokenGenerator(tiny_checkpoint, device=torch.device("cpu"))
+    expected = list(generator.generate(PROMPT, stop_tokens=[], temperature=0.0, max_tokens=10))
+
+    draft_model = Transformer.from_checkpoint(tiny_checkpoint, device="cpu")
+    drafter = DraftModelDrafter(draft_model, num_draft_tokens=4)
+    actual = list(
+        generator.generate(PROMPT, stop_tokens=[], temperature=0.0, max_tokens=10, drafter=drafter)
+    )
+    assert actual == expected
+    stats = generator.speculative_stats
+    assert stats.acceptance_rate == 1.0
+    assert stats.tokens_per_step == 5.0
+
+
+def test_verify_draft_preserves_target_distribution():
+    torch.manual_seed(0)
+    logits = torch.tensor([[0.5, 1.5, -1.0, 0.0], [0.0, 0.0, 0.0, 0.0]])
+    target = torch.softmax(logits[0], dim=-1)
+    draft_probs = torch.tensor([[0.1, 0.2, 0.6, 0.1]])
+
+    trials = 20000
+    counts = {"ngram": torch.zeros(4), "model": torch.zeros(4)}
+    for _ in range(trials):
+        counts["ngram"][verify_draft(logits, [2], None, temperature=1.0)[0]] += 1
+        drafted = int(torch.multinomial(draft_probs[0], 1))
+        counts["model"][verify_draft(logits, [drafted], draft_probs, temperature=1.0)[0]] += 1
+
+    for observed in counts.values():
+        torch.testing.assert_close(observed / trials, target, atol=0.015, rtol=0)
@@ -0,0 +1,70 @@
+import pytest
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from gpt_oss.torch.model import TokenGenerator, Transformer
+
+from conftest import TINY_CONFIG, make_tiny_checkpoint
+
+
+# 4 个 KV 头 / 8 个 Q 头，保证 world_size=2/4 时每个 rank 都分到完整的 KV 头组。
+TP_CONFIG = TINY_CONFIG | dict(num_attention_heads=8, num_key_value_heads=4)
+PROMPT = [3, 17, 5, 42, 8, 11, 60, 2]
+
+
+@torch.inference_mode()
+def _reference_logits(checkpoint, tokens):
+    model = Transformer.from_checkpoint(checkpoint, device="cpu")
+    return model(torch.tensor(tokens, dtype=torch.int32)).float()
+
+
+def _worker(rank, world_size, checkpoint, init_file, result_path):
+    torch.set_num_threads(1)
+    dist.init_process_group(
+        "gloo", init_method=f"file://{init_file}", rank=rank, world_size=world_size
+    )
+    try:
+        with torch.inference_mode():
+            model = Transformer.from_checkpoint(checkpoint, device="cpu")
+            logits = model(torch.tensor(PROMPT, dtype=torch.int32))
+        generator = TokenGenerator(checkpoint, device=torch.device("cpu"), context=64)
+        tokens = list(generator.generate(PROMPT, stop_tokens=[], temperature=0.0, max_tokens=6, return_logprobs=True))
+        # 采样路径：各 rank 必须得到同一个 token。
+        sampled = list(generator.generate(PROMPT, stop_tokens=[], temperature=1.0, max_tokens=4))
+        all_sampled = [None] * world_size
+        dist.all_gather_object(all_sampled, sampled)
+        if rank == 0:
+            torch.save(
+                {"logits": logits, "tokens": tokens, "sampled": all_sampled},
+                result_path,
+            )
+    finally:
+        dist.destroy_process_group()
+
+
+@pytest.mark.parametrize("world_size", [2, 4])
+def test_tensor_parallel_matches_single_process(tmp_path, world_size):
+    checkpoint = make_tiny_checkpoint(tmp_path / "checkpoint", config=TP_CONFIG)
+
+    result_path = str(tmp_path / "result.pt")
+    mp.spawn(
+        _worker,
+        args=(world_size, checkpoint, str(tmp_path / "init"), result_path),
+        nprocs=world_size,
+    )
+    result = torch.load(result_path)
+
+    expected_logits = _reference_logits(checkpoint, PROMPT)
+    torch.testing.assert_close(result["logits"].float(), expected_logits, atol=5e-2, rtol=5e-2)
+
+    # 随机小模型的 logits 常有近似并列，bf16 归约顺序不同就可能换 token，
+    # 所以用单进程模型对 TP 生成的序列做 teacher forcing：每个 token 都应是（近似）argmax。
+    generated = [token for token, _ in result["tokens"]]
+    reference = _reference_logits(checkpoint, PROMPT + generated)[len(PROMPT) - 1 : -1]
+    for step, (token, logprob) in enumerate(result["tokens"]):
+        assert reference[step, token] >= reference[step].max() - 5e-2
+        expected = torch.log_softmax(reference[step], dim=-1)[token].item()
+        assert logprob == pytest.approx(expected, abs=5e-2)
+    assert all(sampled == result["sampled"][0] for sampled in result["sampled"])
+    assert len(result["sampled"][0]) == 4
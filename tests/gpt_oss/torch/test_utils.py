@@ -0,0 +1,79 @@
+import os
+import socket
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from gpt_oss.torch import utils
+from gpt_oss.torch.utils import _parse_cpulist, cpu_placement, init_distributed
+
+
+def test_parse_cpulist():
+    assert _parse_cpulist("0-3,8,10-11\n") == [0, 1, 2, 3, 8, 10, 11]
+    assert _parse_cpulist("") == []
+
+
+def test_cpu_placement_spreads_ranks_over_numa_nodes(monkeypatch):
+    monkeypatch.setattr(utils, "numa_nodes", lambda: {0: list(range(0, 8)), 1: list(range(8, 16))})
+    placements = [cpu_placement(rank, 4) for rank in range(4)]
+    assert [node for node, _ in placements] == [0, 1, 0, 1]
+    assert placements[0][1] == [0, 1, 2, 3]
+    assert placements[2][1] == [4, 5, 6, 7]
+    assert placements[3][1] == [12, 13, 14, 15]
+
+
+def test_cpu_placement_shares_cpus_when_oversubscribed(monkeypatch):
+    monkeypatch.setattr(utils, "numa_nodes", lambda: {0: [0, 1]})
+    assert [cpus for _, cpus in (cpu_placement(rank, 4) for rank in range(4))] == [[0], [1], [0], [1]]
+
+
+def _worker(rank, world_size, port):
+    os.environ.update(
+        MASTER_ADDR="127.0.0.1",
+        MASTER_PORT=str(port),
+        RANK=str(rank),
+        WORLD_SIZE=str(world_size),
+        GPT_OSS_DEVICE="cpu",
+    )
+    device = init_distributed(pin_cpus=False, num_threads=1)
+    try:
+        assert device == torch.device("cpu")
+        assert dist.get_backend() == "gloo"
+        assert torch.get_num_threads() == 1
+        x = torch.tensor([rank + 1.0])
+        dist.all_reduce(x)
+        assert x.item() == world_size * (world_size + 1) / 2
+    finally:
+        dist.destroy_process_group()
+
+
+def test_init_distributed_on_cpu_uses_gloo():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    mp.spawn(_worker, args=(2, port), nprocs=2)
+
+
+def test_single_process_is_not_pinned_by_default(monkeypatch):
+    pinned = []
+    monkeypatch.setattr(os, "sched_setaffinity", lambda pid, cpus: pinned.append(list(cpus)), raising=False)
+    monkeypatch.setattr(os, "sched_getaffinity", lambda pid: {0, 1, 8, 9}, raising=False)
+    monkeypatch.setattr(utils, "numa_nodes", lambda: {0: [0, 1], 1: [8, 9]})
+    monkeypatch.setattr(torch, "set_num_threads", lambda n: pinned.append(n))
+    monkeypatch.setattr(utils, "suppress_output", lambda rank: None)
+    monkeypatch.setenv("GPT_OSS_DEVICE", "cpu")
+    monkeypatch.delenv("GPT_OSS_PIN_CPUS", raising=False)
+    monkeypatch.delenv("GPT_OSS_NUM_THREADS", raising=False)
+    for name in ("WORLD_SIZE", "RANK", "LOCAL_RANK", "LOCAL_WORLD_SIZE"):
+        monkeypatch.delenv(name, raising=False)
+
+    # 单进程默认不绑核，线程数覆盖所有可用核心。
+    assert init_distributed() == torch.device("cpu")
+    assert pinned == [4]
+
+    # 显式要求时仍然绑到一个 NUMA 节点。
+    pinned.clear()
+    monkeypatch.setenv("GPT_OSS_PIN_CPUS", "1")
+    init_distributed()
+    assert pinned == [[0, 1], 2]
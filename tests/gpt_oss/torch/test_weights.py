@@ -0,0 +1,151 @@
+import os
+
+import pytest
+import torch
+from safetensors.torch import save_file
+
+from gpt_oss.torch import weights
+from gpt_oss.torch.weights import Checkpoint, decode_mxfp4
+
+from conftest import TINY_CONFIG, make_tiny_checkpoint
+
+
+def _count_opens(monkeypatch):
+    opened = []
+    real_safe_open = weights.safe_open
+
+    def counting_safe_open(filename, *args, **kwargs):
+        opened.append(os.path.basename(filename))
+        return real_safe_open(filename, *args, **kwargs)
+
+    monkeypatch.setattr(weights, "safe_open", counting_safe_open)
+    return opened
+
+
+def test_checkpoint_opens_each_shard_once(tmp_path, monkeypatch):
+    path = make_tiny_checkpoint(tmp_path / "checkpoint", num_shards=3)
+    opened = _count_opens(monkeypatch)
+    with Checkpoint(path, torch.device("cpu")) as checkpoint:
+        for name in checkpoint.tensor_name_to_file:
+            checkpoint.get(name)
+    assert sorted(opened) == sorted(f for f in os.listdir(path) if f.endswith(".safetensors"))
+
+
+def test_checkpoint_uses_index_without_scanning(tmp_path, monkeypatch):
+    path = make_tiny_checkpoint(tmp_path / "checkpoint", num_shards=3, index=True)
+    opened = _count_opens(monkeypatch)
+    checkpoint = Checkpoint(path, torch.device("cpu"))
+    assert opened == []
+    assert len(checkpoint.tensor_name_to_file) > 0
+    checkpoint.get("embedding.weight")
+    assert opened == [os.path.basename(checkpoint.tensor_name_to_file["embedding.weight"])]
+
+
+def test_get_many_matches_get(tmp_path):
+    path = make_tiny_checkpoint(tmp_path / "checkpoint", num_shards=2, index=True)
+    names = ["embedding.weight", "block.0.mlp.mlp1_weight", "block.1.mlp.mlp2_weight", "norm.scale"] * 3
+    sequential = Checkpoint(path, torch.device("cpu"), num_workers=1)
+    parallel = Checkpoint(path, torch.device("cpu"), num_workers=4)
+    loaded = list(parallel.get_many(names))
+    assert [name for name, _ in loaded] == names
+    for name, tensor in loaded:
+        assert torch.equal(tensor, sequential.get(name))
+
+
+def test_get_many_decodes_each_tensor_on_one_thread(tmp_path, monkeypatch):
+    path = make_tiny_checkpoint(tmp_path / "checkpoint")
+    decode_threads = []
+
+    def recording_decode(blocks, scales, *, num_threads=None, **kwargs):
+        decode_threads.append(num_threads)
+        return decode_mxfp4(blocks, scales, num_threads=num_threads, **kwargs)
+
+    monkeypatch.setattr(weights, "decode_mxfp4", recording_decode)
+    checkpoint = Checkpoint(path, torch.device("cpu"), num_workers=2)
+    names = ["block.0.mlp.mlp1_weight", "block.0.mlp.mlp2_weight"]
+    list(checkpoint.get_many(names))
+    assert decode_threads == [1, 1]
+    # 单独调用 get 时仍按默认线程数解码。
+    checkpoint.get(names[0])
+    assert decode_threads[-1] is None
+
+
+def test_get_many_bounds_read_ahead_by_bytes(tmp_path):
+    path = make_tiny_checkpoint(tmp_path / "checkpoint", num_shards=2, index=True)
+    names = ["embedding.weight", "block.0.mlp.mlp1_weight", "block.1.mlp.mlp2_weight", "norm.scale"]
+    checkpoint = Checkpoint(path, torch.device("cpu"), num_workers=4)
+    for name in names:
+        assert checkpoint.decoded_nbytes(name) == checkpoint.get(name).nbytes
+    spec = (slice(None), slice(0, 32))
+    assert checkpoint.decoded_nbytes("block.0.mlp.mlp1_weight", spec) == checkpoint.get("block.0.mlp.mlp1_weight", spec).nbytes
+
+    events = []
+    real_get = checkpoint.get
+    checkpoint.get = lambda name, slices=None, **kwargs: events.append(("get", name)) or real_get(name, slices, **kwargs)
+    # A budget below every tensor's size: each tensor is read only after the previous one was consumed.
+    checkpoint.max_inflight_bytes = 1
+    for name, _ in checkpoint.get_many(names):
+        events.append(("yield", name))
+    assert events == [(kind, name) for name in names for kind in ("get", "yield")]
+
+
+@pytest.mark.parametrize("intermediate_size", [64, 128])
+@pytest.mark.parametrize("world_size", [1, 2, 4])
+def test_sliced_get_is_bitwise_identical_to_slicing_after_decode(tmp_path, world_size, intermediate_size):
+    # intermediate_size=128 时各 rank 的 mlp2 切片按 32 元素块对齐；64 且 world_size=4 时走未对齐回退路径。
+    path = make_tiny_checkpoint(tmp_path / "checkpoint", config=TINY_CONFIG | dict(intermediate_size=intermediate_size))
+    checkpoint = Checkpoint(path, torch.device("cpu"))
+    per_rank = intermediate_size // world_size
+    for rank in range(world_size):
+        specs = {
+            "block.0.mlp.mlp1_weight": (slice(None), slice(rank * 2 * per_rank, (rank + 1) * 2 * per_rank)),
+            "block.0.mlp.mlp1_bias": (slice(None), slice(rank * 2 * per_rank, (rank + 1) * 2 * per_rank)),
+            "block.1.mlp.mlp2_weight": (..., slice(rank * per_rank, (rank + 1) * per_rank)),
+            "embedding.weight": (slice(rank * 96 // world_size, (rank + 1) * 96 // world_size),),
+        }
+        for name, spec in specs.items():
+            expected = checkpoint.get(name)[spec]
+            actual = checkpoint.get(name, spec)
+            # 按位比较（torch.equal 会把 -0.0 与 +0.0 视为相等）。
+            assert actual.shape == expected.shape
+            assert torch.equal(actual.view(torch.int16), expected.view(torch.int16))
+
+
+def test_sliced_mxfp4_reads_only_selected_blocks(tmp_path, monkeypatch):
+    path = make_tiny_checkpoint(tmp_path / "checkpoint", config=TINY_CONFIG | dict(intermediate_size=128))
+    checkpoint = Checkpoint(path, torch.device("cpu"))
+    read_shapes = []
+    real_get_tensor = checkpoint._get_tensor
+
+    def recording_get_tensor(name, slices=None):
+        tensor = real_get_tensor(name, slices)
+        read_shapes.append((name, tuple(tensor.shape)))
+        return tensor
+
+    monkeypatch.setattr(checkpoint, "_get_tensor", recording_get_tensor)
+    checkpoint.get("block.0.mlp.mlp2_weight", (..., slice(64, 128)))
+    # 完整 blocks 为 [4, 64, 4, 16]，只应读取第二半的 2 个块。
+    assert read_shapes == [
+        ("block.0.mlp.mlp2_weight.blocks", (4, 64, 2, 16)),
+        ("block.0.mlp.mlp2_weight.scales", (4, 64, 2)),
+    ]
+
+
+@pytest.mark.parametrize("scale_range", [(118, 124), (0, 256)])
+@pytest.mark.parametrize("num_threads", [1, 3])
+def test_decode_mxfp4_is_bitwise_identical_to_reference(tmp_path, scale_range, num_threads):
+    generator = torch.Generator().manual_seed(0)
+    blocks = torch.randint(0, 256, (3, 50, 4, 16), dtype=torch.uint8, generator=generator)
+    scales = torch.randint(*scale_range, (3, 50, 4), dtype=torch.uint8, generator=generator)
+    save_file({"w.blocks": blocks, "w.scales": scales}, tmp_path / "model.safetensors")
+    checkpoint = Checkpoint(str(tmp_path), torch.device("cpu"))
+
+    expected = checkpoint._get_mxfp4_tensor("w.blocks", "w.scales")
+    actual = decode_mxfp4(blocks, scales, rows_per_chunk=64, num_threads=num_threads)
+    assert torch.equal(actual.view(torch.int16), expected.view(torch.int16))
+    assert torch.equal(
+        checkpoint._get_mxfp4_tensor_copy("w.blocks", "w.scales").view(torch.int16), expected.view(torch.int16)
+    )
+    torch.testing.assert_close(
+        decode_mxfp4(blocks, scales, dtype=torch.float32), expected.float(), equal_nan=True
+    )
@@ -58,7 +58,54 @@ class TestResponsesEndpoint:
             assert response.status_code == status.HTTP_200_OK
             data = response.json()
             assert "usage" in data
-    
+
+    def test_response_with_multiple_samples(self, api_client, sample_request_data):
+        sample_request_data["n"] = 3
+        response = api_client.post("/v1/responses", json=sample_request_data)
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert len(data["outputs"]) == 3
+        assert data["output"] == data["outputs"][0]
+        assert data["usage"]["output_tokens"] > 0
+
+    def test_greedy_rejects_multiple_samples(self, api_client, sample_request_data):
+        sample_request_data["n"] = 2
+        sample_request_data["temperature"] = 0.0
+        response = api_client.post("/v1/responses", json=sample_request_data)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_multiple_samples_differ_above_zero_temperature(self, harmony_encoding, sample_request_data):
+        import random
+        from fastapi.testclient import TestClient
+        from gpt_oss.responses_api.api_server import create_api_server
+
+        replies = [
+            harmony_encoding.encode(f"<|channel|>final<|message|>{text}<|return|>", allowed_special="all")
+            for text in ["Test response", "Other response"]
+        ]
+        rng = random.Random(0)
+        queue = []
+
+        def sample(tokens: list[int], temperature: float = 0.0, new_request: bool = False) -> int:
+            nonlocal queue
+            if new_request or not queue:
+                queue = list(replies[rng.random() < 0.5 if temperature > 0 else 0])
+            return queue.pop(0)
+
+        app = create_api_server(infer_next_token=sample, encoding=harmony_encoding)
+        sample_request_data["n"] = 8
+        with TestClient(app) as client:
+            response = client.post("/v1/responses", json=sample_request_data)
+        assert response.status_code == status.HTTP_200_OK
+        outputs = {json.dumps(output, sort_keys=True) for output in response.json()["outputs"]}
+        assert len(outputs) > 1
+
+    def test_streaming_rejects_multiple_samples(self, api_client, sample_request_data):
+        sample_request_data["n"] = 2
+        sample_request_data["stream"] = True
+        response = api_client.post("/v1/responses", json=sample_request_data)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
     def test_streaming_response(self, api_client, sample_request_data):
         sample_request_data["stream"] = True
         with api_client.stream("POST", "/v1/responses", json=sample_request_data) as response:
@@ -227,4 +274,27 @@ class TestUsageTracking:
         usage2 = response2.json()["usage"]
         
         # Longer input should use more tokens
-        assert usage2["input_tokens"] > usage1["input_tokens"]
\ No newline at end of file
+        assert usage2["input_tokens"] > usage1["input_tokens"]
+
+class TestMetrics:
+
+    def test_metrics_without_backend_stats(self, api_client):
+        response = api_client.get("/v1/metrics")
+        assert response.status_code == status.HTTP_200_OK
+        # Only the browser cache counters, no inference backend statistics.
+        assert set(response.json()) == {"browser"}
+        assert response.json()["browser"]["page_cache"]["misses"] == 0
+
+    def test_metrics_served_from_backend(self, harmony_encoding, mock_infer_token):
+        from fastapi.testclient import TestClient
+        from gpt_oss.responses_api.api_server import create_api_server
+
+        app = create_api_server(
+            infer_next_token=mock_infer_token,
+            encoding=harmony_encoding,
+            metrics=lambda: {"router": {"num_layers": 2}},
+        )
+        with TestClient(app) as client:
+            response = client.get("/v1/metrics")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["router"]["num_layers"] == 2